@@ -1,10 +1,45 @@
 import os
+import sys
 import requests
 import json
 from flask import Flask, render_template, request, jsonify, send_from_directory, Response, stream_with_context, redirect, url_for
 from dotenv import load_dotenv
+from werkzeug.middleware.proxy_fix import ProxyFix
 from datetime import datetime
 import time
+import queue
+import threading
+import contextvars
+import math
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeoutError
+
+# Os módulos auxiliares ficam ao lado deste arquivo; garante que sejam importáveis
+# tanto via `python main.py` quanto via `gunicorn src.app:app`
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from metrics import metrics
+from load_control import AdmissionController, AdmissionTicket, LatencyTracker, OverloadPolicy
+from fair_scheduler import FairScheduler, PRIORITY_INTERACTIVE, parse_tenant_weights, parse_api_tokens, token_digest
+from keyword_matcher import KeywordMatcher, KeywordHits
+from context_sampling import ContextSampler
+from batch_classifier import BatchGoalClassifier
+from prompt_templates import PromptTemplateRegistry, normalize_template, render_prompt, join_parts, agent_only_template
+from context_encoding import ENCODINGS as CONTEXT_ENCODINGS, encode_context, estimate_tokens
+from data_profile import profile_data, render_profile, sample_records
+from tabular_ingestion import read_tabular, tabular_format
+from json_stream import JsonStreamError, summarize_json_stream
+from context_store import ContextStore, is_context_ref
+from context_retrieval import ChunkIndexCache
+from quality_scoring import CRITERIA as QUALITY_CRITERIA, QualityScorer
+from report_sections import parse_sections, heading_line, normalize_regenerated, outline_sections, stitch_sections
+from report_store import ReportStore, is_report_id
+from generation_profiles import (GenerationProfileRegistry, OutputLengthTracker, parse_profile_overrides, ROLE_DEFAULT,
+                                 ROLE_RESEARCHER, ROLE_COLLABORATOR, ROLE_WRITER, ROLE_SECTION, ROLE_REGENERATE)
+from sse_encoding import DELIVERY_MODES, DELIVERY_CHUNKED, iter_result_events
+from structured_outline import OUTLINE_SCHEMA, OutlineValidationError, parse_outline_json, render_outline, dedupe_insights
+from upload_ingestion import SpoolingRequest, UploadTooLarge, ingest_upload
+from context_cache import SharedPrefix, LocalContextCache, GeminiContextCache, CACHE_MODE_OFF, CACHE_MODE_GEMINI, CACHE_MODE_LOCAL
 
 # Carrega variáveis de ambiente do arquivo .env
 load_dotenv()
@@ -21,6 +56,63 @@ os.makedirs(data_dir, exist_ok=True)
 
 app = Flask(__name__, template_folder=template_dir, static_folder=static_dir)
 
+# Uploads (dataSource) gravados em blocos em um spool com teto de tamanho
+AGENT_UPLOAD_MAX_MB = int(os.environ.get("AGENT_UPLOAD_MAX_MB", "50"))
+AGENT_UPLOAD_MEMORY_KB = int(os.environ.get("AGENT_UPLOAD_MEMORY_KB", "1024"))
+# JSON maior que isso é lido em streaming (perfil, contagens e amostra), sem montar o documento inteiro
+AGENT_UPLOAD_REFORMAT_MAX_KB = int(os.environ.get("AGENT_UPLOAD_REFORMAT_MAX_KB", "512"))
+# Trecho do arquivo repassado aos agentes quando um JSON grande é inválido
+JSON_INVALID_HEAD_CHARS = 4000
+# Codificação do JSON enviado no contexto: pretty, minified, yaml ou tabular
+AGENT_CONTEXT_ENCODING = os.environ.get("AGENT_CONTEXT_ENCODING", "tabular")
+if AGENT_CONTEXT_ENCODING not in CONTEXT_ENCODINGS:
+    AGENT_CONTEXT_ENCODING = "tabular"
+# Perfil estatístico local das listas de registros: off, alongside (perfil + dados) ou
+# replace (perfil + amostra das primeiras linhas de cada lista)
+AGENT_DATA_PROFILE = os.environ.get("AGENT_DATA_PROFILE", "alongside")
+AGENT_DATA_PROFILE_TOP_K = int(os.environ.get("AGENT_DATA_PROFILE_TOP_K", "5"))
+AGENT_DATA_PROFILE_SAMPLE_ROWS = int(os.environ.get("AGENT_DATA_PROFILE_SAMPLE_ROWS", "20"))
+
+# Armazenamento endereçado por conteúdo dos arquivos enviados e dos contextos gerados
+# a partir deles (reutilizados com context_ref=<sha256>, sem novo upload)
+AGENT_CONTEXT_STORE = os.environ.get("AGENT_CONTEXT_STORE", "on").lower()
+AGENT_CONTEXT_STORE_DIR = os.environ.get("AGENT_CONTEXT_STORE_DIR",
+                                         os.path.join(tempfile.gettempdir(), "mangaba_context_store"))
+AGENT_CONTEXT_STORE_MAX_MB = int(os.environ.get("AGENT_CONTEXT_STORE_MAX_MB", "512"))
+# Incrementar quando a geração do contexto mudar, para não reutilizar artefatos antigos
+CONTEXT_ARTIFACT_VERSION = 2
+context_store = ContextStore(AGENT_CONTEXT_STORE_DIR, max_bytes=AGENT_CONTEXT_STORE_MAX_MB * 1024 * 1024) \
+    if AGENT_CONTEXT_STORE != "off" else None
+
+# Recuperação de trechos (BM25) em contextos de texto livre longos: cada agente recebe
+# apenas os k trechos mais relevantes para o objetivo e o seu tipo, em vez do texto inteiro
+AGENT_RETRIEVAL = os.environ.get("AGENT_RETRIEVAL", "on").lower()
+AGENT_RETRIEVAL_MIN_KB = int(os.environ.get("AGENT_RETRIEVAL_MIN_KB", "48"))
+AGENT_RETRIEVAL_TOP_K = int(os.environ.get("AGENT_RETRIEVAL_TOP_K", "8"))
+AGENT_RETRIEVAL_CHUNK_CHARS = int(os.environ.get("AGENT_RETRIEVAL_CHUNK_CHARS", "1500"))
+AGENT_RETRIEVAL_OVERLAP_CHARS = int(os.environ.get("AGENT_RETRIEVAL_OVERLAP_CHARS", "200"))
+retrieval_indexes = ChunkIndexCache(max_entries=int(os.environ.get("AGENT_RETRIEVAL_CACHE_ENTRIES", "16")))
+
+# Relatórios concluídos guardados (conteúdo, outline e referência ao contexto) para
+# regenerar apenas seções selecionadas, sem uma nova execução completa
+AGENT_REPORT_STORE = os.environ.get("AGENT_REPORT_STORE", "on").lower()
+AGENT_REPORT_STORE_DIR = os.environ.get("AGENT_REPORT_STORE_DIR",
+                                        os.path.join(tempfile.gettempdir(), "mangaba_reports"))
+AGENT_REPORT_STORE_MAX_ENTRIES = int(os.environ.get("AGENT_REPORT_STORE_MAX_ENTRIES", "500"))
+# Seções por pedido de regeneração e caracteres de cada seção vizinha enviados ao modelo
+AGENT_REGENERATE_MAX_SECTIONS = int(os.environ.get("AGENT_REGENERATE_MAX_SECTIONS", "8"))
+AGENT_SECTION_NEIGHBOUR_CHARS = int(os.environ.get("AGENT_SECTION_NEIGHBOUR_CHARS", "2000"))
+# Instruções extras do cliente para a regeneração (caracteres)
+SECTION_INSTRUCTIONS_MAX_CHARS = 2000
+report_store = ReportStore(AGENT_REPORT_STORE_DIR, max_entries=AGENT_REPORT_STORE_MAX_ENTRIES) \
+    if AGENT_REPORT_STORE != "off" else None
+
+class AgentRequest(SpoolingRequest):
+    upload_max_bytes = AGENT_UPLOAD_MAX_MB * 1024 * 1024
+    upload_memory_bytes = AGENT_UPLOAD_MEMORY_KB * 1024
+
+app.request_class = AgentRequest
+
 # Configuração da API Gemini
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/models"
@@ -29,108 +121,219 @@ GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/models"
 GEMINI_MODELS = [
     "gemini-2.0-flash"  # Único modelo confirmado como funcionando consistentemente
 ]
-
-# --- Sistema Avançado de Detecção e Ativação de Agentes ---
-def enhanced_detect_goal_type(goal: str, context: str = "") -> str:
+# Escritor: 'single' (uma chamada para o documento inteiro) ou 'sections' (as seções
+# numeradas do outline escritas em paralelo e unidas em ordem)
+AGENT_WRITER_MODE = os.environ.get("AGENT_WRITER_MODE", "single").lower()
+AGENT_WRITER_CONCURRENCY = int(os.environ.get("AGENT_WRITER_CONCURRENCY", "4"))  # seções simultâneas por relatório
+AGENT_WRITER_SECTION_MAX_TOKENS = int(os.environ.get("AGENT_WRITER_SECTION_MAX_TOKENS", "2048"))
+# Outlines com mais seções que isso (ou com menos de duas) usam o escritor único
+AGENT_WRITER_MAX_SECTIONS = int(os.environ.get("AGENT_WRITER_MAX_SECTIONS", "12"))
+# Formato do outline do pesquisador: 'markdown' (texto livre) ou 'json' (saída estruturada,
+# validada localmente, renderizada de forma compacta e com insights colaborativos deduplicados)
+AGENT_OUTLINE_FORMAT = os.environ.get("AGENT_OUTLINE_FORMAT", "markdown").lower()
+# Entrega do final_result: 'single' (um evento com o documento inteiro, formato dos clientes
+# antigos) ou 'chunked' (partes result_chunk em ordem e o marcador result_complete com sha256).
+# O cliente escolhe via 'result_delivery'; resultados menores que AGENT_RESULT_CHUNK_CHARS vão inteiros
+AGENT_RESULT_DELIVERY = os.environ.get("AGENT_RESULT_DELIVERY", "single").lower()
+if AGENT_RESULT_DELIVERY not in DELIVERY_MODES:
+    AGENT_RESULT_DELIVERY = "single"
+AGENT_RESULT_CHUNK_CHARS = int(os.environ.get("AGENT_RESULT_CHUNK_CHARS", "16384"))
+
+# Perfis de geração (teto de tokens de saída, temperatura, topK/topP, sequências de parada)
+# por papel e tipo de objetivo; AGENT_GENERATION_PROFILES sobrepõe os padrões em JSON, ex.:
+# {"researcher": {"maxOutputTokens": 1536}, "writer:academic": {"temperature": 0.5}}
+generation_profiles = GenerationProfileRegistry(overrides={
+    ROLE_SECTION: {'max_output_tokens': AGENT_WRITER_SECTION_MAX_TOKENS},
+    **parse_profile_overrides(os.environ.get("AGENT_GENERATION_PROFILES", ""))
+})
+# Perfis cujas saídas param no teto em ao menos AGENT_TRUNCATION_FLAG_RATE das chamadas recentes são marcados
+output_lengths = OutputLengthTracker(
+    flag_rate=float(os.environ.get("AGENT_TRUNCATION_FLAG_RATE", "0.2")),
+    min_samples=int(os.environ.get("AGENT_TRUNCATION_MIN_SAMPLES", "5"))
+)
+
+# Controle de admissão do /api/run_agent_system
+AGENT_MAX_CONCURRENT_RUNS = int(os.environ.get("AGENT_MAX_CONCURRENT_RUNS", "4"))
+AGENT_MAX_QUEUED_RUNS = int(os.environ.get("AGENT_MAX_QUEUED_RUNS", "16"))
+AGENT_QUEUE_TIMEOUT = float(os.environ.get("AGENT_QUEUE_TIMEOUT", "300"))  # segundos
+AGENT_QUEUE_POLL_INTERVAL = float(os.environ.get("AGENT_QUEUE_POLL_INTERVAL", "2"))  # segundos
+
+admission_controller = AdmissionController(
+    max_concurrent=AGENT_MAX_CONCURRENT_RUNS,
+    max_queue=AGENT_MAX_QUEUED_RUNS
+)
+
+# Degradação adaptativa do pipeline colaborativo sob carga
+AGENT_DEGRADATION_ENABLED = os.environ.get("AGENT_DEGRADATION_ENABLED", "true").lower() in ("1", "true", "yes")
+AGENT_LATENCY_TARGET = float(os.environ.get("AGENT_LATENCY_TARGET", "20"))  # segundos por chamada ao modelo
+AGENT_DEGRADED_MAX_COLLABORATORS = int(os.environ.get("AGENT_DEGRADED_MAX_COLLABORATORS", "2"))
+AGENT_DEGRADED_OUTLINE_CHARS = int(os.environ.get("AGENT_DEGRADED_OUTLINE_CHARS", "1500"))
+
+model_latency = LatencyTracker()
+overload_policy = OverloadPolicy(
+    latency_target=AGENT_LATENCY_TARGET,
+    max_collaborators=AGENT_DEGRADED_MAX_COLLABORATORS,
+    outline_char_limit=AGENT_DEGRADED_OUTLINE_CHARS,
+    enabled=AGENT_DEGRADATION_ENABLED
+)
+
+# Avaliação de qualidade fora do caminho crítico: roda em paralelo ao envio do
+# resultado final e chega ao cliente como evento próprio ('quality_report')
+AGENT_QA_WORKERS = int(os.environ.get("AGENT_QA_WORKERS", "2"))
+AGENT_QA_TIMEOUT = float(os.environ.get("AGENT_QA_TIMEOUT", "5"))  # segundos, contados após o resultado final
+qa_executor = ThreadPoolExecutor(max_workers=max(1, AGENT_QA_WORKERS), thread_name_prefix='qa')
+
+# Escalonador justo: toda chamada ao Gemini é despachada por ele, com filas por tenant
+AGENT_GEMINI_WORKERS = int(os.environ.get("AGENT_GEMINI_WORKERS", "8"))
+AGENT_TENANT_WEIGHTS = parse_tenant_weights(os.environ.get("AGENT_TENANT_WEIGHTS", ""))
+# Credenciais aceitas para identificar o tenant e a prioridade (JSON, ver parse_api_tokens);
+# sem token válido o tenant é o IP do cliente e a prioridade é interactive
+AGENT_API_TOKENS = parse_api_tokens(os.environ.get("AGENT_API_TOKENS", ""))
+# Proxies reversos confiáveis na frente da aplicação: com N > 0, o IP do cliente vem
+# dos últimos N saltos de X-Forwarded-For (ProxyFix); com 0 o cabeçalho é ignorado
+AGENT_TRUSTED_PROXIES = int(os.environ.get("AGENT_TRUSTED_PROXIES", "0"))
+if AGENT_TRUSTED_PROXIES > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=AGENT_TRUSTED_PROXIES)
+
+gemini_scheduler = FairScheduler(workers=AGENT_GEMINI_WORKERS, tenant_weights=AGENT_TENANT_WEIGHTS)
+
+# Prefixo compartilhado (regras ABNT + contexto) das chamadas de uma execução:
+# 'off' (texto único), 'system' (systemInstruction), 'gemini' (cachedContents)
+# ou 'local' (emulação do cache, para testes)
+AGENT_CONTEXT_CACHE = os.environ.get("AGENT_CONTEXT_CACHE", "system").lower()
+AGENT_CONTEXT_CACHE_TTL = int(os.environ.get("AGENT_CONTEXT_CACHE_TTL", "600"))
+AGENT_CONTEXT_CACHE_MIN_KB = int(os.environ.get("AGENT_CONTEXT_CACHE_MIN_KB", "16"))
+if AGENT_CONTEXT_CACHE == CACHE_MODE_GEMINI:
+    context_cache = GeminiContextCache(
+        GEMINI_BASE_URL.rsplit('/models', 1)[0],
+        api_key_provider=lambda: GEMINI_API_KEY,
+        ttl_seconds=AGENT_CONTEXT_CACHE_TTL,
+        min_prefix_bytes=AGENT_CONTEXT_CACHE_MIN_KB * 1024
+    )
+elif AGENT_CONTEXT_CACHE == CACHE_MODE_LOCAL:
+    context_cache = LocalContextCache(ttl_seconds=AGENT_CONTEXT_CACHE_TTL)
+else:
+    context_cache = None
+
+# Detecção do tipo de objetivo: 'sampled' varre apenas uma amostra limitada de
+# contextos grandes (início, fim, janelas espaçadas e chaves JSON); 'full' varre tudo
+AGENT_DETECTION_MODE = os.environ.get("AGENT_DETECTION_MODE", "sampled").lower()
+DETECTION_SAMPLER = ContextSampler(
+    head_chars=int(os.environ.get("AGENT_DETECTION_HEAD_KB", "16")) * 1024,
+    tail_chars=int(os.environ.get("AGENT_DETECTION_TAIL_KB", "8")) * 1024,
+    windows=int(os.environ.get("AGENT_DETECTION_WINDOWS", "128")),
+    window_chars=int(os.environ.get("AGENT_DETECTION_WINDOW_KB", "4")) * 1024,
+    include_json_keys=os.environ.get("AGENT_DETECTION_JSON_KEYS", "true").lower() in ("1", "true", "yes"),
+    threshold_chars=int(os.environ.get("AGENT_DETECTION_THRESHOLD_KB", "1024")) * 1024,
+    key_scan_chars=int(os.environ.get("AGENT_DETECTION_KEY_SCAN_KB", "1024")) * 1024
+)
+
+# Tenant e classe de prioridade da execução corrente (definidos na thread do pipeline)
+current_call_tenant = contextvars.ContextVar('current_call_tenant', default=('anonymous', PRIORITY_INTERACTIVE))
+# Sinal de cancelamento da execução corrente: o cliente SSE desconectou
+current_run_cancel = contextvars.ContextVar('current_run_cancel', default=None)
+
+class PipelineCancelled(RuntimeError):
+    """Execução cancelada porque o cliente desconectou"""
+
+def check_run_cancelled():
+    """Levanta PipelineCancelled se a execução corrente foi cancelada"""
+    cancel = current_run_cancel.get()
+    if cancel is not None and cancel.is_set():
+        raise PipelineCancelled("Execução cancelada: o cliente desconectou")
+
+def request_credential(req):
+    """Credencial de AGENT_API_TOKENS apresentada na requisição (Bearer ou X-API-Key), ou None"""
+    auth_header = req.headers.get('Authorization', '')
+    token = auth_header[7:].strip() if auth_header.lower().startswith('bearer ') else req.headers.get('X-API-Key', '')
+    if not token:
+        return None
+    digest = token_digest(token)
+    credential = AGENT_API_TOKENS.get(digest)
+    return dict(credential, digest=digest) if credential is not None else None
+
+def resolve_tenant(req) -> str:
     """
-    Detecta o tipo de objetivo baseado em palavras-chave, contexto e análise de múltiplos domínios
-    Sistema expandido para garantir ativação de todos os agentes relevantes
+    Identifica o tenant da requisição: credencial de AGENT_API_TOKENS (o
+    usuário final em X-User-Id só vale para credenciais com forward_user,
+    como <tenant da credencial>/<usuário>) e, sem credencial válida, o IP do cliente. X-Forwarded-For só é
+    considerado atrás de proxies configurados (AGENT_TRUSTED_PROXIES, via
+    ProxyFix). Tokens são reduzidos a um hash para não aparecerem em métricas.
     """
-    goal_lower = goal.lower()
-    context_lower = context.lower() if context else ""
-    combined_text = f"{goal_lower} {context_lower}"
-    
-    # Priorize tipos mais específicos primeiro
+    credential = request_credential(req)
+    if credential is not None:
+        tenant = f"user:{credential['user']}" if credential['user'] else f"token:{credential['digest'][:12]}"
+        forwarded_user = req.headers.get('X-User-Id') if credential['forward_user'] else None
+        # Usuários repassados ficam sob o tenant da credencial que os repassou
+        return f"{tenant}/{forwarded_user}" if forwarded_user else tenant
+    return f"ip:{req.remote_addr or 'unknown'}"
+
+def resolve_priority(req) -> str:
+    """Classe de prioridade definida pela credencial (interactive sem credencial)"""
+    credential = request_credential(req)
+    return credential['priority'] if credential is not None else PRIORITY_INTERACTIVE
 
+# --- Sistema Avançado de Detecção e Ativação de Agentes ---
+# Palavras-chave do tipo principal, em ordem de prioridade (o primeiro tipo com
+# alguma ocorrência vence). Tipos mais específicos vêm primeiro.
+GOAL_TYPE_KEYWORDS = [
     # Criativo/Marketing (mais específico que marketing_analysis ou general planning)
-    if any(word in combined_text for word in ['criativo', 'conteúdo', 'post', 'artigo blog', 'campanha de marketing', 'publicidade', 'branding', 'design', 'copywriting', 'social media content', 'peça criativa', 'material gráfico', 'criação de campanha', 'marketing de conteúdo', 'campanha publicitária']):
-        return 'creative'
+    ('creative', ['criativo', 'conteúdo', 'post', 'artigo blog', 'campanha de marketing', 'publicidade', 'branding', 'design', 'copywriting', 'social media content', 'peça criativa', 'material gráfico', 'criação de campanha', 'marketing de conteúdo', 'campanha publicitária']),
 
     # Tipos acadêmicos/científicos
-    elif any(word in combined_text for word in ['artigo', 'paper', 'pesquisa', 'estudo', 'análise científica', 'metodologia', 'revisão bibliográfica', 'tese', 'dissertação', 'monografia', 'científico', 'publicação', 'pesquisa acadêmica', 'trabalho científico', 'artigo científico']):
-        return 'academic'
+    ('academic', ['artigo', 'paper', 'pesquisa', 'estudo', 'análise científica', 'metodologia', 'revisão bibliográfica', 'tese', 'dissertação', 'monografia', 'científico', 'publicação', 'pesquisa acadêmica', 'trabalho científico', 'artigo científico']),
 
     # Relatórios técnicos
-    elif any(word in combined_text for word in ['relatório técnico', 'report técnico', 'análise técnica', 'diagnóstico', 'avaliação técnica', 'auditoria', 'compliance', 'especificação técnica', 'documento técnico', 'laudo', 'parecer técnico', 'relatório de conformidade']):
-        return 'technical_report'
+    ('technical_report', ['relatório técnico', 'report técnico', 'análise técnica', 'diagnóstico', 'avaliação técnica', 'auditoria', 'compliance', 'especificação técnica', 'documento técnico', 'laudo', 'parecer técnico', 'relatório de conformidade']),
 
     # Resumos e sínteses
-    elif any(word in combined_text for word in ['resumo', 'resumir', 'sintetizar', 'síntese', 'sumarizar', 'executive summary', 'sumário executivo', 'abstract', 'condensar', 'apresentação resumida']):
-        return 'summary'
+    ('summary', ['resumo', 'resumir', 'sintetizar', 'síntese', 'sumarizar', 'executive summary', 'sumário executivo', 'abstract', 'condensar', 'apresentação resumida']),
 
     # Planejamento estratégico (PRIORIDADE ALTA)
-    elif any(word in combined_text for word in ['planejamento estratégico', 'estratégia empresarial', 'plano estratégico', 'visão estratégica', 'missão', 'valores', 'objetivos estratégicos', 'metas organizacionais', 'okr', 'okrs', 'objectives and key results', 'swot', 'balanced scorecard', 'kpi estratégico', 'planejamento de longo prazo', 'diretrizes estratégicas', 'plano de negócios', 'estratégia de crescimento']):
-        return 'strategic_planning'
+    ('strategic_planning', ['planejamento estratégico', 'estratégia empresarial', 'plano estratégico', 'visão estratégica', 'missão', 'valores', 'objetivos estratégicos', 'metas organizacionais', 'okr', 'okrs', 'objectives and key results', 'swot', 'balanced scorecard', 'kpi estratégico', 'planejamento de longo prazo', 'diretrizes estratégicas', 'plano de negócios', 'estratégia de crescimento']),
 
     # Análise de concorrência (PRIORIDADE ALTA)
-    elif any(word in combined_text for word in ['análise de concorrência', 'concorrência', 'concorrentes', 'benchmarking', 'análise competitiva', 'mercado competitivo', 'posicionamento mercado', 'competitivo', 'competitor', 'market share', 'participação mercado', 'inteligência competitiva', 'rival', 'panorama competitivo', 'estudo de mercado competitivo']):
-        return 'competitive_analysis'
+    ('competitive_analysis', ['análise de concorrência', 'concorrência', 'concorrentes', 'benchmarking', 'análise competitiva', 'mercado competitivo', 'posicionamento mercado', 'competitivo', 'competitor', 'market share', 'participação mercado', 'inteligência competitiva', 'rival', 'panorama competitivo', 'estudo de mercado competitivo']),
 
     # Análise de vendas e performance comercial
-    elif any(word in combined_text for word in ['vendas', 'receita', 'faturamento', 'conversão', 'pipeline', 'crm', 'leads', 'prospects', 'clientes', 'ticket médio', 'ltv', 'churn', 'funil vendas', 'performance comercial', 'roi vendas', 'forecast', 'comercial', 'desempenho de vendas', 'análise de vendas']):
-        return 'sales_analysis'
+    ('sales_analysis', ['vendas', 'receita', 'faturamento', 'conversão', 'pipeline', 'crm', 'leads', 'prospects', 'clientes', 'ticket médio', 'ltv', 'churn', 'funil vendas', 'performance comercial', 'roi vendas', 'forecast', 'comercial', 'desempenho de vendas', 'análise de vendas']),
 
     # Gestão de produtos
-    elif any(word in combined_text for word in ['produto', 'produtos', 'roadmap', 'features', 'backlog', 'mvp', 'user story', 'product owner', 'desenvolvimento produto', 'lançamento', 'product market fit', 'ciclo vida produto', 'gestão de produto', 'portfólio de produtos', 'inovação de produto', 'estratégia de produto']):
-        return 'product_management'
+    ('product_management', ['produto', 'produtos', 'roadmap', 'features', 'backlog', 'mvp', 'user story', 'product owner', 'desenvolvimento produto', 'lançamento', 'product market fit', 'ciclo vida produto', 'gestão de produto', 'portfólio de produtos', 'inovação de produto', 'estratégia de produto']),
 
     # Gestão de usuários e experiência
-    elif any(word in combined_text for word in ['usuários', 'users', 'ux', 'ui', 'experiência usuário', 'jornada usuário', 'personas', 'segmentação', 'comportamento usuário', 'usabilidade', 'customer journey', 'user research', 'gestão de usuários', 'engajamento de usuários', 'satisfação do cliente', 'pesquisa de usuário']):
-        return 'user_management'
+    ('user_management', ['usuários', 'users', 'ux', 'ui', 'experiência usuário', 'jornada usuário', 'personas', 'segmentação', 'comportamento usuário', 'usabilidade', 'customer journey', 'user research', 'gestão de usuários', 'engajamento de usuários', 'satisfação do cliente', 'pesquisa de usuário']),
 
     # Gestão de tarefas e projetos
-    elif any(word in combined_text for word in ['tarefas', 'tasks', 'sprint', 'scrum', 'kanban', 'agile', 'projeto', 'cronograma', 'milestone', 'deliverables', 'gestão projetos', 'pmo', 'waterfall', 'gestão de tarefas', 'planejamento de projeto', 'gerenciamento de projeto', 'metodologia ágil']):
-        return 'task_management'
+    ('task_management', ['tarefas', 'tasks', 'sprint', 'scrum', 'kanban', 'agile', 'projeto', 'cronograma', 'milestone', 'deliverables', 'gestão projetos', 'pmo', 'waterfall', 'gestão de tarefas', 'planejamento de projeto', 'gerenciamento de projeto', 'metodologia ágil']),
 
     # Análise financeira e orçamentária
-    elif any(word in combined_text for word in ['financeiro', 'orçamento', 'budget', 'fluxo caixa', 'dre', 'balanço', 'roi', 'investimento', 'custo', 'margem', 'lucro', 'ebitda', 'valuation', 'análise financeira', 'contabilidade', 'saúde financeira', 'planejamento financeiro']):
-        return 'financial_analysis'
+    ('financial_analysis', ['financeiro', 'orçamento', 'budget', 'fluxo caixa', 'dre', 'balanço', 'roi', 'investimento', 'custo', 'margem', 'lucro', 'ebitda', 'valuation', 'análise financeira', 'contabilidade', 'saúde financeira', 'planejamento financeiro']),
 
     # Recursos humanos e gestão de pessoas
-    elif any(word in combined_text for word in ['recursos humanos', 'rh', 'colaboradores', 'funcionários', 'recrutamento', 'seleção', 'treinamento', 'desenvolvimento', 'performance', 'avaliação desempenho', 'cultura organizacional', 'gestão de pessoas', 'capital humano', 'engajamento de funcionários', 'políticas de rh']):
-        return 'hr_management'
+    ('hr_management', ['recursos humanos', 'rh', 'colaboradores', 'funcionários', 'recrutamento', 'seleção', 'treinamento', 'desenvolvimento', 'performance', 'avaliação desempenho', 'cultura organizacional', 'gestão de pessoas', 'capital humano', 'engajamento de funcionários', 'políticas de rh']),
 
     # Marketing e comunicação (mais genérico que 'creative')
-    elif any(word in combined_text for word in ['marketing', 'campanha', 'comunicação', 'branding', 'marca', 'publicidade', 'digital marketing', 'seo', 'sem', 'social media', 'content marketing', 'inbound', 'estratégia de marketing', 'plano de marketing', 'relações públicas']):
-        return 'marketing_analysis'
+    ('marketing_analysis', ['marketing', 'campanha', 'comunicação', 'branding', 'marca', 'publicidade', 'digital marketing', 'seo', 'sem', 'social media', 'content marketing', 'inbound', 'estratégia de marketing', 'plano de marketing', 'relações públicas']),
 
     # Operações e processos
-    elif any(word in combined_text for word in ['operações', 'processos', 'workflow', 'automação', 'eficiência', 'produtividade', 'lean', 'six sigma', 'melhoria contínua', 'otimização', 'gestão de operações', 'cadeia de suprimentos', 'logística', 'gestão da qualidade']):
-        return 'operations_management'
+    ('operations_management', ['operações', 'processos', 'workflow', 'automação', 'eficiência', 'produtividade', 'lean', 'six sigma', 'melhoria contínua', 'otimização', 'gestão de operações', 'cadeia de suprimentos', 'logística', 'gestão da qualidade']),
 
     # Tecnologia e inovação
-    elif any(word in combined_text for word in ['tecnologia', 'inovação', 'digital', 'transformação digital', 'ti', 'sistemas', 'software', 'infraestrutura', 'arquitetura', 'desenvolvimento', 'análise tecnológica', 'cibersegurança', 'segurança da informação', 'tendências tecnológicas']):
-        return 'technology_analysis'
+    ('technology_analysis', ['tecnologia', 'inovação', 'digital', 'transformação digital', 'ti', 'sistemas', 'software', 'infraestrutura', 'arquitetura', 'desenvolvimento', 'análise tecnológica', 'cibersegurança', 'segurança da informação', 'tendências tecnológicas']),
 
     # Análise de dados
-    elif any(word in combined_text for word in ['dados', 'estatística', 'gráfico', 'dashboard', 'métricas', 'kpi', 'analytics', 'business intelligence', 'big data', 'data science', 'análise de dados', 'relatório de dados', 'interpretação de dados', 'modelagem de dados']):
-        return 'data_analysis'
+    ('data_analysis', ['dados', 'estatística', 'gráfico', 'dashboard', 'métricas', 'kpi', 'analytics', 'business intelligence', 'big data', 'data science', 'análise de dados', 'relatório de dados', 'interpretação de dados', 'modelagem de dados']),
 
     # Documentação
-    elif any(word in combined_text for word in ['documentação', 'manual', 'guia', 'tutorial', 'procedimento', 'política', 'norma', 'regulamento', 'documentar', 'instruções', 'especificação', 'criação de documentos']):
-        return 'documentation'
+    ('documentation', ['documentação', 'manual', 'guia', 'tutorial', 'procedimento', 'política', 'norma', 'regulamento', 'documentar', 'instruções', 'especificação', 'criação de documentos']),
 
     # Planejamento geral (mais genérico que strategic_planning ou task_management)
-    elif any(word in combined_text for word in ['plano', 'planejamento', 'cronograma', 'projeto', 'agenda', 'organização', 'programação', 'planejar']):
-        return 'planning'
-
-    # Default
-    else:
-        return 'general'
+    ('planning', ['plano', 'planejamento', 'cronograma', 'projeto', 'agenda', 'organização', 'programação', 'planejar']),
+]
 
-def detect_multiple_goal_types(goal: str, context: str = "") -> list:
-    """
-    Detecta múltiplos tipos de objetivos que podem estar relacionados
-    Garante que todos os agentes relevantes sejam acionados
-    """
-    goal_lower = goal.lower()
-    context_lower = context.lower() if context else ""
-    combined_text = f"{goal_lower} {context_lower}"
-    
-    detected_types = []
-    
-    # Mapeamento de palavras-chave para tipos de agentes
-    agent_keywords = {
+# Mapeamento de palavras-chave para tipos de agentes relacionados (detecção múltipla)
+RELATED_GOAL_TYPE_KEYWORDS = {
         'competitive_analysis': ['concorrência', 'concorrentes', 'benchmarking', 'competitivo', 'market share', 'inteligência competitiva'],
         'strategic_planning': ['estratégia', 'planejamento estratégico', 'visão', 'missão', 'okr', 'swot'],
         'sales_analysis': ['vendas', 'receita', 'conversão', 'pipeline', 'crm', 'leads', 'clientes'],
@@ -143,44 +346,88 @@ def detect_multiple_goal_types(goal: str, context: str = "") -> list:
         'operations_management': ['operações', 'processos', 'eficiência', 'automação', 'lean'],
         'technology_analysis': ['tecnologia', 'inovação', 'digital', 'ti', 'sistemas'],
         'data_analysis': ['dados', 'estatística', 'analytics', 'dashboard', 'métricas']
-    }
+}
+
+# Vocabulário compilado uma única vez na importação: uma varredura do texto
+# alimenta tanto o tipo principal quanto os tipos relacionados
+GOAL_KEYWORD_MATCHER = KeywordMatcher({
+    **{('primary', goal_type): keywords for goal_type, keywords in GOAL_TYPE_KEYWORDS},
+    **{('related', goal_type): keywords for goal_type, keywords in RELATED_GOAL_TYPE_KEYWORDS.items()}
+})
+
+def scan_goal_keywords(goal: str, context: str = "", mode: str = None, sampler: ContextSampler = None) -> KeywordHits:
+    """
+    Varre objetivo e contexto em uma única passada e devolve todas as
+    ocorrências de palavras-chave com tipo e posição. No modo 'sampled',
+    contextos grandes são substituídos por uma amostra limitada (as posições
+    passam a ser relativas à amostra).
+    """
+    mode = mode or AGENT_DETECTION_MODE
+    goal_lower = goal.lower()
+    if mode == 'sampled':
+        context_segments = [segment.lower() for segment in (sampler or DETECTION_SAMPLER).segments(context)]
+    else:
+        context_segments = [context.lower()] if context else []
+    # Equivalente a varrer f"{goal_lower} {context_lower}" sem montar a cópia concatenada
+    return GOAL_KEYWORD_MATCHER.scan(goal_lower, " ", *context_segments)
+
+def enhanced_detect_goal_type(goal: str, context: str = "", hits: KeywordHits = None) -> str:
+    """
+    Detecta o tipo de objetivo baseado em palavras-chave, contexto e análise de múltiplos domínios
+    Sistema expandido para garantir ativação de todos os agentes relevantes
+    """
+    if hits is None:
+        hits = scan_goal_keywords(goal, context)
+    
+    for goal_type, _ in GOAL_TYPE_KEYWORDS:
+        if hits.has(('primary', goal_type)):
+            return goal_type
+    
+    # Default
+    return 'general'
+
+def detect_multiple_goal_types(goal: str, context: str = "", hits: KeywordHits = None) -> list:
+    """
+    Detecta múltiplos tipos de objetivos que podem estar relacionados
+    Garante que todos os agentes relevantes sejam acionados
+    """
+    if hits is None:
+        hits = scan_goal_keywords(goal, context)
     
     # Verificar cada tipo de agente
-    for agent_type, keywords in agent_keywords.items():
-        if any(keyword in combined_text for keyword in keywords):
-            detected_types.append(agent_type)
+    detected_types = [agent_type for agent_type in RELATED_GOAL_TYPE_KEYWORDS if hits.has(('related', agent_type))]
     
     # Se nenhum tipo específico foi detectado, usar o tipo principal
     if not detected_types:
-        primary_type = enhanced_detect_goal_type(goal, context)
+        primary_type = enhanced_detect_goal_type(goal, context, hits)
         detected_types.append(primary_type)
     
     return detected_types
 
+# Agentes que sempre colaboram com tipos específicos
+COLLABORATION_MATRIX = {
+    'strategic_planning': ['competitive_analysis', 'financial_analysis', 'market_analysis'],
+    'competitive_analysis': ['strategic_planning', 'sales_analysis', 'marketing_analysis'],
+    'sales_analysis': ['competitive_analysis', 'product_management', 'user_management'],
+    'product_management': ['user_management', 'technology_analysis', 'sales_analysis'],
+    'user_management': ['product_management', 'marketing_analysis', 'data_analysis'],
+    'financial_analysis': ['strategic_planning', 'sales_analysis', 'operations_management'],
+    'marketing_analysis': ['competitive_analysis', 'user_management', 'data_analysis'],
+    'operations_management': ['financial_analysis', 'technology_analysis', 'hr_management'],
+    'technology_analysis': ['product_management', 'operations_management', 'data_analysis'],
+    'hr_management': ['operations_management', 'strategic_planning', 'financial_analysis']
+}
+
 def get_collaborative_agents(primary_goal_type: str, all_detected_types: list) -> list:
     """
     Determina quais agentes colaborativos devem ser acionados
     baseado no tipo principal e tipos detectados
     """
-    # Agentes que sempre colaboram com tipos específicos
-    collaboration_matrix = {
-        'strategic_planning': ['competitive_analysis', 'financial_analysis', 'market_analysis'],
-        'competitive_analysis': ['strategic_planning', 'sales_analysis', 'marketing_analysis'],
-        'sales_analysis': ['competitive_analysis', 'product_management', 'user_management'],
-        'product_management': ['user_management', 'technology_analysis', 'sales_analysis'],
-        'user_management': ['product_management', 'marketing_analysis', 'data_analysis'],
-        'financial_analysis': ['strategic_planning', 'sales_analysis', 'operations_management'],
-        'marketing_analysis': ['competitive_analysis', 'user_management', 'data_analysis'],
-        'operations_management': ['financial_analysis', 'technology_analysis', 'hr_management'],
-        'technology_analysis': ['product_management', 'operations_management', 'data_analysis'],
-        'hr_management': ['operations_management', 'strategic_planning', 'financial_analysis']
-    }
-    
     collaborative_agents = set()
     
     # Adicionar agentes colaborativos baseados no tipo principal
-    if primary_goal_type in collaboration_matrix:
-        collaborative_agents.update(collaboration_matrix[primary_goal_type])
+    if primary_goal_type in COLLABORATION_MATRIX:
+        collaborative_agents.update(COLLABORATION_MATRIX[primary_goal_type])
     
     # Adicionar agentes detectados diretamente
     collaborative_agents.update(all_detected_types)
@@ -190,6 +437,124 @@ def get_collaborative_agents(primary_goal_type: str, all_detected_types: list) -
     
     return list(collaborative_agents)
 
+# --- Classificação pontuada do objetivo (uma vez por requisição) ---
+# Ocorrências no texto do objetivo pesam mais que ocorrências no contexto
+GOAL_TEXT_WEIGHT = 3.0
+
+# Vocabulário completo de cada tipo (tipo principal + detecção múltipla)
+GOAL_TYPE_VOCABULARY = {}
+for _goal_type, _keywords in GOAL_TYPE_KEYWORDS:
+    GOAL_TYPE_VOCABULARY.setdefault(_goal_type, set()).update(_keywords)
+for _goal_type, _keywords in RELATED_GOAL_TYPE_KEYWORDS.items():
+    GOAL_TYPE_VOCABULARY.setdefault(_goal_type, set()).update(_keywords)
+
+class GoalClassification:
+    """
+    Resultado da classificação de um objetivo: tipo principal (regras de
+    prioridade), tipos relacionados, colaboradores e ranking pontuado
+    """
+    
+    def __init__(self, primary_type: str, related_types: list, collaborators: list, ranked: list, confidence: float):
+        self.primary_type = primary_type
+        self.related_types = related_types
+        self.collaborators = collaborators
+        self.ranked = ranked
+        self.confidence = confidence
+    
+    def to_dict(self) -> dict:
+        return {
+            'primary_type': self.primary_type,
+            'related_types': self.related_types,
+            'collaborators': self.collaborators,
+            'ranked': self.ranked,
+            'confidence': self.confidence
+        }
+
+def score_goal_types(hits: KeywordHits, goal_length: int, max_details: int = 5) -> list:
+    """
+    Pontua cada tipo pelas palavras-chave encontradas. Palavras compostas são
+    mais específicas e pesam mais; ocorrências no objetivo valem GOAL_TEXT_WEIGHT
+    e repetições no contexto crescem de forma logarítmica.
+    """
+    scored = {}
+    for keyword, count in hits.keyword_counts.items():
+        specificity = 1 + keyword.count(' ')
+        positions = hits.keyword_positions[keyword]
+        goal_count = sum(1 for position in positions if position < goal_length)
+        weight = specificity * (GOAL_TEXT_WEIGHT * (goal_count > 0) + math.log1p(count - goal_count))
+        for goal_type, vocabulary in GOAL_TYPE_VOCABULARY.items():
+            if keyword in vocabulary:
+                entry = scored.setdefault(goal_type, {'type': goal_type, 'score': 0.0, 'hits': 0, 'keywords': [], 'positions': []})
+                entry['score'] += weight
+                entry['hits'] += count
+                entry['keywords'].append((weight, keyword))
+                entry['positions'].append(positions[0])
+    
+    # Arredondado para que empates não dependam da ordem de soma dos pesos
+    ranked = sorted(scored.values(), key=lambda entry: (-round(entry['score'], 9), entry['type']))
+    for entry in ranked:
+        entry['score'] = round(entry['score'], 3)
+        entry['keywords'] = [kw for _, kw in sorted(entry['keywords'], reverse=True)[:max_details]]
+        entry['positions'] = sorted(entry['positions'])[:max_details]
+    return ranked
+
+def classify_goal(goal: str, context: str = "", mode: str = None) -> GoalClassification:
+    """
+    Classifica o objetivo em uma única varredura do texto. O tipo principal
+    continua vindo das regras de prioridade de enhanced_detect_goal_type; o
+    ranking pontuado e a confiança complementam essa decisão.
+    """
+    hits = scan_goal_keywords(goal, context, mode=mode)
+    primary_type = enhanced_detect_goal_type(goal, context, hits)
+    related_types = detect_multiple_goal_types(goal, context, hits)
+    ranked = score_goal_types(hits, goal_length=len(goal.lower()))
+    
+    # Colaboradores em ordem de relevância (tipos sem pontuação por último)
+    rank_of = {entry['type']: index for index, entry in enumerate(ranked)}
+    collaborators = sorted(get_collaborative_agents(primary_type, related_types),
+                           key=lambda agent: (rank_of.get(agent, len(ranked)), agent))
+    
+    total_score = sum(entry['score'] for entry in ranked)
+    primary_score = next((entry['score'] for entry in ranked if entry['type'] == primary_type), 0.0)
+    confidence = round(primary_score / total_score, 3) if total_score else 0.0
+    
+    return GoalClassification(primary_type, related_types, collaborators, ranked, confidence)
+
+# --- Classificação em lote (matriz de contagens vetorizada) ---
+AGENT_CLASSIFY_MAX_BATCH = int(os.environ.get("AGENT_CLASSIFY_MAX_BATCH", "50000"))
+
+BATCH_GOAL_CLASSIFIER = BatchGoalClassifier(
+    GOAL_KEYWORD_MATCHER,
+    primary_types=[goal_type for goal_type, _ in GOAL_TYPE_KEYWORDS],
+    related_types=list(RELATED_GOAL_TYPE_KEYWORDS),
+    vocabulary=GOAL_TYPE_VOCABULARY,
+    collaboration_matrix=COLLABORATION_MATRIX,
+    goal_text_weight=GOAL_TEXT_WEIGHT
+)
+
+def classify_goals(pairs: list, mode: str = None) -> list:
+    """
+    Classifica uma lista de pares objetivo/contexto (tuplas (goal, context),
+    strings com apenas o objetivo ou dicts com 'goal' e 'context'). Retorna,
+    para cada par, tipo principal, tipos relacionados, colaboradores e confiança.
+    """
+    mode = mode or AGENT_DETECTION_MODE
+    goals, contexts = [], []
+    for pair in pairs:
+        if isinstance(pair, dict):
+            goal, context = pair.get('goal') or "", pair.get('context') or ""
+        elif isinstance(pair, str):
+            goal, context = pair, ""
+        else:
+            goal, context = pair
+        if not isinstance(context, str):
+            context = json.dumps(context, ensure_ascii=False)
+        if mode == 'sampled':
+            context = "".join(DETECTION_SAMPLER.segments(context))
+        goals.append(str(goal).lower())
+        contexts.append(context.lower())
+    return BATCH_GOAL_CLASSIFIER.classify(goals, contexts)
+
 # Manter compatibilidade com versão anterior
 def detect_goal_type(goal: str) -> str:
     """
@@ -197,11 +562,7 @@ def detect_goal_type(goal: str) -> str:
     """
     return enhanced_detect_goal_type(goal)
 
-def get_abnt_formatting_rules() -> str:
-    """
-    Retorna as regras de formatação ABNT para incluir nos prompts
-    """
-    return """
+ABNT_FORMATTING_RULES = normalize_template("""
     FORMATAÇÃO ABNT OBRIGATÓRIA:
     - Use fonte Times New Roman ou Arial, tamanho 12
     - Espaçamento entre linhas: 1,5
@@ -214,639 +575,711 @@ def get_abnt_formatting_rules() -> str:
     - Numeração de páginas no canto superior direito
     - Resumo: máximo 500 palavras, parágrafo único
     - Palavras-chave: 3 a 5 palavras, separadas por ponto
+    """)
+
+def get_abnt_formatting_rules() -> str:
     """
+    Retorna as regras de formatação ABNT para incluir nos prompts
+    """
+    return ABNT_FORMATTING_RULES
 
-def generate_specialized_prompts(goal_type: str, goal: str, context: str) -> tuple:
+# Prefixo estável compartilhado por todos os agentes de uma execução; as
+# instruções específicas de cada agente vêm depois dele
+SHARED_PREFIX_TEMPLATE = normalize_template("""
+    Você integra uma equipe de agentes especializados que trabalham sobre os mesmos dados.
+    As instruções específicas do seu papel vêm depois deste bloco.
+
+    {abnt_rules}
+
+    CONTEXTO COMPARTILHADO:
+    '''{context}'''
+    """)
+
+def build_shared_prefix(context: str):
+    """Prefixo da execução (None com AGENT_CONTEXT_CACHE=off: prompts em texto único)"""
+    if AGENT_CONTEXT_CACHE == CACHE_MODE_OFF:
+        return None
+    return SharedPrefix(render_prompt(SHARED_PREFIX_TEMPLATE, abnt_rules=get_abnt_formatting_rules(), context=context))
+
+def assemble_agent_prompt(custom_prompt, context, shared_prefix=None, **values) -> tuple:
     """
-    Gera prompts especializados baseados no tipo de objetivo
+    Monta o prompt do agente. Com prefixo compartilhado, retorna apenas as
+    instruções do agente (o contexto e as regras ABNT já estão no prefixo);
+    partes extras do contexto (ex.: insights colaborativos) vão no fim delas.
+    Retorna (prompt, prefixo a enviar junto ou None).
     """
-    abnt_rules = get_abnt_formatting_rules()
-    
-    prompts = {
-        'academic': {
-            'researcher': """
-            Você é um pesquisador acadêmico especializado. Analise o objetivo: "{goal}" e crie uma estrutura detalhada para um trabalho acadêmico seguindo metodologia científica.
-            
-            Contexto fornecido:
-            '''{context}'''
-            
-            Sua estrutura deve incluir:
-            1. Introdução e justificativa
-            2. Objetivos (geral e específicos)
-            3. Revisão bibliográfica
-            4. Metodologia
-            4. Resultados esperados
-            5. Conclusões
-            6. Referências
-            
-            {abnt_rules}
-            """,
-            'writer': """
-            Você é um escritor acadêmico especializado em produção científica. Desenvolva um texto acadêmico completo baseado na estrutura:
-            
-            {outline}
-            
-            Contexto de referência:
-            '''{context}'''
-            
-            REQUISITOS OBRIGATÓRIOS:
-            - Linguagem formal e técnica
-            - Citações e referências adequadas
-            - Argumentação lógica e fundamentada
-            - Metodologia clara e replicável
-            {abnt_rules}
-            
-            Produza um texto de qualidade acadêmica, pronto para submissão.
-            """
-        },
-        'technical_report': {
-            'researcher': """
-            Você é um analista técnico especializado. Analise o objetivo: "{goal}" e estruture um relatório técnico profissional.
-            
-            Dados técnicos:
-            '''{context}'''
-            
-            Estruture o relatório com:
-            1. Sumário executivo
-            2. Introdução e objetivos
-            3. Metodologia aplicada
-            4. Resultados e análises
-            5. Discussão técnica
-            6. Conclusões e recomendações
-            7. Anexos (quando necessário)
-            
-            {abnt_rules}
-            """,
-            'writer': """
-            Você é um redator técnico especializado. Desenvolva um relatório técnico completo baseado na estrutura:
-            
-            {outline}
-            
-            Dados de referência:
-            '''{context}'''
-            
-            CARACTERÍSTICAS OBRIGATÓRIAS:
-            - Linguagem técnica precisa
-            - Dados quantitativos quando possível
-            - Gráficos e tabelas (descreva quando necessário)
-            - Recomendações práticas e implementáveis
-            {abnt_rules}
-            
-            Produza um relatório profissional e acionável.
-            """
-        },
-        'summary': {
-            'researcher': """
-            Você é um especialista em síntese de informações. Analise o objetivo: "{goal}" e estruture um resumo eficiente.
-            
-            Conteúdo para resumir:
-            '''{context}'''
-            
-            Estruture o resumo com:
-            1. Pontos principais identificados
-            2. Informações essenciais
-            3. Conclusões-chave
-            4. Insights relevantes
-            
-            {abnt_rules}
-            """,
-            'writer': """
-            Você é um redator especializado em sínteses. Crie um resumo claro e conciso baseado na estrutura:
-            
-            {outline}
-            
-            Conteúdo original:
-            '''{context}'''
-            
-            CARACTERÍSTICAS DO RESUMO:
-            - Máximo 500 palavras para resumo executivo
-            - Linguagem clara e objetiva
-            - Preservação das informações essenciais
-            - Estrutura lógica e fluida
-            {abnt_rules}
-            
-            Produza um resumo profissional e informativo.
-            """
-        },
-        'data_analysis': {
-            'researcher': """
-            Você é um analista de dados especializado. Analise o objetivo: "{goal}" e estruture uma análise de dados completa.
-            
-            Dados fornecidos:
-            '''{context}'''
-            
-            Estruture a análise com:
-            1. Visão geral dos dados
-            2. Metodologia de análise
-            3. Estatísticas descritivas
-            4. Padrões e tendências identificados
-            5. Insights e correlações
-            6. Recomendações baseadas em dados
-            
-            {abnt_rules}
-            """,
-            'writer': """
-            Você é um especialista em relatórios de dados. Desenvolva uma análise completa baseada na estrutura:
-            
-            {outline}
-            
-            Dataset:
-            '''{context}'''
-            
-            ELEMENTOS OBRIGATÓRIOS:
-            - Interpretação clara dos dados
-            - Visualizações descritas (quando aplicável)
-            - Insights acionáveis
-            - Conclusões baseadas em evidências
-            {abnt_rules}
-            
-            Produza uma análise de dados profissional e compreensível.
-            """
-        },
-        'strategic_planning': {
-            'researcher': """
-            Você é um consultor estratégico sênior especializado em planejamento empresarial;
-            Analise o objetivo: "{goal}";
-            Estruture um plano estratégico abrangente
-            
-            Contexto organizacional:
-            '''{context}'''
-            
-            Estruture o planejamento estratégico com:
-            1. Análise do ambiente interno e externo (SWOT)
-            2. Definição de missão, visão e valores
-            3. Objetivos estratégicos de longo prazo
-            4. OKRs (Objectives and Key Results) trimestrais e anuais
-            5. Estratégias e iniciativas prioritárias
-            6. Plano de implementação e cronograma
-            7. Indicadores de performance (KPIs)
-            8. Gestão de riscos e contingências
-            9. Orçamento e recursos necessários
-            
-            {abnt_rules}
-            """,
-            'writer': """
-            Você é um especialista em documentação estratégica empresarial. Desenvolva um plano estratégico completo baseado na estrutura:
-            
-            {outline}
-            
-            Dados organizacionais:
-            '''{context}'''
-            
-            ELEMENTOS OBRIGATÓRIOS:
-            - Análise situacional detalhada
-            - Objetivos SMART (específicos, mensuráveis, atingíveis, relevantes, temporais)
-            - OKRs estruturados com objetivos qualitativos e key results quantitativos
-            - Estratégias claras e acionáveis
-            - Cronograma de implementação realista
-            - Métricas de acompanhamento e revisão trimestral de OKRs
-            - Análise de viabilidade financeira
-            - Planos de contingência
-            {abnt_rules}
-            
-            Produza um plano estratégico executável e profissional.
-            """
-        },
-        'competitive_analysis': {
-            'researcher': """
-            Você é um analista de mercado especializado em inteligência competitiva. Analise o objetivo: "{goal}" e estruture uma análise de concorrência completa.
-            
-            Dados de mercado e concorrentes:
-            '''{context}'''
-            
-            Estruture a análise competitiva com:
-            1. Mapeamento do cenário competitivo
-            2. Identificação dos principais concorrentes
-            3. Análise de produtos/serviços concorrentes
-            4. Estratégias de preços e posicionamento
-            5. Forças e fraquezas dos concorrentes
-            6. Participação de mercado e tendências
-            7. Oportunidades e ameaças identificadas
-            8. Recomendações estratégicas
-            
-            {abnt_rules}
-            """,
-            'writer': """
-            Você é um especialista em relatórios de inteligência competitiva. Desenvolva uma análise de concorrência detalhada baseada na estrutura:
-            
-            {outline}
-            
-            Informações de mercado:
-            '''{context}'''
-            
-            COMPONENTES ESSENCIAIS:
-            - Perfil detalhado dos concorrentes principais
-            - Análise comparativa de produtos/serviços
-            - Benchmarking de preços e estratégias
-            - Matriz de posicionamento competitivo
-            - Análise de market share e tendências
-            - Identificação de gaps de mercado
-            - Recomendações táticas e estratégicas
-            {abnt_rules}
-            
-            Produza uma análise competitiva acionável e estratégica.
-            """
-        },
-        'sales_analysis': {
-            'researcher': """
-            Você é um analista de vendas sênior especializado em performance comercial. Analise o objetivo: "{goal}" e estruture uma análise completa de vendas.
-            
-            Dados de vendas:
-            '''{context}'''
-            
-            Estruture a análise com:
-            1. Visão geral do desempenho de vendas
-            2. Análise de métricas-chave (receita, conversão, ticket médio, LTV, churn)
-            3. Segmentação de clientes e produtos
-            4. Análise de tendências e sazonalidade
-            5. Identificação de oportunidades e gargalos
-            6. Benchmarking e comparações históricas
-            7. Previsões e projeções
-            8. Recomendações estratégicas para crescimento
-            
-            {abnt_rules}
-            """,
-            'writer': """
-            Você é um especialista em relatórios comerciais. Desenvolva uma análise de vendas detalhada baseada na estrutura:
-            
-            {outline}
-            
-            Dados comerciais:
-            '''{context}'''
-            
-            ELEMENTOS OBRIGATÓRIOS:
-            - Dashboard executivo com KPIs principais
-            - Análise quantitativa com gráficos e tabelas
-            - Insights acionáveis para equipe comercial
-            - Plano de ação com metas específicas
-            - ROI e análise de investimento em vendas
-            - Estratégias de retenção e upselling
-            {abnt_rules}
-            
-            Produza um relatório comercial estratégico e acionável.
-            """
-        },
-        'financial_analysis': {
-            'researcher': """
-            Você é um analista financeiro sênior especializado em análise empresarial. Analise o objetivo: "{goal}" e estruture uma análise financeira completa.
-            
-            Dados financeiros:
-            '''{context}'''
-            
-            Estruture a análise com:
-            1. Análise de demonstrações financeiras (DRE, Balanço, Fluxo de Caixa)
-            2. Indicadores de rentabilidade e liquidez
-            3. Análise de custos e margem
-            4. ROI e análise de investimentos
-            5. Projeções financeiras e cenários
-            6. Análise de riscos financeiros
-            7. Benchmarking setorial
-            8. Recomendações para otimização financeira
-            
-            {abnt_rules}
-            """,
-            'writer': """
-            Você é um especialista em relatórios financeiros. Desenvolva uma análise financeira detalhada baseada na estrutura:
-            
-            {outline}
-            
-            Dados financeiros:
-            '''{context}'''
-            
-            ELEMENTOS OBRIGATÓRIOS:
-            - Resumo executivo financeiro
-            - Análise de indicadores-chave (ROI, EBITDA, Margem)
-            - Gráficos e tabelas financeiras
-            - Análise de tendências e variações
-            - Recomendações de investimento e corte de custos
-            - Projeções e cenários futuros
-            {abnt_rules}
-            
-            Produza um relatório financeiro profissional e acionável.
-            """
-        },
-        'hr_management': {
-            'researcher': """
-            Você é um especialista em gestão de recursos humanos. Analise o objetivo: "{goal}" e estruture uma análise completa de RH.
-            
-            Dados de RH:
-            '''{context}'''
-            
-            Estruture a análise com:
-            1. Análise do capital humano atual
-            2. Indicadores de performance e engajamento
-            3. Análise de turnover e retenção
-            4. Mapeamento de competências e gaps
-            5. Planos de desenvolvimento e treinamento
-            6. Cultura organizacional e clima
-            7. Estratégias de recrutamento e seleção
-            8. Recomendações para gestão de pessoas
-            
-            {abnt_rules}
-            """,
-            'writer': """
-            Você é um especialista em relatórios de RH. Desenvolva uma análise de recursos humanos baseada na estrutura:
-            
-            {outline}
-            
-            Dados de RH:
-            '''{context}'''
-            
-            ELEMENTOS OBRIGATÓRIOS:
-            - Dashboard de indicadores de RH
-            - Análise de performance e produtividade
-            - Planos de desenvolvimento individuais
-            - Estratégias de retenção de talentos
-            - Programas de treinamento e capacitação
-            - Métricas de satisfação e engajamento
-            {abnt_rules}
-            
-            Produza um relatório de RH estratégico e implementável.
-            """
-        },
-        'marketing_analysis': {
-            'researcher': """
-            Você é um analista de marketing digital especializado. Analise o objetivo: "{goal}" e estruture uma análise completa de marketing.
-            
-            Dados de marketing:
-            '''{context}'''
-            
-            Estruture a análise com:
-            1. Análise do mix de marketing atual
-            2. Performance de campanhas e canais
-            3. Análise de audiência e segmentação
-            4. ROI de investimentos em marketing
-            5. Análise de concorrência em marketing
-            6. Tendências e oportunidades de mercado
-            7. Estratégias de branding e posicionamento
-            8. Recomendações para otimização de marketing
-            
-            {abnt_rules}
-            """,
-            'writer': """
-            Você é um especialista em relatórios de marketing. Desenvolva uma análise de marketing baseada na estrutura:
-            
-            {outline}
-            
-            Dados de marketing:
-            '''{context}'''
-            
-            ELEMENTOS OBRIGATÓRIOS:
-            - Dashboard de métricas de marketing
-            - Análise de ROI por canal
-            - Estratégias de conteúdo e engajamento
-            - Planos de campanhas futuras
-            - Análise de brand awareness
-            - Recomendações de otimização de budget
-            {abnt_rules}
-            
-            Produza um relatório de marketing estratégico e acionável.
-            """
-        },
-        'operations_management': {
-            'researcher': """
-            Você é um especialista em gestão de operações. Analise o objetivo: "{goal}" e estruture uma análise completa de operações.
-            
-            Dados operacionais:
-            '''{context}'''
-            
-            Estruture a análise com:
-            1. Mapeamento de processos atuais
-            2. Análise de eficiência e produtividade
-            3. Identificação de gargalos e desperdícios
-            4. Análise de qualidade e conformidade
-            5. Oportunidades de automação
-            6. Benchmarking operacional
-            7. Estratégias de melhoria contínua
-            8. Recomendações para otimização operacional
-            
-            {abnt_rules}
-            """,
-            'writer': """
-            Você é um especialista em relatórios operacionais. Desenvolva uma análise de operações baseada na estrutura:
-            
-            {outline}
-            
-            Dados operacionais:
-            '''{context}'''
-            
-            ELEMENTOS OBRIGATÓRIOS:
-            - Mapa de processos otimizado
-            - Indicadores de performance operacional
-            - Planos de melhoria e automação
-            - Análise de custos operacionais
-            - Estratégias lean e six sigma
-            - Cronograma de implementação
-            {abnt_rules}
-            
-            Produza um relatório operacional prático e implementável.
-            """
-        },
-        'technology_analysis': {
-            'researcher': """
-            Você é um analista de tecnologia especializado. Analise o objetivo: "{goal}" e estruture uma análise completa de tecnologia.
-            
-            Dados tecnológicos:
-            '''{context}'''
-            
-            Estruture a análise com:
-            1. Avaliação da infraestrutura tecnológica atual
-            2. Análise de sistemas e arquitetura
-            3. Identificação de gaps tecnológicos
-            4. Oportunidades de inovação e digitalização
-            5. Análise de segurança e compliance
-            6. Roadmap de transformação digital
-            7. Análise de ROI tecnológico
-            8. Recomendações para modernização
-            
-            {abnt_rules}
-            """,
-            'writer': """
-            Você é um especialista em relatórios de tecnologia. Desenvolva uma análise tecnológica baseada na estrutura:
-            
-            {outline}
-            
-            Dados tecnológicos:
-            '''{context}'''
-            
-            ELEMENTOS OBRIGATÓRIOS:
-            - Arquitetura tecnológica recomendada
-            - Plano de modernização e migração
-            - Análise de custos e benefícios
-            - Estratégias de segurança cibernética
-            - Roadmap de implementação tecnológica
-            - Métricas de performance de TI
-            {abnt_rules}
-            
-            Produza um relatório tecnológico estratégico e implementável.
-            """
-        },
-        'product_management': {
-            'researcher': """
-            Você é um Product Manager sênior especializado em estratégia de produtos. Analise o objetivo: "{goal}" e estruture um plano de gestão de produtos.
-            
-            Dados de produtos:
-            '''{context}'''
-            
-            Estruture o plano com:
-            1. Análise do portfólio atual de produtos
-            2. Pesquisa de mercado e análise competitiva
-            3. Definição de personas e necessidades dos usuários
-            4. Roadmap de desenvolvimento e priorização
-            5. Especificações funcionais e técnicas
-            6. Estratégia de lançamento e go-to-market
-            7. Métricas de sucesso e KPIs de produto
-            8. Análise de viabilidade e ROI
-            
-            {abnt_rules}
-            """,
-            'writer': """
-            Você é um especialista em documentação de produtos. Desenvolva um plano de produto completo baseado na estrutura:
-            
-            {outline}
-            
-            Informações de produto:
-            '''{context}'''
-            
-            COMPONENTES ESSENCIAIS:
-            - Product Vision e estratégia clara
-            - User Stories e casos de uso detalhados
-            - Roadmap visual com timelines realistas
-            - Análise de features e priorização (MoSCoW)
-            - Plano de testes e validação
-            - Estratégia de pricing e monetização
-            - Métricas de adoção e engajamento
-            {abnt_rules}
-            
-            Produza um documento de produto profissional e executável.
-            """
-        },
-        'user_management': {
-            'researcher': """
-            Você é um especialista em experiência do usuário e análise comportamental. Analise o objetivo: "{goal}" e estruture uma análise de usuários.
-            
-            Dados de usuários:
-            '''{context}'''
-            
-            Estruture a análise com:
-            1. Perfil demográfico e comportamental dos usuários
-            2. Jornada do usuário e pontos de contato
-            3. Análise de engajamento e retenção
-            4. Segmentação de usuários e personas
-            5. Identificação de pain points e oportunidades
-            6. Análise de usabilidade e UX
-            7. Métricas de satisfação e NPS
-            8. Estratégias de melhoria da experiência
-            
-            {abnt_rules}
-            """,
-            'writer': """
-            Você é um especialista em relatórios de UX e análise de usuários. Desenvolva uma análise completa baseada na estrutura:
-            
-            {outline}
-            
-            Dados comportamentais:
-            '''{context}'''
-            
-            ELEMENTOS FUNDAMENTAIS:
-            - Personas detalhadas com dados reais
-            - Mapa da jornada do usuário com touchpoints
-            - Análise de funil de conversão
-            - Heatmaps e análise de comportamento
-            - Recomendações de UX/UI prioritizadas
-            - Plano de testes A/B e validação
-            - Estratégias de onboarding e retenção
-            {abnt_rules}
-            
-            Produza um relatório de UX acionável e centrado no usuário.
-            """
-        },
-        'task_management': {
-            'researcher': """
-            Você é um especialista em gestão de projetos e metodologias ágeis. Analise o objetivo: "{goal}" e estruture um plano de gestão de tarefas.
-            
-            Dados de tarefas e projetos:
-            '''{context}'''
-            
-            Estruture o plano com:
-            1. Análise do backlog atual e priorização
-            2. Estruturação de sprints e metodologia ágil
-            3. Definição de épicos, user stories e tasks
-            4. Estimativas de esforço e capacity planning
-            5. Identificação de dependências e riscos
-            6. Cronograma e milestones principais
-            7. Métricas de produtividade e velocity
-            8. Estratégias de otimização de processos
-            
-            {abnt_rules}
-            """,
-            'writer': """
-            Você é um especialista em documentação de projetos ágeis. Desenvolva um plano de gestão completo baseado na estrutura:
-            
-            {outline}
-            
-            Dados de projeto:
-            '''{context}'''
-            
-            COMPONENTES OBRIGATÓRIOS:
-            - Backlog priorizado com critérios claros
-            - Sprint planning com estimativas realistas
-            - Definition of Done e critérios de aceitação
-            - Burndown charts e métricas de progresso
-            - Risk management e planos de contingência
-            - Retrospectivas e melhorias contínuas
-            - Comunicação e stakeholder management
-            {abnt_rules}
-            
-            Produza um plano de projeto ágil e executável.
-            """
-        },
-        'general': {
-            'researcher': """
-            Você é um pesquisador versátil. Analise o objetivo: "{goal}" e crie uma estrutura lógica e abrangente.
-            
-            Contexto fornecido:
-            '''{context}'''
-            
-            Desenvolva uma estrutura adequada ao objetivo, incluindo:
-            1. Introdução ao tema
-            2. Desenvolvimento dos pontos principais
-            3. Análise e discussão
-            4. Conclusões
-            
-            {abnt_rules}
-            """,
-            'writer': """
-            Você é um redator profissional versátil. Desenvolva um conteúdo completo baseado na estrutura:
-            
-            {outline}
-            
-            Contexto de referência:
-            '''{context}'''
-            
-            PADRÕES DE QUALIDADE:
-            - Linguagem adequada ao público-alvo
-            - Estrutura lógica e coerente
-            - Conteúdo informativo e relevante
-            {abnt_rules}
-            
-            Produza um texto de alta qualidade e bem estruturado.
-            """
-        }
+    agent_template = agent_only_template(str(custom_prompt)) if shared_prefix is not None else None
+    if agent_template is None:
+        prompt = render_prompt(custom_prompt, context=context, abnt_rules=get_abnt_formatting_rules(), **values)
+        return prompt, None
+    context_extra = "" if isinstance(context, str) else list(context[1:])
+    return render_prompt(agent_template, context_extra=context_extra, **values), shared_prefix
+
+def build_retrieval_index(context: str):
+    """Índice de trechos do contexto (None com AGENT_RETRIEVAL=off ou texto curto)"""
+    if AGENT_RETRIEVAL == 'off' or not context or len(context) < AGENT_RETRIEVAL_MIN_KB * 1024:
+        return None
+    return retrieval_indexes.get(context, AGENT_RETRIEVAL_CHUNK_CHARS, AGENT_RETRIEVAL_OVERLAP_CHARS)
+
+def retrieve_agent_context(retrieval_index, context, goal: str, goal_type: str, role: str,
+                           outline: str = "", send_update=None) -> str:
+    """
+    Contexto de um agente: sem índice, o contexto inteiro; com índice, os
+    AGENT_RETRIEVAL_TOP_K trechos mais relevantes para o objetivo, reforçados
+    pelo vocabulário do tipo de agente e pelo outline (escritor)
+    """
+    if retrieval_index is None:
+        return context
+    boost = " ".join(sorted(GOAL_TYPE_VOCABULARY.get(goal_type, ())))
+    if outline:
+        boost = f"{boost}\n{outline}"
+    chunk_ids = retrieval_index.select(goal, AGENT_RETRIEVAL_TOP_K, boost=boost)
+    if send_update:
+        send_update(f"[RETRIEVAL] {role} ({goal_type}): trechos {', '.join(str(chunk_id + 1) for chunk_id in chunk_ids)} "
+                    f"de {retrieval_index.chunk_count}", 'log')
+    return retrieval_index.render(chunk_ids)
+
+# Templates especializados por tipo de objetivo ({goal}, {context}, {outline} e
+# {abnt_rules} são preenchidos na renderização)
+SPECIALIZED_PROMPT_TEMPLATES = {
+    'academic': {
+        'researcher': """
+        Você é um pesquisador acadêmico especializado. Analise o objetivo: "{goal}" e crie uma estrutura detalhada para um trabalho acadêmico seguindo metodologia científica.
+        
+        Contexto fornecido:
+        '''{context}'''
+        
+        Sua estrutura deve incluir:
+        1. Introdução e justificativa
+        2. Objetivos (geral e específicos)
+        3. Revisão bibliográfica
+        4. Metodologia
+        4. Resultados esperados
+        5. Conclusões
+        6. Referências
+        
+        {abnt_rules}
+        """,
+        'writer': """
+        Você é um escritor acadêmico especializado em produção científica. Desenvolva um texto acadêmico completo baseado na estrutura:
+        
+        {outline}
+        
+        Contexto de referência:
+        '''{context}'''
+        
+        REQUISITOS OBRIGATÓRIOS:
+        - Linguagem formal e técnica
+        - Citações e referências adequadas
+        - Argumentação lógica e fundamentada
+        - Metodologia clara e replicável
+        {abnt_rules}
+        
+        Produza um texto de qualidade acadêmica, pronto para submissão.
+        """
+    },
+    'technical_report': {
+        'researcher': """
+        Você é um analista técnico especializado. Analise o objetivo: "{goal}" e estruture um relatório técnico profissional.
+        
+        Dados técnicos:
+        '''{context}'''
+        
+        Estruture o relatório com:
+        1. Sumário executivo
+        2. Introdução e objetivos
+        3. Metodologia aplicada
+        4. Resultados e análises
+        5. Discussão técnica
+        6. Conclusões e recomendações
+        7. Anexos (quando necessário)
+        
+        {abnt_rules}
+        """,
+        'writer': """
+        Você é um redator técnico especializado. Desenvolva um relatório técnico completo baseado na estrutura:
+        
+        {outline}
+        
+        Dados de referência:
+        '''{context}'''
+        
+        CARACTERÍSTICAS OBRIGATÓRIAS:
+        - Linguagem técnica precisa
+        - Dados quantitativos quando possível
+        - Gráficos e tabelas (descreva quando necessário)
+        - Recomendações práticas e implementáveis
+        {abnt_rules}
+        
+        Produza um relatório profissional e acionável.
+        """
+    },
+    'summary': {
+        'researcher': """
+        Você é um especialista em síntese de informações. Analise o objetivo: "{goal}" e estruture um resumo eficiente.
+        
+        Conteúdo para resumir:
+        '''{context}'''
+        
+        Estruture o resumo com:
+        1. Pontos principais identificados
+        2. Informações essenciais
+        3. Conclusões-chave
+        4. Insights relevantes
+        
+        {abnt_rules}
+        """,
+        'writer': """
+        Você é um redator especializado em sínteses. Crie um resumo claro e conciso baseado na estrutura:
+        
+        {outline}
+        
+        Conteúdo original:
+        '''{context}'''
+        
+        CARACTERÍSTICAS DO RESUMO:
+        - Máximo 500 palavras para resumo executivo
+        - Linguagem clara e objetiva
+        - Preservação das informações essenciais
+        - Estrutura lógica e fluida
+        {abnt_rules}
+        
+        Produza um resumo profissional e informativo.
+        """
+    },
+    'data_analysis': {
+        'researcher': """
+        Você é um analista de dados especializado. Analise o objetivo: "{goal}" e estruture uma análise de dados completa.
+        
+        Dados fornecidos:
+        '''{context}'''
+        
+        Estruture a análise com:
+        1. Visão geral dos dados
+        2. Metodologia de análise
+        3. Estatísticas descritivas
+        4. Padrões e tendências identificados
+        5. Insights e correlações
+        6. Recomendações baseadas em dados
+        
+        {abnt_rules}
+        """,
+        'writer': """
+        Você é um especialista em relatórios de dados. Desenvolva uma análise completa baseada na estrutura:
+        
+        {outline}
+        
+        Dataset:
+        '''{context}'''
+        
+        ELEMENTOS OBRIGATÓRIOS:
+        - Interpretação clara dos dados
+        - Visualizações descritas (quando aplicável)
+        - Insights acionáveis
+        - Conclusões baseadas em evidências
+        {abnt_rules}
+        
+        Produza uma análise de dados profissional e compreensível.
+        """
+    },
+    'strategic_planning': {
+        'researcher': """
+        Você é um consultor estratégico sênior especializado em planejamento empresarial;
+        Analise o objetivo: "{goal}";
+        Estruture um plano estratégico abrangente
+        
+        Contexto organizacional:
+        '''{context}'''
+        
+        Estruture o planejamento estratégico com:
+        1. Análise do ambiente interno e externo (SWOT)
+        2. Definição de missão, visão e valores
+        3. Objetivos estratégicos de longo prazo
+        4. OKRs (Objectives and Key Results) trimestrais e anuais
+        5. Estratégias e iniciativas prioritárias
+        6. Plano de implementação e cronograma
+        7. Indicadores de performance (KPIs)
+        8. Gestão de riscos e contingências
+        9. Orçamento e recursos necessários
+        
+        {abnt_rules}
+        """,
+        'writer': """
+        Você é um especialista em documentação estratégica empresarial. Desenvolva um plano estratégico completo baseado na estrutura:
+        
+        {outline}
+        
+        Dados organizacionais:
+        '''{context}'''
+        
+        ELEMENTOS OBRIGATÓRIOS:
+        - Análise situacional detalhada
+        - Objetivos SMART (específicos, mensuráveis, atingíveis, relevantes, temporais)
+        - OKRs estruturados com objetivos qualitativos e key results quantitativos
+        - Estratégias claras e acionáveis
+        - Cronograma de implementação realista
+        - Métricas de acompanhamento e revisão trimestral de OKRs
+        - Análise de viabilidade financeira
+        - Planos de contingência
+        {abnt_rules}
+        
+        Produza um plano estratégico executável e profissional.
+        """
+    },
+    'competitive_analysis': {
+        'researcher': """
+        Você é um analista de mercado especializado em inteligência competitiva. Analise o objetivo: "{goal}" e estruture uma análise de concorrência completa.
+        
+        Dados de mercado e concorrentes:
+        '''{context}'''
+        
+        Estruture a análise competitiva com:
+        1. Mapeamento do cenário competitivo
+        2. Identificação dos principais concorrentes
+        3. Análise de produtos/serviços concorrentes
+        4. Estratégias de preços e posicionamento
+        5. Forças e fraquezas dos concorrentes
+        6. Participação de mercado e tendências
+        7. Oportunidades e ameaças identificadas
+        8. Recomendações estratégicas
+        
+        {abnt_rules}
+        """,
+        'writer': """
+        Você é um especialista em relatórios de inteligência competitiva. Desenvolva uma análise de concorrência detalhada baseada na estrutura:
+        
+        {outline}
+        
+        Informações de mercado:
+        '''{context}'''
+        
+        COMPONENTES ESSENCIAIS:
+        - Perfil detalhado dos concorrentes principais
+        - Análise comparativa de produtos/serviços
+        - Benchmarking de preços e estratégias
+        - Matriz de posicionamento competitivo
+        - Análise de market share e tendências
+        - Identificação de gaps de mercado
+        - Recomendações táticas e estratégicas
+        {abnt_rules}
+        
+        Produza uma análise competitiva acionável e estratégica.
+        """
+    },
+    'sales_analysis': {
+        'researcher': """
+        Você é um analista de vendas sênior especializado em performance comercial. Analise o objetivo: "{goal}" e estruture uma análise completa de vendas.
+        
+        Dados de vendas:
+        '''{context}'''
+        
+        Estruture a análise com:
+        1. Visão geral do desempenho de vendas
+        2. Análise de métricas-chave (receita, conversão, ticket médio, LTV, churn)
+        3. Segmentação de clientes e produtos
+        4. Análise de tendências e sazonalidade
+        5. Identificação de oportunidades e gargalos
+        6. Benchmarking e comparações históricas
+        7. Previsões e projeções
+        8. Recomendações estratégicas para crescimento
+        
+        {abnt_rules}
+        """,
+        'writer': """
+        Você é um especialista em relatórios comerciais. Desenvolva uma análise de vendas detalhada baseada na estrutura:
+        
+        {outline}
+        
+        Dados comerciais:
+        '''{context}'''
+        
+        ELEMENTOS OBRIGATÓRIOS:
+        - Dashboard executivo com KPIs principais
+        - Análise quantitativa com gráficos e tabelas
+        - Insights acionáveis para equipe comercial
+        - Plano de ação com metas específicas
+        - ROI e análise de investimento em vendas
+        - Estratégias de retenção e upselling
+        {abnt_rules}
+        
+        Produza um relatório comercial estratégico e acionável.
+        """
+    },
+    'financial_analysis': {
+        'researcher': """
+        Você é um analista financeiro sênior especializado em análise empresarial. Analise o objetivo: "{goal}" e estruture uma análise financeira completa.
+        
+        Dados financeiros:
+        '''{context}'''
+        
+        Estruture a análise com:
+        1. Análise de demonstrações financeiras (DRE, Balanço, Fluxo de Caixa)
+        2. Indicadores de rentabilidade e liquidez
+        3. Análise de custos e margem
+        4. ROI e análise de investimentos
+        5. Projeções financeiras e cenários
+        6. Análise de riscos financeiros
+        7. Benchmarking setorial
+        8. Recomendações para otimização financeira
+        
+        {abnt_rules}
+        """,
+        'writer': """
+        Você é um especialista em relatórios financeiros. Desenvolva uma análise financeira detalhada baseada na estrutura:
+        
+        {outline}
+        
+        Dados financeiros:
+        '''{context}'''
+        
+        ELEMENTOS OBRIGATÓRIOS:
+        - Resumo executivo financeiro
+        - Análise de indicadores-chave (ROI, EBITDA, Margem)
+        - Gráficos e tabelas financeiras
+        - Análise de tendências e variações
+        - Recomendações de investimento e corte de custos
+        - Projeções e cenários futuros
+        {abnt_rules}
+        
+        Produza um relatório financeiro profissional e acionável.
+        """
+    },
+    'hr_management': {
+        'researcher': """
+        Você é um especialista em gestão de recursos humanos. Analise o objetivo: "{goal}" e estruture uma análise completa de RH.
+        
+        Dados de RH:
+        '''{context}'''
+        
+        Estruture a análise com:
+        1. Análise do capital humano atual
+        2. Indicadores de performance e engajamento
+        3. Análise de turnover e retenção
+        4. Mapeamento de competências e gaps
+        5. Planos de desenvolvimento e treinamento
+        6. Cultura organizacional e clima
+        7. Estratégias de recrutamento e seleção
+        8. Recomendações para gestão de pessoas
+        
+        {abnt_rules}
+        """,
+        'writer': """
+        Você é um especialista em relatórios de RH. Desenvolva uma análise de recursos humanos baseada na estrutura:
+        
+        {outline}
+        
+        Dados de RH:
+        '''{context}'''
+        
+        ELEMENTOS OBRIGATÓRIOS:
+        - Dashboard de indicadores de RH
+        - Análise de performance e produtividade
+        - Planos de desenvolvimento individuais
+        - Estratégias de retenção de talentos
+        - Programas de treinamento e capacitação
+        - Métricas de satisfação e engajamento
+        {abnt_rules}
+        
+        Produza um relatório de RH estratégico e implementável.
+        """
+    },
+    'marketing_analysis': {
+        'researcher': """
+        Você é um analista de marketing digital especializado. Analise o objetivo: "{goal}" e estruture uma análise completa de marketing.
+        
+        Dados de marketing:
+        '''{context}'''
+        
+        Estruture a análise com:
+        1. Análise do mix de marketing atual
+        2. Performance de campanhas e canais
+        3. Análise de audiência e segmentação
+        4. ROI de investimentos em marketing
+        5. Análise de concorrência em marketing
+        6. Tendências e oportunidades de mercado
+        7. Estratégias de branding e posicionamento
+        8. Recomendações para otimização de marketing
+        
+        {abnt_rules}
+        """,
+        'writer': """
+        Você é um especialista em relatórios de marketing. Desenvolva uma análise de marketing baseada na estrutura:
+        
+        {outline}
+        
+        Dados de marketing:
+        '''{context}'''
+        
+        ELEMENTOS OBRIGATÓRIOS:
+        - Dashboard de métricas de marketing
+        - Análise de ROI por canal
+        - Estratégias de conteúdo e engajamento
+        - Planos de campanhas futuras
+        - Análise de brand awareness
+        - Recomendações de otimização de budget
+        {abnt_rules}
+        
+        Produza um relatório de marketing estratégico e acionável.
+        """
+    },
+    'operations_management': {
+        'researcher': """
+        Você é um especialista em gestão de operações. Analise o objetivo: "{goal}" e estruture uma análise completa de operações.
+        
+        Dados operacionais:
+        '''{context}'''
+        
+        Estruture a análise com:
+        1. Mapeamento de processos atuais
+        2. Análise de eficiência e produtividade
+        3. Identificação de gargalos e desperdícios
+        4. Análise de qualidade e conformidade
+        5. Oportunidades de automação
+        6. Benchmarking operacional
+        7. Estratégias de melhoria contínua
+        8. Recomendações para otimização operacional
+        
+        {abnt_rules}
+        """,
+        'writer': """
+        Você é um especialista em relatórios operacionais. Desenvolva uma análise de operações baseada na estrutura:
+        
+        {outline}
+        
+        Dados operacionais:
+        '''{context}'''
+        
+        ELEMENTOS OBRIGATÓRIOS:
+        - Mapa de processos otimizado
+        - Indicadores de performance operacional
+        - Planos de melhoria e automação
+        - Análise de custos operacionais
+        - Estratégias lean e six sigma
+        - Cronograma de implementação
+        {abnt_rules}
+        
+        Produza um relatório operacional prático e implementável.
+        """
+    },
+    'technology_analysis': {
+        'researcher': """
+        Você é um analista de tecnologia especializado. Analise o objetivo: "{goal}" e estruture uma análise completa de tecnologia.
+        
+        Dados tecnológicos:
+        '''{context}'''
+        
+        Estruture a análise com:
+        1. Avaliação da infraestrutura tecnológica atual
+        2. Análise de sistemas e arquitetura
+        3. Identificação de gaps tecnológicos
+        4. Oportunidades de inovação e digitalização
+        5. Análise de segurança e compliance
+        6. Roadmap de transformação digital
+        7. Análise de ROI tecnológico
+        8. Recomendações para modernização
+        
+        {abnt_rules}
+        """,
+        'writer': """
+        Você é um especialista em relatórios de tecnologia. Desenvolva uma análise tecnológica baseada na estrutura:
+        
+        {outline}
+        
+        Dados tecnológicos:
+        '''{context}'''
+        
+        ELEMENTOS OBRIGATÓRIOS:
+        - Arquitetura tecnológica recomendada
+        - Plano de modernização e migração
+        - Análise de custos e benefícios
+        - Estratégias de segurança cibernética
+        - Roadmap de implementação tecnológica
+        - Métricas de performance de TI
+        {abnt_rules}
+        
+        Produza um relatório tecnológico estratégico e implementável.
+        """
+    },
+    'product_management': {
+        'researcher': """
+        Você é um Product Manager sênior especializado em estratégia de produtos. Analise o objetivo: "{goal}" e estruture um plano de gestão de produtos.
+        
+        Dados de produtos:
+        '''{context}'''
+        
+        Estruture o plano com:
+        1. Análise do portfólio atual de produtos
+        2. Pesquisa de mercado e análise competitiva
+        3. Definição de personas e necessidades dos usuários
+        4. Roadmap de desenvolvimento e priorização
+        5. Especificações funcionais e técnicas
+        6. Estratégia de lançamento e go-to-market
+        7. Métricas de sucesso e KPIs de produto
+        8. Análise de viabilidade e ROI
+        
+        {abnt_rules}
+        """,
+        'writer': """
+        Você é um especialista em documentação de produtos. Desenvolva um plano de produto completo baseado na estrutura:
+        
+        {outline}
+        
+        Informações de produto:
+        '''{context}'''
+        
+        COMPONENTES ESSENCIAIS:
+        - Product Vision e estratégia clara
+        - User Stories e casos de uso detalhados
+        - Roadmap visual com timelines realistas
+        - Análise de features e priorização (MoSCoW)
+        - Plano de testes e validação
+        - Estratégia de pricing e monetização
+        - Métricas de adoção e engajamento
+        {abnt_rules}
+        
+        Produza um documento de produto profissional e executável.
+        """
+    },
+    'user_management': {
+        'researcher': """
+        Você é um especialista em experiência do usuário e análise comportamental. Analise o objetivo: "{goal}" e estruture uma análise de usuários.
+        
+        Dados de usuários:
+        '''{context}'''
+        
+        Estruture a análise com:
+        1. Perfil demográfico e comportamental dos usuários
+        2. Jornada do usuário e pontos de contato
+        3. Análise de engajamento e retenção
+        4. Segmentação de usuários e personas
+        5. Identificação de pain points e oportunidades
+        6. Análise de usabilidade e UX
+        7. Métricas de satisfação e NPS
+        8. Estratégias de melhoria da experiência
+        
+        {abnt_rules}
+        """,
+        'writer': """
+        Você é um especialista em relatórios de UX e análise de usuários. Desenvolva uma análise completa baseada na estrutura:
+        
+        {outline}
+        
+        Dados comportamentais:
+        '''{context}'''
+        
+        ELEMENTOS FUNDAMENTAIS:
+        - Personas detalhadas com dados reais
+        - Mapa da jornada do usuário com touchpoints
+        - Análise de funil de conversão
+        - Heatmaps e análise de comportamento
+        - Recomendações de UX/UI prioritizadas
+        - Plano de testes A/B e validação
+        - Estratégias de onboarding e retenção
+        {abnt_rules}
+        
+        Produza um relatório de UX acionável e centrado no usuário.
+        """
+    },
+    'task_management': {
+        'researcher': """
+        Você é um especialista em gestão de projetos e metodologias ágeis. Analise o objetivo: "{goal}" e estruture um plano de gestão de tarefas.
+        
+        Dados de tarefas e projetos:
+        '''{context}'''
+        
+        Estruture o plano com:
+        1. Análise do backlog atual e priorização
+        2. Estruturação de sprints e metodologia ágil
+        3. Definição de épicos, user stories e tasks
+        4. Estimativas de esforço e capacity planning
+        5. Identificação de dependências e riscos
+        6. Cronograma e milestones principais
+        7. Métricas de produtividade e velocity
+        8. Estratégias de otimização de processos
+        
+        {abnt_rules}
+        """,
+        'writer': """
+        Você é um especialista em documentação de projetos ágeis. Desenvolva um plano de gestão completo baseado na estrutura:
+        
+        {outline}
+        
+        Dados de projeto:
+        '''{context}'''
+        
+        COMPONENTES OBRIGATÓRIOS:
+        - Backlog priorizado com critérios claros
+        - Sprint planning com estimativas realistas
+        - Definition of Done e critérios de aceitação
+        - Burndown charts e métricas de progresso
+        - Risk management e planos de contingência
+        - Retrospectivas e melhorias contínuas
+        - Comunicação e stakeholder management
+        {abnt_rules}
+        
+        Produza um plano de projeto ágil e executável.
+        """
+    },
+    'general': {
+        'researcher': """
+        Você é um pesquisador versátil. Analise o objetivo: "{goal}" e crie uma estrutura lógica e abrangente.
+        
+        Contexto fornecido:
+        '''{context}'''
+        
+        Desenvolva uma estrutura adequada ao objetivo, incluindo:
+        1. Introdução ao tema
+        2. Desenvolvimento dos pontos principais
+        3. Análise e discussão
+        4. Conclusões
+        
+        {abnt_rules}
+        """,
+        'writer': """
+        Você é um redator profissional versátil. Desenvolva um conteúdo completo baseado na estrutura:
+        
+        {outline}
+        
+        Contexto de referência:
+        '''{context}'''
+        
+        PADRÕES DE QUALIDADE:
+        - Linguagem adequada ao público-alvo
+        - Estrutura lógica e coerente
+        - Conteúdo informativo e relevante
+        {abnt_rules}
+        
+        Produza um texto de alta qualidade e bem estruturado.
+        """
     }
-    
-    selected_prompts = prompts.get(goal_type, prompts['general'])
-    return selected_prompts['researcher'], selected_prompts['writer']
+}
+
+# Compilado uma única vez na importação (templates desindentados, com hash de versão)
+PROMPT_TEMPLATES = PromptTemplateRegistry(SPECIALIZED_PROMPT_TEMPLATES)
+
+def generate_specialized_prompts(goal_type: str, goal: str, context: str) -> tuple:
+    """
+    Gera prompts especializados baseados no tipo de objetivo
+    """
+    researcher_template, writer_template = PROMPT_TEMPLATES.pair(goal_type)
+    return researcher_template.text, writer_template.text
 
 # --- Classes do Sistema Multi-Agente Avançado ---
+# Termos da avaliação de qualidade montados uma única vez
+QUALITY_SCORER = QualityScorer()
+
 class MangabaAgentOrchestrator:
     """
     Orquestrador avançado para coordenação de múltiplos agentes especializados
     """
     
-    def __init__(self, send_update=None):
+    def __init__(self, send_update=None, retrieval_index=None):
         self.send_update = send_update
+        # Com índice de trechos, cada agente recebe apenas os trechos relevantes ao seu tipo
+        self.retrieval_index = retrieval_index
         self.agents_results = {}
+        self._shared_prefix = None
+        self._shared_prefix_context = None
         self.collaboration_matrix = {
             'sales_analysis': ['product_management', 'user_management'],
             'product_management': ['sales_analysis', 'user_management', 'task_management'],
@@ -856,6 +1289,16 @@ class MangabaAgentOrchestrator:
             'competitive_analysis': ['strategic_planning', 'product_management']
         }
     
+    def get_shared_prefix(self, context: str):
+        """Prefixo (regras ABNT + contexto) montado uma vez e reutilizado por todos os agentes da execução"""
+        if self.retrieval_index is not None:
+            # O contexto difere por agente: não há prefixo comum a reutilizar
+            return None
+        if self._shared_prefix_context is not context:
+            self._shared_prefix = build_shared_prefix(context)
+            self._shared_prefix_context = context
+        return self._shared_prefix
+    
     def should_collaborate(self, primary_goal_type: str) -> list:
         """
         Determina quais agentes devem colaborar baseado no tipo de objetivo principal
@@ -874,6 +1317,7 @@ class MangabaAgentOrchestrator:
         Executa análise paralela com agentes colaborativos específicos
         """
         results = {'primary': None, 'collaborative': {}}
+        shared_prefix = self.get_shared_prefix(context)
         
         if self.send_update:
             self.send_update(f"[ORCHESTRATOR] Iniciando análise colaborativa: {primary_goal_type} + {collaborative_agents}", 'log')
@@ -881,10 +1325,13 @@ class MangabaAgentOrchestrator:
         # Análise principal
         try:
             researcher_prompt, writer_prompt = generate_specialized_prompts(primary_goal_type, goal, context)
-            primary_outline = agent_researcher(goal, context, researcher_prompt, primary_goal_type, self.send_update)
+            agent_context = retrieve_agent_context(self.retrieval_index, context, goal, primary_goal_type, 'Pesquisador', send_update=self.send_update)
+            primary_outline, primary_data = research_outline(goal, agent_context, researcher_prompt, primary_goal_type,
+                                                             self.send_update, shared_prefix=shared_prefix)
             results['primary'] = {
                 'goal_type': primary_goal_type,
                 'outline': primary_outline,
+                'outline_data': primary_data,
                 'writer_prompt': writer_prompt
             }
             if self.send_update:
@@ -909,10 +1356,13 @@ class MangabaAgentOrchestrator:
                     if self.send_update:
                         self.send_update(f"[ORCHESTRATOR] Usando prompt genérico para {agent_type}", 'log')
                 
-                collab_outline = agent_researcher(goal, context, collab_researcher_prompt, agent_type, self.send_update)
+                agent_context = retrieve_agent_context(self.retrieval_index, context, goal, agent_type, 'Colaborador', send_update=self.send_update)
+                collab_outline, collab_data = research_outline(goal, agent_context, collab_researcher_prompt, agent_type,
+                                                               self.send_update, shared_prefix=shared_prefix, role=ROLE_COLLABORATOR)
                 
                 results['collaborative'][agent_type] = {
                     'outline': collab_outline,
+                    'outline_data': collab_data,
                     'writer_prompt': collab_writer_prompt
                 }
                 
@@ -925,24 +1375,44 @@ class MangabaAgentOrchestrator:
         
         return results
     
-    def synthesize_collaborative_content(self, goal: str, context: str, analysis_results: dict) -> str:
+    def synthesize_collaborative_content(self, goal: str, context: str, analysis_results: dict, outline_char_limit: int = None) -> str:
         """
-        Sintetiza o conteúdo final integrando análises de múltiplos agentes
+        Sintetiza o conteúdo final integrando análises de múltiplos agentes.
+        Com outline_char_limit, cada outline colaborativo é truncado (modo degradado).
         """
         if self.send_update:
             self.send_update("[ORCHESTRATOR] Iniciando síntese colaborativa", 'log')
         
-        # Construir contexto enriquecido com insights colaborativos
-        enriched_context = context
-        collaborative_insights = ""
+        # Construir contexto enriquecido com insights colaborativos. O contexto
+        # original não é copiado: as partes só são unidas no prompt final
+        primary = analysis_results['primary']
+        if primary:
+            writer_context = retrieve_agent_context(self.retrieval_index, context, goal, primary['goal_type'], 'Escritor',
+                                                    outline=primary['outline'], send_update=self.send_update)
+        else:
+            writer_context = context
+        enriched_context = [writer_context]
         
         if analysis_results['collaborative']:
-            collaborative_insights = "\n\n=== INSIGHTS COLABORATIVOS ===\n"
+            enriched_context.append("\n\n=== INSIGHTS COLABORATIVOS ===\n")
+            # Outlines estruturados: pontos já cobertos pelo principal ou por outro colaborador saem sem nova chamada
+            structured = {agent_type: result['outline_data'] for agent_type, result in analysis_results['collaborative'].items()
+                          if result and result.get('outline_data')}
+            if structured:
+                structured, removed = dedupe_insights(structured, primary.get('outline_data') if primary else None)
+                if self.send_update and removed:
+                    self.send_update(f"[ORCHESTRATOR] {removed} insights colaborativos repetidos removidos", 'log')
             for agent_type, result in analysis_results['collaborative'].items():
                 if result and result['outline']:
-                    collaborative_insights += f"\n--- Perspectiva {agent_type.upper()} ---\n{result['outline']}\n"
-        
-        enriched_context += collaborative_insights
+                    if agent_type in structured:
+                        if not structured[agent_type]['sections']:
+                            continue
+                        outline = render_outline(structured[agent_type], numbered=False)
+                    else:
+                        outline = result['outline']
+                    if outline_char_limit and len(outline) > outline_char_limit:
+                        outline = outline[:outline_char_limit].rstrip() + "\n[...]"
+                    enriched_context.append(f"\n--- Perspectiva {agent_type.upper()} ---\n{outline}\n")
         
         # Gerar conteúdo final usando o agente principal com contexto enriquecido
         if analysis_results['primary']:
@@ -953,7 +1423,8 @@ class MangabaAgentOrchestrator:
                     analysis_results['primary']['writer_prompt'],
                     goal,
                     analysis_results['primary']['goal_type'],
-                    self.send_update
+                    self.send_update,
+                    shared_prefix=self.get_shared_prefix(context)
                 )
                 
                 if self.send_update:
@@ -963,7 +1434,7 @@ class MangabaAgentOrchestrator:
             except Exception as e:
                 if self.send_update:
                     self.send_update(f"[ORCHESTRATOR] Erro na síntese: {e}", 'log')
-                return generate_fallback_content(goal, enriched_context, analysis_results['primary']['outline'], analysis_results['primary']['goal_type'], self.send_update)
+                return generate_fallback_content(goal, join_parts(enriched_context), analysis_results['primary']['outline'], analysis_results['primary']['goal_type'], self.send_update)
         
         return generate_fallback_content(goal, context, "Estrutura não disponível", 'general', self.send_update)
 
@@ -972,109 +1443,72 @@ class QualityAssurance:
     Sistema de garantia de qualidade para validação de outputs
     """
     
-    def __init__(self, send_update=None):
+    def __init__(self, send_update=None, scorer: QualityScorer = None):
         self.send_update = send_update
-        self.quality_metrics = {
-            'completeness': 0.0,
-            'accuracy': 0.0,
-            'relevance': 0.0,
-            'actionability': 0.0
-        }
+        self.scorer = scorer or QUALITY_SCORER
+        self.quality_metrics = {criterion: 0.0 for criterion in QUALITY_CRITERIA}
     
     def evaluate_content_quality(self, content: str, goal: str, goal_type: str) -> dict:
         """
         Avalia a qualidade do conteúdo gerado baseado em critérios específicos
+        (completude, precisão, relevância e acionabilidade), com uma única
+        normalização do conteúdo
         """
         if self.send_update:
             self.send_update("[QA] Iniciando avaliação de qualidade", 'log')
         
-        # Critérios básicos de qualidade
-        quality_score = {
-            'completeness': self._evaluate_completeness(content, goal_type),
-            'accuracy': self._evaluate_accuracy(content, goal),
-            'relevance': self._evaluate_relevance(content, goal),
-            'actionability': self._evaluate_actionability(content, goal_type)
-        }
-        
-        overall_score = sum(quality_score.values()) / len(quality_score)
+        report = self.scorer.evaluate(content, goal, goal_type)
+        self.quality_metrics = dict(report['detailed_scores'])
         
         if self.send_update:
-            self.send_update(f"[QA] Score de qualidade: {overall_score:.2f}/1.0", 'log')
-        
-        return {
-            'overall_score': overall_score,
-            'detailed_scores': quality_score,
-            'recommendations': self._generate_recommendations(quality_score)
-        }
-    
-    def _evaluate_completeness(self, content: str, goal_type: str) -> float:
-        """Avalia se o conteúdo está completo baseado no tipo de objetivo"""
-        required_sections = {
-            'strategic_planning': ['análise', 'objetivos', 'estratégias', 'implementação'],
-            'sales_analysis': ['métricas', 'tendências', 'recomendações'],
-            'product_management': ['roadmap', 'features', 'personas'],
-            'user_management': ['jornada', 'experiência', 'melhorias'],
-            'task_management': ['backlog', 'sprint', 'cronograma']
-        }
-        
-        sections = required_sections.get(goal_type, ['introdução', 'desenvolvimento', 'conclusão'])
-        content_lower = content.lower()
-        
-        found_sections = sum(1 for section in sections if section in content_lower)
-        return found_sections / len(sections)
-    
-    def _evaluate_accuracy(self, content: str, goal: str) -> float:
-        """Avalia a precisão do conteúdo em relação ao objetivo"""
-        goal_keywords = goal.lower().split()
-        content_lower = content.lower()
-        
-        keyword_matches = sum(1 for keyword in goal_keywords if keyword in content_lower)
-        return min(keyword_matches / len(goal_keywords), 1.0)
-    
-    def _evaluate_relevance(self, content: str, goal: str) -> float:
-        """Avalia a relevância do conteúdo"""
-        # Critério simples: presença de palavras-chave do objetivo
-        return min(len(content) / 1000, 1.0)  # Assume que conteúdo mais longo é mais relevante
-    
-    def _evaluate_actionability(self, content: str, goal_type: str) -> float:
-        """Avalia se o conteúdo contém elementos acionáveis"""
-        actionable_keywords = ['recomendação', 'ação', 'implementar', 'executar', 'plano', 'estratégia', 'próximos passos']
-        content_lower = content.lower()
-        
-        found_keywords = sum(1 for keyword in actionable_keywords if keyword in content_lower)
-        return min(found_keywords / 3, 1.0)  # Normaliza para máximo de 1.0
-    
-    def _generate_recommendations(self, quality_scores: dict) -> list:
-        """Gera recomendações baseadas nos scores de qualidade"""
-        recommendations = []
-        
-        if quality_scores['completeness'] < 0.7:
-            recommendations.append("Adicionar seções faltantes para maior completude")
-        
-        if quality_scores['accuracy'] < 0.6:
-            recommendations.append("Revisar alinhamento com o objetivo principal")
-        
-        if quality_scores['relevance'] < 0.5:
-            recommendations.append("Expandir conteúdo com mais detalhes relevantes")
+            self.send_update(f"[QA] Score de qualidade: {report['overall_score']:.2f}/1.0 "
+                             f"({report['elapsed_ms']:.1f} ms, {len(content)} caracteres)", 'log')
         
-        if quality_scores['actionability'] < 0.6:
-            recommendations.append("Incluir mais recomendações práticas e acionáveis")
-        
-        return recommendations
+        return report
 
 # --- Lógica do Sistema de Agentes ---
-def run_generative_model(prompt, max_retries=3, send_update=None):
-    import time
-    import random
-    
-    if not GEMINI_API_KEY:
-        raise ConnectionError("Chave da API Gemini não encontrada. Configure a variável de ambiente GEMINI_API_KEY.")
-    
-    headers = {
-        'Content-Type': 'application/json',
-        'X-goog-api-key': GEMINI_API_KEY
-    }
-    
+def run_generative_model(prompt, max_retries=3, send_update=None, shared_prefix=None, profile=None, details=None):
+    """
+    Chamada ao modelo com cada tentativa HTTP despachada pelo escalonador
+    justo, na fila do tenant da execução corrente. O backoff entre tentativas
+    e a troca de modelo acontecem na thread do pipeline, sem ocupar um worker,
+    e cada tentativa é cobrada do tenant. profile é o perfil de geração do
+    papel (padrão: perfil 'default'); details, se informado, recebe o
+    finish_reason da resposta
+    """
+    check_run_cancelled()
+    tenant, priority = current_call_tenant.get()
+    # Custo proporcional ao tamanho do prompt (~1 unidade a cada 32 mil caracteres)
+    prompt_chars = len(prompt) + (len(shared_prefix.text) if shared_prefix is not None else 0)
+    cost = 1.0 + prompt_chars / 32000
+
+    def dispatch(send):
+        submitted = time.monotonic()
+
+        def scheduled():
+            # O cliente pode ter desconectado enquanto a tentativa esperava na fila
+            check_run_cancelled()
+            waited = time.monotonic() - submitted
+            if send_update and waited >= 1.0:
+                send_update(f"[SCHEDULER] Chamada do tenant {tenant} ({priority}) aguardou {waited:.1f}s na fila", 'log')
+            return send()
+
+        # Os workers do escalonador não herdam os contextvars da thread do pipeline:
+        # a tentativa roda numa cópia do contexto para enxergar o sinal de cancelamento
+        context = contextvars.copy_context()
+        return gemini_scheduler.run(tenant, context.run, scheduled, priority=priority, cost=cost)
+
+    return call_generative_model(prompt, max_retries, send_update, shared_prefix=shared_prefix, profile=profile,
+                                 details=details, dispatch=dispatch)
+
+def build_generation_request(model: str, prompt: str, shared_prefix: SharedPrefix = None, profile=None) -> tuple:
+    """
+    Monta o corpo do generateContent. O prefixo compartilhado vai como referência
+    ao cache de contexto (modo 'gemini') ou como systemInstruction; o texto do
+    agente vai em contents. O generationConfig vem do perfil de geração da
+    chamada. Retorna (corpo, bytes de prompt enviados).
+    """
+    profile = profile or generation_profiles.get(ROLE_DEFAULT)
     data = {
         "contents": [
             {
@@ -1085,15 +1519,55 @@ def run_generative_model(prompt, max_retries=3, send_update=None):
                 ]
             }
         ],
-        "generationConfig": {
-            "temperature": 0.7,
-            "topK": 40,
-            "topP": 0.95,
-            "maxOutputTokens": 8192
-        }
+        "generationConfig": profile.to_config()
+    }
+    upload_bytes = len(prompt.encode('utf-8'))
+    
+    if shared_prefix is not None:
+        cached_name = context_cache.get(model, shared_prefix) if context_cache else None
+        if cached_name and context_cache.mode == CACHE_MODE_GEMINI:
+            data["cachedContent"] = cached_name
+        else:
+            # Enviado na chamada (também no modo 'local', que só estima a economia)
+            data["systemInstruction"] = {"parts": [{"text": shared_prefix.text}]}
+            upload_bytes += shared_prefix.size_bytes
+    
+    return data, upload_bytes
+
+def record_output_length(profile, result: dict, text: str, send_update=None):
+    """
+    Registra o tamanho da saída (usageMetadata, ou estimado pelo texto) e se
+    ela parou no teto de tokens do perfil (finishReason MAX_TOKENS)
+    """
+    output_tokens = (result.get('usageMetadata') or {}).get('candidatesTokenCount') or estimate_tokens(text)
+    truncated = result['candidates'][0].get('finishReason') == 'MAX_TOKENS'
+    output_lengths.record(profile, output_tokens, truncated)
+    metrics.observe('gemini_output_tokens', output_tokens, labels={'role': profile.role})
+    if truncated:
+        metrics.inc('gemini_truncated_outputs_total', labels={'role': profile.role, 'goal_type': profile.goal_type})
+        if send_update:
+            send_update(f"[GENERATION] Saída truncada no teto de {profile.max_output_tokens} tokens "
+                        f"(perfil {profile.key})", 'log')
+
+def call_generative_model(prompt, max_retries=3, send_update=None, shared_prefix=None, profile=None, details=None,
+                          dispatch=None):
+    """
+    Executa a chamada HTTP ao Gemini com retry e backoff. dispatch(send), se
+    informado, executa cada tentativa (send) e retorna a resposta
+    """
+    import time
+    import random
+    
+    if not GEMINI_API_KEY:
+        raise ConnectionError("Chave da API Gemini não encontrada. Configure a variável de ambiente GEMINI_API_KEY.")
+    
+    headers = {
+        'Content-Type': 'application/json',
+        'X-goog-api-key': GEMINI_API_KEY
     }
     
     last_error = None
+    request_started = time.monotonic()
     
     # Tenta cada modelo na ordem de prioridade
     for model in GEMINI_MODELS:
@@ -1105,13 +1579,24 @@ def run_generative_model(prompt, max_retries=3, send_update=None):
                     if send_update:
                         send_update(f"[DEBUG] Tentativa {retry + 1}/{max_retries} para {model} após {wait_time:.1f}s", 'log')
                     time.sleep(wait_time)
+                    check_run_cancelled()
                 else:
                     if send_update:
                         send_update(f"[DEBUG] Tentando modelo: {model}", 'log')
                 
                 url = f"{GEMINI_BASE_URL}/{model}:generateContent"
+                data, upload_bytes = build_generation_request(model, prompt, shared_prefix, profile)
+                metrics.inc('gemini_prompt_upload_bytes_total', upload_bytes, labels={'cache': AGENT_CONTEXT_CACHE})
                 
-                response = requests.post(url, headers=headers, json=data, timeout=120) # Aumentado timeout para 120 segundos
+                def send():
+                    nonlocal request_started
+                    request_started = time.monotonic()
+                    return requests.post(url, headers=headers, json=data, timeout=120) # Aumentado timeout para 120 segundos
+
+                response = dispatch(send) if dispatch else send()
+                request_seconds = time.monotonic() - request_started
+                model_latency.record(request_seconds)
+                metrics.observe('gemini_request_seconds', request_seconds, labels={'model': model, 'status': response.status_code})
                 if send_update:
                     send_update(f"[DEBUG] Status Code: {response.status_code}", 'log')
                 
@@ -1121,7 +1606,15 @@ def run_generative_model(prompt, max_retries=3, send_update=None):
                     if 'candidates' in result and len(result['candidates']) > 0:
                         if send_update:
                             send_update(f"[SUCCESS] Modelo {model} funcionou!", 'log')
-                        return result['candidates'][0]['content']['parts'][0]['text']
+                        text = result['candidates'][0]['content']['parts'][0]['text']
+                        # Tokens do prompt servidos do cache do Gemini (implícito no modo 'system')
+                        cached_tokens = (result.get('usageMetadata') or {}).get('cachedContentTokenCount')
+                        if cached_tokens:
+                            metrics.inc('gemini_cached_prompt_tokens_total', cached_tokens, labels={'cache': AGENT_CONTEXT_CACHE})
+                        record_output_length(profile or generation_profiles.get(ROLE_DEFAULT), result, text, send_update)
+                        if details is not None:
+                            details['finish_reason'] = result['candidates'][0].get('finishReason')
+                        return text
                     else:
                         if send_update:
                             send_update(f"[ERROR] Resposta sem candidates: {json.dumps(result, indent=2)}", 'log')
@@ -1146,6 +1639,14 @@ def run_generative_model(prompt, max_retries=3, send_update=None):
                     else:
                         break   # Próximo modelo
                 
+                # Conteúdo em cache expirado ou recusado: repete enviando o prefixo diretamente
+                elif response.status_code in [400, 403, 404] and "cachedContent" in data and retry < max_retries - 1:
+                    context_cache.invalidate(model, shared_prefix)
+                    if send_update:
+                        send_update(f"[CACHE] Conteúdo em cache recusado por {model} (HTTP {response.status_code}); reenviando o prefixo", 'log')
+                    last_error = f"Modelo {model}: cache de contexto recusado (HTTP {response.status_code})"
+                    continue
+                
                 # Erros permanentes que não merecem retry
                 elif response.status_code in [400, 401, 403]:
                     try:
@@ -1163,6 +1664,8 @@ def run_generative_model(prompt, max_retries=3, send_update=None):
                     response.raise_for_status() # Levanta uma exceção para outros códigos de status
                     
             except requests.exceptions.Timeout as e:
+                # Timeouts também indicam um modelo sobrecarregado
+                model_latency.record(time.monotonic() - request_started)
                 if send_update:
                     send_update(f"[WARNING] Timeout em {model} (tentativa {retry + 1}/{max_retries}): {e}", 'log')
                 last_error = f"Modelo {model}: Timeout - {e}"
@@ -1316,27 +1819,89 @@ def generate_fallback_outline(goal: str, context: str, goal_type: str, send_upda
     template = fallback_templates.get(goal_type, fallback_templates['default'])
     return template
 
-def agent_researcher(goal: str, context: str, custom_prompt: str, goal_type: str = 'general', send_update=None):
+def agent_researcher(goal: str, context, custom_prompt, goal_type: str = 'general', send_update=None, shared_prefix=None,
+                     role: str = ROLE_RESEARCHER):
+    """
+    O contexto pode ser uma string ou uma lista de partes; os valores entram no
+    prompt em uma única passada, sem escape de chaves (não passam por str.format).
+    Com shared_prefix, o contexto segue no prefixo compartilhado da execução.
+    role escolhe o perfil de geração (pesquisador principal ou colaborador).
+    """
     try:
-        # Escapar caracteres especiais no contexto para evitar erros de formatação
-        # Isso é crucial para que strings que contenham '{' ou '}' não quebrem o .format()
-        safe_context = context.replace('{', '{{').replace('}', '}}')
-        safe_goal = goal.replace('{', '{{').replace('}', '}}')
-        prompt = custom_prompt.format(goal=safe_goal, context=safe_context, abnt_rules=get_abnt_formatting_rules())
+        prompt, shared_prefix = assemble_agent_prompt(custom_prompt, context, shared_prefix, goal=goal)
         if send_update:
             send_update(f"[DEBUG] Prompt do pesquisador gerado com sucesso (tamanho: {len(prompt)} caracteres)", 'log')
-        return run_generative_model(prompt, send_update=send_update)
+        return run_generative_model(prompt, send_update=send_update, shared_prefix=shared_prefix,
+                                    profile=generation_profiles.get(role, goal_type))
     except ConnectionError as e:
         if send_update:
             send_update(f"[WARNING] API indisponível, usando fallback para pesquisador: {e}", 'log')
-        return generate_fallback_outline(goal, context, goal_type, send_update=send_update)
+        return generate_fallback_outline(goal, join_parts(context), goal_type, send_update=send_update)
     except Exception as e:
+        context = join_parts(context)
         if send_update:
             send_update(f"[ERROR] Erro na formatação do prompt do pesquisador: {e}", 'log')
             send_update(f"[DEBUG] Contexto problemático (primeiros 200 chars): {repr(context[:200])}...", 'log')
             send_update("[FALLBACK] Gerando estrutura de emergência para pesquisador...", 'log')
         return generate_fallback_outline(goal, context, goal_type, send_update=send_update)
 
+# Acrescentado ao prompt do pesquisador no modo estruturado (o esquema vai no generationConfig)
+STRUCTURED_OUTLINE_INSTRUCTIONS = normalize_template("""
+    FORMATO DA RESPOSTA: responda somente com JSON no esquema fornecido, sem texto fora dele.
+    - "title": título do documento
+    - "sections": as seções da estrutura, em ordem, cada uma com "title", "key_points" (tópicos curtos e objetivos)
+      e "data_refs" (campos, colunas, registros ou trechos do contexto que sustentam a seção)
+    """)
+
+def agent_structured_outline(goal: str, context, custom_prompt, goal_type: str = 'general', send_update=None,
+                             shared_prefix=None, role: str = ROLE_RESEARCHER) -> tuple:
+    """
+    Outline do pesquisador em JSON (responseMimeType + responseSchema),
+    validado localmente. Retorna (texto compacto para os prompts, outline
+    estruturado). Se a resposta não for um outline válido, repete a chamada
+    no formato markdown e retorna (texto, None).
+    """
+    try:
+        prompt, prefix = assemble_agent_prompt(custom_prompt, context, shared_prefix, goal=goal)
+        prompt = f"{prompt}\n\n{STRUCTURED_OUTLINE_INSTRUCTIONS}"
+        profile = generation_profiles.get(role, goal_type).replace(response_mime_type='application/json',
+                                                                   response_schema=OUTLINE_SCHEMA)
+        details = {}
+        text = run_generative_model(prompt, send_update=send_update, shared_prefix=prefix, profile=profile, details=details)
+        if details.get('finish_reason') == 'MAX_TOKENS':
+            # JSON cortado no teto não é válido: repete uma vez em JSON com o dobro do teto
+            # em vez de cair direto para outra chamada completa em markdown
+            profile = profile.replace(max_output_tokens=(profile.max_output_tokens or 2048) * 2)
+            if send_update:
+                send_update(f"[OUTLINE] Outline JSON truncado ({role}, {goal_type}); repetindo com teto de "
+                            f"{profile.max_output_tokens} tokens", 'log')
+            details = {}
+            text = run_generative_model(prompt, send_update=send_update, shared_prefix=prefix, profile=profile, details=details)
+            if details.get('finish_reason') == 'MAX_TOKENS':
+                raise OutlineValidationError(f"resposta truncada no teto de {profile.max_output_tokens} tokens")
+        outline = parse_outline_json(text)
+    except ConnectionError as e:
+        if send_update:
+            send_update(f"[WARNING] API indisponível, usando fallback para pesquisador: {e}", 'log')
+        return generate_fallback_outline(goal, join_parts(context), goal_type, send_update=send_update), None
+    except OutlineValidationError as e:
+        if send_update:
+            send_update(f"[OUTLINE] Outline JSON inválido ({role}, {goal_type}): {e}; repetindo em markdown", 'log')
+        return agent_researcher(goal, context, custom_prompt, goal_type, send_update, shared_prefix=shared_prefix, role=role), None
+    rendered = render_outline(outline)
+    if send_update:
+        points = sum(len(section['key_points']) for section in outline['sections'])
+        send_update(f"[OUTLINE] JSON válido ({role}, {goal_type}): {len(outline['sections'])} seções, {points} pontos; "
+                    f"{len(rendered)} caracteres nos prompts (resposta com {len(text)})", 'log')
+    return rendered, outline
+
+def research_outline(goal: str, context, custom_prompt, goal_type: str = 'general', send_update=None,
+                     shared_prefix=None, role: str = ROLE_RESEARCHER) -> tuple:
+    """(outline em texto, outline estruturado ou None), conforme AGENT_OUTLINE_FORMAT"""
+    if AGENT_OUTLINE_FORMAT == 'json':
+        return agent_structured_outline(goal, context, custom_prompt, goal_type, send_update, shared_prefix=shared_prefix, role=role)
+    return agent_researcher(goal, context, custom_prompt, goal_type, send_update, shared_prefix=shared_prefix, role=role), None
+
 def generate_fallback_content(goal: str, context: str, outline: str, goal_type: str, send_update=None):
     """Gera conteúdo de fallback quando a API falha"""
     if send_update:
@@ -1397,22 +1962,116 @@ Este documento serve como base estrutural para o desenvolvimento de uma análise
     
     return fallback_content
 
-def agent_writer(outline: str, context: str, custom_prompt: str, goal: str = "", goal_type: str = 'general', send_update=None):
+# Escritor por seções: cada chamada recebe a estrutura inteira (brief comum) e escreve só a sua seção
+SECTION_WRITER_TEMPLATE = normalize_template("""
+    Você é o escritor de UMA seção de um documento sobre o objetivo: "{goal}".
+    As outras seções estão sendo escritas ao mesmo tempo, a partir da mesma estrutura.
+
+    Estrutura completa do documento:
+    {outline}
+
+    Contexto de referência:
+    '''{context}'''
+
+    SUA SEÇÃO ({position} de {total}): {heading}
+    Pontos a desenvolver:
+    {points}
+
+    REQUISITOS:
+    - Escreva apenas esta seção, começando pelo título "{heading}"
+    - Use subtítulos de nível 3 (###) quando precisar dividir a seção
+    - Não escreva introdução nem conclusão do documento inteiro e não repita o conteúdo das outras seções
+    - Extensão máxima de cerca de {word_budget} palavras
+    {abnt_rules}
+    """)
+
+# Texto da seção cuja chamada falhou; as demais seções do relatório são mantidas
+SECTION_UNAVAILABLE_NOTE = ("> **Nota**: esta seção não foi gerada porque a API de IA ficou indisponível. "
+                            "Ela pode ser regenerada isoladamente a partir do relatório guardado.")
+
+def agent_section_writer(outline: str, context, sections: list, goal: str = "", goal_type: str = 'general',
+                         send_update=None, shared_prefix=None) -> str:
+    """
+    Escreve as seções do outline em paralelo (até AGENT_WRITER_CONCURRENCY
+    por relatório, cada uma com o teto de tokens do perfil 'section') e as
+    une em ordem. O tempo do escritor passa a acompanhar a seção mais longa,
+    e não o documento inteiro. Uma seção que falha vira uma nota;
+    se todas falharem, levanta ConnectionError (fallback do escritor).
+    """
+    total = len(sections)
+    headings = [f"## {section['title']}" if section['title'][:1].isdigit() else f"## {position}. {section['title']}"
+                for position, section in enumerate(sections, 1)]
+    profile = generation_profiles.get(ROLE_SECTION, goal_type)
+    # ~2 tokens por palavra em português: o limite pedido fica abaixo do teto de saída
+    word_budget = max(100, profile.max_output_tokens // 2)
+
+    def write(position):
+        prompt, prefix = assemble_agent_prompt(
+            SECTION_WRITER_TEMPLATE, context, shared_prefix,
+            goal=goal, outline=outline, position=position + 1, total=total, heading=headings[position],
+            points=sections[position]['points'] or "(desenvolver conforme o título)", word_budget=word_budget
+        )
+        started = time.monotonic()
+        text = run_generative_model(prompt, send_update=send_update, shared_prefix=prefix, profile=profile)
+        return text, time.monotonic() - started
+
+    if send_update:
+        send_update(f"[WRITER] Escrevendo {total} seções em paralelo (até {AGENT_WRITER_CONCURRENCY} simultâneas)", 'log')
+    started = time.monotonic()
+    texts = [None] * total
+    section_seconds = []
+    failed = set()
+    with ThreadPoolExecutor(max_workers=max(1, min(AGENT_WRITER_CONCURRENCY, total)), thread_name_prefix='writer') as executor:
+        # Cada seção roda no contexto da execução (tenant e prioridade do escalonador)
+        futures = {executor.submit(contextvars.copy_context().run, write, position): position for position in range(total)}
+        for future in as_completed(futures):
+            position = futures[future]
+            try:
+                texts[position], seconds = future.result()
+            except ConnectionError as e:
+                failed.add(position)
+                texts[position] = SECTION_UNAVAILABLE_NOTE
+                if send_update:
+                    send_update(f"[WARNING] Seção {position + 1} ({sections[position]['title']}) não foi escrita: {e}", 'log')
+                continue
+            section_seconds.append(seconds)
+            metrics.observe('writer_section_seconds', seconds)
+            if send_update:
+                send_update(f"[WRITER] Seção {position + 1}/{total} concluída em {seconds:.1f}s ({len(texts[position])} caracteres)", 'log')
+    if len(failed) == total:
+        raise ConnectionError("Nenhuma seção do relatório pôde ser escrita")
+    # A nota se repete em cada seção que falhou: fica fora da remoção de parágrafos repetidos
+    content = stitch_sections(texts, headings, verbatim=failed)
+    if send_update:
+        send_update(f"[WRITER] {total} seções unidas em {time.monotonic() - started:.1f}s "
+                    f"(soma das seções: {sum(section_seconds):.1f}s)", 'log')
+    return content
+
+def agent_writer(outline: str, context, custom_prompt, goal: str = "", goal_type: str = 'general', send_update=None, shared_prefix=None):
+    """
+    O contexto pode ser uma string ou uma lista de partes (ex.: contexto original
+    + insights colaborativos), concatenadas apenas no prompt final. Com
+    shared_prefix, a primeira parte segue no prefixo compartilhado. Com
+    AGENT_WRITER_MODE=sections, as seções do outline são escritas em paralelo.
+    """
     try:
-        # Escapar caracteres especiais no contexto e outline para evitar erros de formatação
-        # Isso é crucial para que strings que contenham '{' ou '}' não quebrem o .format()
-        safe_context = context.replace('{', '{{').replace('}', '}}')
-        safe_outline = outline.replace('{', '{{').replace('}', '}}')
-        abnt_rules = get_abnt_formatting_rules()
-        prompt = custom_prompt.format(outline=safe_outline, context=safe_context, abnt_rules=abnt_rules)
+        if AGENT_WRITER_MODE == 'sections':
+            sections = outline_sections(outline)
+            if 2 <= len(sections) <= AGENT_WRITER_MAX_SECTIONS:
+                return agent_section_writer(outline, context, sections, goal, goal_type, send_update, shared_prefix=shared_prefix)
+            if send_update:
+                send_update(f"[WRITER] Outline com {len(sections)} seções identificadas; usando o escritor único", 'log')
+        prompt, shared_prefix = assemble_agent_prompt(custom_prompt, context, shared_prefix, outline=outline)
         if send_update:
             send_update(f"[DEBUG] Prompt do escritor gerado com sucesso (tamanho: {len(prompt)} caracteres)", 'log')
-        return run_generative_model(prompt, send_update=send_update)
+        return run_generative_model(prompt, send_update=send_update, shared_prefix=shared_prefix,
+                                    profile=generation_profiles.get(ROLE_WRITER, goal_type))
     except ConnectionError as e:
         if send_update:
             send_update(f"[WARNING] API indisponível, usando fallback para escritor: {e}", 'log')
-        return generate_fallback_content(goal, context, outline, goal_type, send_update=send_update)
+        return generate_fallback_content(goal, join_parts(context), outline, goal_type, send_update=send_update)
     except Exception as e:
+        context = join_parts(context)
         if send_update:
             send_update(f"[ERROR] Erro na formatação do prompt do escritor: {e}", 'log')
             send_update(f"[DEBUG] Outline problemático (primeiros 200 chars): {repr(outline[:200])}...", 'log')
@@ -1421,17 +2080,57 @@ def agent_writer(outline: str, context: str, custom_prompt: str, goal: str = "",
         return generate_fallback_content(goal, context, outline, goal_type, send_update=send_update)
 
 # --- Orquestrador (MCP) Aprimorado ---
-def master_control_plane_enhanced(goal: str, context: str, goal_type: str = 'general', send_update=None, use_collaboration=True, use_qa=True):
+def evaluate_degradation():
+    """Avalia o nível de degradação a partir da fila de admissão e da latência recente do modelo"""
+    return overload_policy.evaluate(
+        admission_controller.queue_depth,
+        admission_controller.max_queue,
+        model_latency.recent()
+    )
+
+def start_quality_assessment(content: str, goal: str, goal_type: str):
+    """Agenda a avaliação de qualidade no executor de QA e retorna o Future do relatório"""
+    return qa_executor.submit(QualityAssurance().evaluate_content_quality, content, goal, goal_type)
+
+def collect_quality_report(future, timeout: float = None) -> dict:
+    """
+    Relatório de qualidade estruturado (evento 'quality_report'). Falha ou
+    demora da avaliação viram apenas um status, sem afetar o resto da execução.
+    """
+    timeout = AGENT_QA_TIMEOUT if timeout is None else timeout
+    try:
+        report = future.result(timeout=timeout)
+    except FutureTimeoutError:
+        future.cancel()
+        return {'status': 'timeout', 'timeout_seconds': timeout}
+    except Exception as e:
+        return {'status': 'error', 'error': str(e)}
+    return {
+        'status': 'ok',
+        'overall_score': round(report['overall_score'], 4),
+        'detailed_scores': {criterion: round(score, 4) for criterion, score in report['detailed_scores'].items()},
+        'recommendations': report['recommendations'],
+        'elapsed_ms': round(report['elapsed_ms'], 3)
+    }
+
+def master_control_plane_enhanced(goal: str, context: str, goal_type: str = 'general', send_update=None, use_collaboration=True, use_qa=True, degradation=None, classification=None, retrieval_index=None):
     """
-    Orquestrador principal aprimorado com colaboração multi-agente e QA
+    Orquestrador principal aprimorado com colaboração multi-agente e QA.
+    Sob carga, aplica a política de sobrecarga (menos colaboradores, outlines
+    truncados e, no limite, o modo tradicional). Reutiliza a classificação já
+    calculada pela requisição quando informada. Com retrieval_index, cada
+    agente recebe só os trechos do contexto relevantes para ele. O QA não
+    atrasa o retorno: 'quality_report' traz o Future da avaliação.
     """
     if send_update:
         send_update("[MCP-ENHANCED] Iniciando sistema multi-agente avançado", 'log')
     
     # Detectar tipo de objetivo principal e tipos relacionados
-    primary_goal_type = enhanced_detect_goal_type(goal, context)
-    detected_types = detect_multiple_goal_types(goal, context)
-    collaborative_agents = get_collaborative_agents(primary_goal_type, detected_types)
+    if classification is None:
+        classification = classify_goal(goal, context)
+    primary_goal_type = classification.primary_type
+    detected_types = classification.related_types
+    collaborative_agents = list(classification.collaborators)
     
     if send_update:
         send_update(f"[MCP-ENHANCED] Objetivo principal: {primary_goal_type}", 'log')
@@ -1440,6 +2139,26 @@ def master_control_plane_enhanced(goal: str, context: str, goal_type: str = 'gen
     
     goal_type = primary_goal_type
     final_content = ""
+    outline = ""
+    
+    # Política de sobrecarga
+    if degradation is None:
+        degradation = evaluate_degradation()
+    overload_policy.record(degradation)
+    if send_update:
+        send_update(degradation.to_dict(), 'degradation')
+        if degradation.level > 0:
+            send_update(f"[MCP-ENHANCED] Carga elevada, modo degradado: {degradation.name} (nível {degradation.level})", 'log')
+    
+    if degradation.use_traditional:
+        return master_control_plane_traditional(goal, context, goal_type, send_update, retrieval_index=retrieval_index)
+    
+    if degradation.max_collaborators is not None and len(collaborative_agents) > degradation.max_collaborators:
+        # Prioriza os tipos detectados diretamente sobre os sugeridos pela matriz de colaboração
+        collaborative_agents.sort(key=lambda agent: detected_types.index(agent) if agent in detected_types else len(detected_types))
+        collaborative_agents = collaborative_agents[:degradation.max_collaborators]
+        if send_update:
+            send_update(f"[MCP-ENHANCED] Agentes colaborativos reduzidos para: {collaborative_agents}", 'log')
     
     # Expandir condições para ativação do modo colaborativo
     collaborative_goal_types = [
@@ -1450,16 +2169,20 @@ def master_control_plane_enhanced(goal: str, context: str, goal_type: str = 'gen
     
     if use_collaboration and (goal_type in collaborative_goal_types or collaborative_agents):
         # Usar orquestrador colaborativo
-        orchestrator = MangabaAgentOrchestrator(send_update)
+        orchestrator = MangabaAgentOrchestrator(send_update, retrieval_index=retrieval_index)
         
         try:
             # Análise colaborativa com agentes específicos
             analysis_results = orchestrator.run_parallel_analysis_enhanced(
                 goal, context, goal_type, collaborative_agents
             )
+            if analysis_results['primary']:
+                outline = analysis_results['primary']['outline']
             
             # Síntese colaborativa
-            final_content = orchestrator.synthesize_collaborative_content(goal, context, analysis_results)
+            final_content = orchestrator.synthesize_collaborative_content(
+                goal, context, analysis_results, outline_char_limit=degradation.outline_char_limit
+            )
             
             if send_update:
                 send_update("[MCP-ENHANCED] Análise colaborativa concluída", 'log')
@@ -1468,48 +2191,26 @@ def master_control_plane_enhanced(goal: str, context: str, goal_type: str = 'gen
             if send_update:
                 send_update(f"[MCP-ENHANCED] Erro na colaboração, usando modo tradicional: {e}", 'log')
             # Fallback para modo tradicional
-            return master_control_plane_traditional(goal, context, goal_type, send_update)
+            return master_control_plane_traditional(goal, context, goal_type, send_update, retrieval_index=retrieval_index)
     
     else:
         # Usar modo tradicional para tipos não colaborativos
-        return master_control_plane_traditional(goal, context, goal_type, send_update)
+        return master_control_plane_traditional(goal, context, goal_type, send_update, retrieval_index=retrieval_index)
     
-    # Sistema de QA
+    # O outline acompanha o resultado para a regeneração posterior de seções
+    result = {"result": final_content, "outline": outline, "goal_type": goal_type}
     if use_qa and final_content:
-        try:
-            qa_system = QualityAssurance(send_update)
-            quality_report = qa_system.evaluate_content_quality(final_content, goal, goal_type)
-            
-            if send_update:
-                send_update(f"[QA] Avaliação concluída - Score: {quality_report['overall_score']:.2f}", 'log')
-                
-                if quality_report['recommendations']:
-                    send_update(f"[QA] Recomendações: {'; '.join(quality_report['recommendations'])}", 'log')
-            
-            # Adicionar relatório de qualidade ao final do conteúdo
-            qa_summary = f"\n\n--- RELATÓRIO DE QUALIDADE ---\nScore Geral: {quality_report['overall_score']:.2f}/1.0\n"
-            qa_summary += f"Completude: {quality_report['detailed_scores']['completeness']:.2f}\n"
-            qa_summary += f"Precisão: {quality_report['detailed_scores']['accuracy']:.2f}\n"
-            qa_summary += f"Relevância: {quality_report['detailed_scores']['relevance']:.2f}\n"
-            qa_summary += f"Acionabilidade: {quality_report['detailed_scores']['actionability']:.2f}\n"
-            
-            if quality_report['recommendations']:
-                qa_summary += f"\nRecomendações de Melhoria:\n"
-                for i, rec in enumerate(quality_report['recommendations'], 1):
-                    qa_summary += f"{i}. {rec}\n"
-            
-            final_content += qa_summary
-        
-        except Exception as e:
-            if send_update:
-                send_update(f"[QA] Erro na avaliação de qualidade: {e}", 'log')
+        # QA em paralelo: o resultado é devolvido (e enviado) sem esperar pela avaliação
+        result['quality_report'] = start_quality_assessment(final_content, goal, goal_type)
+        if send_update:
+            send_update("[QA] Avaliação de qualidade iniciada em paralelo", 'log')
     
     if send_update:
         send_update("[MCP-ENHANCED] Processo completo finalizado", 'log')
     
-    return {"result": final_content}
+    return result
 
-def master_control_plane_traditional(goal: str, context: str, goal_type: str = 'general', send_update=None):
+def master_control_plane_traditional(goal: str, context: str, goal_type: str = 'general', send_update=None, retrieval_index=None):
     """
     Orquestrador tradicional (modo de compatibilidade)
     """
@@ -1518,23 +2219,127 @@ def master_control_plane_traditional(goal: str, context: str, goal_type: str = '
     
     try:
         researcher_prompt, writer_prompt = generate_specialized_prompts(goal_type, goal, context)
+        # Com índice de trechos, cada agente tem o seu contexto e não há prefixo comum
+        shared_prefix = build_shared_prefix(context) if retrieval_index is None else None
         
         # Agente Pesquisador
-        outline = agent_researcher(goal, context, researcher_prompt, goal_type, send_update)
+        researcher_context = retrieve_agent_context(retrieval_index, context, goal, goal_type, 'Pesquisador', send_update=send_update)
+        outline, _ = research_outline(goal, researcher_context, researcher_prompt, goal_type, send_update, shared_prefix=shared_prefix)
         if send_update:
             send_update(outline, 'partial_result')
         
         # Agente Escritor
-        final_content = agent_writer(outline, context, writer_prompt, goal, goal_type, send_update)
+        writer_context = retrieve_agent_context(retrieval_index, context, goal, goal_type, 'Escritor', outline=outline, send_update=send_update)
+        final_content = agent_writer(outline, writer_context, writer_prompt, goal, goal_type, send_update, shared_prefix=shared_prefix)
         
-        return {"result": final_content}
+        return {"result": final_content, "outline": outline, "goal_type": goal_type}
     
     except Exception as e:
         if send_update:
             send_update(f"[MCP-TRADITIONAL] Erro: {e}", 'log')
         
         fallback_content = generate_fallback_content(goal, context, "Estrutura indisponível", goal_type, send_update)
-        return {"result": fallback_content}
+        return {"result": fallback_content, "outline": "", "goal_type": goal_type}
+
+# --- Regeneração de seções de relatórios guardados ---
+# Uma chamada por seção: outline, contexto (ou os trechos relevantes) e as seções vizinhas
+SECTION_REGENERATION_TEMPLATE = normalize_template("""
+    Você é o escritor responsável por revisar UMA seção de um relatório já pronto sobre o objetivo: "{goal}".
+    Reescreva somente a seção indicada, mantendo o título, o nível do título e a continuidade com as seções vizinhas.
+    Não repita o conteúdo das outras seções e não acrescente introdução ou conclusão do documento.
+
+    Estrutura do relatório (outline do pesquisador):
+    {outline}
+
+    Contexto de referência:
+    '''{context}'''
+
+    Final do texto anterior à seção:
+    {previous_section}
+
+    SEÇÃO A REESCREVER:
+    {section}
+
+    Início do texto seguinte à seção:
+    {next_section}
+
+    {instructions}
+
+    {abnt_rules}
+
+    Responda apenas com o markdown da seção reescrita, começando pelo título.
+    """)
+
+def save_report(content: str, goal: str, goal_type: str, outline: str, context: str, context_source=None,
+                free_text: bool = False, parent_id: str = None):
+    """
+    Guarda o relatório para regeneração por seção e retorna o id (None com
+    AGENT_REPORT_STORE=off). context_source = (context_ref, artefato) aponta
+    o contexto no ContextStore; sem ele, o texto do contexto vai no registro.
+    """
+    if report_store is None:
+        return None
+    record = {'content': content, 'goal': goal, 'goal_type': goal_type, 'outline': outline or '',
+              'free_text': free_text, 'parent_id': parent_id}
+    if context_source is not None:
+        record['context_ref'], record['context_artifact'] = context_source
+    else:
+        record['context'] = context
+    return report_store.save(record)
+
+def load_report_context(record: dict):
+    """Contexto usado pelo relatório, ou None se o artefato já saiu do ContextStore"""
+    if 'context' in record:
+        return record['context']
+    if context_store is None:
+        return None
+    return context_store.get_artifact(record['context_ref'], record['context_artifact'])
+
+def regenerate_report_sections(record: dict, context: str, selectors: list, instructions: str = "", send_update=None) -> dict:
+    """
+    Regenera apenas as seções selecionadas (por id ou título) e as encaixa no
+    relatório; o restante do texto não muda. Retorna o novo conteúdo e o
+    resumo de cada seção. Levanta KeyError (seção inexistente) e
+    ConnectionError (modelo indisponível): não há conteúdo de fallback aqui,
+    já que ele pioraria um relatório pronto.
+    """
+    tree = parse_sections(record['content'])
+    sections = tree.resolve(selectors)
+    goal, goal_type = record['goal'], record['goal_type']
+    # Mesma forma de contexto da execução original: trechos por seção ou prefixo compartilhado
+    retrieval_index = build_retrieval_index(context) if record.get('free_text') else None
+    shared_prefix = build_shared_prefix(context) if retrieval_index is None and len(sections) > 1 else None
+    instructions = f"Instruções adicionais para a revisão: {instructions}" if instructions else ""
+    replacements = {}
+    regenerated = []
+    for section in sections:
+        original = tree.content(section)
+        previous_text, next_text = tree.neighbours(section, AGENT_SECTION_NEIGHBOUR_CHARS)
+        section_context = retrieve_agent_context(retrieval_index, context, f"{section.title} {goal}", goal_type,
+                                                 'Revisor', outline=original, send_update=send_update)
+        prompt, prefix = assemble_agent_prompt(
+            SECTION_REGENERATION_TEMPLATE, section_context, shared_prefix,
+            goal=goal,
+            outline=record.get('outline') or "Estrutura não disponível",
+            previous_section=previous_text or "(início do documento)",
+            section=original,
+            next_section=next_text or "(fim do documento)",
+            instructions=instructions
+        )
+        started = time.monotonic()
+        text = run_generative_model(prompt, send_update=send_update, shared_prefix=prefix,
+                                    profile=generation_profiles.get(ROLE_REGENERATE, goal_type))
+        replacements[section.id] = normalize_regenerated(text, section, heading_line(tree.text, section))
+        regenerated.append({
+            'id': section.id,
+            'title': section.title,
+            'previous_chars': len(original),
+            'chars': len(replacements[section.id]),
+            'elapsed_ms': round((time.monotonic() - started) * 1000, 1)
+        })
+        if send_update:
+            send_update(f"[REGENERATE] Seção {section.id} ({section.title}) regenerada", 'log')
+    return {'content': tree.splice(replacements), 'sections': regenerated}
 
 # --- Orquestrador (MCP) Original (mantido para compatibilidade) ---
 def master_control_plane(goal: str, context: str, researcher_prompt: str, writer_prompt: str, goal_type: str = 'general', send_update=None):
@@ -1542,10 +2347,11 @@ def master_control_plane(goal: str, context: str, researcher_prompt: str, writer
     log_1 = "[MCP] Objetivo recebido. Acionando Agente Pesquisador..."
     if send_update:
         send_update(log_1, 'log')
+    shared_prefix = build_shared_prefix(context)
     
     # O Agente Pesquisador gera a estrutura (outline)
     try:
-        outline = agent_researcher(goal, context, researcher_prompt, goal_type, send_update=send_update)
+        outline = agent_researcher(goal, context, researcher_prompt, goal_type, send_update=send_update, shared_prefix=shared_prefix)
         log_2 = "[Agente Pesquisador] Estrutura criada."
         if send_update:
             send_update(log_2, 'log')
@@ -1564,7 +2370,7 @@ def master_control_plane(goal: str, context: str, researcher_prompt: str, writer
 
     # O Agente Escritor gera o conteúdo final baseado na estrutura e no contexto
     try:
-        final_content = agent_writer(outline, context, writer_prompt, goal, goal_type, send_update=send_update)
+        final_content = agent_writer(outline, context, writer_prompt, goal, goal_type, send_update=send_update, shared_prefix=shared_prefix)
         log_3 = "[Agente Escritor] Conteúdo final gerado."
         if send_update:
             send_update(log_3, 'log')
@@ -1615,6 +2421,166 @@ def health_check():
     """Verificação de saúde da aplicação"""
     return jsonify({"status": "ok", "message": "Servidor funcionando"})
 
+@app.route('/metrics')
+def metrics_prometheus():
+    """Métricas da aplicação no formato texto do Prometheus"""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/metrics')
+def metrics_json():
+    """Métricas da aplicação em JSON"""
+    return jsonify({
+        "admission": admission_controller.snapshot(),
+        "scheduler": gemini_scheduler.snapshot(),
+        "context_cache": context_cache.snapshot() if context_cache else {'mode': AGENT_CONTEXT_CACHE},
+        "context_store": context_store.snapshot() if context_store else None,
+        "context_retrieval": retrieval_indexes.snapshot(),
+        "report_store": report_store.snapshot() if report_store else None,
+        "generation_profiles": {
+            "profiles": generation_profiles.entries(),
+            "outputs": output_lengths.snapshot(),
+            "flagged": output_lengths.flagged()
+        },
+        "metrics": metrics.snapshot()
+    })
+
+@app.route('/api/context/<context_ref>', methods=['GET', 'HEAD'])
+def context_ref_status(context_ref):
+    """
+    Verifica se um arquivo já está armazenado (HEAD: 200 ou 404, sem corpo;
+    GET: metadados e artefatos gerados), para enviar context_ref sem novo upload.
+    Só encontra arquivos enviados pelo próprio tenant (os demais dão 404).
+    """
+    info = context_store.info(context_ref.lower(), owner=resolve_tenant(request)) \
+        if context_store is not None and is_context_ref(context_ref.lower()) else None
+    if info is None:
+        return jsonify({'error': 'Contexto não encontrado', 'context_ref': context_ref}), 404
+    response = jsonify({'context_ref': context_ref.lower(), **info})
+    response.headers['X-Context-Size'] = str(info.get('size_bytes', 0))
+    return response
+
+@app.route('/api/reports/<report_id>', methods=['GET'])
+def report_status(report_id):
+    """Relatório guardado: conteúdo e árvore de seções (ids usados na regeneração)"""
+    record = report_store.get(report_id.lower()) if report_store is not None and is_report_id(report_id.lower()) else None
+    if record is None:
+        return jsonify({'error': 'Relatório não encontrado', 'report_id': report_id}), 404
+    return jsonify({
+        'report_id': record['report_id'],
+        'parent_id': record.get('parent_id'),
+        'goal': record['goal'],
+        'goal_type': record['goal_type'],
+        'created_at': record['created_at'],
+        'context_ref': record.get('context_ref'),
+        'sections': parse_sections(record['content']).outline(),
+        'content': record['content']
+    })
+
+@app.route('/api/reports/<report_id>/regenerate', methods=['POST'])
+def regenerate_report(report_id):
+    """
+    Regenera apenas as seções indicadas de um relatório guardado:
+    {"sections": ["2.1", "Recomendações"], "instructions": "..."}. Cada seção
+    custa uma chamada ao modelo; o resultado é gravado como nova versão
+    (parent_id = relatório de origem) e devolvido com o relatório de qualidade.
+    """
+    payload = request.get_json(silent=True)
+    selectors = payload.get('sections') if isinstance(payload, dict) else None
+    if isinstance(selectors, (str, int)):
+        selectors = [selectors]
+    if not isinstance(selectors, list) or not selectors or not all(isinstance(item, (str, int)) for item in selectors):
+        return jsonify({'error': 'Informe "sections": lista de ids ou títulos de seções.'}), 400
+    if len(selectors) > AGENT_REGENERATE_MAX_SECTIONS:
+        return jsonify({'error': f'Máximo de {AGENT_REGENERATE_MAX_SECTIONS} seções por pedido.'}), 413
+    instructions = str(payload.get('instructions') or '').strip()[:SECTION_INSTRUCTIONS_MAX_CHARS]
+
+    report_id = report_id.lower()
+    record = report_store.get(report_id) if report_store is not None and is_report_id(report_id) else None
+    if record is None:
+        return jsonify({'error': 'Relatório não encontrado', 'report_id': report_id}), 404
+    context = load_report_context(record)
+    if context is None:
+        return jsonify({'error': 'O contexto deste relatório não está mais armazenado. Execute o pipeline novamente.',
+                        'context_ref': record.get('context_ref')}), 410
+    if not GEMINI_API_KEY:
+        return jsonify({'error': 'A API do Gemini não está configurada. Verifique sua chave de API no arquivo .env.'}), 503
+
+    # Mesmo controle de admissão e escalonamento por tenant das execuções completas
+    ticket = admission_controller.try_enqueue()
+    if ticket is None:
+        retry_after = admission_controller.retry_after()
+        response = jsonify({'error': 'Servidor sobrecarregado. Tente novamente em instantes.', 'retry_after': retry_after})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+    tenant_token = current_call_tenant.set((resolve_tenant(request), resolve_priority(request)))
+    started = time.monotonic()
+    try:
+        if not admission_controller.wait(ticket, timeout=AGENT_QUEUE_TIMEOUT):
+            return jsonify({'error': 'Servidor sobrecarregado. Tente novamente em instantes.'}), 503
+        regeneration = regenerate_report_sections(record, context, selectors, instructions)
+    except KeyError as missing:
+        return jsonify({
+            'error': 'Seção não encontrada no relatório.',
+            'missing': missing.args[0],
+            'sections': [{'id': section['id'], 'title': section['title']}
+                         for section in parse_sections(record['content']).outline()]
+        }), 400
+    except ConnectionError as e:
+        return jsonify({'error': str(e)}), 502
+    finally:
+        current_call_tenant.reset(tenant_token)
+        admission_controller.release(ticket)
+    elapsed = time.monotonic() - started
+    metrics.inc('report_sections_regenerated_total', len(regeneration['sections']))
+    metrics.observe('report_regeneration_seconds', elapsed)
+
+    content = regeneration['content']
+    new_id = save_report(content, record['goal'], record['goal_type'], record.get('outline', ''), record.get('context'),
+                         context_source=(record['context_ref'], record['context_artifact']) if 'context_ref' in record else None,
+                         free_text=record.get('free_text', False), parent_id=report_id)
+    return jsonify({
+        'report_id': new_id,
+        'parent_id': report_id,
+        'regenerated': regeneration['sections'],
+        'sections': parse_sections(content).outline(),
+        'result': content,
+        'quality_report': collect_quality_report(start_quality_assessment(content, record['goal'], record['goal_type'])),
+        'elapsed_ms': round(elapsed * 1000, 1)
+    })
+
+@app.route('/api/classify', methods=['POST'])
+def classify_api():
+    """
+    Classificação em lote: recebe {"items": [{"goal": ..., "context": ...}, ...]}
+    (ou a lista diretamente) e devolve tipo principal, tipos relacionados e
+    colaboradores de cada item, na mesma ordem.
+    """
+    payload = request.get_json(silent=True)
+    items = payload.get('items') if isinstance(payload, dict) else payload
+    if not isinstance(items, list):
+        return jsonify({'error': 'Envie uma lista de itens com "goal" e "context".'}), 400
+    if len(items) > AGENT_CLASSIFY_MAX_BATCH:
+        return jsonify({'error': f'Lote muito grande: máximo de {AGENT_CLASSIFY_MAX_BATCH} itens.'}), 413
+
+    if not all(isinstance(item, (dict, str)) for item in items):
+        return jsonify({'error': 'Cada item deve ser um objeto com "goal" e "context" ou uma string.'}), 400
+
+    mode = payload.get('mode') if isinstance(payload, dict) else None
+    if mode not in (None, 'full', 'sampled'):
+        return jsonify({'error': "Modo inválido: use 'full' ou 'sampled'."}), 400
+
+    start_time = time.time()
+    results = classify_goals(items, mode=mode)
+    elapsed = time.time() - start_time
+    metrics.inc('goal_classifications_total', len(results))
+    metrics.observe('goal_classify_batch_seconds', elapsed)
+    return jsonify({
+        'results': results,
+        'count': len(results),
+        'elapsed_ms': round(elapsed * 1000, 2)
+    })
+
 @app.route('/data/<filename>')
 def get_data_file(filename):
     try:
@@ -1622,49 +2588,350 @@ def get_data_file(filename):
     except FileNotFoundError:
         return jsonify({"error": "Arquivo não encontrado"}), 404
 
+def stream_pipeline_events(target, events, tenant=None):
+    """
+    Executa target() em uma thread e repassa como eventos SSE tudo o que for
+    publicado em events até o término. Retorna o resultado de target() ou
+    propaga a exceção levantada por ele. tenant é o par (tenant, prioridade)
+    usado pelo escalonador nas chamadas ao modelo feitas por target().
+
+    Se o gerador for fechado antes do fim (cliente desconectou), as próximas
+    chamadas ao modelo de target() são canceladas e o fechamento aguarda a
+    thread terminar, para que a vaga de admissão só seja liberada depois.
+    """
+    outcome = {}
+    cancel = threading.Event()
+
+    def runner():
+        current_run_cancel.set(cancel)
+        if tenant:
+            current_call_tenant.set(tenant)
+        try:
+            outcome['result'] = target()
+        except BaseException as e:
+            outcome['error'] = e
+        finally:
+            events.put(None)
+
+    thread = threading.Thread(target=runner, daemon=True)
+    thread.start()
+    finished = False
+    try:
+        while True:
+            item = events.get()
+            if item is None:
+                break
+            event_type, data = item
+            yield format_sse_event(data, event_type)
+        finished = True
+    finally:
+        if not finished:
+            cancel.set()
+            thread.join()
+
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome.get('result')
+
+def stream_admission_wait(ticket):
+    """
+    Aguarda a admissão do ticket emitindo eventos SSE com posição na fila e
+    tempo estimado de espera. Retorna True quando a execução foi admitida.
+    """
+    started = time.monotonic()
+    queued = False
+    timeout = 0  # Primeira verificação imediata para informar a posição sem atraso
+    while not admission_controller.wait(ticket, timeout=timeout):
+        waited = time.monotonic() - started
+        if ticket.state == AdmissionTicket.RELEASED or waited >= AGENT_QUEUE_TIMEOUT:
+            yield format_sse_event(f"[ERROR] Tempo máximo de espera na fila excedido ({AGENT_QUEUE_TIMEOUT:.0f}s)", 'log')
+            yield format_sse_event({'error': 'Servidor sobrecarregado. Tente novamente em instantes.'}, 'error')
+            return False
+        position = admission_controller.position(ticket)
+        yield format_sse_event({
+            'position': position,
+            'queue_depth': admission_controller.queue_depth,
+            'estimated_wait_seconds': round(admission_controller.estimated_wait(position), 1),
+            'waited_seconds': round(waited, 1)
+        }, 'queue')
+        queued = True
+        timeout = AGENT_QUEUE_POLL_INTERVAL
+    if queued:
+        yield format_sse_event({'position': 0, 'waited_seconds': round(time.monotonic() - started, 1)}, 'queue')
+    return True
+
+def upload_context_events(upload, filename: str, context_encoding: str):
+    """
+    Gera os eventos de log do processamento de um arquivo enviado e retorna
+    (via yield from) o contexto para os agentes
+    """
+    warnings = []
+    tabular = tabular_format(filename)
+    if tabular:
+        # CSV/TSV/JSONL: lido em streaming para colunas tipadas, sem o texto inteiro em memória
+        small = upload.size_bytes <= AGENT_UPLOAD_REFORMAT_MAX_KB * 1024
+        table = read_tabular(upload, tabular, sample_rows=None if small and AGENT_DATA_PROFILE != 'replace'
+                             else AGENT_DATA_PROFILE_SAMPLE_ROWS)
+        yield format_sse_event(f"[INFO] Arquivo tabular ({tabular}): {table.rows} linhas, {len(table.columns)} colunas", 'log')
+        if table.malformed_count:
+            lines = ', '.join(str(line) for line, _ in table.malformed[:10])
+            yield format_sse_event(f"[WARNING] {table.malformed_count} linhas malformadas ignoradas (linhas {lines})", 'log')
+        context = format_table_context(table, warnings=warnings)
+        for warning in warnings:
+            yield format_sse_event(warning, 'log')
+        yield format_sse_event(f"[INFO] Contexto tabular: ~{estimate_tokens(context)} tokens", 'log')
+    else:
+        is_json = filename.lower().endswith('.json')
+        if is_json and upload.size_bytes > AGENT_UPLOAD_REFORMAT_MAX_KB * 1024:
+            # JSON grande: lido em eventos a partir do spool, sem montar o documento inteiro
+            try:
+                summary = summarize_json_stream(upload.iter_text(), sample_rows=AGENT_DATA_PROFILE_SAMPLE_ROWS)
+            except JsonStreamError as json_err:
+                yield format_sse_event(f"[ERROR] JSON inválido no arquivo: {json_err}", 'log')
+                return f"Arquivo JSON inválido ({json_err}). Início do conteúdo bruto:\n{upload.head(JSON_INVALID_HEAD_CHARS)}"
+            yield format_sse_event(f"[SUCCESS] JSON válido lido em streaming: {summary.record_count} registros em "
+                                   f"{len(summary.tables)} listas", 'log')
+            if summary.top_level_keys:
+                yield format_sse_event(f"[INFO] Chaves de primeiro nível: {', '.join(summary.top_level_keys[:20])}", 'log')
+            context = format_json_summary_context(summary, context_encoding, warnings=warnings)
+            for warning in warnings:
+                yield format_sse_event(warning, 'log')
+            yield format_sse_event(f"[INFO] Contexto JSON codificado ({context_encoding}): ~{estimate_tokens(context)} tokens", 'log')
+            return context
+
+        file_content = upload.read_text()
+
+        # Verificar se é um arquivo JSON
+        if is_json:
+            try:
+                # Validar e formatar o JSON
+                json_data = json.loads(file_content)
+                context = format_json_context(json_data, context_encoding, warnings=warnings)
+                yield format_sse_event("[SUCCESS] JSON válido processado do arquivo", 'log')
+                for warning in warnings:
+                    yield format_sse_event(warning, 'log')
+                yield format_sse_event(f"[INFO] Contexto JSON codificado ({context_encoding}): ~{estimate_tokens(context)} tokens", 'log')
+            except json.JSONDecodeError as json_err:
+                yield format_sse_event(f"[ERROR] JSON inválido no arquivo: {json_err}", 'log')
+                context = f"Arquivo JSON inválido. Conteúdo bruto:\n{file_content}"
+        else:
+            context = file_content
+            yield format_sse_event("[INFO] Arquivo de texto processado", 'log')
+        del file_content
+    return context
+
+def context_file_format(filename: str) -> str:
+    """Formato do arquivo de contexto: csv/tsv/jsonl, json ou text"""
+    return tabular_format(filename) or ('json' if filename.lower().endswith('.json') else 'text')
+
+def context_artifact_key(filename: str, context_encoding: str) -> str:
+    """Chave do contexto gerado a partir de um arquivo: inclui todas as opções que alteram o resultado"""
+    file_format = context_file_format(filename)
+    return (f"context-v{CONTEXT_ARTIFACT_VERSION}-{file_format}-{context_encoding}-{AGENT_DATA_PROFILE}"
+            f"-k{AGENT_DATA_PROFILE_TOP_K}-s{AGENT_DATA_PROFILE_SAMPLE_ROWS}-r{AGENT_UPLOAD_REFORMAT_MAX_KB}")
+
+def record_profile_error(error: Exception, source: str, warnings: list = None):
+    """
+    Falha no perfil estatístico (os dados seguem sem o perfil): conta em
+    data_profile_errors_total e acrescenta o aviso em warnings, emitido pelo
+    chamador como evento [WARNING]
+    """
+    metrics.inc('data_profile_errors_total', labels={'source': source})
+    if warnings is not None:
+        warnings.append(f"[WARNING] Perfil estatístico descartado ({source}): {type(error).__name__}: {error}")
+
+def format_json_context(json_data, encoding: str = None, profile_mode: str = None, warnings: list = None) -> str:
+    """
+    Contexto a partir do JSON enviado, na codificação configurada (compacta por
+    padrão), precedido do perfil estatístico das listas de registros
+    """
+    profile_mode = profile_mode or AGENT_DATA_PROFILE
+    sections = []
+    data_label = "Dados JSON fornecidos:"
+    if profile_mode != 'off':
+        # Falha no perfil (valor inesperado em alguma célula) descarta só o perfil, não os dados
+        try:
+            profiles = profile_data(json_data, top_k=AGENT_DATA_PROFILE_TOP_K)
+            rendered = "\n\n".join(render_profile(profile) for profile in profiles)
+        except Exception as e:
+            record_profile_error(e, 'json', warnings)
+            profiles = []
+        if profiles:
+            sections.append("Perfil estatístico dos dados (calculado localmente, valores exatos):\n" + rendered)
+            if profile_mode == 'replace' and any(profile.rows > AGENT_DATA_PROFILE_SAMPLE_ROWS for profile in profiles):
+                json_data = sample_records(json_data, AGENT_DATA_PROFILE_SAMPLE_ROWS)
+                data_label = f"Amostra dos dados JSON fornecidos (até {AGENT_DATA_PROFILE_SAMPLE_ROWS} registros por lista):"
+    sections.append(f"{data_label}\n{encode_context(json_data, encoding or AGENT_CONTEXT_ENCODING)}")
+    return "\n\n".join(sections)
+
+def format_json_summary_context(summary, encoding: str = None, profile_mode: str = None, warnings: list = None) -> str:
+    """
+    Contexto de um JSON grande lido em streaming: perfil das listas de
+    registros (sobre todos os registros), contagens e o documento com cada
+    lista reduzida à amostra
+    """
+    profile_mode = profile_mode or AGENT_DATA_PROFILE
+    sections = []
+    tables = [table for table in summary.tables.values() if table.rows]
+    if profile_mode != 'off' and tables:
+        try:
+            sections.append("Perfil estatístico dos dados (calculado localmente, valores exatos):\n"
+                            + "\n\n".join(render_profile(table.profile(top_k=AGENT_DATA_PROFILE_TOP_K)) for table in tables))
+        except Exception as e:
+            record_profile_error(e, 'json_stream', warnings)  # Segue sem o perfil
+    counts = [f"{path or 'raiz'}: {count}" for path, count in summary.list_counts.items()]
+    if counts:
+        sections.append("Itens por lista no arquivo completo: " + ", ".join(counts))
+    sections.append(f"Amostra dos dados JSON fornecidos (até {AGENT_DATA_PROFILE_SAMPLE_ROWS} registros por lista):\n"
+                    f"{encode_context(summary.skeleton, encoding or AGENT_CONTEXT_ENCODING)}")
+    return "\n\n".join(sections)
+
+def format_table_context(table, profile_mode: str = None, warnings: list = None) -> str:
+    """Contexto de um arquivo CSV/TSV/JSONL: perfil estatístico, linhas (ou amostra) e linhas malformadas"""
+    profile_mode = profile_mode or AGENT_DATA_PROFILE
+    sections = []
+    if profile_mode != 'off' and table.rows:
+        try:
+            sections.append("Perfil estatístico dos dados (calculado localmente, valores exatos):\n"
+                            + render_profile(table.profile(top_k=AGENT_DATA_PROFILE_TOP_K)))
+        except Exception as e:
+            record_profile_error(e, 'tabular', warnings)  # Segue sem o perfil
+    if len(table.sample) == table.rows:
+        label = "Dados tabulares fornecidos:"
+    else:
+        label = f"Amostra dos dados tabulares fornecidos ({len(table.sample)} de {table.rows} registros):"
+    sections.append(f"{label}\n{table.encode_sample()}")
+    if table.malformed_count:
+        lines = ', '.join(f"{line} ({reason})" for line, reason in table.malformed[:10])
+        sections.append(f"Linhas malformadas ignoradas: {table.malformed_count} — {lines}")
+    return "\n\n".join(sections)
+
 @app.route('/api/run_agent_system', methods=['POST'])
 def run_agent_system():
+    # Validações baratas antes da fila: requisições inválidas não ocupam posição nem vaga
+    try:
+        form = request.form
+    except UploadTooLarge as too_large:
+        # Mesmo formato de antes (eventos SSE), sem passar pela fila
+        return Response([format_sse_event(f"[ERROR] {too_large}", 'log'),
+                         format_sse_event({'error': f'{too_large}. Envie um arquivo menor.'}, 'error'),
+                         format_sse_event('END_STREAM', 'end')], mimetype='text/event-stream')
+    if not form.get('goal'):
+        return jsonify({'error': 'O objetivo (goal) é obrigatório.'}), 400
+    if not GEMINI_API_KEY:
+        return jsonify({'error': 'A API do Gemini não está configurada. Verifique sua chave de API no arquivo .env.'}), 503
+    # O formulário já foi lido aqui; os arquivos enviados seguem abertos para o stream
+    agent_request = request._get_current_object()
+    agent_request.keep_files_open()
+
+    # Controle de admissão: rejeita rapidamente quando a fila de espera está cheia
+    ticket = admission_controller.try_enqueue()
+    if ticket is None:
+        retry_after = admission_controller.retry_after()
+        response = jsonify({
+            'error': 'Servidor sobrecarregado. Tente novamente em instantes.',
+            'retry_after': retry_after
+        })
+        response.status_code = 503
+        response.headers['Retry-After'] = str(retry_after)
+        agent_request.close_files()
+        return response
+
     def generate():
-        if 'goal' not in request.form or not request.form['goal']:
-            yield format_sse_event({'error': 'O objetivo (goal) é obrigatório.'}, 'error')
-            return
+        try:
+            admitted = yield from stream_admission_wait(ticket)
+            if not admitted:
+                yield format_sse_event('END_STREAM', 'end')
+                return
+            yield from run_pipeline()
+        finally:
+            admission_controller.release(ticket)
+            agent_request.close_files()
 
+    def run_pipeline():
+        yield format_sse_event("[INFO] Requisição recebida, processando dados enviados...", 'log')
         try:
             goal = request.form['goal']
             yield format_sse_event(f"[INFO] Objetivo recebido: {goal[:100]}...", 'log')
 
             context = "Nenhum contexto fornecido." # Valor padrão
+            # Texto livre (arquivo de texto ou textarea): candidato à recuperação de trechos
+            free_text = False
+            # (context_ref, artefato) do contexto no ContextStore, referenciado pelo relatório guardado
+            context_source = None
+            # Codificação do JSON no contexto (o cliente pode escolher outra via 'context_encoding')
+            context_encoding = request.form.get('context_encoding') or AGENT_CONTEXT_ENCODING
+            if context_encoding not in CONTEXT_ENCODINGS:
+                yield format_sse_event(f"[WARNING] Codificação '{context_encoding}' desconhecida, usando {AGENT_CONTEXT_ENCODING}", 'log')
+                context_encoding = AGENT_CONTEXT_ENCODING
+            # Entrega do resultado final: o cliente que entende as partes pede 'chunked'
+            result_delivery = request.form.get('result_delivery') or AGENT_RESULT_DELIVERY
+            if result_delivery not in DELIVERY_MODES:
+                result_delivery = AGENT_RESULT_DELIVERY
 
             # Processar dados de contexto
             try:
-                if 'dataSource' in request.files:
+                upload = None
+                context_ref = None
+                filename = ''
+                if 'dataSource' in request.files and request.files['dataSource'].filename != '':
                     file = request.files['dataSource']
-                    if file.filename != '':
-                        yield format_sse_event(f"[INFO] Processando arquivo: {file.filename}", 'log')
-                        file_content = file.read().decode('utf-8')
-                        yield format_sse_event(f"[DEBUG] Tamanho do arquivo: {len(file_content)} caracteres", 'log')
-                        
-                        # Verificar se é um arquivo JSON
-                        if file.filename.endswith('.json'):
-                            try:
-                                # Validar e formatar o JSON
-                                json_data = json.loads(file_content)
-                                context = f"Dados JSON fornecidos:\n{json.dumps(json_data, indent=2, ensure_ascii=False)}"
-                                yield format_sse_event("[SUCCESS] JSON válido processado do arquivo", 'log')
-                            except json.JSONDecodeError as json_err:
-                                yield format_sse_event(f"[ERROR] JSON inválido no arquivo: {json_err}", 'log')
-                                context = f"Arquivo JSON inválido. Conteúdo bruto:\n{file_content}"
-                        else:
-                            context = file_content
-                            yield format_sse_event("[INFO] Arquivo de texto processado", 'log')
+                    filename = file.filename
+                    yield format_sse_event(f"[INFO] Processando arquivo: {filename}", 'log')
+                    upload = ingest_upload(file, max_bytes=AgentRequest.upload_max_bytes,
+                                           memory_bytes=AgentRequest.upload_memory_bytes)
+                    yield format_sse_event(f"[DEBUG] Tamanho do arquivo: {upload.size_bytes} bytes (codificação: {upload.encoding})", 'log')
+                    if context_store is not None:
+                        context_ref = context_store.put_upload(upload, owner=resolve_tenant(request))
+                        yield format_sse_event({'context_ref': context_ref, 'filename': filename,
+                                                'size_bytes': upload.size_bytes}, 'context_ref')
+                elif request.form.get('context_ref'):
+                    # Arquivo já enviado antes: referenciado pelo SHA-256, sem novo upload
+                    context_ref = request.form['context_ref'].strip().lower()
+                    info = context_store.info(context_ref, owner=resolve_tenant(request)) \
+                        if context_store is not None and is_context_ref(context_ref) else None
+                    if info is None:
+                        yield format_sse_event(f"[ERROR] context_ref não encontrado: {context_ref}", 'log')
+                        yield format_sse_event({'error': 'Contexto não encontrado (context_ref). Envie o arquivo novamente.'}, 'error')
+                        return
+                    filename = info.get('filename', '')
+                    yield format_sse_event(f"[INFO] Usando contexto armazenado: {filename} ({info.get('size_bytes', 0)} bytes)", 'log')
+
+                if upload is not None or context_ref:
+                    artifact = context_artifact_key(filename, context_encoding)
+                    cached_context = context_store.get_artifact(context_ref, artifact) if context_ref else None
+                    if cached_context is not None:
+                        context = cached_context
+                        yield format_sse_event("[INFO] Contexto processado reutilizado (mesmo arquivo e opções)", 'log')
+                    else:
+                        if upload is None:
+                            upload = context_store.load_upload(context_ref, memory_bytes=AgentRequest.upload_memory_bytes,
+                                                               owner=resolve_tenant(request))
+                            if upload is None:
+                                # Removido pela evicção depois da verificação acima
+                                yield format_sse_event(f"[ERROR] context_ref não encontrado: {context_ref}", 'log')
+                                yield format_sse_event({'error': 'Contexto não encontrado (context_ref). Envie o arquivo novamente.'}, 'error')
+                                return
+                        context = yield from upload_context_events(upload, filename, context_encoding)
+                        if context_ref:
+                            context_store.put_artifact(context_ref, artifact, context)
+                    if context_ref:
+                        context_source = (context_ref, artifact)
+                    if upload is not None:
+                        upload.close()
+                    free_text = context_file_format(filename) == 'text'
                 elif 'json_data' in request.form and request.form['json_data']:
                     # Processar JSON direto do formulário (textarea)
                     json_input = request.form['json_data']
                     yield format_sse_event("[INFO] Processando JSON do formulário", 'log')
                     try:
                         json_data = json.loads(json_input)
-                        context = f"Dados JSON fornecidos:\n{json.dumps(json_data, indent=2, ensure_ascii=False)}"
+                        profile_warnings = []
+                        context = format_json_context(json_data, context_encoding, warnings=profile_warnings)
                         yield format_sse_event("[SUCCESS] JSON do formulário válido", 'log')
+                        for warning in profile_warnings:
+                            yield format_sse_event(warning, 'log')
+                        yield format_sse_event(f"[INFO] Contexto JSON codificado ({context_encoding}): ~{estimate_tokens(context)} tokens", 'log')
                     except json.JSONDecodeError as json_err:
                         yield format_sse_event(f"[ERROR] JSON do formulário inválido: {json_err}", 'log')
                         yield format_sse_event({'error': f'JSON inválido: {json_err}'}, 'error')
@@ -1672,29 +2939,37 @@ def run_agent_system():
                 elif 'text_context' in request.form and request.form['text_context']:
                     # Processar texto simples do formulário (textarea)
                     context = request.form['text_context']
+                    free_text = True
                     yield format_sse_event("[INFO] Texto simples do formulário processado", 'log')
 
+            except UploadTooLarge as too_large:
+                yield format_sse_event(f"[ERROR] {too_large}", 'log')
+                yield format_sse_event({'error': f'{too_large}. Envie um arquivo menor.'}, 'error')
+                return
             except Exception as context_err:
                 yield format_sse_event(f"[ERROR] Erro ao processar contexto: {context_err}", 'log')
                 context = "Erro ao processar dados de contexto." # Define um contexto de erro para o LLM
+                free_text = False
+                context_source = None
 
-            if not GEMINI_API_KEY:
-                yield format_sse_event("[ERROR] API Key do Gemini não configurada", 'log')
-                yield format_sse_event({'error': 'A API do Gemini não está configurada. Verifique sua chave de API no arquivo .env.'}, 'error')
-                return
+            # Texto livre longo: índice de trechos (em cache pelo hash do texto) para a recuperação por agente
+            retrieval_index = build_retrieval_index(context) if free_text else None
+            if retrieval_index is not None:
+                yield format_sse_event(f"[INFO] Contexto indexado em {retrieval_index.chunk_count} trechos; "
+                                       f"cada agente recebe os {AGENT_RETRIEVAL_TOP_K} mais relevantes", 'log')
 
             # Sistema de parametrização automática aprimorado com detecção múltipla
             try:
-                # Detectar tipo principal e tipos relacionados
-                goal_type = enhanced_detect_goal_type(goal, context)
-                all_detected_types = detect_multiple_goal_types(goal, context)
+                # Classificação única do objetivo, reaproveitada por todo o pipeline
+                classification = classify_goal(goal, context)
+                goal_type = classification.primary_type
+                all_detected_types = classification.related_types
+                collaborative_agents = classification.collaborators
                 
-                yield format_sse_event(f"[INFO] Tipo principal detectado: {goal_type}", 'log')
+                yield format_sse_event(classification.to_dict(), 'classification')
+                yield format_sse_event(f"[INFO] Tipo principal detectado: {goal_type} (confiança {classification.confidence:.2f})", 'log')
                 yield format_sse_event(f"[INFO] Tipos relacionados detectados: {', '.join(all_detected_types)}", 'log')
                 
-                # Determinar agentes colaborativos
-                collaborative_agents = get_collaborative_agents(goal_type, all_detected_types)
-                
                 # Verificar se deve usar modo colaborativo (expandido para incluir novos tipos)
                 collaboration_types = [
                     'sales_analysis', 'product_management', 'user_management', 'task_management', 
@@ -1715,29 +2990,64 @@ def run_agent_system():
                 all_detected_types = ['general']
                 collaborative_agents = []
                 use_collaboration = False
+                classification = None
+
+            # Fila de eventos: os agentes rodam em uma thread separada e publicam
+            # atualizações que são repassadas ao cliente via SSE
+            events = queue.Queue()
+            call_tenant = (resolve_tenant(request), resolve_priority(request))
 
-            # Função para enviar atualizações via SSE
             def send_update(data, event_type='message'):
-                yield format_sse_event(data, event_type)
-                time.sleep(0.05) # Pequeno delay para garantir que o navegador processe os eventos
+                events.put((event_type, data))
 
             # Executar sistema de agentes aprimorado
             try:
                 yield format_sse_event("[INFO] Iniciando sistema multi-agente Mangaba.AI", 'log')
                 
                 # Usar o novo orquestrador aprimorado
-                result_data = master_control_plane_enhanced(
-                    goal=goal, 
-                    context=context, 
-                    goal_type=goal_type, 
-                    send_update=send_update,
-                    use_collaboration=use_collaboration,
-                    use_qa=True
+                result_data = yield from stream_pipeline_events(
+                    lambda: master_control_plane_enhanced(
+                        goal=goal, 
+                        context=context, 
+                        goal_type=goal_type, 
+                        send_update=send_update,
+                        use_collaboration=use_collaboration,
+                        use_qa=True,
+                        classification=classification,
+                        retrieval_index=retrieval_index
+                    ),
+                    events,
+                    tenant=call_tenant
                 )
                 
-                yield format_sse_event(result_data['result'], 'final_result')
+                yield from final_result_events(result_data['result'], result_delivery)
                 yield format_sse_event("[SUCCESS] Sistema multi-agente concluído com sucesso", 'log')
                 
+                # Relatório guardado: seções podem ser regeneradas depois, sem nova execução completa
+                try:
+                    report_id = save_report(result_data['result'], goal, result_data.get('goal_type', goal_type),
+                                            result_data.get('outline', ''), context, context_source=context_source,
+                                            free_text=free_text)
+                    if report_id:
+                        yield format_sse_event({'report_id': report_id,
+                                                'sections': parse_sections(result_data['result']).outline()}, 'report')
+                except OSError as store_err:
+                    yield format_sse_event(f"[WARNING] Relatório não guardado para regeneração: {store_err}", 'log')
+                
+                # Resultado entregue: a vaga de admissão é liberada antes de esperar pelo QA,
+                # que roda no qa_executor e não deve segurar a próxima execução da fila
+                admission_controller.release(ticket)
+                if result_data.get('quality_report') is not None:
+                    # O resultado já foi enviado; o relatório de qualidade segue como evento próprio
+                    quality_report = collect_quality_report(result_data['quality_report'])
+                    if quality_report['status'] == 'ok':
+                        yield format_sse_event(f"[QA] Avaliação concluída - Score: {quality_report['overall_score']:.2f}", 'log')
+                        if quality_report['recommendations']:
+                            yield format_sse_event(f"[QA] Recomendações: {'; '.join(quality_report['recommendations'])}", 'log')
+                    else:
+                        yield format_sse_event(f"[QA] Avaliação de qualidade indisponível ({quality_report['status']})", 'log')
+                    yield format_sse_event(quality_report, 'quality_report')
+                
             except Exception as agent_err:
                 yield format_sse_event(f"[ERROR] Erro no sistema multi-agente: {agent_err}", 'log')
                 
@@ -1745,8 +3055,12 @@ def run_agent_system():
                 try:
                     yield format_sse_event("[FALLBACK] Tentando sistema tradicional...", 'log')
                     researcher_prompt, writer_prompt = generate_specialized_prompts(goal_type, goal, context)
-                    result_data = master_control_plane(goal, context, researcher_prompt, writer_prompt, goal_type, send_update=send_update)
-                    yield format_sse_event(result_data['result'], 'final_result')
+                    result_data = yield from stream_pipeline_events(
+                        lambda: master_control_plane(goal, context, researcher_prompt, writer_prompt, goal_type, send_update=send_update),
+                        events,
+                        tenant=call_tenant
+                    )
+                    yield from final_result_events(result_data['result'], result_delivery)
                     yield format_sse_event("[SUCCESS] Sistema tradicional concluído", 'log')
                 except Exception as fallback_err:
                     yield format_sse_event(f"[ERROR] Erro no fallback: {fallback_err}", 'log')
@@ -1765,13 +3079,29 @@ def run_agent_system():
         finally:
             yield format_sse_event('END_STREAM', 'end') # Sinaliza o fim do stream
 
-    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    # Garante a liberação da vaga mesmo se o cliente desconectar antes do stream começar
+    response.call_on_close(lambda: admission_controller.release(ticket))
+    response.call_on_close(agent_request.close_files)
+    return response
 
 def format_sse_event(data, event_type='message'):
     """Formata os dados para o padrão Server-Sent Events."""
     json_data = json.dumps(data, ensure_ascii=False)
     return f"event: {event_type}\ndata: {json_data}\n\n"
 
+def final_result_events(result, delivery=None):
+    """
+    Eventos SSE do resultado final: um único final_result (clientes antigos)
+    ou, no modo chunked e acima de AGENT_RESULT_CHUNK_CHARS, as partes
+    result_chunk em bytes UTF-8 seguidas do marcador result_complete
+    """
+    if (delivery or AGENT_RESULT_DELIVERY) == DELIVERY_CHUNKED and isinstance(result, str) \
+            and len(result) > AGENT_RESULT_CHUNK_CHARS:
+        yield from iter_result_events(result, AGENT_RESULT_CHUNK_CHARS)
+    else:
+        yield format_sse_event(result, 'final_result')
+
 if __name__ == '__main__':
     # Em ambiente de produção, defina debug=False
     app.run(debug=True)
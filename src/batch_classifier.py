@@ -0,0 +1,153 @@
+"""
+Classificação de objetivos em lote
+
+Classifica milhares de pares objetivo/contexto de uma vez. Os textos de um
+bloco são varridos em uma única passada do KeywordMatcher e as ocorrências
+viram uma matriz de contagens (pares x palavras-chave). A partir dela, tipo
+principal, tipos relacionados, pontuação e colaboradores saem de produtos de
+matrizes NumPy, com as mesmas regras de classify_goal.
+"""
+import numpy as np
+
+from keyword_matcher import KeywordMatcher
+
+# Nenhuma palavra-chave contém quebra de linha: separa os pares no texto do bloco
+ROW_SEPARATOR = "\n"
+
+
+class BatchGoalClassifier:
+    """
+    Vocabulário e regras de classificação compilados em matrizes
+    """
+
+    def __init__(self, matcher: KeywordMatcher, primary_types: list, related_types: list,
+                 vocabulary: dict, collaboration_matrix: dict, goal_text_weight: float = 3.0,
+                 default_type: str = 'general', chunk_size: int = 2048):
+        self.matcher = matcher
+        self.goal_text_weight = goal_text_weight
+        self.default_type = default_type
+        self.chunk_size = max(1, int(chunk_size))
+
+        self.keywords = sorted(matcher.labels_by_keyword)
+        self.keyword_index = {keyword: index for index, keyword in enumerate(self.keywords)}
+        self.primary_types = list(primary_types)
+        self.related_types = list(related_types)
+
+        # Eixo de tipos em ordem alfabética: argsort estável por -score reproduz (-score, tipo)
+        all_types = set(self.primary_types) | set(self.related_types) | set(vocabulary)
+        for primary, collaborators in collaboration_matrix.items():
+            all_types.add(primary)
+            all_types.update(collaborators)
+        all_types.discard(default_type)
+        self.types = sorted(all_types)
+        type_index = {goal_type: index for index, goal_type in enumerate(self.types)}
+        self._default_index = len(self.types)
+
+        n_keywords, n_types = len(self.keywords), len(self.types)
+        self._specificity = np.array([1 + keyword.count(' ') for keyword in self.keywords], dtype=np.float64)
+        self._primary = np.zeros((n_keywords, len(self.primary_types)), dtype=np.float32)
+        self._related = np.zeros((n_keywords, len(self.related_types)), dtype=np.float32)
+        self._vocabulary = np.zeros((n_keywords, n_types), dtype=np.float64)
+        primary_column = {goal_type: index for index, goal_type in enumerate(self.primary_types)}
+        related_column = {goal_type: index for index, goal_type in enumerate(self.related_types)}
+        for keyword, labels in matcher.labels_by_keyword.items():
+            row = self.keyword_index[keyword]
+            for kind, goal_type in labels:
+                if kind == 'primary':
+                    self._primary[row, primary_column[goal_type]] = 1
+                elif kind == 'related':
+                    self._related[row, related_column[goal_type]] = 1
+        for goal_type, keywords in vocabulary.items():
+            for keyword in keywords:
+                if keyword in self.keyword_index:
+                    self._vocabulary[self.keyword_index[keyword], type_index[goal_type]] = 1
+
+        self._primary_to_type = np.array([type_index[goal_type] for goal_type in self.primary_types], dtype=np.intp)
+        self._related_to_type = np.array([type_index[goal_type] for goal_type in self.related_types], dtype=np.intp)
+
+        # Linha extra (índice default_index) para o tipo padrão, sem colaboradores fixos
+        self._collaboration = np.zeros((n_types + 1, n_types + 1), dtype=bool)
+        for primary, collaborators in collaboration_matrix.items():
+            for collaborator in collaborators:
+                self._collaboration[type_index[primary], type_index[collaborator]] = True
+
+    def _count_matrices(self, rows: list, goal_lengths: np.ndarray):
+        """Contagens (objetivo, contexto) por par e palavra-chave em uma única varredura"""
+        n_rows, n_keywords = len(rows), len(self.keywords)
+        starts = np.zeros(n_rows, dtype=np.int64)
+        if n_rows > 1:
+            lengths = np.fromiter((len(row) + len(ROW_SEPARATOR) for row in rows[:-1]), dtype=np.int64, count=n_rows - 1)
+            starts[1:] = np.cumsum(lengths)
+
+        keyword_index = self.keyword_index
+        found = [(position, keyword_index[keyword])
+                 for position, keyword in self.matcher.finditer(ROW_SEPARATOR.join(rows))]
+        goal_counts = np.zeros((n_rows, n_keywords), dtype=np.int32)
+        context_counts = np.zeros((n_rows, n_keywords), dtype=np.int32)
+        if not found:
+            return goal_counts, context_counts
+
+        matches = np.array(found, dtype=np.int64)
+        row_of = np.searchsorted(starts, matches[:, 0], side='right') - 1
+        in_goal = matches[:, 0] - starts[row_of] < goal_lengths[row_of]
+        cells = row_of * n_keywords + matches[:, 1]
+        size = n_rows * n_keywords
+        goal_counts += np.bincount(cells[in_goal], minlength=size).reshape(n_rows, n_keywords).astype(np.int32)
+        context_counts += np.bincount(cells[~in_goal], minlength=size).reshape(n_rows, n_keywords).astype(np.int32)
+        return goal_counts, context_counts
+
+    def _classify_chunk(self, goals: list, contexts: list) -> list:
+        goal_lengths = np.fromiter((len(goal) for goal in goals), dtype=np.int64, count=len(goals))
+        # Mesmo texto varrido por scan_goal_keywords: objetivo + " " + contexto
+        rows = [goal + " " + context for goal, context in zip(goals, contexts)]
+        goal_counts, context_counts = self._count_matrices(rows, goal_lengths)
+
+        present = ((goal_counts + context_counts) > 0).astype(np.float32)
+        has_primary = (present @ self._primary) > 0
+        has_related = (present @ self._related) > 0
+
+        n_rows = len(rows)
+        row_range = np.arange(n_rows)
+        primary = np.where(has_primary.any(axis=1),
+                           self._primary_to_type[has_primary.argmax(axis=1)],
+                           self._default_index)
+
+        weights = self._specificity * (self.goal_text_weight * (goal_counts > 0) + np.log1p(context_counts))
+        scores = weights @ self._vocabulary
+        # Arredondado como em score_goal_types: empates resolvidos pelo nome do tipo
+        order = np.argsort(-np.round(scores, 9), axis=1, kind='stable')
+
+        collaborators = self._collaboration[primary].copy()
+        collaborators[:, self._related_to_type] |= has_related
+        collaborators[row_range, primary] = False
+
+        total = scores.sum(axis=1)
+        primary_score = np.where(primary < self._default_index,
+                                 scores[row_range, np.minimum(primary, self._default_index - 1)], 0.0)
+        confidence = np.divide(primary_score, total, out=np.zeros(n_rows), where=total > 0)
+
+        results = []
+        types = self.types
+        related_types = self.related_types
+        for primary_index, related_row, collaborator_row, order_row, row_confidence in zip(
+                primary.tolist(), has_related.tolist(), collaborators.tolist(), order.tolist(), confidence.tolist()):
+            primary_type = types[primary_index] if primary_index < self._default_index else self.default_type
+            related = [goal_type for goal_type, hit in zip(related_types, related_row) if hit] or [primary_type]
+            results.append({
+                'primary_type': primary_type,
+                'related_types': related,
+                'collaborators': [types[index] for index in order_row if collaborator_row[index]],
+                'confidence': round(row_confidence, 3)
+            })
+        return results
+
+    def classify(self, goals: list, contexts: list) -> list:
+        """
+        Classifica os pares (textos já em minúsculas; o contexto pode ser a
+        amostra montada por ContextSampler). Retorna um dict por par.
+        """
+        results = []
+        for start in range(0, len(goals), self.chunk_size):
+            end = start + self.chunk_size
+            results.extend(self._classify_chunk(goals[start:end], contexts[start:end]))
+        return results
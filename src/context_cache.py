@@ -0,0 +1,205 @@
+"""
+Prefixo compartilhado e cache de contexto para as chamadas ao modelo
+
+Em uma execução colaborativa todos os agentes recebem as mesmas instruções
+estáticas (regras ABNT) e o mesmo contexto. Esses blocos formam um prefixo
+estável (SharedPrefix); só as instruções do agente vêm depois dele. O prefixo
+pode ser enviado como systemInstruction ou registrado uma única vez no cache
+de contexto do Gemini (cachedContents) e referenciado pelo nome nas chamadas
+seguintes. LocalContextCache simula esse cache localmente (sem rede), para
+testes; nesse modo o prefixo continua indo em cada chamada e a economia é só
+estimada.
+
+gemini_prompt_upload_bytes_total conta os bytes realmente enviados (chamadas
+e criação do cache); context_cache_saved_bytes_total conta, à parte, os bytes
+de prefixo que deixaram de ser enviados (reais no modo 'gemini', emulados no
+modo 'local').
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+from metrics import metrics as default_metrics
+
+CACHE_MODE_OFF = 'off'          # prefixo + instruções em um único texto (comportamento anterior)
+CACHE_MODE_SYSTEM = 'system'    # prefixo como systemInstruction
+CACHE_MODE_GEMINI = 'gemini'    # prefixo em cachedContents do Gemini
+CACHE_MODE_LOCAL = 'local'      # emulação local do cache (testes)
+CACHE_MODES = (CACHE_MODE_OFF, CACHE_MODE_SYSTEM, CACHE_MODE_GEMINI, CACHE_MODE_LOCAL)
+
+
+class SharedPrefix:
+    """
+    Prefixo estável de uma execução; hash e tamanho são calculados uma única vez
+    """
+
+    __slots__ = ('text', '_key', '_size_bytes')
+
+    def __init__(self, text: str):
+        self.text = text
+        self._key = None
+        self._size_bytes = None
+
+    @property
+    def key(self) -> str:
+        if self._key is None:
+            self._key = hashlib.sha256(self.text.encode('utf-8')).hexdigest()
+        return self._key
+
+    @property
+    def size_bytes(self) -> int:
+        if self._size_bytes is None:
+            self._size_bytes = len(self.text.encode('utf-8'))
+        return self._size_bytes
+
+
+class ContextCache:
+    """
+    Registro (modelo, hash do prefixo) -> nome do conteúdo em cache, com TTL e
+    limite de entradas. Subclasses implementam _create.
+    """
+
+    mode = None
+    # True quando as chamadas continuam levando o prefixo (a criação não envia nada)
+    sends_prefix_inline = False
+
+    def __init__(self, ttl_seconds: float = 600.0, max_entries: int = 64, min_prefix_bytes: int = 0,
+                 metrics=None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, int(max_entries))
+        self.min_prefix_bytes = min_prefix_bytes
+        self.metrics = metrics or default_metrics
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._creating = {}
+        self._stats = {'hits': 0, 'misses': 0, 'failures': 0, 'uploaded_prefix_bytes': 0, 'saved_bytes': 0}
+
+        self.metrics.describe('context_cache_hits_total', 'Chamadas ao modelo que reutilizaram um prefixo em cache')
+        self.metrics.describe('context_cache_misses_total', 'Prefixos enviados ao cache de contexto')
+        self.metrics.describe('context_cache_saved_bytes_total',
+                              'Bytes de prefixo não enviados graças ao cache (emulados no modo local)')
+
+    def _create(self, model: str, prefix: SharedPrefix):
+        """Registra o prefixo e retorna o nome do conteúdo em cache (ou None se falhar)"""
+        raise NotImplementedError
+
+    def _record(self, outcome: str, saved_bytes: int = 0, uploaded_bytes: int = 0):
+        with self._lock:
+            self._stats[outcome] += 1
+            self._stats['saved_bytes'] += saved_bytes
+            self._stats['uploaded_prefix_bytes'] += uploaded_bytes
+        self.metrics.inc(f'context_cache_{outcome}_total', labels={'mode': self.mode})
+        if saved_bytes:
+            self.metrics.inc('context_cache_saved_bytes_total', saved_bytes, labels={'mode': self.mode})
+        if uploaded_bytes and not self.sends_prefix_inline:
+            # O envio do prefixo ao cache entra na mesma conta de bytes das chamadas
+            self.metrics.inc('gemini_prompt_upload_bytes_total', uploaded_bytes, labels={'cache': self.mode})
+
+    def get(self, model: str, prefix: SharedPrefix):
+        """
+        Nome do conteúdo em cache para o prefixo, criando-o na primeira chamada.
+        Retorna None quando o prefixo é pequeno demais ou a criação falhou
+        (o chamador envia o prefixo diretamente).
+        """
+        if prefix.size_bytes < self.min_prefix_bytes:
+            return None
+        entry_key = (model, prefix.key)
+        while True:
+            with self._lock:
+                entry = self._entries.get(entry_key)
+                now = time.monotonic()
+                if entry is not None and entry[1] > now:
+                    self._entries.move_to_end(entry_key)
+                    name = entry[0]
+                    break
+                # Apenas uma thread cria o conteúdo; as demais aguardam o resultado
+                pending = self._creating.get(entry_key)
+                if pending is None:
+                    pending = self._creating[entry_key] = threading.Event()
+                    creator = True
+                else:
+                    creator = False
+            if not creator:
+                pending.wait(timeout=60)
+                continue
+
+            try:
+                name = self._create(model, prefix)
+            except Exception:
+                name = None
+            with self._lock:
+                # Falhas também ficam registradas (nome None) para não repetir a tentativa a cada chamada
+                self._entries[entry_key] = (name, time.monotonic() + self.ttl_seconds * 0.9)
+                self._entries.move_to_end(entry_key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                del self._creating[entry_key]
+            pending.set()
+            if name is None:
+                self._record('failures')
+                return None
+            self._record('misses', uploaded_bytes=prefix.size_bytes)
+            return name
+
+        if name is not None:
+            self._record('hits', saved_bytes=prefix.size_bytes)
+        return name
+
+    def invalidate(self, model: str, prefix: SharedPrefix):
+        """Descarta o conteúdo recusado pela API; até o TTL expirar o prefixo é enviado diretamente"""
+        with self._lock:
+            self._entries[(model, prefix.key)] = (None, time.monotonic() + self.ttl_seconds * 0.9)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {'mode': self.mode, 'entries': len(self._entries), **self._stats}
+
+
+class LocalContextCache(ContextCache):
+    """
+    Emulação local do cache de contexto: nenhum dado sai do processo; as
+    chamadas continuam enviando o prefixo como systemInstruction (e esses
+    bytes são contados como enviados), enquanto acertos e bytes economizados
+    são contabilizados como se o cache existisse.
+    """
+
+    mode = CACHE_MODE_LOCAL
+    sends_prefix_inline = True
+
+    def _create(self, model: str, prefix: SharedPrefix):
+        return f"localCachedContents/{prefix.key[:16]}"
+
+
+class GeminiContextCache(ContextCache):
+    """
+    Cache de contexto explícito do Gemini (POST {api}/cachedContents)
+    """
+
+    mode = CACHE_MODE_GEMINI
+
+    def __init__(self, api_base_url: str, api_key_provider, ttl_seconds: float = 600.0, max_entries: int = 64,
+                 min_prefix_bytes: int = 16384, timeout: float = 60.0, metrics=None):
+        super().__init__(ttl_seconds=ttl_seconds, max_entries=max_entries,
+                         min_prefix_bytes=min_prefix_bytes, metrics=metrics)
+        self.api_base_url = api_base_url.rstrip('/')
+        self.api_key_provider = api_key_provider
+        self.timeout = timeout
+
+    def _create(self, model: str, prefix: SharedPrefix):
+        body = {
+            "model": f"models/{model}",
+            "systemInstruction": {"parts": [{"text": prefix.text}]},
+            "ttl": f"{int(self.ttl_seconds)}s"
+        }
+        response = requests.post(
+            f"{self.api_base_url}/cachedContents",
+            headers={'Content-Type': 'application/json', 'X-goog-api-key': self.api_key_provider()},
+            json=body,
+            timeout=self.timeout
+        )
+        if response.status_code != 200:
+            return None
+        return response.json().get('name')
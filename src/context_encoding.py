@@ -0,0 +1,183 @@
+"""
+Codificações compactas de dados JSON para o contexto dos agentes
+
+O JSON enviado era reserializado com indent=2: a indentação e as chaves
+repetidas em cada registro de uma lista consomem boa parte dos tokens de
+entrada. As codificações disponíveis são:
+
+- pretty: JSON indentado (comportamento anterior)
+- minified: JSON sem espaços
+- yaml: forma compacta no estilo YAML (chave: valor, listas com "-")
+- tabular: como yaml, mas listas de registros homogêneos viram tabelas,
+  com o cabeçalho uma única vez e uma linha por registro
+
+estimate_tokens aproxima a contagem de tokens de um tokenizador BPE
+(sem dependências), para comparar as codificações entre si.
+"""
+import json
+import re
+
+ENCODING_PRETTY = 'pretty'
+ENCODING_MINIFIED = 'minified'
+ENCODING_YAML = 'yaml'
+ENCODING_TABULAR = 'tabular'
+ENCODINGS = (ENCODING_PRETTY, ENCODING_MINIFIED, ENCODING_YAML, ENCODING_TABULAR)
+
+TABLE_DELIMITER = '|'
+TABLE_LEGEND = f"(tabelas: cabeçalho 'nome[registros]{{colunas}}:', um registro por linha, separador '{TABLE_DELIMITER}')"
+# Listas menores não compensam a legenda e o cabeçalho da tabela
+TABLE_MIN_ROWS = 3
+INDENT = '  '
+
+# Sequências curtas de letras/dígitos, cada pontuação e cada quebra de linha com a indentação
+# seguinte contam como um token, como nos tokenizadores BPE
+_TOKEN_PIECES = re.compile(r"[^\W\d_]{1,4}|\d{1,3}|[^\w\s]|\n[ \t]*")
+_PLAIN_KEY = re.compile(r"^[\w][\w .\-/]*$")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa de tokens de entrada (não substitui o countTokens do modelo)"""
+    return sum(1 for _ in _TOKEN_PIECES.finditer(text))
+
+
+def _is_scalar(value) -> bool:
+    return value is None or isinstance(value, (str, int, float, bool))
+
+
+def _scalar(value, delimiters: str = '') -> str:
+    if value is None:
+        return 'null'
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if not isinstance(value, str):
+        return json.dumps(value)
+    if (not value or value != value.strip() or '\n' in value or value[0] in '"[{-#'
+            or any(delimiter in value for delimiter in delimiters)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def encode_key(key) -> str:
+    """Chave sem aspas quando possível"""
+    key = str(key)
+    return key if _PLAIN_KEY.match(key) and not key.endswith(' ') else json.dumps(key, ensure_ascii=False)
+
+
+def _inline_list(values, delimiters: str = ',') -> str:
+    return f"[{', '.join(_scalar(item, delimiters) for item in values)}]"
+
+
+def encode_cell(value) -> str:
+    """Valor de uma célula de tabela (vazio para None)"""
+    if value is None:
+        return ''
+    if _is_scalar(value):
+        return _scalar(value, TABLE_DELIMITER)
+    return _inline_list(value, ',' + TABLE_DELIMITER)
+
+
+def table_columns(value):
+    """
+    Colunas da tabela se value for uma lista de registros homogêneos (dicts
+    com valores escalares ou listas de escalares, compartilhando a maior parte
+    das chaves); senão None
+    """
+    if not isinstance(value, list) or len(value) < TABLE_MIN_ROWS or not all(isinstance(item, dict) and item for item in value):
+        return None
+    columns = {}
+    for record in value:
+        for key, cell in record.items():
+            if not (_is_scalar(cell) or (isinstance(cell, list) and all(_is_scalar(item) for item in cell))):
+                return None
+            columns.setdefault(key, None)
+    # Registros com menos da metade das colunas tornariam a tabela esparsa demais
+    if any(len(record) * 2 < len(columns) for record in value):
+        return None
+    return list(columns)
+
+
+class _Writer:
+    def __init__(self, tables: bool):
+        self.tables = tables
+        self.lines = []
+        self.table_count = 0
+
+    def table(self, prefix: str, items: list, columns: list, depth: int):
+        self.table_count += 1
+        self.lines.append(f"{prefix}[{len(items)}]{{{TABLE_DELIMITER.join(encode_key(column) for column in columns)}}}:")
+        indent = INDENT * (depth + 1)
+        missing = object()
+        for record in items:
+            cells = [record.get(column, missing) for column in columns]
+            self.lines.append(indent + TABLE_DELIMITER.join('' if cell is missing else encode_cell(cell) for cell in cells))
+
+    def value(self, prefix: str, value, depth: int):
+        """Escreve value; prefix é 'chave' (dict) ou '-' (item de lista), já indentado"""
+        separator = ' ' if prefix.endswith('-') else ': '
+        if _is_scalar(value):
+            self.lines.append(f"{prefix}{separator}{_scalar(value)}")
+        elif not value:
+            self.lines.append(f"{prefix}{separator}{'{}' if isinstance(value, dict) else '[]'}")
+        elif isinstance(value, list) and all(_is_scalar(item) for item in value):
+            self.lines.append(f"{prefix}{separator}{_inline_list(value)}")
+        else:
+            columns = table_columns(value) if self.tables else None
+            if columns is not None:
+                self.table(prefix if not prefix.endswith('-') else prefix + ' ', value, columns, depth)
+                return
+            self.lines.append(prefix if prefix.endswith('-') else prefix + ':')
+            self.block(value, depth + 1)
+
+    def block(self, value, depth: int):
+        indent = INDENT * depth
+        if isinstance(value, dict):
+            for key, item in value.items():
+                self.value(indent + encode_key(key), item, depth)
+        else:
+            for item in value:
+                self.value(indent + '-', item, depth)
+
+
+def _encode_structured(data, tables: bool) -> str:
+    writer = _Writer(tables)
+    if _is_scalar(data):
+        return _scalar(data)
+    columns = table_columns(data) if tables else None
+    if columns is not None:
+        writer.table('', data, columns, -1)
+    elif not data:
+        return '{}' if isinstance(data, dict) else '[]'
+    else:
+        writer.block(data, 0)
+    text = '\n'.join(writer.lines)
+    if writer.table_count:
+        text = f"{TABLE_LEGEND}\n{text}"
+    return text
+
+
+def encode_context(data, encoding: str = ENCODING_TABULAR) -> str:
+    """Texto do dado JSON (já carregado) na codificação escolhida"""
+    if encoding == ENCODING_PRETTY:
+        return json.dumps(data, indent=2, ensure_ascii=False)
+    if encoding == ENCODING_MINIFIED:
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    if encoding == ENCODING_YAML:
+        return _encode_structured(data, tables=False)
+    if encoding == ENCODING_TABULAR:
+        return _encode_structured(data, tables=True)
+    raise ValueError(f"Codificação de contexto desconhecida: {encoding}")
+
+
+def compare_encodings(data, encodings=ENCODINGS) -> dict:
+    """{codificação: {'chars', 'bytes', 'tokens'}} para o mesmo dado"""
+    report = {}
+    for encoding in encodings:
+        text = encode_context(data, encoding)
+        report[encoding] = {
+            'chars': len(text),
+            'bytes': len(text.encode('utf-8')),
+            'tokens': estimate_tokens(text),
+        }
+    return report
@@ -0,0 +1,209 @@
+"""
+Recuperação de trechos do contexto por BM25
+
+Contextos de texto livre (relatórios, atas, documentos colados) iam inteiros
+no prompt de cada agente. ChunkIndex divide o texto em trechos de tamanho
+fixo (com sobreposição, cortados em quebras de parágrafo ou espaços) e monta
+um índice invertido em memória; cada agente recebe apenas os k trechos mais
+relevantes para o objetivo e o tipo do agente, na ordem do documento.
+
+Não há serviço de embeddings: a pontuação é BM25 sobre termos minusculizados
+e sem acentos. ChunkIndexCache guarda os índices pelo SHA-256 do texto, para
+que execuções com o mesmo contexto não reconstruam o índice.
+"""
+import hashlib
+import re
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+_WORDS = re.compile(r"[a-z0-9]+")
+# Palavras muito frequentes em português, sem valor para a busca
+STOPWORDS = frozenset("""
+a ao aos as at com como da das de del do dos e em entre era essa esse esta este foi for ha isso ja
+la mais mas na nas no nos o os ou para pela pelas pelo pelos por que se sem ser seu sua sao so sobre
+tem the to um uma umas uns and of in is on
+""".split())
+
+
+def fold_text(text: str) -> str:
+    """Minúsculas e sem acentos"""
+    text = text.lower()
+    if text.isascii():
+        return text
+    return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+
+
+def tokenize(text: str) -> list:
+    """Termos indexáveis: sem stopwords, com o plural simples removido (vendas -> venda)"""
+    terms = []
+    for word in _WORDS.findall(fold_text(text)):
+        if len(word) < 2 or word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith('s'):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+def chunk_bounds(text: str, chunk_chars: int = 1500, overlap_chars: int = 200) -> list:
+    """
+    (início, fim) de trechos de até chunk_chars caracteres. O corte procura
+    uma quebra de parágrafo (ou de linha, ou um espaço) no último quinto do
+    trecho; o trecho seguinte recomeça overlap_chars antes do corte.
+    """
+    chunk_chars = max(100, chunk_chars)
+    overlap_chars = max(0, min(overlap_chars, chunk_chars // 2))
+    bounds = []
+    start = 0
+    length = len(text)
+    while start < length:
+        end = min(length, start + chunk_chars)
+        if end < length:
+            floor = start + chunk_chars * 4 // 5
+            for separator in ('\n\n', '\n', ' '):
+                cut = text.rfind(separator, floor, end)
+                if cut > start:
+                    end = cut + len(separator)
+                    break
+        bounds.append((start, end))
+        if end >= length:
+            break
+        next_start = end - overlap_chars
+        if overlap_chars:
+            # Recomeça no início de uma palavra
+            space = text.find(' ', next_start, end)
+            next_start = space + 1 if space != -1 else next_start
+        start = max(next_start, start + 1)
+    return bounds
+
+
+class ChunkIndex:
+    """
+    Índice BM25 de um texto dividido em trechos
+    """
+
+    def __init__(self, text: str, chunk_chars: int = 1500, overlap_chars: int = 200, k1: float = 1.5, b: float = 0.75):
+        self.text = text
+        self.chunk_chars = chunk_chars
+        self.overlap_chars = overlap_chars
+        self.k1 = k1
+        self.b = b
+        self.bounds = chunk_bounds(text, chunk_chars, overlap_chars)
+        # termo -> ([trechos], [frequências])
+        self._postings = {}
+        lengths = []
+        for chunk_id, (start, end) in enumerate(self.bounds):
+            terms = Counter(tokenize(text[start:end]))
+            lengths.append(sum(terms.values()))
+            for term, frequency in terms.items():
+                posting = self._postings.get(term)
+                if posting is None:
+                    posting = self._postings[term] = ([], [])
+                posting[0].append(chunk_id)
+                posting[1].append(frequency)
+        self.lengths = np.array(lengths, dtype=np.float64)
+        self.average_length = float(self.lengths.mean()) if lengths else 0.0
+
+    @property
+    def chunk_count(self) -> int:
+        return len(self.bounds)
+
+    def chunk(self, chunk_id: int) -> str:
+        start, end = self.bounds[chunk_id]
+        return self.text[start:end]
+
+    def scores(self, query: str, boost: str = '', boost_weight: float = 0.5) -> np.ndarray:
+        """Pontuação BM25 de cada trecho; os termos de boost (ex.: vocabulário do tipo de agente) pesam boost_weight"""
+        weights = {}
+        for term in tokenize(boost):
+            weights[term] = boost_weight
+        for term in tokenize(query):
+            weights[term] = 1.0
+        scores = np.zeros(self.chunk_count, dtype=np.float64)
+        if not self.chunk_count:
+            return scores
+        norm = self.k1 * (1 - self.b + self.b * self.lengths / max(self.average_length, 1.0))
+        for term, weight in weights.items():
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            ids = np.array(posting[0], dtype=np.intp)
+            frequencies = np.array(posting[1], dtype=np.float64)
+            idf = np.log(1 + (self.chunk_count - len(ids) + 0.5) / (len(ids) + 0.5))
+            scores[ids] += weight * idf * frequencies * (self.k1 + 1) / (frequencies + norm[ids])
+        return scores
+
+    def search(self, query: str, k: int = 8, boost: str = '', boost_weight: float = 0.5) -> list:
+        """Até k ids de trechos com pontuação positiva, do mais para o menos relevante"""
+        scores = self.scores(query, boost, boost_weight)
+        k = min(k, self.chunk_count)
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [int(chunk_id) for chunk_id in top if scores[chunk_id] > 0]
+
+    def select(self, query: str, k: int = 8, boost: str = '', include_first: bool = True) -> list:
+        """
+        Ids dos trechos para o prompt, em ordem do documento. O primeiro trecho
+        (título, resumo) entra por padrão; sem nenhum termo em comum com a
+        busca, os primeiros k trechos são usados.
+        """
+        chosen = self.search(query, k, boost)
+        if not chosen:
+            return list(range(min(k, self.chunk_count)))
+        if include_first and 0 not in chosen:
+            chosen = [0] + chosen[:max(k - 1, 0)]
+        return sorted(chosen)
+
+    def render(self, chunk_ids: list) -> str:
+        """Texto dos trechos escolhidos, identificados e separados por [...] onde há lacunas"""
+        parts = [f"Trechos do contexto selecionados por relevância ({len(chunk_ids)} de {self.chunk_count}; "
+                 f"documento completo com {len(self.text)} caracteres):"]
+        previous = None
+        for chunk_id in chunk_ids:
+            if previous is not None and chunk_id != previous + 1:
+                parts.append("[...]")
+            parts.append(f"[Trecho {chunk_id + 1}/{self.chunk_count}]\n{self.chunk(chunk_id).strip()}")
+            previous = chunk_id
+        return "\n\n".join(parts)
+
+    def context_for(self, query: str, k: int = 8, boost: str = '') -> str:
+        return self.render(self.select(query, k, boost))
+
+
+class ChunkIndexCache:
+    """
+    Índices por SHA-256 do texto e parâmetros de divisão (LRU em memória)
+    """
+
+    def __init__(self, max_entries: int = 16):
+        self.max_entries = max(1, int(max_entries))
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._stats = {'hits': 0, 'misses': 0}
+
+    def get(self, text: str, chunk_chars: int = 1500, overlap_chars: int = 200) -> ChunkIndex:
+        key = (hashlib.sha256(text.encode('utf-8')).hexdigest(), chunk_chars, overlap_chars)
+        with self._lock:
+            index = self._entries.get(key)
+            if index is not None:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return index
+        # Construído fora da trava; duas execuções simultâneas com o mesmo texto constroem o mesmo índice
+        index = ChunkIndex(text, chunk_chars, overlap_chars)
+        with self._lock:
+            self._stats['misses'] += 1
+            self._entries[key] = index
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {'entries': len(self._entries), **self._stats}
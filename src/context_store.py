@@ -0,0 +1,271 @@
+"""
+Armazenamento de contextos endereçado por conteúdo
+
+Cada arquivo ingerido é guardado comprimido (zlib) sob o SHA-256 dos seus
+bytes, já calculado durante o upload. Os artefatos derivados (contexto
+codificado, perfil, índice de trechos...) ficam ao lado do original, sob
+uma chave que descreve as opções usadas para gerá-los. O cliente pode
+enviar context_ref=<hash> em vez de repetir o upload; se o artefato já
+existir, nenhum trabalho de decodificação, leitura ou codificação é refeito.
+
+Cada conteúdo guarda os tenants que o enviaram, com o nome de arquivo de
+cada um (owners); info e load_upload com owner só o encontram para esses
+tenants, para que o hash de um arquivo não dê acesso ao upload de outro
+tenant nem confirme que ele existe.
+
+O espaço em disco é limitado: quando o total passa de max_bytes, os
+conteúdos acessados há mais tempo (com seus artefatos) são removidos.
+"""
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from upload_ingestion import UploadSpool, UploadedText
+
+CHUNK_SIZE = 64 * 1024
+_HASH = re.compile(r"^[0-9a-f]{64}$")
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.=-]")
+
+
+def is_context_ref(value: str) -> bool:
+    return bool(value) and bool(_HASH.match(value))
+
+
+class ContextStore:
+    """
+    Conteúdos e artefatos em disco, com índice LRU em memória
+    """
+
+    def __init__(self, root_dir: str, max_bytes: int = 512 * 1024 * 1024, compression_level: int = 6):
+        self.root_dir = root_dir
+        self.max_bytes = max_bytes
+        self.compression_level = compression_level
+        self._lock = threading.Lock()
+        # Serializa as atualizações da lista de owners nos metadados
+        self._meta_lock = threading.Lock()
+        # hash -> bytes ocupados em disco (original + artefatos), do menos para o mais recente
+        self._entries = OrderedDict()
+        self._stats = {'hits': 0, 'misses': 0, 'artifact_hits': 0, 'artifact_misses': 0, 'evictions': 0}
+        os.makedirs(root_dir, exist_ok=True)
+        self._load_index()
+
+    # --- Caminhos ---
+
+    def _dir(self, key: str) -> str:
+        return os.path.join(self.root_dir, key[:2])
+
+    def _blob_path(self, key: str) -> str:
+        return os.path.join(self._dir(key), f"{key}.blob")
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self._dir(key), f"{key}.json")
+
+    def _artifact_path(self, key: str, artifact: str) -> str:
+        return os.path.join(self._dir(key), f"{key}.{_UNSAFE.sub('_', artifact)}.art")
+
+    def _files(self, key: str) -> list:
+        directory = self._dir(key)
+        if not os.path.isdir(directory):
+            return []
+        return [os.path.join(directory, name) for name in os.listdir(directory) if name.startswith(key)]
+
+    def _load_index(self):
+        found = []
+        for directory, _, names in os.walk(self.root_dir):
+            for name in names:
+                if name.endswith('.json') and _HASH.match(name[:-5]):
+                    key = name[:-5]
+                    size = sum(os.path.getsize(path) for path in self._files(key))
+                    found.append((os.path.getmtime(os.path.join(directory, name)), key, size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+
+    # --- Escrita ---
+
+    def _write_atomic(self, path: str, chunks) -> int:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        written = 0
+        try:
+            with os.fdopen(handle, 'wb') as target:
+                for chunk in chunks:
+                    target.write(chunk)
+                    written += len(chunk)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return written
+
+    def _compressed(self, buffer):
+        compressor = zlib.compressobj(self.compression_level)
+        for start in range(0, len(buffer), CHUNK_SIZE):
+            chunk = compressor.compress(buffer[start:start + CHUNK_SIZE])
+            if chunk:
+                yield chunk
+        yield compressor.flush()
+
+    def _read_meta(self, key: str):
+        try:
+            with open(self._meta_path(key), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _add_owner(self, key: str, owner: str, filename: str):
+        with self._meta_lock:
+            meta = self._read_meta(key)
+            if meta is None or meta.get('owners', {}).get(owner) == filename:
+                return
+            meta['owners'] = {**meta.get('owners', {}), owner: filename}
+            self._write_atomic(self._meta_path(key), [json.dumps(meta, ensure_ascii=False).encode('utf-8')])
+
+    def put_upload(self, upload: UploadedText, owner: str = None) -> str:
+        """Guarda os bytes do upload (se ainda não existirem), registra o owner e retorna o hash"""
+        key = upload.sha256
+        with self._lock:
+            exists = key in self._entries
+        if exists:
+            if owner:
+                self._add_owner(key, owner, upload.filename)
+            self._touch(key)
+            return key
+        with upload.spool.view() as buffer:
+            size = self._write_atomic(self._blob_path(key), self._compressed(buffer))
+        with self._meta_lock:
+            # Outro tenant pode ter enviado o mesmo conteúdo ao mesmo tempo: preserva os owners dele
+            owners = (self._read_meta(key) or {}).get('owners', {})
+            if owner:
+                owners[owner] = upload.filename
+            meta = json.dumps({
+                'sha256': key,
+                'filename': upload.filename,
+                'encoding': upload.encoding,
+                'size_bytes': upload.size_bytes,
+                'stored_bytes': size,
+                'created_at': time.time(),
+                'owners': owners,
+            }, ensure_ascii=False).encode('utf-8')
+            size += self._write_atomic(self._meta_path(key), [meta])
+        with self._lock:
+            self._entries[key] = self._entries.get(key, 0) + size
+            self._entries.move_to_end(key)
+        self._evict(keep=key)
+        return key
+
+    def put_artifact(self, key: str, artifact: str, text: str):
+        """Guarda um artefato textual derivado do conteúdo key"""
+        with self._lock:
+            if key not in self._entries:
+                return
+        size = self._write_atomic(self._artifact_path(key, artifact), [zlib.compress(text.encode('utf-8'), self.compression_level)])
+        with self._lock:
+            if key in self._entries:
+                self._entries[key] += size
+        self._evict(keep=key)
+
+    # --- Leitura ---
+
+    def _touch(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        try:
+            os.utime(self._meta_path(key))
+        except OSError:
+            pass
+
+    def contains(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def info(self, key: str, owner: str = None):
+        """
+        Metadados do conteúdo (ou None), com a lista de artefatos guardados.
+        Com owner, None também quando esse tenant não enviou o conteúdo.
+        """
+        if not self.contains(key):
+            return None
+        meta = self._read_meta(key)
+        if meta is None:
+            return None
+        owners = meta.pop('owners', {})
+        if owner is not None:
+            if owner not in owners:
+                return None
+            meta['filename'] = owners[owner]
+        prefix = f"{key}."
+        meta['artifacts'] = sorted(os.path.basename(path)[len(prefix):-len('.art')]
+                                   for path in self._files(key) if path.endswith('.art'))
+        return meta
+
+    def load_upload(self, key: str, memory_bytes: int = 1024 * 1024, owner: str = None):
+        """Conteúdo original como UploadedText (descomprimido em blocos para um spool), ou None"""
+        meta = self.info(key, owner=owner)
+        if meta is None:
+            with self._lock:
+                self._stats['misses'] += 1
+            return None
+        spool = UploadSpool(memory_bytes=memory_bytes)
+        decompressor = zlib.decompressobj()
+        try:
+            with open(self._blob_path(key), 'rb') as source:
+                while True:
+                    chunk = source.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    spool.write(decompressor.decompress(chunk))
+                spool.write(decompressor.flush())
+        except (OSError, zlib.error):
+            # Removido pela evicção (ou corrompido) entre info() e a leitura
+            spool.close()
+            with self._lock:
+                self._stats['misses'] += 1
+            return None
+        with self._lock:
+            self._stats['hits'] += 1
+        self._touch(key)
+        return UploadedText(spool, meta.get('filename', ''))
+
+    def get_artifact(self, key: str, artifact: str):
+        """Texto do artefato, ou None se ainda não foi gerado"""
+        try:
+            with open(self._artifact_path(key, artifact), 'rb') as source:
+                text = zlib.decompress(source.read()).decode('utf-8')
+        except (OSError, zlib.error):
+            with self._lock:
+                self._stats['artifact_misses'] += 1
+            return None
+        with self._lock:
+            self._stats['artifact_hits'] += 1
+        self._touch(key)
+        return text
+
+    # --- Remoção ---
+
+    def _evict(self, keep: str = None):
+        while True:
+            with self._lock:
+                if sum(self._entries.values()) <= self.max_bytes or len(self._entries) <= 1:
+                    return
+                victim = next((key for key in self._entries if key != keep), None)
+                if victim is None:
+                    return
+                del self._entries[victim]
+                self._stats['evictions'] += 1
+            for path in self._files(victim):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'stored_bytes': sum(self._entries.values()),
+                    'max_bytes': self.max_bytes, **self._stats}
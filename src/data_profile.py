@@ -0,0 +1,319 @@
+"""
+Perfil estatístico local de dados tabulares
+
+Antes do prompt, as listas de registros do contexto (ex.: data/vendas.json)
+viram colunas NumPy. Para cada coluna é inferido o tipo (numérica, data,
+categórica, texto ou identificador) e são calculados, de forma exata:
+estatísticas descritivas, top-k de categorias, agrupamentos (soma, média e
+contagem de cada medida por categoria), evolução por período com variação
+percentual e os maiores registros. O perfil renderizado acompanha (ou
+substitui) as linhas brutas, e o modelo não precisa calcular médias,
+tendências ou ticket médio a partir delas.
+"""
+import math
+import re
+from datetime import date as _date
+
+import numpy as np
+
+from context_encoding import table_columns
+
+COLUMN_NUMERIC = 'numérica'
+COLUMN_DATE = 'data'
+COLUMN_CATEGORICAL = 'categórica'
+COLUMN_TEXT = 'texto'
+COLUMN_IDENTIFIER = 'identificador'
+
+_ISO_DATE = re.compile(r"^(\d{4})-(\d{2})-(\d{2})")
+_BR_DATE = re.compile(r"^(\d{2})/(\d{2})/(\d{4})")
+
+
+def find_record_tables(data, path: str = '', min_rows: int = 3):
+    """Gera (caminho, registros) para cada lista de registros homogêneos no dado"""
+    if table_columns(data) is not None and len(data) >= min_rows:
+        yield path or 'registros', data
+        return
+    if isinstance(data, dict):
+        for key, value in data.items():
+            yield from find_record_tables(value, f"{path}.{key}" if path else str(key), min_rows)
+    elif isinstance(data, list):
+        for index, value in enumerate(data):
+            yield from find_record_tables(value, f"{path}[{index}]", min_rows)
+
+
+def records_to_columns(records: list) -> dict:
+    """{coluna: lista de valores} (None para campos ausentes)"""
+    columns = {}
+    for record in records:
+        for key in record:
+            columns.setdefault(key, None)
+    return {key: [record.get(key) for record in records] for key in columns}
+
+
+def parse_date(value):
+    """Data ISO (AAAA-MM-DD) a partir de AAAA-MM-DD... ou DD/MM/AAAA; None se não for data"""
+    if not isinstance(value, str):
+        return None
+    match = _ISO_DATE.match(value)
+    if match:
+        iso = f"{match.group(1)}-{match.group(2)}-{match.group(3)}"
+    else:
+        match = _BR_DATE.match(value)
+        if not match:
+            return None
+        iso = f"{match.group(3)}-{match.group(2)}-{match.group(1)}"
+    # Formato de data com dia ou mês inexistente (ex.: 2024-02-30): não é data
+    try:
+        _date.fromisoformat(iso)
+    except ValueError:
+        return None
+    return iso
+
+
+class ColumnProfile:
+    """Tipo inferido e valores convertidos (array NumPy) de uma coluna"""
+
+    def __init__(self, name: str, values):
+        self.name = name
+        self.size = len(values)
+        self.kind, self.values, self.mask = self._infer(name, values)
+        self.missing = int(self.size - self.mask.sum())
+
+    @staticmethod
+    def _infer(name: str, values):
+        # Colunas já tipadas (ex.: CSV convertido para arrays)
+        if isinstance(values, np.ndarray) and values.dtype.kind in 'iuf':
+            array = values.astype(np.float64)
+            mask = ~np.isnan(array)
+            kind = COLUMN_IDENTIFIER if ColumnProfile._looks_like_identifier(name) else COLUMN_NUMERIC
+            return kind, array, mask
+        if isinstance(values, np.ndarray) and values.dtype.kind == 'M':
+            mask = ~np.isnat(values)
+            return COLUMN_DATE, values.astype('datetime64[D]'), mask
+
+        if isinstance(values, np.ndarray) and values.dtype == object:
+            # Textos já separados de números e datas pela leitura
+            return ColumnProfile._classify_strings(values)
+
+        values = list(values)
+        present = [value for value in values if value is not None and value != '']
+        if present and all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+            array = np.array([np.nan if value is None or value == '' else value for value in values], dtype=np.float64)
+            mask = ~np.isnan(array)
+            kind = COLUMN_IDENTIFIER if ColumnProfile._looks_like_identifier(name) else COLUMN_NUMERIC
+            return kind, array, mask
+
+        dates = [parse_date(value) for value in values]
+        parsed = sum(date is not None for date in dates)
+        if present and parsed >= 0.9 * len(present):
+            array = np.array([date or 'NaT' for date in dates], dtype='datetime64[D]')
+            return COLUMN_DATE, array, ~np.isnat(array)
+
+        strings = np.array(['' if value is None else str(value) if not isinstance(value, list) else ', '.join(map(str, value))
+                            for value in values], dtype=object)
+        return ColumnProfile._classify_strings(strings)
+
+    @staticmethod
+    def _classify_strings(strings: np.ndarray):
+        mask = strings != ''
+        present_strings = strings[mask].tolist()
+        distinct = len(set(present_strings))
+        # Categoria: valores curtos que se repetem; descrições e nomes únicos ficam como texto
+        short = present_strings and sum(map(len, present_strings)) <= 40 * len(present_strings)
+        if short and distinct < len(present_strings) and distinct <= max(20, len(present_strings) // 2):
+            return COLUMN_CATEGORICAL, strings, mask
+        return COLUMN_TEXT, strings, mask
+
+    @staticmethod
+    def _looks_like_identifier(name: str) -> bool:
+        lowered = name.lower()
+        return lowered == 'id' or lowered.endswith('_id') or lowered.startswith('id_')
+
+
+class TableProfile:
+    """
+    Perfil de uma tabela (lista de registros ou colunas já tipadas)
+    """
+
+    def __init__(self, name: str, columns: dict, top_k: int = 5, max_groups: int = 20, max_periods: int = 36):
+        self.name = name
+        self.top_k = top_k
+        self.max_groups = max_groups
+        self.max_periods = max_periods
+        self.columns = [ColumnProfile(column, values) for column, values in columns.items()]
+        self.rows = self.columns[0].size if self.columns else 0
+
+    @classmethod
+    def from_records(cls, name: str, records: list, **options):
+        return cls(name, records_to_columns(records), **options)
+
+    def _of_kind(self, kind: str) -> list:
+        return [column for column in self.columns if column.kind == kind]
+
+    def numeric_summary(self) -> dict:
+        summary = {}
+        for column in self._of_kind(COLUMN_NUMERIC):
+            present = column.values[column.mask]
+            if not present.size:
+                continue
+            summary[column.name] = {
+                'contagem': int(present.size),
+                'ausentes': column.missing,
+                'soma': float(present.sum()),
+                'media': float(present.mean()),
+                'mediana': float(np.median(present)),
+                'desvio_padrao': float(present.std()),
+                'minimo': float(present.min()),
+                'maximo': float(present.max()),
+            }
+        return summary
+
+    def categorical_summary(self) -> dict:
+        summary = {}
+        for column in self._of_kind(COLUMN_CATEGORICAL):
+            labels, counts = np.unique(column.values[column.mask].astype(str), return_counts=True)
+            order = np.argsort(-counts, kind='stable')[:self.top_k]
+            summary[column.name] = {
+                'distintos': int(labels.size),
+                'top': [(str(labels[index]), int(counts[index])) for index in order],
+            }
+        return summary
+
+    def group_by(self) -> dict:
+        """{(categoria, medida): [(grupo, soma, média, contagem)]} ordenado pela soma"""
+        groups = {}
+        measures = self._of_kind(COLUMN_NUMERIC)
+        for category in self._of_kind(COLUMN_CATEGORICAL):
+            labels, inverse = np.unique(category.values.astype(str), return_inverse=True)
+            if labels.size > self.max_groups or labels.size < 2:
+                continue
+            for measure in measures:
+                valid = category.mask & measure.mask
+                if not valid.any():
+                    continue
+                sums = np.bincount(inverse[valid], weights=measure.values[valid], minlength=labels.size)
+                counts = np.bincount(inverse[valid], minlength=labels.size)
+                means = np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0)
+                order = [index for index in np.argsort(-sums, kind='stable') if counts[index]][:self.top_k]
+                groups[(category.name, measure.name)] = [
+                    (str(labels[index]), float(sums[index]), float(means[index]), int(counts[index])) for index in order
+                ]
+        return groups
+
+    def periods(self) -> dict:
+        """
+        {(data, medida): [(período, soma, variação % sobre o anterior)]}, por mês
+        (por dia se tudo cair no mesmo mês, por ano se houver mais de max_periods meses)
+        """
+        trends = {}
+        for date in self._of_kind(COLUMN_DATE):
+            if not date.mask.any():
+                continue
+            month_count = np.unique(date.values[date.mask].astype('datetime64[M]')).size
+            unit = 'D' if month_count == 1 else 'M' if month_count <= self.max_periods else 'Y'
+            buckets = date.values.astype(f'datetime64[{unit}]')
+            labels, inverse = np.unique(buckets[date.mask], return_inverse=True)
+            if labels.size < 2:
+                continue
+            for measure in [None] + self._of_kind(COLUMN_NUMERIC):
+                if measure is None:
+                    totals = np.bincount(inverse, minlength=labels.size).astype(np.float64)
+                    name = 'registros'
+                else:
+                    valid = measure.mask[date.mask]
+                    totals = np.bincount(inverse[valid], weights=measure.values[date.mask][valid], minlength=labels.size)
+                    name = measure.name
+                previous = np.concatenate(([np.nan], totals[:-1]))
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    delta = np.where(previous > 0, (totals - previous) / previous * 100, np.nan)
+                trends[(date.name, name)] = [
+                    (str(label), float(total), None if np.isnan(change) else float(change))
+                    for label, total, change in zip(labels, totals, delta)
+                ]
+        return trends
+
+    def date_ranges(self) -> dict:
+        return {
+            column.name: (str(column.values[column.mask].min()), str(column.values[column.mask].max()))
+            for column in self._of_kind(COLUMN_DATE) if column.mask.any()
+        }
+
+    def top_records(self) -> dict:
+        """{medida: [(rótulo do registro, valor)]} dos maiores valores de cada medida"""
+        label_column = next(iter(self._of_kind(COLUMN_TEXT) + self._of_kind(COLUMN_CATEGORICAL)), None)
+        tops = {}
+        for measure in self._of_kind(COLUMN_NUMERIC):
+            indexes = np.flatnonzero(measure.mask)
+            if indexes.size <= self.top_k:
+                continue
+            order = indexes[np.argsort(-measure.values[indexes], kind='stable')[:self.top_k]]
+            tops[measure.name] = [
+                (str(label_column.values[index]) if label_column is not None else f"#{index + 1}", float(measure.values[index]))
+                for index in order
+            ]
+        return tops
+
+    def to_dict(self) -> dict:
+        return {
+            'tabela': self.name,
+            'registros': self.rows,
+            'colunas': {column.name: column.kind for column in self.columns},
+            'numericas': self.numeric_summary(),
+            'categoricas': self.categorical_summary(),
+            'periodos_datas': self.date_ranges(),
+            'agrupamentos': {f"{measure} por {category}": rows for (category, measure), rows in self.group_by().items()},
+            'evolucao': {f"{measure} por {date}": rows for (date, measure), rows in self.periods().items()},
+            'maiores': self.top_records(),
+        }
+
+
+def _number(value: float) -> str:
+    if not math.isfinite(value):
+        return str(value)
+    if value == int(value) and abs(value) < 1e15:
+        return f"{int(value)}"
+    return f"{value:.2f}"
+
+
+def render_profile(profile: TableProfile) -> str:
+    """Perfil em texto compacto para o prompt"""
+    lines = [f"Tabela {profile.name}: {profile.rows} registros; colunas: "
+             + ', '.join(f"{column.name} ({column.kind})" for column in profile.columns)]
+    for name, stats in profile.numeric_summary().items():
+        lines.append(f"- {name}: soma {_number(stats['soma'])}, média {_number(stats['media'])}, "
+                     f"mediana {_number(stats['mediana'])}, desvio {_number(stats['desvio_padrao'])}, "
+                     f"mín {_number(stats['minimo'])}, máx {_number(stats['maximo'])}"
+                     + (f", ausentes {stats['ausentes']}" if stats['ausentes'] else ''))
+    for name, (start, end) in profile.date_ranges().items():
+        lines.append(f"- {name}: de {start} a {end}")
+    for name, stats in profile.categorical_summary().items():
+        top = ', '.join(f"{label} ({count})" for label, count in stats['top'])
+        lines.append(f"- {name}: {stats['distintos']} valores distintos; mais frequentes: {top}")
+    for (category, measure), rows in profile.group_by().items():
+        values = '; '.join(f"{label}: soma {_number(total)}, média {_number(mean)}, n={count}"
+                           for label, total, mean, count in rows)
+        lines.append(f"- {measure} por {category}: {values}")
+    for (date, measure), rows in profile.periods().items():
+        values = '; '.join(f"{label}: {_number(total)}" + ('' if change is None else f" ({change:+.1f}%)")
+                           for label, total, change in rows)
+        lines.append(f"- {measure} por período ({date}): {values}")
+    for measure, rows in profile.top_records().items():
+        lines.append(f"- maiores {measure}: " + '; '.join(f"{label}: {_number(value)}" for label, value in rows))
+    return '\n'.join(lines)
+
+
+def profile_data(data, top_k: int = 5, min_rows: int = 3) -> list:
+    """Perfis de todas as listas de registros do dado JSON"""
+    return [TableProfile.from_records(path, records, top_k=top_k)
+            for path, records in find_record_tables(data, min_rows=min_rows)]
+
+
+def sample_records(data, max_rows: int, min_rows: int = 3):
+    """Cópia do dado com cada lista de registros reduzida às primeiras max_rows linhas"""
+    if table_columns(data) is not None and len(data) >= min_rows:
+        return data[:max_rows]
+    if isinstance(data, dict):
+        return {key: sample_records(value, max_rows, min_rows) for key, value in data.items()}
+    if isinstance(data, list):
+        return [sample_records(value, max_rows, min_rows) for value in data]
+    return data
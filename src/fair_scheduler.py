@@ -0,0 +1,258 @@
+"""
+Escalonador justo multi-tenant para chamadas ao modelo
+
+Cada tenant (token de API, usuário ou IP do cliente) tem sua própria fila.
+Um conjunto fixo de workers despacha as chamadas usando Deficit Round-Robin
+em dois níveis: primeiro entre classes de prioridade (interactive / batch,
+com pesos) e depois entre os tenants de cada classe (com pesos por tenant e
+custo por chamada). Assim uma execução com muitos colaboradores não monopoliza
+os workers nem a cota da API.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from metrics import metrics as default_metrics
+
+PRIORITY_INTERACTIVE = 'interactive'
+PRIORITY_BATCH = 'batch'
+DEFAULT_CLASS_WEIGHTS = {PRIORITY_INTERACTIVE: 4.0, PRIORITY_BATCH: 1.0}
+
+
+class _Job:
+    __slots__ = ('tenant', 'priority', 'cost', 'fn', 'args', 'kwargs', 'future', 'submitted_at')
+
+    def __init__(self, tenant, priority, cost, fn, args, kwargs):
+        self.tenant = tenant
+        self.priority = priority
+        self.cost = cost
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.submitted_at = time.monotonic()
+
+
+class _DeficitRoundRobin:
+    """
+    Deficit Round-Robin sobre filas identificadas por chave
+    """
+
+    def __init__(self, quantum: float = 1.0):
+        self.quantum = quantum
+        self.queues = {}
+        self.ring = deque()
+        self.deficits = {}
+
+    def __len__(self):
+        return len(self.ring)
+
+    def push(self, key, item):
+        queue = self.queues.get(key)
+        if not queue:
+            queue = self.queues[key] = deque()
+            self.ring.append(key)
+            self.deficits[key] = 0.0
+        queue.append(item)
+
+    def pop(self, weight_of, cost_of):
+        """Retira o próximo item respeitando pesos e custos; None se vazio"""
+        while self.ring:
+            key = self.ring[0]
+            queue = self.queues[key]
+            cost = cost_of(queue[0])
+            if self.deficits[key] >= cost:
+                self.deficits[key] -= cost
+                item = queue.popleft()
+                if not queue:
+                    # Fila esvaziada: sai do anel e perde o crédito acumulado
+                    self.ring.popleft()
+                    del self.queues[key]
+                    del self.deficits[key]
+                return item
+            self.ring.rotate(-1)
+            head = self.ring[0]
+            self.deficits[head] += self.quantum * weight_of(head)
+        return None
+
+
+class FairScheduler:
+    """
+    Ponto de despacho das chamadas ao modelo com filas por tenant
+    """
+
+    def __init__(self, workers: int = 8, class_weights: dict = None, tenant_weights: dict = None,
+                 metrics=None):
+        self.workers = max(1, int(workers))
+        self.class_weights = dict(class_weights or DEFAULT_CLASS_WEIGHTS)
+        self.tenant_weights = dict(tenant_weights or {})
+        self.metrics = metrics or default_metrics
+        self._condition = threading.Condition()
+        self._classes = _DeficitRoundRobin()
+        self._tenants = {priority: _DeficitRoundRobin() for priority in self.class_weights}
+        self._threads = []
+        self._stats = {}
+        self._running = 0
+        self._shutdown = False
+
+        self.metrics.describe('scheduler_wait_seconds', 'Tempo de espera das chamadas ao modelo por tenant')
+        self.metrics.describe('scheduler_queued_calls', 'Chamadas ao modelo aguardando despacho')
+
+    # --- Configuração ---
+    def set_tenant_weight(self, tenant: str, weight: float):
+        with self._condition:
+            self.tenant_weights[tenant] = float(weight)
+
+    def _tenant_weight(self, tenant) -> float:
+        return self.tenant_weights.get(tenant, 1.0)
+
+    def _class_weight(self, priority) -> float:
+        return self.class_weights.get(priority, 1.0)
+
+    def _start_workers(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._worker_loop, name=f"fair-scheduler-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    # --- Submissão ---
+    def submit(self, tenant: str, fn, *args, priority: str = PRIORITY_INTERACTIVE, cost: float = 1.0, **kwargs) -> Future:
+        """Enfileira fn(*args, **kwargs) na fila do tenant e retorna um Future"""
+        if priority not in self._tenants:
+            priority = PRIORITY_INTERACTIVE
+        job = _Job(tenant, priority, max(float(cost), 0.01), fn, args, kwargs)
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("Escalonador encerrado")
+            self._start_workers()
+            # Uma ficha por chamada no anel de classes; a chamada em si fica na fila do tenant
+            self._classes.push(priority, priority)
+            self._tenants[priority].push(tenant, job)
+            stats = self._tenant_stats(tenant)
+            stats['queued'] += 1
+            self._publish()
+            self._condition.notify()
+        return job.future
+
+    def run(self, tenant: str, fn, *args, priority: str = PRIORITY_INTERACTIVE, cost: float = 1.0, **kwargs):
+        """Submete e aguarda o resultado (propaga exceções de fn)"""
+        return self.submit(tenant, fn, *args, priority=priority, cost=cost, **kwargs).result()
+
+    # --- Despacho ---
+    def _next_job(self):
+        priority = self._classes.pop(self._class_weight, lambda item: 1.0)
+        if priority is None:
+            return None
+        return self._tenants[priority].pop(self._tenant_weight, lambda item: item.cost)
+
+    def _worker_loop(self):
+        while True:
+            with self._condition:
+                job = self._next_job()
+                while job is None:
+                    if self._shutdown:
+                        return
+                    self._condition.wait()
+                    job = self._next_job()
+                waited = time.monotonic() - job.submitted_at
+                stats = self._tenant_stats(job.tenant)
+                stats['queued'] -= 1
+                stats['dispatched'] += 1
+                stats['wait_total'] += waited
+                stats['wait_max'] = max(stats['wait_max'], waited)
+                self._running += 1
+                self._publish()
+
+            self.metrics.observe('scheduler_wait_seconds', waited, labels={'tenant': job.tenant, 'priority': job.priority})
+            if job.future.set_running_or_notify_cancel():
+                try:
+                    job.future.set_result(job.fn(*job.args, **job.kwargs))
+                except BaseException as e:
+                    job.future.set_exception(e)
+
+            with self._condition:
+                self._running -= 1
+                self._publish()
+
+    # --- Estatísticas ---
+    def _tenant_stats(self, tenant) -> dict:
+        stats = self._stats.get(tenant)
+        if stats is None:
+            stats = self._stats[tenant] = {'queued': 0, 'dispatched': 0, 'wait_total': 0.0, 'wait_max': 0.0}
+        return stats
+
+    def _publish(self):
+        queued = sum(stats['queued'] for stats in self._stats.values())
+        self.metrics.set_gauge('scheduler_queued_calls', queued)
+        self.metrics.set_gauge('scheduler_running_calls', self._running)
+
+    def snapshot(self) -> dict:
+        """Estado atual e tempo de espera por tenant"""
+        with self._condition:
+            tenants = {
+                tenant: {
+                    'queued': stats['queued'],
+                    'dispatched': stats['dispatched'],
+                    'avg_wait_seconds': round(stats['wait_total'] / stats['dispatched'], 3) if stats['dispatched'] else 0.0,
+                    'max_wait_seconds': round(stats['wait_max'], 3),
+                    'weight': self._tenant_weight(tenant)
+                }
+                for tenant, stats in self._stats.items()
+            }
+            return {'workers': self.workers, 'running': self._running, 'tenants': tenants}
+
+    def shutdown(self):
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+
+
+def parse_tenant_weights(spec: str) -> dict:
+    """Converte 'user:ana=2,ip:10.0.0.1=0.5' em {'user:ana': 2.0, 'ip:10.0.0.1': 0.5}"""
+    weights = {}
+    for item in (spec or "").split(','):
+        if '=' not in item:
+            continue
+        tenant, _, weight = item.rpartition('=')
+        try:
+            weights[tenant.strip()] = float(weight)
+        except ValueError:
+            continue
+    return weights
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def parse_api_tokens(spec: str) -> dict:
+    """
+    Converte o JSON de AGENT_API_TOKENS em {sha256 do token: credencial}.
+    Cada chave é o token (ou 'sha256:<hex>' do token) e o valor define o
+    usuário, a classe de prioridade e se o portador pode repassar o usuário
+    final em X-User-Id (gateways confiáveis), ex.:
+    {"sha256:ab12...": {"user": "etl", "priority": "batch"},
+     "token-do-portal": {"user": "portal", "forward_user": true}}
+    Entradas inválidas e JSON inválido são ignorados.
+    """
+    try:
+        raw = json.loads(spec) if spec else {}
+    except ValueError:
+        return {}
+    if not isinstance(raw, dict):
+        return {}
+    tokens = {}
+    for key, values in raw.items():
+        if not isinstance(values, dict) or not key:
+            continue
+        digest = key[len('sha256:'):].lower() if key.startswith('sha256:') else token_digest(key)
+        priority = values.get('priority', PRIORITY_INTERACTIVE)
+        tokens[digest] = {
+            'user': str(values['user']) if values.get('user') else None,
+            'priority': priority if priority in (PRIORITY_INTERACTIVE, PRIORITY_BATCH) else PRIORITY_INTERACTIVE,
+            'forward_user': bool(values.get('forward_user')),
+        }
+    return tokens
@@ -0,0 +1,228 @@
+"""
+Perfis de geração por papel e tipo de objetivo
+
+Toda chamada ao Gemini enviava o mesmo generationConfig (temperatura 0.7 e
+teto de 8192 tokens de saída), fosse um outline de colaborador, um resumo
+de 500 palavras ou um plano estratégico completo. O registro resolve o
+perfil de cada chamada por (papel, tipo de objetivo), com o papel como
+padrão: teto de tokens de saída, temperatura, topK/topP, sequências de
+parada e, quando a saída é estruturada, responseMimeType/responseSchema.
+Tetos menores nos outlines reduzem a latência dessas chamadas.
+
+Os padrões seguem o tamanho esperado de cada saída: outlines com
+tópicos numerados, seções isoladas do escritor por seções e resumos de até
+500 palavras têm tetos menores; documentos completos mantêm o teto de 8192.
+OutputLengthTracker registra o tamanho real de cada saída e se ela parou no
+teto (finishReason MAX_TOKENS). Perfis que truncam com frequência são
+marcados, com um teto sugerido maior; perfis cujo p95 fica bem abaixo do
+teto recebem um teto sugerido menor (p95 + 50%).
+"""
+import json
+import math
+import threading
+from collections import deque
+
+ROLE_RESEARCHER = 'researcher'
+ROLE_COLLABORATOR = 'collaborator'
+ROLE_WRITER = 'writer'
+ROLE_SECTION = 'section'
+ROLE_REGENERATE = 'regenerate'
+ROLE_DEFAULT = 'default'
+
+# Campos do perfil -> chaves do generationConfig
+CONFIG_FIELDS = (
+    ('temperature', 'temperature'),
+    ('top_k', 'topK'),
+    ('top_p', 'topP'),
+    ('max_output_tokens', 'maxOutputTokens'),
+    ('stop_sequences', 'stopSequences'),
+    ('response_mime_type', 'responseMimeType'),
+    ('response_schema', 'responseSchema'),
+)
+
+DEFAULT_PROFILES = {
+    ROLE_DEFAULT: {'temperature': 0.7, 'top_k': 40, 'top_p': 0.95, 'max_output_tokens': 8192},
+    # Outlines: estrutura numerada com tópicos, menos variação
+    ROLE_RESEARCHER: {'temperature': 0.4, 'max_output_tokens': 2048},
+    ROLE_COLLABORATOR: {'temperature': 0.4, 'max_output_tokens': 1536},
+    ROLE_WRITER: {'max_output_tokens': 8192},
+    ROLE_SECTION: {'max_output_tokens': 2048},
+    ROLE_REGENERATE: {'max_output_tokens': 2048},
+    # Resumos: no máximo 500 palavras
+    f'{ROLE_RESEARCHER}:summary': {'max_output_tokens': 1024},
+    f'{ROLE_WRITER}:summary': {'max_output_tokens': 2048},
+}
+
+
+class GenerationProfile:
+    """
+    Parâmetros de geração resolvidos para um (papel, tipo de objetivo)
+    """
+
+    __slots__ = ('role', 'goal_type', 'source', 'temperature', 'top_k', 'top_p', 'max_output_tokens', 'stop_sequences',
+                 'response_mime_type', 'response_schema')
+
+    def __init__(self, role: str, goal_type: str, source: str, values: dict):
+        self.role = role
+        self.goal_type = goal_type
+        # Entradas do registro usadas, da mais geral para a mais específica
+        self.source = source
+        self.temperature = values.get('temperature')
+        self.top_k = values.get('top_k')
+        self.top_p = values.get('top_p')
+        self.max_output_tokens = values.get('max_output_tokens')
+        self.stop_sequences = tuple(values.get('stop_sequences') or ())
+        # Saída estruturada (ex.: application/json com esquema)
+        self.response_mime_type = values.get('response_mime_type')
+        self.response_schema = values.get('response_schema')
+
+    @property
+    def key(self) -> str:
+        return f"{self.role}:{self.goal_type}"
+
+    def replace(self, **changes):
+        """Cópia do perfil com alguns campos trocados (o perfil do registro não muda)"""
+        values = {name: getattr(self, name) for name, _ in CONFIG_FIELDS}
+        values.update(changes)
+        return GenerationProfile(self.role, self.goal_type, self.source, values)
+
+    def to_config(self) -> dict:
+        """generationConfig da chamada (campos não definidos ficam de fora)"""
+        config = {}
+        for name, config_key in CONFIG_FIELDS:
+            value = getattr(self, name)
+            if value is not None and value != ():
+                config[config_key] = list(value) if name == 'stop_sequences' else value
+        return config
+
+    def to_dict(self) -> dict:
+        return {'role': self.role, 'goal_type': self.goal_type, 'source': self.source, **self.to_config()}
+
+
+def parse_profile_overrides(spec: str) -> dict:
+    """
+    Converte o JSON de AGENT_GENERATION_PROFILES ({"researcher": {...},
+    "writer:summary": {...}}) em entradas do registro; chaves desconhecidas e
+    JSON inválido são ignorados
+    """
+    try:
+        raw = json.loads(spec) if spec else {}
+    except ValueError:
+        return {}
+    if not isinstance(raw, dict):
+        return {}
+    fields = {name for name, _ in CONFIG_FIELDS}
+    aliases = {config_key: name for name, config_key in CONFIG_FIELDS}
+    overrides = {}
+    for key, values in raw.items():
+        if not isinstance(values, dict):
+            continue
+        entry = {}
+        for field, value in values.items():
+            field = aliases.get(field, field)
+            if field in fields:
+                entry[field] = value
+        overrides[str(key)] = entry
+    return overrides
+
+
+class GenerationProfileRegistry:
+    """
+    Perfis por 'papel' e 'papel:tipo_de_objetivo', sobre o perfil 'default'.
+    Resolução: default <- papel <- papel:tipo (o mais específico prevalece
+    campo a campo). Os perfis resolvidos ficam em cache.
+    """
+
+    def __init__(self, profiles: dict = None, overrides: dict = None):
+        entries = {key: dict(values) for key, values in (DEFAULT_PROFILES if profiles is None else profiles).items()}
+        for key, values in (overrides or {}).items():
+            entries.setdefault(key, {}).update(values)
+        entries.setdefault(ROLE_DEFAULT, {})
+        self._entries = entries
+        self._resolved = {}
+        self._lock = threading.Lock()
+
+    def get(self, role: str, goal_type: str = 'general') -> GenerationProfile:
+        cache_key = (role, goal_type)
+        profile = self._resolved.get(cache_key)
+        if profile is not None:
+            return profile
+        values = {}
+        sources = []
+        for key in (ROLE_DEFAULT, role, f"{role}:{goal_type}"):
+            if key in self._entries and key not in sources:
+                values.update(self._entries[key])
+                sources.append(key)
+        profile = GenerationProfile(role, goal_type, '+'.join(sources), values)
+        with self._lock:
+            self._resolved[cache_key] = profile
+        return profile
+
+    def entries(self) -> dict:
+        return {key: dict(values) for key, values in self._entries.items()}
+
+
+def _round_tokens(tokens: float) -> int:
+    return max(256, int(math.ceil(tokens / 256) * 256))
+
+
+class OutputLengthTracker:
+    """
+    Tamanho das saídas e truncamentos por perfil (papel:tipo de objetivo),
+    com janela das últimas max_samples saídas de cada perfil
+    """
+
+    def __init__(self, max_samples: int = 200, flag_rate: float = 0.2, min_samples: int = 5):
+        self.max_samples = max_samples
+        self.flag_rate = flag_rate
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._profiles = {}
+
+    def record(self, profile: GenerationProfile, output_tokens: int, truncated: bool):
+        with self._lock:
+            stats = self._profiles.get(profile.key)
+            if stats is None:
+                stats = self._profiles[profile.key] = {'calls': 0, 'truncated': 0,
+                                                       'recent': deque(maxlen=self.max_samples)}
+            stats['calls'] += 1
+            stats['truncated'] += 1 if truncated else 0
+            stats['max_output_tokens'] = profile.max_output_tokens
+            stats['recent'].append((int(output_tokens), bool(truncated)))
+
+    def _summary(self, stats: dict) -> dict:
+        recent = stats['recent']
+        lengths = sorted(tokens for tokens, _ in recent)
+        truncated_recent = sum(1 for _, truncated in recent if truncated)
+        rate = truncated_recent / len(recent) if recent else 0.0
+        p95 = lengths[min(len(lengths) - 1, int(math.ceil(len(lengths) * 0.95)) - 1)] if lengths else 0
+        summary = {
+            'calls': stats['calls'],
+            'truncated': stats['truncated'],
+            'max_output_tokens': stats.get('max_output_tokens'),
+            'mean_output_tokens': round(sum(lengths) / len(lengths), 1) if lengths else 0.0,
+            'p50_output_tokens': lengths[len(lengths) // 2] if lengths else 0,
+            'p95_output_tokens': p95,
+            'truncation_rate': round(rate, 4),
+            'flagged': len(recent) >= self.min_samples and rate >= self.flag_rate,
+        }
+        ceiling = stats.get('max_output_tokens')
+        if ceiling and summary['flagged']:
+            # Saídas truncadas param no teto: o p95 não mostra o tamanho real, dobra o teto
+            summary['suggested_max_output_tokens'] = _round_tokens(ceiling * 2)
+        elif ceiling and len(recent) >= self.min_samples and p95 * 2 < ceiling:
+            # Folga grande: teto menor, com margem de 50% sobre o p95
+            summary['suggested_max_output_tokens'] = _round_tokens(p95 * 1.5)
+        return summary
+
+    def is_flagged(self, profile: GenerationProfile) -> bool:
+        with self._lock:
+            stats = self._profiles.get(profile.key)
+            return stats is not None and self._summary(stats)['flagged']
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {key: self._summary(stats) for key, stats in sorted(self._profiles.items())}
+
+    def flagged(self) -> list:
+        return [key for key, summary in self.snapshot().items() if summary['flagged']]
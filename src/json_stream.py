@@ -0,0 +1,307 @@
+"""
+Leitura incremental de JSON em eventos
+
+JsonEventReader percorre o JSON a partir de blocos de texto (ex.:
+UploadedText.iter_text), sem montar o documento inteiro. Objetos e listas
+dos níveis externos viram eventos (start_map, map_key, end_map, start_array,
+end_array); cada item de uma lista é decodificado sozinho pelo
+json.JSONDecoder (em C) e emitido como um evento 'value'. Assim um arquivo
+com milhões de registros é lido um registro por vez, com memória limitada
+ao bloco atual e ao maior registro.
+
+Erros de sintaxe são reportados assim que encontrados, com linha e coluna
+no arquivo original (JsonStreamError).
+
+summarize_json_stream usa os eventos para validar o arquivo, listar as
+chaves de primeiro nível, contar os registros de cada lista e montar
+colunas tipadas (tabular_ingestion.ParsedTable) com uma amostra de linhas.
+"""
+import json
+import re
+from json.decoder import scanstring
+
+from tabular_ingestion import ParsedTable
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_DECODER = json.JSONDecoder()
+# Itens de listas que não são registros: quantos manter no resumo
+MAX_LIST_ITEMS = 50
+
+
+class JsonStreamError(ValueError):
+    """JSON inválido, com a posição no arquivo"""
+
+    def __init__(self, message: str, offset: int, line: int, column: int):
+        super().__init__(f"{message}: linha {line}, coluna {column}")
+        self.msg = message
+        self.offset = offset
+        self.line = line
+        self.column = column
+
+
+class JsonEventReader:
+    """
+    Eventos (tipo, caminho, valor) de um JSON lido em blocos. Objetos com
+    profundidade menor que expand_depth são expandidos em eventos; listas
+    nesses níveis também, com cada item decodificado inteiro.
+    """
+
+    def __init__(self, chunks, expand_depth: int = 2, compact_bytes: int = 1024 * 1024):
+        self._chunks = iter(chunks)
+        self.expand_depth = expand_depth
+        self.compact_bytes = compact_bytes
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        # Texto já descartado do início do buffer: deslocamento, linhas e início da última linha
+        self._base = 0
+        self._base_lines = 0
+        self._base_line_start = 0
+
+    # --- Buffer ---
+
+    def _read_chunk(self) -> bool:
+        if self._eof:
+            return False
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self._eof = True
+            return False
+        if self._pos > self.compact_bytes:
+            # Descarta o texto já consumido, mantendo a contagem de linhas para as mensagens de erro
+            consumed = self._buffer[:self._pos]
+            newlines = consumed.count('\n')
+            if newlines:
+                self._base_line_start = self._base + consumed.rfind('\n') + 1
+            self._base_lines += newlines
+            self._base += self._pos
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        self._buffer += chunk
+        return True
+
+    def _grow(self) -> bool:
+        """Lê até dobrar o texto disponível a partir da posição atual (custo linear para itens grandes)"""
+        target = len(self._buffer) + max(len(self._buffer) - self._pos, 1)
+        grew = False
+        while len(self._buffer) < target and self._read_chunk():
+            grew = True
+        return grew
+
+    def _skip_whitespace(self):
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer) or not self._read_chunk():
+                return
+
+    def _peek(self) -> str:
+        self._skip_whitespace()
+        return self._buffer[self._pos] if self._pos < len(self._buffer) else ''
+
+    def position(self, index: int = None) -> tuple:
+        """(deslocamento, linha, coluna) de uma posição do buffer, no arquivo inteiro (base 1)"""
+        index = self._pos if index is None else index
+        offset = self._base + index
+        newlines = self._buffer.count('\n', 0, index)
+        line = self._base_lines + newlines + 1
+        if newlines:
+            line_start = self._base + self._buffer.rfind('\n', 0, index) + 1
+        else:
+            line_start = self._base_line_start
+        return offset, line, offset - line_start + 1
+
+    def _error(self, message: str, index: int = None):
+        offset, line, column = self.position(index)
+        return JsonStreamError(message, offset, line, column)
+
+    # --- Decodificação ---
+
+    def _decode(self, decode):
+        """Aplica decode(buffer, pos) -> (valor, fim), lendo mais blocos se o item estiver incompleto"""
+        while True:
+            try:
+                value, end = decode(self._buffer, self._pos)
+            except json.JSONDecodeError as error:
+                incomplete = error.pos >= len(self._buffer) - 16 or error.msg.startswith('Unterminated')
+                if incomplete and self._grow():
+                    continue
+                raise self._error(error.msg, error.pos) from None
+            # Número ou literal no fim do buffer pode continuar no próximo bloco
+            if end >= len(self._buffer) and self._grow():
+                continue
+            self._pos = end
+            return value
+
+    def _decode_value(self):
+        return self._decode(_DECODER.raw_decode)
+
+    def _decode_key(self):
+        if self._peek() != '"':
+            raise self._error("Chave entre aspas esperada")
+        return self._decode(lambda buffer, pos: scanstring(buffer, pos + 1))
+
+    def _expect(self, expected: str):
+        char = self._peek()
+        if char != expected:
+            raise self._error(f"'{expected}' esperado" if char else f"Fim inesperado do arquivo, '{expected}' esperado")
+        self._pos += 1
+
+    # --- Eventos ---
+
+    def events(self):
+        self._skip_whitespace()
+        if not self._peek():
+            raise self._error("Documento JSON vazio")
+        yield from self._value(path='', depth=0)
+        if self._peek():
+            raise self._error("Conteúdo extra após o fim do JSON")
+
+    def _value(self, path: str, depth: int):
+        char = self._peek()
+        if char == '{' and depth < self.expand_depth:
+            yield from self._object(path, depth)
+        elif char == '[' and depth < self.expand_depth:
+            yield from self._array(path, depth)
+        elif not char:
+            raise self._error("Fim inesperado do arquivo, valor esperado")
+        else:
+            yield 'value', path, self._decode_value()
+
+    def _object(self, path: str, depth: int):
+        self._pos += 1
+        yield 'start_map', path, None
+        if self._peek() == '}':
+            self._pos += 1
+            yield 'end_map', path, None
+            return
+        while True:
+            key = self._decode_key()
+            yield 'map_key', path, key
+            self._expect(':')
+            yield from self._value(f"{path}.{key}" if path else key, depth + 1)
+            char = self._peek()
+            self._pos += 1
+            if char == '}':
+                yield 'end_map', path, None
+                return
+            if char != ',':
+                raise self._error("',' ou '}' esperado" if char else "Fim inesperado do arquivo, '}' esperado",
+                                  self._pos - 1 if char else None)
+
+    def _array(self, path: str, depth: int):
+        self._pos += 1
+        yield 'start_array', path, None
+        if self._peek() == ']':
+            self._pos += 1
+            yield 'end_array', path, None
+            return
+        item_path = f"{path}[]"
+        decode = _DECODER.raw_decode
+        while True:
+            if not self._peek():
+                raise self._error("Fim inesperado do arquivo, valor esperado")
+            # Itens de lista são decodificados inteiros (um registro por evento)
+            try:
+                value, end = decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                end = len(self._buffer)
+            if end < len(self._buffer):
+                self._pos = end
+            else:
+                # Item incompleto ou inválido: caminho com releitura e mensagem de erro
+                value = self._decode_value()
+            yield 'value', item_path, value
+            char = self._peek()
+            self._pos += 1
+            if char == ']':
+                yield 'end_array', path, None
+                return
+            if char != ',':
+                raise self._error("',' ou ']' esperado" if char else "Fim inesperado do arquivo, ']' esperado",
+                                  self._pos - 1 if char else None)
+
+
+class JsonSummary:
+    """
+    Resultado de summarize_json_stream: esqueleto do documento (listas de
+    registros reduzidas à amostra), tabelas tipadas e contagens
+    """
+
+    def __init__(self):
+        self.skeleton = None
+        self.top_level_keys = []
+        self.tables = {}
+        self.list_counts = {}
+
+    @property
+    def record_count(self) -> int:
+        return sum(table.rows for table in self.tables.values())
+
+
+def summarize_json_stream(chunks, sample_rows: int = 20, max_list_items: int = MAX_LIST_ITEMS,
+                          expand_depth: int = 3, batch_rows: int = 8192, **table_options) -> JsonSummary:
+    """
+    Lê o JSON em streaming e monta o resumo. Listas de objetos viram
+    ParsedTable (perfil completo, amostra de sample_rows linhas); demais
+    listas guardam só os primeiros max_list_items itens.
+    """
+    summary = JsonSummary()
+    # Pilha de (contêiner, chave pendente, caminho)
+    stack = []
+    # Registros aguardando conversão em bloco, por lista
+    batches = {}
+
+    def flush(list_path):
+        pending = batches.pop(list_path, None)
+        if pending:
+            summary.tables[list_path].add_records(pending)
+
+    def attach(value):
+        if not stack:
+            summary.skeleton = value
+            return
+        container, key, _ = stack[-1]
+        if isinstance(container, dict):
+            container[key] = value
+        else:
+            container.append(value)
+
+    for event, path, value in JsonEventReader(chunks, expand_depth=expand_depth).events():
+        if event == 'start_map':
+            container = {}
+            attach(container)
+            stack.append([container, None, path])
+        elif event == 'map_key':
+            stack[-1][1] = value
+            if len(stack) == 1:
+                summary.top_level_keys.append(value)
+        elif event == 'start_array':
+            container = []
+            attach(container)
+            stack.append([container, None, path])
+        elif event == 'end_map':
+            stack.pop()
+        elif event == 'end_array':
+            flush(path)
+            stack.pop()
+        elif path.endswith('[]'):
+            # Item de lista
+            list_path = path[:-2]
+            container = stack[-1][0]
+            summary.list_counts[list_path] = summary.list_counts.get(list_path, 0) + 1
+            if isinstance(value, dict) and value:
+                table = summary.tables.get(list_path)
+                if table is None:
+                    name = list_path.rsplit('.', 1)[-1] or 'registros'
+                    table = summary.tables[list_path] = ParsedTable(name, 'json', sample_rows=sample_rows, **table_options)
+                if table.rows + len(batches.get(list_path, ())) < sample_rows:
+                    container.append(value)
+                pending = batches.setdefault(list_path, [])
+                pending.append(value)
+                if len(pending) >= batch_rows:
+                    flush(list_path)
+            elif len(container) < max_list_items:
+                container.append(value)
+        else:
+            attach(value)
+    return summary
@@ -0,0 +1,130 @@
+"""
+Matcher de palavras-chave em passada única
+
+Compila um conjunto de grupos de palavras-chave (rótulo -> palavras) em uma
+trie, no espírito de um autômato Aho-Corasick. A trie é executada pelo motor
+de expressões regulares em C (uma alternância aninhada dentro de um lookahead)
+e, para cada posição do texto, devolve a palavra mais longa que começa ali.
+As demais palavras que começam na mesma posição são exatamente os prefixos
+dela e vêm de uma tabela pré-calculada. Assim uma única varredura linear
+encontra todas as ocorrências (inclusive sobrepostas) de todas as palavras,
+com a mesma semântica de `palavra in texto`.
+"""
+import re
+
+
+class KeywordHits:
+    """
+    Resultado de uma varredura: ocorrências por palavra e por rótulo
+    """
+
+    def __init__(self, labels_by_keyword: dict, max_positions: int = 8):
+        self._labels_by_keyword = labels_by_keyword
+        self.max_positions = max_positions
+        self.keyword_counts = {}
+        self.keyword_positions = {}
+
+    def add(self, keyword: str, position: int):
+        count = self.keyword_counts.get(keyword, 0)
+        self.keyword_counts[keyword] = count + 1
+        if count < self.max_positions:
+            self.keyword_positions.setdefault(keyword, []).append(position)
+
+    def keywords_for(self, label) -> list:
+        """Palavras do rótulo encontradas no texto"""
+        return [kw for kw in self.keyword_counts if label in self._labels_by_keyword[kw]]
+
+    def has(self, label) -> bool:
+        return any(label in self._labels_by_keyword[kw] for kw in self.keyword_counts)
+
+    def labels(self) -> set:
+        found = set()
+        for keyword in self.keyword_counts:
+            found.update(self._labels_by_keyword[keyword])
+        return found
+
+    def count(self, label) -> int:
+        """Total de ocorrências de todas as palavras do rótulo"""
+        return sum(n for kw, n in self.keyword_counts.items() if label in self._labels_by_keyword[kw])
+
+    def first_position(self, label):
+        positions = [self.keyword_positions[kw][0] for kw in self.keywords_for(label)]
+        return min(positions) if positions else None
+
+
+class KeywordMatcher:
+    """
+    Vocabulário compilado uma única vez; varre o texto em uma passada
+    """
+
+    def __init__(self, groups: dict):
+        labels_by_keyword = {}
+        for label, keywords in groups.items():
+            for keyword in keywords:
+                labels_by_keyword.setdefault(keyword, set()).add(label)
+        self.labels_by_keyword = {kw: frozenset(labels) for kw, labels in labels_by_keyword.items()}
+        self.max_keyword_length = max((len(kw) for kw in self.labels_by_keyword), default=0)
+
+        # Palavras que começam na mesma posição que `kw` são exatamente seus prefixos
+        keywords = set(self.labels_by_keyword)
+        self._matches_at = {
+            kw: tuple(kw[:size] for size in range(1, len(kw) + 1) if kw[:size] in keywords)
+            for kw in keywords
+        }
+        self._pattern = re.compile("(?=(" + self._trie_pattern(keywords) + "))") if keywords else None
+
+    @staticmethod
+    def _trie_pattern(keywords) -> str:
+        trie = {}
+        for keyword in keywords:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[''] = {}
+
+        def build(node) -> str:
+            branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+            if not branches:
+                return ''
+            body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+            # Nó terminal: a continuação é opcional (gulosa, prefere a palavra mais longa)
+            return '(?:' + body + ')?' if '' in node else body
+
+        return build(trie)
+
+    def finditer(self, text: str, offset: int = 0):
+        """Gera (posição, palavra) para cada ocorrência de cada palavra no texto"""
+        if self._pattern is None:
+            return
+        matches_at = self._matches_at
+        for match in self._pattern.finditer(text):
+            start = match.start() + offset
+            for keyword in matches_at[match.group(1)]:
+                yield start, keyword
+
+    def scan(self, *segments, max_positions: int = 8) -> KeywordHits:
+        """
+        Varre os segmentos como se fossem um único texto concatenado, sem
+        concatená-los: cada segmento é varrido isoladamente e só as janelas
+        curtas nas junções são revisitadas para as palavras que as atravessam.
+        """
+        hits = KeywordHits(self.labels_by_keyword, max_positions=max_positions)
+        overlap = max(self.max_keyword_length - 1, 0)
+        carry = ""
+        offset = 0
+        for segment in segments:
+            if not segment:
+                continue
+            if carry and overlap:
+                window = carry + segment[:overlap]
+                window_start = offset - len(carry)
+                for position, keyword in self.finditer(window, window_start):
+                    # Apenas ocorrências que começam antes e terminam depois da junção
+                    if position < offset < position + len(keyword):
+                        hits.add(keyword, position)
+            for position, keyword in self.finditer(segment, offset):
+                hits.add(keyword, position)
+            offset += len(segment)
+            if overlap:
+                carry = (carry + segment)[-overlap:] if len(segment) < overlap else segment[-overlap:]
+        return hits
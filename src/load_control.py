@@ -0,0 +1,270 @@
+"""
+Controle de carga do sistema multi-agente
+
+Limita o número de execuções simultâneas de /api/run_agent_system com uma
+fila de espera limitada. Requisições que não cabem na fila são rejeitadas
+imediatamente (HTTP 503 com Retry-After) em vez de disputarem a mesma cota
+da API Gemini com todas as outras.
+
+Também define a política de sobrecarga que degrada progressivamente o
+pipeline colaborativo conforme a fila cresce e o modelo fica mais lento.
+"""
+import math
+import threading
+import time
+from collections import deque
+
+from metrics import metrics as default_metrics
+
+
+class AdmissionTicket:
+    """
+    Representa uma requisição na fila de admissão
+    """
+
+    __slots__ = ('state', 'enqueued_at', 'admitted_at')
+
+    WAITING = 'waiting'
+    ADMITTED = 'admitted'
+    RELEASED = 'released'
+
+    def __init__(self):
+        self.state = self.WAITING
+        self.enqueued_at = time.monotonic()
+        self.admitted_at = None
+
+    @property
+    def admitted(self) -> bool:
+        return self.state == self.ADMITTED
+
+
+class AdmissionController:
+    """
+    Limitador global de concorrência com fila de espera FIFO limitada
+    """
+
+    def __init__(self, max_concurrent: int = 4, max_queue: int = 16, default_run_seconds: float = 60.0,
+                 smoothing: float = 0.2, metrics=None):
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_queue = max(0, int(max_queue))
+        self.smoothing = smoothing
+        self.metrics = metrics or default_metrics
+        self._condition = threading.Condition()
+        self._waiting = deque()
+        self._in_flight = 0
+        self._avg_run_seconds = float(default_run_seconds)
+
+        self.metrics.describe('agent_runs_in_flight', 'Execuções do sistema de agentes em andamento')
+        self.metrics.describe('agent_runs_queue_depth', 'Execuções aguardando na fila de admissão')
+        self.metrics.describe('agent_runs_rejected_total', 'Execuções rejeitadas com HTTP 503')
+        self._publish()
+
+    # --- Estado interno (chamar com o lock adquirido) ---
+    def _publish(self):
+        self.metrics.set_gauge('agent_runs_in_flight', self._in_flight)
+        self.metrics.set_gauge('agent_runs_queue_depth', len(self._waiting))
+
+    def _admit(self, ticket: AdmissionTicket):
+        ticket.state = AdmissionTicket.ADMITTED
+        ticket.admitted_at = time.monotonic()
+        self._in_flight += 1
+        self.metrics.inc('agent_runs_admitted_total')
+        self.metrics.observe('agent_runs_queue_wait_seconds', ticket.admitted_at - ticket.enqueued_at)
+
+    def _promote_waiting(self):
+        while self._waiting and self._in_flight < self.max_concurrent:
+            self._admit(self._waiting.popleft())
+        self._condition.notify_all()
+
+    # --- API pública ---
+    def try_enqueue(self):
+        """
+        Tenta admitir uma nova execução. Retorna um AdmissionTicket (admitido ou
+        na fila) ou None quando a fila está cheia e a requisição deve ser rejeitada.
+        """
+        with self._condition:
+            ticket = AdmissionTicket()
+            if self._in_flight < self.max_concurrent and not self._waiting:
+                self._admit(ticket)
+            elif len(self._waiting) < self.max_queue:
+                self._waiting.append(ticket)
+            else:
+                self.metrics.inc('agent_runs_rejected_total')
+                return None
+            self._publish()
+            return ticket
+
+    def wait(self, ticket: AdmissionTicket, timeout: float = None) -> bool:
+        """Aguarda até o ticket ser admitido; retorna False se o timeout expirar antes"""
+        with self._condition:
+            return self._condition.wait_for(lambda: ticket.state != AdmissionTicket.WAITING, timeout) \
+                and ticket.admitted
+
+    def release(self, ticket: AdmissionTicket):
+        """Libera a vaga do ticket (ou o remove da fila). Pode ser chamado mais de uma vez."""
+        with self._condition:
+            if ticket.state == AdmissionTicket.ADMITTED:
+                duration = time.monotonic() - ticket.admitted_at
+                self._in_flight -= 1
+                self._avg_run_seconds += self.smoothing * (duration - self._avg_run_seconds)
+                self.metrics.observe('agent_runs_duration_seconds', duration)
+            elif ticket.state == AdmissionTicket.WAITING:
+                try:
+                    self._waiting.remove(ticket)
+                except ValueError:
+                    pass
+                self.metrics.inc('agent_runs_abandoned_total')
+            ticket.state = AdmissionTicket.RELEASED
+            self._promote_waiting()
+            self._publish()
+
+    def position(self, ticket: AdmissionTicket) -> int:
+        """Posição do ticket na fila (1 = próximo a ser admitido, 0 = já admitido)"""
+        with self._condition:
+            if ticket.state != AdmissionTicket.WAITING:
+                return 0
+            try:
+                return self._waiting.index(ticket) + 1
+            except ValueError:
+                return 0
+
+    def estimated_wait(self, position: int) -> float:
+        """Estimativa em segundos para a admissão de quem está na posição informada"""
+        if position <= 0:
+            return 0.0
+        return math.ceil(position / self.max_concurrent) * self._avg_run_seconds
+
+    def retry_after(self) -> int:
+        """Valor sugerido para o cabeçalho Retry-After de uma requisição rejeitada"""
+        with self._condition:
+            depth = len(self._waiting)
+        return max(1, int(math.ceil(self.estimated_wait(depth + 1))))
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiting)
+
+    def snapshot(self) -> dict:
+        with self._condition:
+            return {
+                'in_flight': self._in_flight,
+                'queue_depth': len(self._waiting),
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'avg_run_seconds': round(self._avg_run_seconds, 2)
+            }
+
+
+class LatencyTracker:
+    """
+    Janela deslizante com as latências recentes das chamadas ao modelo
+    """
+
+    def __init__(self, max_samples: int = 50, window_seconds: float = 300.0):
+        self.window_seconds = window_seconds
+        self._samples = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append((time.monotonic(), float(seconds)))
+
+    def recent(self) -> float:
+        """Latência média (segundos) das amostras dentro da janela; 0.0 sem amostras"""
+        cutoff = time.monotonic() - self.window_seconds
+        with self._lock:
+            values = [value for stamp, value in self._samples if stamp >= cutoff]
+        return sum(values) / len(values) if values else 0.0
+
+
+class DegradationLevel:
+    """
+    Nível de degradação aplicado a uma execução do pipeline colaborativo
+    """
+
+    __slots__ = ('level', 'name', 'max_collaborators', 'outline_char_limit', 'use_traditional', 'pressure')
+
+    def __init__(self, level: int, name: str, max_collaborators=None, outline_char_limit=None,
+                 use_traditional: bool = False, pressure: dict = None):
+        self.level = level
+        self.name = name
+        self.max_collaborators = max_collaborators
+        self.outline_char_limit = outline_char_limit
+        self.use_traditional = use_traditional
+        self.pressure = pressure or {}
+
+    def to_dict(self) -> dict:
+        return {
+            'level': self.level,
+            'name': self.name,
+            'max_collaborators': self.max_collaborators,
+            'outline_char_limit': self.outline_char_limit,
+            'use_traditional': self.use_traditional,
+            'pressure': self.pressure
+        }
+
+
+class OverloadPolicy:
+    """
+    Política de degradação progressiva guiada pela profundidade da fila e pela
+    latência recente do modelo.
+
+    Níveis:
+        0 full                   - pipeline colaborativo completo
+        1 reduced_collaborators  - limita o número de agentes colaborativos
+        2 truncated_outlines     - também trunca os outlines colaborativos na síntese
+        3 traditional            - usa master_control_plane_traditional
+    """
+
+    LEVEL_NAMES = ('full', 'reduced_collaborators', 'truncated_outlines', 'traditional')
+
+    def __init__(self, latency_target: float = 20.0, queue_thresholds=(0.25, 0.5, 0.75),
+                 latency_thresholds=(1.0, 1.5, 2.0), max_collaborators: int = 2,
+                 outline_char_limit: int = 1500, enabled: bool = True, metrics=None):
+        self.latency_target = latency_target
+        self.queue_thresholds = tuple(queue_thresholds)
+        self.latency_thresholds = tuple(latency_thresholds)
+        self.max_collaborators = max_collaborators
+        self.outline_char_limit = outline_char_limit
+        self.enabled = enabled
+        self.metrics = metrics or default_metrics
+        self.metrics.describe('agent_degradation_level', 'Último nível de degradação aplicado (0 = completo)')
+
+    @staticmethod
+    def _level_for(ratio: float, thresholds: tuple) -> int:
+        return sum(1 for threshold in thresholds if ratio >= threshold)
+
+    def evaluate(self, queue_depth: int, max_queue: int, recent_latency: float) -> DegradationLevel:
+        """Calcula o nível de degradação para as condições de carga informadas"""
+        queue_ratio = queue_depth / max_queue if max_queue > 0 else 0.0
+        latency_ratio = recent_latency / self.latency_target if self.latency_target > 0 else 0.0
+        pressure = {
+            'queue_depth': queue_depth,
+            'queue_ratio': round(queue_ratio, 3),
+            'recent_latency_seconds': round(recent_latency, 2),
+            'latency_ratio': round(latency_ratio, 3)
+        }
+
+        level = 0
+        if self.enabled:
+            level = max(self._level_for(queue_ratio, self.queue_thresholds),
+                        self._level_for(latency_ratio, self.latency_thresholds))
+            level = min(level, len(self.LEVEL_NAMES) - 1)
+
+        return DegradationLevel(
+            level=level,
+            name=self.LEVEL_NAMES[level],
+            max_collaborators=self.max_collaborators if level >= 1 else None,
+            outline_char_limit=self.outline_char_limit if level >= 2 else None,
+            use_traditional=level >= 3,
+            pressure=pressure
+        )
+
+    def record(self, degradation: DegradationLevel):
+        """Publica o nível aplicado nas métricas"""
+        self.metrics.set_gauge('agent_degradation_level', degradation.level)
+        self.metrics.inc('agent_degradation_runs_total', labels={'level': degradation.name})
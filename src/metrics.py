@@ -0,0 +1,112 @@
+"""
+Registro simples de métricas em memória para o sistema Mangaba.AI
+
+Mantém gauges, contadores e sumários (contagem, soma e máximo) com rótulos
+opcionais, e exporta tudo como JSON ou no formato texto do Prometheus.
+"""
+import threading
+
+
+def _label_key(labels) -> tuple:
+    if not labels:
+        return ()
+    return tuple(sorted((str(k), str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: tuple) -> str:
+    if not key:
+        return ""
+    parts = []
+    for name, value in key:
+        escaped = value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{name}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class MetricsRegistry:
+    """
+    Registro thread-safe de métricas do processo
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._gauges = {}
+        self._counters = {}
+        self._summaries = {}
+        self._help = {}
+
+    def describe(self, name: str, help_text: str):
+        """Registra a descrição de uma métrica (usada no formato Prometheus)"""
+        with self._lock:
+            self._help[name] = help_text
+
+    def set_gauge(self, name: str, value: float, labels: dict = None):
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = float(value)
+
+    def inc(self, name: str, amount: float = 1, labels: dict = None):
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            key = _label_key(labels)
+            series[key] = series.get(key, 0.0) + amount
+
+    def observe(self, name: str, value: float, labels: dict = None):
+        with self._lock:
+            series = self._summaries.setdefault(name, {})
+            key = _label_key(labels)
+            count, total, maximum = series.get(key, (0, 0.0, 0.0))
+            series[key] = (count + 1, total + value, max(maximum, value))
+
+    def get_gauge(self, name: str, labels: dict = None, default: float = 0.0) -> float:
+        with self._lock:
+            return self._gauges.get(name, {}).get(_label_key(labels), default)
+
+    def get_counter(self, name: str, labels: dict = None) -> float:
+        with self._lock:
+            return self._counters.get(name, {}).get(_label_key(labels), 0.0)
+
+    def snapshot(self) -> dict:
+        """Retorna todas as métricas em uma estrutura serializável em JSON"""
+        def series_list(series, render):
+            return [dict(labels=dict(key), **render(value)) for key, value in series.items()]
+
+        with self._lock:
+            return {
+                'gauges': {name: series_list(s, lambda v: {'value': v}) for name, s in self._gauges.items()},
+                'counters': {name: series_list(s, lambda v: {'value': v}) for name, s in self._counters.items()},
+                'summaries': {
+                    name: series_list(s, lambda v: {
+                        'count': v[0],
+                        'sum': v[1],
+                        'max': v[2],
+                        'avg': v[1] / v[0] if v[0] else 0.0
+                    })
+                    for name, s in self._summaries.items()
+                }
+            }
+
+    def render_prometheus(self) -> str:
+        """Exporta as métricas no formato texto do Prometheus"""
+        lines = []
+        with self._lock:
+            for kind, store in (('gauge', self._gauges), ('counter', self._counters)):
+                for name in sorted(store):
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    for key, value in store[name].items():
+                        lines.append(f"{name}{_format_labels(key)} {value:g}")
+            for name in sorted(self._summaries):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} summary")
+                for key, (count, total, maximum) in self._summaries[name].items():
+                    labels = _format_labels(key)
+                    lines.append(f"{name}_count{labels} {count}")
+                    lines.append(f"{name}_sum{labels} {total:g}")
+                    lines.append(f"{name}_max{labels} {maximum:g}")
+        return "\n".join(lines) + "\n"
+
+
+# Registro global usado pela aplicação
+metrics = MetricsRegistry()
@@ -0,0 +1,190 @@
+"""
+Registro imutável de templates de prompt
+
+Os templates especializados são compilados uma única vez, na importação:
+o texto é desindentado e tem os espaços normalizados (menos tokens enviados
+ao modelo a cada chamada) e cada template recebe um hash do conteúdo que
+serve como versão para chaves de cache. A consulta é um acesso O(1) a um
+mapeamento somente leitura.
+
+A renderização usa o template já decomposto em trechos literais e slots
+nomeados: os valores (inclusive um contexto de vários MB, ou uma lista de
+partes dele) são copiados uma única vez, direto para o prompt final, sem o
+escape de chaves exigido por str.format.
+"""
+import hashlib
+import re
+import string
+import textwrap
+from functools import lru_cache
+from types import MappingProxyType
+
+ROLE_RESEARCHER = 'researcher'
+ROLE_WRITER = 'writer'
+
+_BLANK_LINES = re.compile(r'\n{3,}')
+
+
+def normalize_template(text: str) -> str:
+    """Remove a indentação comum, espaços ao fim das linhas e linhas em branco repetidas"""
+    lines = [line.rstrip() for line in textwrap.dedent(text).splitlines()]
+    return _BLANK_LINES.sub('\n\n', '\n'.join(lines)).strip('\n')
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+class CompiledTemplate:
+    """
+    Template decomposto em (trecho literal, slot) para renderização em uma passada
+    """
+
+    __slots__ = ('_ops', 'slots')
+
+    def __init__(self, text: str):
+        ops = []
+        slots = []
+        for literal, field, spec, conversion in string.Formatter().parse(text):
+            if field is not None and (spec or conversion or not field.isidentifier()):
+                raise ValueError(f"Slot não suportado no template: {{{field}}}")
+            ops.append((literal, field))
+            if field is not None and field not in slots:
+                slots.append(field)
+        self._ops = tuple(ops)
+        self.slots = tuple(slots)
+
+    def render(self, **values) -> str:
+        """
+        Substitui os slots pelos valores. Cada valor pode ser uma string ou uma
+        sequência de partes (concatenadas apenas no prompt final). Slot ausente
+        levanta KeyError, como str.format.
+        """
+        pieces = []
+        append, extend = pieces.append, pieces.extend
+        for literal, field in self._ops:
+            if literal:
+                append(literal)
+            if field is not None:
+                value = values[field]
+                if isinstance(value, str):
+                    append(value)
+                elif isinstance(value, (list, tuple)):
+                    extend(value)
+                else:
+                    append(str(value))
+        return ''.join(pieces)
+
+
+@lru_cache(maxsize=256)
+def compile_template(text: str) -> CompiledTemplate:
+    """Decompõe o texto uma vez; chamadas seguintes com o mesmo texto reutilizam o resultado"""
+    return CompiledTemplate(text)
+
+
+def render_prompt(template, **values) -> str:
+    """Renderiza um PromptTemplate ou o texto de um template"""
+    if isinstance(template, PromptTemplate):
+        return template.compiled.render(**values)
+    return compile_template(template).render(**values)
+
+
+# Bloco "Rótulo:" + contexto entre aspas triplas e linha das regras ABNT dos templates especializados
+_CONTEXT_BLOCK = re.compile(r"^(.+):\n'''\{context\}'''$", re.M)
+_ABNT_LINE = re.compile(r"^\{abnt_rules\}$", re.M)
+CONTEXT_REFERENCE = r"\1: use o CONTEXTO COMPARTILHADO fornecido.{context_extra}"
+ABNT_REFERENCE = "Siga a FORMATAÇÃO ABNT OBRIGATÓRIA fornecida."
+
+
+@lru_cache(maxsize=256)
+def agent_only_template(text: str):
+    """
+    Versão do template sem o contexto e as regras ABNT, que passam para o
+    prefixo compartilhado da execução. O slot {context_extra} recebe o que for
+    específico do agente (ex.: insights colaborativos). Retorna None se o
+    template não seguir o formato dos templates especializados.
+    """
+    agent_text = _CONTEXT_BLOCK.sub(CONTEXT_REFERENCE, text)
+    agent_text = _ABNT_LINE.sub(ABNT_REFERENCE, agent_text)
+    if '{context}' in agent_text or '{abnt_rules}' in agent_text:
+        return None
+    return agent_text
+
+
+def join_parts(value) -> str:
+    """Contexto em partes -> string única (apenas para caminhos que precisam do texto)"""
+    return value if isinstance(value, str) else ''.join(value)
+
+
+class PromptTemplate:
+    """
+    Template normalizado de um papel (pesquisador/escritor) de um tipo de objetivo
+    """
+
+    __slots__ = ('goal_type', 'role', 'text', 'version', 'compiled')
+
+    def __init__(self, goal_type: str, role: str, text: str):
+        object.__setattr__(self, 'goal_type', goal_type)
+        object.__setattr__(self, 'role', role)
+        object.__setattr__(self, 'text', normalize_template(text))
+        object.__setattr__(self, 'version', content_hash(self.text))
+        object.__setattr__(self, 'compiled', compile_template(self.text))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("PromptTemplate é imutável")
+
+    def render(self, **values) -> str:
+        return self.compiled.render(**values)
+
+    def __str__(self) -> str:
+        return self.text
+
+    def __repr__(self) -> str:
+        return f"PromptTemplate({self.goal_type!r}, {self.role!r}, version={self.version!r})"
+
+
+class PromptTemplateRegistry:
+    """
+    Templates por tipo de objetivo e papel, com fallback para o tipo padrão
+    """
+
+    def __init__(self, templates: dict, default_type: str = 'general'):
+        if default_type not in templates:
+            raise ValueError(f"Tipo padrão '{default_type}' ausente dos templates")
+        self.default_type = default_type
+        self._templates = MappingProxyType({
+            goal_type: MappingProxyType({role: PromptTemplate(goal_type, role, text) for role, text in roles.items()})
+            for goal_type, roles in templates.items()
+        })
+        # Versão do registro inteiro: muda se qualquer template mudar
+        self.version = content_hash('\n'.join(
+            f"{goal_type}:{role}:{template.version}"
+            for goal_type, roles in sorted(self._templates.items())
+            for role, template in sorted(roles.items())
+        ))
+
+    def __contains__(self, goal_type) -> bool:
+        return goal_type in self._templates
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    @property
+    def goal_types(self) -> tuple:
+        return tuple(self._templates)
+
+    def get(self, goal_type: str, role: str) -> PromptTemplate:
+        """Template do papel para o tipo (ou para o tipo padrão, se o tipo não existir)"""
+        roles = self._templates.get(goal_type) or self._templates[self.default_type]
+        return roles[role]
+
+    def pair(self, goal_type: str) -> tuple:
+        """(pesquisador, escritor) do tipo de objetivo"""
+        return self.get(goal_type, ROLE_RESEARCHER), self.get(goal_type, ROLE_WRITER)
+
+    def versions(self) -> dict:
+        """{tipo: {papel: versão}} para diagnóstico e chaves de cache"""
+        return {
+            goal_type: {role: template.version for role, template in roles.items()}
+            for goal_type, roles in self._templates.items()
+        }
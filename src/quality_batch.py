@@ -0,0 +1,337 @@
+"""
+Avaliação de qualidade em lote (relatórios armazenados)
+
+Reavalia milhares de relatórios quando os critérios do QualityAssurance
+mudam. Os relatórios vêm de um diretório (um arquivo por relatório) ou de um
+arquivo JSONL e são divididos em blocos de tamanho fixo. Cada bloco é
+avaliado em um processo separado com o próprio QualityScorer, relatório a
+relatório: o ganho sobre o laço de uma única thread vem só do pool de
+processos (a verificação de presença com `termo in texto`, em C e parando
+na primeira ocorrência, já é o custo mínimo por relatório; uma matriz de
+presença com produtos NumPy não reduzia esse custo).
+
+Cada bloco concluído é gravado em seu próprio arquivo (scores-NNNNN.jsonl,
+escrita atômica), com um manifesto na primeira linha: hash dos nomes,
+tamanhos e datas de modificação dos arquivos do bloco (diretório) ou das
+linhas do bloco (JSONL). Uma execução interrompida retoma a partir dos
+blocos que faltam; blocos cujo manifesto não confere mais (arquivos novos
+ou alterados, JSONL com linhas acrescentadas no meio) são reavaliados. Ao
+final, summary.json traz os agregados de todos os blocos.
+
+Uso:
+    python src/quality_batch.py <diretório|arquivo.jsonl> <diretório de saída> [--chunk-size 500] [--workers N]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from quality_scoring import (ACTIONABLE_TARGET, CRITERIA, RECOMMENDATION_RULES, RELEVANCE_TARGET_CHARS,
+                             QualityScorer, recommendations_for)
+
+# Extensões lidas de um diretório (.json: objeto com content/goal/goal_type)
+REPORT_EXTENSIONS = ('.md', '.txt', '.json')
+# Campos aceitos para o texto do relatório em registros JSON
+CONTENT_FIELDS = ('content', 'result', 'report', 'text')
+RUN_FILE = 'run.json'
+SUMMARY_FILE = 'summary.json'
+
+
+class BatchQualityScorer:
+    """
+    Critérios do QualityScorer aplicados a um bloco de registros
+    """
+
+    def __init__(self, scorer: QualityScorer = None):
+        self.scorer = scorer or QualityScorer()
+        self.goal_types = sorted(self.scorer.sections)
+
+    def fingerprint(self) -> str:
+        """Identifica os critérios: blocos gravados com outro fingerprint não são reaproveitados"""
+        criteria = {
+            'sections': {goal_type: list(self.scorer.sections[goal_type]) for goal_type in self.goal_types},
+            'default_sections': list(self.scorer.default_sections),
+            'actionable': list(self.scorer.actionable_keywords),
+            'targets': [ACTIONABLE_TARGET, RELEVANCE_TARGET_CHARS],
+            'rules': RECOMMENDATION_RULES,
+        }
+        return hashlib.sha256(json.dumps(criteria, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+    def score_records(self, records: list) -> list:
+        """Resultado por relatório: scores, score geral e recomendações (registros inválidos mantêm o erro)"""
+        results = []
+        for record in records:
+            if 'error' in record:
+                results.append({'id': record['id'], 'error': record['error']})
+                continue
+            scores = self.scorer.scores(record['content'], record['goal'], record['goal_type'])
+            results.append({
+                'id': record['id'],
+                'goal_type': record['goal_type'],
+                'chars': len(record['content']),
+                'overall_score': sum(scores.values()) / len(scores),
+                'detailed_scores': scores,
+                'recommendations': recommendations_for(scores),
+            })
+        return results
+
+
+def report_record(report_id: str, data, default_goal: str = '', default_goal_type: str = 'general') -> dict:
+    """Registro normalizado (id, content, goal, goal_type) a partir de texto ou objeto JSON"""
+    if isinstance(data, str):
+        return {'id': report_id, 'content': data, 'goal': default_goal, 'goal_type': default_goal_type}
+    if not isinstance(data, dict):
+        return {'id': report_id, 'error': 'registro não é um objeto JSON'}
+    content = next((data[field] for field in CONTENT_FIELDS if isinstance(data.get(field), str)), None)
+    if content is None:
+        return {'id': str(data.get('id', report_id)), 'error': f"nenhum campo de texto ({', '.join(CONTENT_FIELDS)})"}
+    return {
+        'id': str(data.get('id', report_id)),
+        'content': content,
+        'goal': data.get('goal') or default_goal,
+        'goal_type': data.get('goal_type') or default_goal_type,
+    }
+
+
+def _read_report_file(path: str, report_id: str, default_goal: str, default_goal_type: str) -> dict:
+    try:
+        with open(path, encoding='utf-8') as source:
+            text = source.read()
+    except (OSError, UnicodeDecodeError) as e:
+        return {'id': report_id, 'error': str(e)}
+    if path.endswith('.json'):
+        try:
+            return report_record(report_id, json.loads(text), default_goal, default_goal_type)
+        except json.JSONDecodeError as e:
+            return {'id': report_id, 'error': f"JSON inválido: {e}"}
+    return report_record(report_id, text, default_goal, default_goal_type)
+
+
+def _parse_jsonl_line(line: str, report_id: str, default_goal: str, default_goal_type: str) -> dict:
+    try:
+        return report_record(report_id, json.loads(line), default_goal, default_goal_type)
+    except json.JSONDecodeError as e:
+        return {'id': report_id, 'error': f"JSON inválido: {e}"}
+
+
+def iter_input_chunks(input_path: str, chunk_size: int, default_goal: str = '', default_goal_type: str = 'general'):
+    """
+    Gera (índice do bloco, manifesto, carregar) em ordem determinística. O
+    manifesto identifica o conteúdo do bloco sem avaliá-lo; carregar() lê e
+    normaliza os registros do bloco, só quando o bloco ainda falta
+    """
+    defaults = (default_goal, default_goal_type)
+    if os.path.isdir(input_path):
+        names = sorted(name for name in os.listdir(input_path)
+                       if name.lower().endswith(REPORT_EXTENSIONS) and os.path.isfile(os.path.join(input_path, name)))
+        for index, start in enumerate(range(0, len(names), chunk_size)):
+            batch = names[start:start + chunk_size]
+            digest = hashlib.sha256()
+            for name in batch:
+                try:
+                    stat = os.stat(os.path.join(input_path, name))
+                    digest.update(f"{name}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode('utf-8'))
+                except OSError:
+                    digest.update(f"{name}\0?\n".encode('utf-8'))
+            yield index, digest.hexdigest()[:32], \
+                lambda batch=batch: [_read_report_file(os.path.join(input_path, name), name, *defaults) for name in batch]
+        return
+    with open(input_path, encoding='utf-8') as source:
+        lines = []
+        digest = hashlib.sha256()
+        line_number = 0
+        index = 0
+        for line in source:
+            line_number += 1
+            if not line.strip():
+                continue
+            lines.append((line_number, line))
+            digest.update(f"{line_number}\0".encode('utf-8') + line.encode('utf-8'))
+            if len(lines) == chunk_size:
+                yield index, digest.hexdigest()[:32], \
+                    lambda lines=lines: [_parse_jsonl_line(line, f"linha {number}", *defaults) for number, line in lines]
+                index += 1
+                lines = []
+                digest = hashlib.sha256()
+        if lines:
+            yield index, digest.hexdigest()[:32], \
+                lambda lines=lines: [_parse_jsonl_line(line, f"linha {number}", *defaults) for number, line in lines]
+
+
+def chunk_path(output_dir: str, index: int) -> str:
+    return os.path.join(output_dir, f"scores-{index:05d}.jsonl")
+
+
+def _write_atomic(path: str, text: str):
+    handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'w', encoding='utf-8') as target:
+            target.write(text)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+# Avaliador de cada processo (criado uma vez por processo)
+_worker_scorer = None
+
+
+def _score_chunk(output_dir: str, index: int, manifest: str, records: list) -> int:
+    global _worker_scorer
+    if _worker_scorer is None:
+        _worker_scorer = BatchQualityScorer()
+    results = _worker_scorer.score_records(records)
+    header = json.dumps({'chunk': index, 'manifest': manifest, 'ids': [result['id'] for result in results]},
+                        ensure_ascii=False)
+    _write_atomic(chunk_path(output_dir, index),
+                  header + '\n' + ''.join(json.dumps(result, ensure_ascii=False) + '\n' for result in results))
+    return len(results)
+
+
+def chunk_manifest(output_dir: str, index: int):
+    """Manifesto gravado no bloco (None se o bloco não existe ou não tem manifesto)"""
+    try:
+        with open(chunk_path(output_dir, index), encoding='utf-8') as source:
+            header = json.loads(source.readline() or 'null')
+    except (OSError, ValueError):
+        return None
+    return header.get('manifest') if isinstance(header, dict) else None
+
+
+def _prepare_output(output_dir: str, input_path: str, chunk_size: int, fingerprint: str, defaults: tuple):
+    os.makedirs(output_dir, exist_ok=True)
+    run = {'input': os.path.abspath(input_path), 'chunk_size': chunk_size, 'criteria': fingerprint,
+           'default_goal': defaults[0], 'default_goal_type': defaults[1]}
+    run_path = os.path.join(output_dir, RUN_FILE)
+    if os.path.exists(run_path):
+        with open(run_path, encoding='utf-8') as f:
+            previous = json.load(f)
+        if previous != run:
+            raise ValueError(f"{output_dir} contém uma execução com outra entrada, tamanho de bloco, critérios ou "
+                             f"valores padrão de objetivo; "
+                             f"use outro diretório de saída")
+    else:
+        _write_atomic(run_path, json.dumps(run, ensure_ascii=False))
+
+
+def summarize_output(output_dir: str) -> dict:
+    """Agregados de todos os blocos gravados: médias por critério e por tipo, distribuição e recomendações"""
+    names = sorted(name for name in os.listdir(output_dir) if name.startswith('scores-') and name.endswith('.jsonl'))
+    rows = []
+    goal_types = []
+    recommendations = {}
+    errors = 0
+    for name in names:
+        with open(os.path.join(output_dir, name), encoding='utf-8') as source:
+            for line in source:
+                result = json.loads(line)
+                if 'manifest' in result:
+                    continue
+                if 'error' in result:
+                    errors += 1
+                    continue
+                rows.append([result['overall_score']] + [result['detailed_scores'][criterion] for criterion in CRITERIA])
+                goal_types.append(result['goal_type'])
+                for recommendation in result['recommendations']:
+                    recommendations[recommendation] = recommendations.get(recommendation, 0) + 1
+    summary = {'reports': len(rows), 'errors': errors, 'chunks': len(names)}
+    if not rows:
+        return summary
+    matrix = np.array(rows, dtype=np.float64)
+    columns = ('overall_score',) + CRITERIA
+    summary['scores'] = {
+        column: {'mean': round(float(matrix[:, position].mean()), 4),
+                 'p50': round(float(np.median(matrix[:, position])), 4),
+                 'min': round(float(matrix[:, position].min()), 4),
+                 'max': round(float(matrix[:, position].max()), 4)}
+        for position, column in enumerate(columns)
+    }
+    counts, _ = np.histogram(matrix[:, 0], bins=10, range=(0.0, 1.0))
+    summary['overall_histogram'] = {f"{bucket / 10:.1f}-{(bucket + 1) / 10:.1f}": int(count) for bucket, count in enumerate(counts)}
+    types = np.array(goal_types)
+    summary['by_goal_type'] = {
+        goal_type: {'reports': int((types == goal_type).sum()),
+                    'overall_score': round(float(matrix[types == goal_type, 0].mean()), 4)}
+        for goal_type in sorted(set(goal_types))
+    }
+    summary['recommendations'] = dict(sorted(recommendations.items(), key=lambda item: -item[1]))
+    return summary
+
+
+def run_batch(input_path: str, output_dir: str, chunk_size: int = 500, workers: int = None,
+              default_goal: str = '', default_goal_type: str = 'general') -> dict:
+    """
+    Avalia todos os relatórios da entrada, pulando blocos já gravados em
+    output_dir com o mesmo manifesto, e grava summary.json. Retorna o resumo com as contagens
+    da execução (blocos avaliados e reaproveitados).
+    """
+    chunk_size = max(1, int(chunk_size))
+    workers = workers or os.cpu_count() or 1
+    chunks = iter_input_chunks(input_path, chunk_size, default_goal, default_goal_type)
+    _prepare_output(output_dir, input_path, chunk_size, BatchQualityScorer().fingerprint(),
+                    (default_goal, default_goal_type))
+
+    scored = skipped = 0
+    total = 0
+    if workers == 1:
+        for index, manifest, load in chunks:
+            total += 1
+            if chunk_manifest(output_dir, index) == manifest:
+                skipped += 1
+                continue
+            _score_chunk(output_dir, index, manifest, load())
+            scored += 1
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = set()
+            for index, manifest, load in chunks:
+                total += 1
+                if chunk_manifest(output_dir, index) == manifest:
+                    skipped += 1
+                    continue
+                # Poucos blocos em andamento por vez: a memória fica limitada a alguns blocos
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                pending.add(pool.submit(_score_chunk, output_dir, index, manifest, load()))
+                scored += 1
+            for future in pending:
+                future.result()
+
+    # Entrada encolheu: blocos além do último não pertencem mais à execução
+    index = total
+    while os.path.exists(chunk_path(output_dir, index)):
+        os.remove(chunk_path(output_dir, index))
+        index += 1
+
+    summary = summarize_output(output_dir)
+    _write_atomic(os.path.join(output_dir, SUMMARY_FILE), json.dumps(summary, ensure_ascii=False, indent=2))
+    return {**summary, 'scored_chunks': scored, 'skipped_chunks': skipped}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Avaliação de qualidade em lote de relatórios armazenados")
+    parser.add_argument('input', help="diretório com relatórios (.md, .txt, .json) ou arquivo JSONL")
+    parser.add_argument('output', help="diretório de saída (blocos scores-*.jsonl e summary.json)")
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--goal', default='', help="objetivo dos relatórios sem o campo goal")
+    parser.add_argument('--goal-type', default='general', help="tipo dos relatórios sem o campo goal_type")
+    args = parser.parse_args(argv)
+    result = run_batch(args.input, args.output, chunk_size=args.chunk_size, workers=args.workers,
+                       default_goal=args.goal, default_goal_type=args.goal_type)
+    print(json.dumps({key: result[key] for key in ('reports', 'errors', 'scored_chunks', 'skipped_chunks')}))
+    if 'scores' in result:
+        print(f"Score geral médio: {result['scores']['overall_score']['mean']:.4f}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Pontuação de qualidade do conteúdo gerado (QualityAssurance)
+
+O conteúdo é minusculizado uma única vez e todos os termos da avaliação
+(seções exigidas pelo tipo de objetivo, termos acionáveis e palavras do
+objetivo) são verificados sobre essa cópia, cada termo uma única vez mesmo
+que pertença a mais de um critério. Os conjuntos de termos por tipo de
+objetivo são montados na criação do QualityScorer.
+
+A semântica é a de `termo in texto` (ocorrência como substring), a mesma da
+avaliação anterior: os quatro scores não mudam. Para um vocabulário de
+poucas dezenas de termos, a busca de substring do Python (em C, parando na
+primeira ocorrência) é mais rápida que a varredura por autômato do
+keyword_matcher, que percorre o texto inteiro e gera cada ocorrência.
+"""
+import time
+
+CRITERIA = ('completeness', 'accuracy', 'relevance', 'actionability')
+
+# Seções esperadas no conteúdo de cada tipo de objetivo
+REQUIRED_SECTIONS = {
+    'strategic_planning': ['análise', 'objetivos', 'estratégias', 'implementação'],
+    'sales_analysis': ['métricas', 'tendências', 'recomendações'],
+    'product_management': ['roadmap', 'features', 'personas'],
+    'user_management': ['jornada', 'experiência', 'melhorias'],
+    'task_management': ['backlog', 'sprint', 'cronograma']
+}
+DEFAULT_SECTIONS = ['introdução', 'desenvolvimento', 'conclusão']
+
+ACTIONABLE_KEYWORDS = ['recomendação', 'ação', 'implementar', 'executar', 'plano', 'estratégia', 'próximos passos']
+# Termos acionáveis distintos para o score máximo
+ACTIONABLE_TARGET = 3
+# Tamanho (caracteres) a partir do qual a relevância é máxima
+RELEVANCE_TARGET_CHARS = 1000
+
+# (critério, limite, recomendação quando o score fica abaixo do limite)
+RECOMMENDATION_RULES = [
+    ('completeness', 0.7, "Adicionar seções faltantes para maior completude"),
+    ('accuracy', 0.6, "Revisar alinhamento com o objetivo principal"),
+    ('relevance', 0.5, "Expandir conteúdo com mais detalhes relevantes"),
+    ('actionability', 0.6, "Incluir mais recomendações práticas e acionáveis"),
+]
+
+
+def recommendations_for(scores: dict) -> list:
+    """Recomendações de melhoria para os critérios abaixo do limite"""
+    return [message for criterion, threshold, message in RECOMMENDATION_RULES if scores[criterion] < threshold]
+
+
+def goal_words(goal: str) -> list:
+    """Palavras do objetivo (com repetições, que contam na precisão)"""
+    return goal.lower().split()
+
+
+class QualityScorer:
+    """
+    Conjuntos de termos pré-montados por tipo de objetivo; avalia um conteúdo
+    com uma única normalização
+    """
+
+    def __init__(self, required_sections: dict = None, default_sections: list = None, actionable_keywords: list = None):
+        required_sections = REQUIRED_SECTIONS if required_sections is None else required_sections
+        self.default_sections = tuple(dict.fromkeys(DEFAULT_SECTIONS if default_sections is None else default_sections))
+        self.actionable_keywords = tuple(dict.fromkeys(ACTIONABLE_KEYWORDS if actionable_keywords is None else actionable_keywords))
+        self.sections = {goal_type: tuple(dict.fromkeys(terms)) for goal_type, terms in required_sections.items()}
+        # Termos fixos de cada tipo (seções + acionáveis), sem repetição entre critérios
+        self._terms = {goal_type: tuple(dict.fromkeys(sections + self.actionable_keywords))
+                       for goal_type, sections in self.sections.items()}
+        self._default_terms = tuple(dict.fromkeys(self.default_sections + self.actionable_keywords))
+
+    def sections_for(self, goal_type: str) -> tuple:
+        return self.sections.get(goal_type, self.default_sections)
+
+    def terms_for(self, goal_type: str, words: list = ()) -> tuple:
+        """Todos os termos verificados para o tipo de objetivo e as palavras do objetivo"""
+        terms = self._terms.get(goal_type, self._default_terms)
+        if words:
+            terms = tuple(dict.fromkeys(terms + tuple(words)))
+        return terms
+
+    def scores(self, content: str, goal: str, goal_type: str) -> dict:
+        """Os quatro scores (0 a 1) do conteúdo"""
+        text = content.lower()
+        words = goal_words(goal)
+        found = {term for term in self.terms_for(goal_type, words) if term in text}
+        sections = self.sections_for(goal_type)
+        return {
+            'completeness': sum(1 for section in sections if section in found) / len(sections) if sections else 0.0,
+            # Objetivo vazio: sem palavras para alinhar
+            'accuracy': min(sum(1 for word in words if word in found) / len(words), 1.0) if words else 0.0,
+            'relevance': min(len(content) / RELEVANCE_TARGET_CHARS, 1.0),
+            'actionability': min(sum(1 for keyword in self.actionable_keywords if keyword in found) / ACTIONABLE_TARGET, 1.0),
+        }
+
+    def evaluate(self, content: str, goal: str, goal_type: str) -> dict:
+        """Relatório de qualidade: score geral, scores por critério, recomendações e tempo da avaliação"""
+        started = time.perf_counter()
+        scores = self.scores(content, goal, goal_type)
+        overall_score = sum(scores.values()) / len(scores)
+        return {
+            'overall_score': overall_score,
+            'detailed_scores': scores,
+            'recommendations': recommendations_for(scores),
+            'elapsed_ms': (time.perf_counter() - started) * 1000,
+        }
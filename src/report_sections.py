@@ -0,0 +1,309 @@
+"""
+Árvore de seções de um relatório em markdown
+
+O conteúdo final é dividido pelos títulos (# a ######, fora de blocos de
+código) em uma árvore de seções. Cada seção cobre do seu título até o
+próximo título de nível igual ou superior, incluindo as subseções. Os ids
+são posicionais ("2", "2.1", ...), independentes da numeração escrita no
+título, e as seções também podem ser localizadas pelo título (sem
+diferenciar maiúsculas e acentos).
+
+splice() substitui seções pelo texto regenerado e devolve o documento
+inteiro, sem tocar no restante: assim uma seção fraca é refeita com uma
+única chamada ao modelo, em vez de uma nova execução completa.
+
+outline_sections() faz o caminho inverso para o escritor por seções: divide
+o outline do pesquisador nas suas seções numeradas (ou nos títulos de mesmo
+nível), que são escritas em paralelo; stitch_sections() une os textos em
+ordem, com ajustes locais de consistência (títulos e parágrafos repetidos).
+"""
+import re
+
+from context_retrieval import fold_text
+
+_HEADING = re.compile(r"^ {0,3}(#{1,6})[ \t]+(.+?)[ \t]*#*[ \t]*$")
+_FENCE = re.compile(r"^ {0,3}(```|~~~)")
+# Item numerado de primeiro nível do outline ("1. Introdução", "- **2) Metodologia**"); "1.1" não conta
+_OUTLINE_ITEM = re.compile(r"^ {0,3}(?:[*-][ \t]+)?(?:\*\*)?\d{1,2}[.)][ \t]+(.+?)[ \t]*$")
+# Parágrafos repetidos entre seções só são removidos a partir deste tamanho
+REPEATED_PARAGRAPH_MIN_CHARS = 80
+
+
+class Section:
+    """
+    Seção do documento: [start, end) cobre o título e o corpo, com as
+    subseções; body_start é o início do corpo (após a linha do título)
+    """
+
+    __slots__ = ('id', 'title', 'level', 'start', 'body_start', 'end', 'children', 'parent')
+
+    def __init__(self, title: str, level: int, start: int, body_start: int):
+        self.id = ''
+        self.title = title
+        self.level = level
+        self.start = start
+        self.body_start = body_start
+        self.end = start
+        self.children = []
+        self.parent = None
+
+    def contains(self, other) -> bool:
+        return other is not self and self.start <= other.start and other.end <= self.end
+
+    def to_dict(self, text: str = None) -> dict:
+        data = {'id': self.id, 'title': self.title, 'level': self.level,
+                'chars': self.end - self.start, 'children': [child.id for child in self.children]}
+        if text is not None:
+            data['content'] = text[self.start:self.end]
+        return data
+
+
+def heading_lines(text: str) -> list:
+    """(início, fim da linha, nível, título) de cada título fora de blocos de código"""
+    headings = []
+    fence = None
+    position = 0
+    for line in text.splitlines(keepends=True):
+        stripped = line.rstrip('\r\n')
+        marker = _FENCE.match(stripped)
+        if marker:
+            if fence is None:
+                fence = marker.group(1)
+            elif marker.group(1) == fence:
+                fence = None
+        elif fence is None:
+            match = _HEADING.match(stripped)
+            if match:
+                headings.append((position, position + len(line), len(match.group(1)), match.group(2).strip()))
+        position += len(line)
+    return headings
+
+
+class SectionTree:
+    """
+    Seções de um documento em ordem, com a árvore pelos níveis dos títulos
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.sections = []
+        self.roots = []
+        stack = []
+        for start, body_start, level, title in heading_lines(text):
+            section = Section(title, level, start, body_start)
+            while stack and stack[-1].level >= level:
+                stack.pop().end = start
+            siblings = stack[-1].children if stack else self.roots
+            section.parent = stack[-1] if stack else None
+            section.id = f"{section.parent.id}.{len(siblings) + 1}" if section.parent else str(len(siblings) + 1)
+            siblings.append(section)
+            self.sections.append(section)
+            stack.append(section)
+        for section in stack:
+            section.end = len(text)
+        self._by_id = {section.id: section for section in self.sections}
+
+    @property
+    def preamble(self) -> str:
+        """Texto antes do primeiro título"""
+        return self.text[:self.sections[0].start] if self.sections else self.text
+
+    def __len__(self) -> int:
+        return len(self.sections)
+
+    def content(self, section: Section) -> str:
+        return self.text[section.start:section.end]
+
+    def body(self, section: Section) -> str:
+        """Corpo da seção até a primeira subseção"""
+        end = section.children[0].start if section.children else section.end
+        return self.text[section.body_start:end]
+
+    def find(self, selector: str):
+        """Seção pelo id posicional ou pelo título (o primeiro com o título, sem acentos/maiúsculas); None se não houver"""
+        selector = str(selector).strip()
+        section = self._by_id.get(selector)
+        if section is not None:
+            return section
+        folded = fold_text(selector)
+        # Títulos numerados ("2. Análise") também são encontrados sem o número
+        for section in self.sections:
+            title = fold_text(section.title)
+            if title == folded or title.lstrip('0123456789. ') == folded:
+                return section
+        return None
+
+    def resolve(self, selectors: list) -> list:
+        """
+        Seções selecionadas, em ordem do documento e sem sobreposição (uma
+        subseção de outra seção selecionada é descartada). Levanta KeyError
+        com os seletores não encontrados.
+        """
+        found = {}
+        missing = []
+        for selector in selectors:
+            section = self.find(selector)
+            if section is None:
+                missing.append(selector)
+            else:
+                found[section.id] = section
+        if missing:
+            raise KeyError(missing)
+        chosen = [section for section in found.values()
+                  if not any(other.contains(section) for other in found.values())]
+        return sorted(chosen, key=lambda section: section.start)
+
+    def neighbours(self, section: Section, max_chars: int = 2000) -> tuple:
+        """
+        (texto anterior, texto seguinte) à seção, para dar continuidade à
+        regeneração: a seção irmã anterior (ou o início da seção-mãe, ou o
+        preâmbulo) e o que vem depois da seção. O anterior é cortado no fim
+        e o seguinte no começo, até max_chars caracteres cada.
+        """
+        siblings = section.parent.children if section.parent else self.roots
+        index = siblings.index(section)
+        if index > 0:
+            previous = self.content(siblings[index - 1])
+        elif section.parent is not None:
+            previous = self.text[section.parent.start:section.start]
+        else:
+            previous = self.preamble
+        following = self.text[section.end:section.end + max_chars]
+        return previous[-max_chars:].strip('\n'), following.strip('\n')
+
+    def splice(self, replacements: dict) -> str:
+        """
+        Documento com as seções (por id) trocadas pelo novo texto; o resto do
+        documento fica intacto. As seções não podem se sobrepor.
+        """
+        chosen = sorted((self._by_id[section_id] for section_id in replacements), key=lambda section: section.start)
+        parts = []
+        position = 0
+        for section in chosen:
+            if section.start < position:
+                raise ValueError(f"Seções sobrepostas: {section.id}")
+            parts.append(self.text[position:section.start])
+            parts.append(fit_section_text(replacements[section.id], section.end < len(self.text)))
+            position = section.end
+        parts.append(self.text[position:])
+        return ''.join(parts)
+
+    def outline(self) -> list:
+        return [section.to_dict() for section in self.sections]
+
+
+def heading_line(text: str, section: Section) -> str:
+    """Linha do título da seção, sem a quebra de linha"""
+    return text[section.start:section.body_start].rstrip('\r\n')
+
+
+def strip_code_fence(text: str) -> str:
+    """Resposta do modelo sem a cerca de código em volta (```markdown ... ```)"""
+    text = text.strip()
+    fenced = re.match(r"^```[a-zA-Z]*\n(.*?)\n?```$", text, re.S)
+    return fenced.group(1).strip() if fenced else text
+
+
+def with_heading(text: str, heading: str, level: int) -> str:
+    """Texto começando por heading; um título de mesmo nível na primeira linha é trocado por ele"""
+    lines = text.split('\n', 1)
+    match = _HEADING.match(lines[0])
+    if match and len(match.group(1)) == level:
+        text = lines[1].lstrip('\n') if len(lines) > 1 else ''
+    return f"{heading}\n\n{text}" if text else heading
+
+
+def normalize_regenerated(text: str, section: Section, original_heading: str) -> str:
+    """
+    Saída do modelo pronta para substituir a seção: sem cercas de código em
+    volta, começando pelo título original (o modelo pode omiti-lo ou trocar
+    o nível, o que mudaria a árvore do documento)
+    """
+    return with_heading(strip_code_fence(text), original_heading, section.level)
+
+
+def fit_section_text(text: str, followed: bool) -> str:
+    """Seção pronta para o encaixe: uma linha em branco antes do próximo título"""
+    text = text.strip('\n')
+    return f"{text}\n\n" if followed else f"{text}\n"
+
+
+def outline_sections(outline: str) -> list:
+    """
+    Seções do outline, em ordem: [{'title', 'points'}], com os pontos de
+    cada seção (as linhas até a próxima). Usa o nível de título mais alto
+    com ao menos duas ocorrências; sem títulos, os itens numerados de
+    primeiro nível. Lista vazia quando não há ao menos duas seções.
+    """
+    outline = outline or ''
+    headings = heading_lines(outline)
+    starts = []
+    for level in sorted({heading[2] for heading in headings}):
+        same_level = [heading for heading in headings if heading[2] == level]
+        if len(same_level) >= 2:
+            starts = [(start, body_start, title) for start, body_start, _, title in same_level]
+            break
+    if not starts:
+        position = 0
+        for line in outline.splitlines(keepends=True):
+            match = _OUTLINE_ITEM.match(line.rstrip('\r\n'))
+            if match:
+                starts.append((position, position + len(line), match.group(1).strip('* \t')))
+            position += len(line)
+    if len(starts) < 2:
+        return []
+    sections = []
+    for index, (start, body_start, title) in enumerate(starts):
+        end = starts[index + 1][0] if index + 1 < len(starts) else len(outline)
+        sections.append({'title': title, 'points': outline[body_start:end].strip('\n')})
+    return sections
+
+
+def _paragraph_key(paragraph: str) -> str:
+    return ' '.join(paragraph.split()).lower()
+
+
+def stitch_sections(texts: list, headings: list, verbatim: set = frozenset()) -> str:
+    """
+    Une as seções escritas em paralelo, em ordem. Ajustes locais de
+    consistência: cada seção começa pelo seu título (nível 2), títulos de
+    nível 1 ou 2 gerados dentro da seção descem para o nível 3 e parágrafos
+    longos idênticos a um de uma seção anterior (avisos, definições
+    repetidas) são removidos. As posições em verbatim (ex.: notas de seções
+    que falharam) entram sem ajustes e fora da remoção de repetidos.
+    """
+    seen = set()
+    parts = []
+    for position, (text, heading) in enumerate(zip(texts, headings)):
+        if position in verbatim:
+            parts.append(f"{heading}\n\n{text}")
+            continue
+        text = strip_code_fence(text)
+        # O título do documento (nível 1) e o da própria seção, repetidos pelo modelo no início
+        own_heading = True
+        while True:
+            first, _, rest = text.partition('\n')
+            match = _HEADING.match(first)
+            if not match or len(match.group(1)) > 2 or (len(match.group(1)) == 2 and not own_heading):
+                break
+            own_heading = own_heading and len(match.group(1)) == 1
+            text = rest.lstrip('\n')
+        for start, _, level, title in reversed(heading_lines(text)):
+            if level <= 2:
+                end = text.find('\n', start)
+                text = text[:start] + f"### {title}" + (text[end:] if end != -1 else '')
+        paragraphs = []
+        for paragraph in text.split('\n\n'):
+            key = _paragraph_key(paragraph)
+            if len(key) >= REPEATED_PARAGRAPH_MIN_CHARS:
+                if key in seen:
+                    continue
+                seen.add(key)
+            paragraphs.append(paragraph)
+        body = '\n\n'.join(paragraphs).strip('\n')
+        parts.append(f"{heading}\n\n{body}" if body else heading)
+    return '\n\n'.join(parts) + '\n'
+
+
+def parse_sections(text: str) -> SectionTree:
+    return SectionTree(text or '')
@@ -0,0 +1,113 @@
+"""
+Relatórios gerados, guardados para regeneração por seção
+
+Cada execução concluída grava um registro com o conteúdo final, o outline
+do pesquisador, o objetivo, o tipo de objetivo e a referência ao contexto
+usado (context_ref + artefato no ContextStore; o texto do contexto só é
+guardado no registro quando não há referência, ex.: textarea). Uma
+regeneração parcial grava uma nova versão com parent_id apontando para a
+anterior, sem alterar o registro original.
+
+Os registros ficam em disco (JSON comprimido com zlib, escrito de forma
+atômica); acima de max_entries, os acessados há mais tempo são removidos.
+"""
+import json
+import os
+import re
+import secrets
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+_REPORT_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def is_report_id(value: str) -> bool:
+    return bool(value) and bool(_REPORT_ID.match(value))
+
+
+def new_report_id() -> str:
+    return secrets.token_hex(16)
+
+
+class ReportStore:
+    """
+    Registros de relatórios por id, com índice LRU em memória
+    """
+
+    def __init__(self, root_dir: str, max_entries: int = 500, compression_level: int = 6):
+        self.root_dir = root_dir
+        self.max_entries = max(1, int(max_entries))
+        self.compression_level = compression_level
+        self._lock = threading.Lock()
+        # id -> None, do menos para o mais recente
+        self._entries = OrderedDict()
+        self._stats = {'saved': 0, 'hits': 0, 'misses': 0, 'evictions': 0}
+        os.makedirs(root_dir, exist_ok=True)
+        found = []
+        for name in os.listdir(root_dir):
+            if name.endswith('.report') and is_report_id(name[:-7]):
+                found.append((os.path.getmtime(os.path.join(root_dir, name)), name[:-7]))
+        for _, report_id in sorted(found):
+            self._entries[report_id] = None
+
+    def _path(self, report_id: str) -> str:
+        return os.path.join(self.root_dir, f"{report_id}.report")
+
+    def save(self, record: dict) -> str:
+        """Grava o registro (content, goal, goal_type, outline, ...) e retorna o id gerado"""
+        report_id = new_report_id()
+        record = {**record, 'report_id': report_id, 'created_at': time.time()}
+        payload = zlib.compress(json.dumps(record, ensure_ascii=False).encode('utf-8'), self.compression_level)
+        handle, temp_path = tempfile.mkstemp(dir=self.root_dir, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as target:
+                target.write(payload)
+            os.replace(temp_path, self._path(report_id))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        with self._lock:
+            self._entries[report_id] = None
+            self._stats['saved'] += 1
+            victims = []
+            while len(self._entries) > self.max_entries:
+                victims.append(self._entries.popitem(last=False)[0])
+                self._stats['evictions'] += 1
+        for victim in victims:
+            try:
+                os.remove(self._path(victim))
+            except OSError:
+                pass
+        return report_id
+
+    def get(self, report_id: str):
+        """Registro do relatório, ou None se não existir (ou já tiver sido removido)"""
+        with self._lock:
+            known = report_id in self._entries
+        record = None
+        if known:
+            try:
+                with open(self._path(report_id), 'rb') as source:
+                    record = json.loads(zlib.decompress(source.read()).decode('utf-8'))
+            except (OSError, ValueError, zlib.error):
+                record = None
+        with self._lock:
+            if record is None:
+                self._stats['misses'] += 1
+                return None
+            self._stats['hits'] += 1
+            if report_id in self._entries:
+                self._entries.move_to_end(report_id)
+        try:
+            os.utime(self._path(report_id))
+        except OSError:
+            pass
+        return record
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'max_entries': self.max_entries, **self._stats}
@@ -0,0 +1,96 @@
+"""
+Codificação de eventos SSE em bytes e entrega do resultado final em partes
+
+format_sse_event monta o evento como str e o WSGI o codifica depois; para o
+relatório final isso significa uma única linha 'data:' com o documento
+inteiro escapado em JSON (mais uma cópia em UTF-8), e o navegador só começa
+a exibir quando o quadro chega completo.
+
+encode_sse_event produz o mesmo evento já em bytes UTF-8, com o mesmo
+número de cópias de format_sse_event por quadro (JSON, bytes e o quadro
+montado com b''.join). O ganho vem da divisão: iter_result_events divide o
+resultado em eventos 'result_chunk' ordenados ({'index', 'text'}), cortando
+de preferência em quebras de linha, e termina com 'result_complete'
+({'chunks', 'chars', 'bytes', 'sha256'}), calculado parte a parte. Cada parte
+é escapada e codificada sozinha, sem um quadro com o documento inteiro; o
+cliente exibe o texto à medida que as partes chegam e confere o total no
+marcador final. ResultAssembler faz o caminho inverso (clientes em Python e
+testes).
+"""
+import hashlib
+import json
+
+EVENT_RESULT_CHUNK = 'result_chunk'
+EVENT_RESULT_COMPLETE = 'result_complete'
+
+DELIVERY_SINGLE = 'single'
+DELIVERY_CHUNKED = 'chunked'
+DELIVERY_MODES = (DELIVERY_SINGLE, DELIVERY_CHUNKED)
+
+# Uma quebra de linha só é usada como corte se ficar na segunda metade da parte
+_MIN_CUT_FRACTION = 0.5
+
+
+def encode_sse_event(data, event_type: str = 'message') -> bytes:
+    """Evento SSE em bytes UTF-8 (mesmo formato de format_sse_event)"""
+    payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+    return b''.join((b'event: ', event_type.encode('utf-8'), b'\ndata: ', payload, b'\n\n'))
+
+
+def split_result(text: str, chunk_chars: int):
+    """
+    Partes de até chunk_chars caracteres, em ordem; o corte é feito após a
+    última quebra de linha da parte quando ela existe na segunda metade
+    """
+    chunk_chars = max(1, int(chunk_chars))
+    start = 0
+    length = len(text)
+    while start < length:
+        end = min(start + chunk_chars, length)
+        if end < length:
+            cut = text.rfind('\n', start + int(chunk_chars * _MIN_CUT_FRACTION), end)
+            if cut != -1:
+                end = cut + 1
+        yield text[start:end]
+        start = end
+
+
+def iter_result_events(text: str, chunk_chars: int):
+    """Eventos result_chunk (bytes) do texto, seguidos do marcador result_complete"""
+    digest = hashlib.sha256()
+    size = 0
+    count = 0
+    for index, part in enumerate(split_result(text, chunk_chars)):
+        encoded = part.encode('utf-8')
+        digest.update(encoded)
+        size += len(encoded)
+        count += 1
+        yield encode_sse_event({'index': index, 'text': part}, EVENT_RESULT_CHUNK)
+    yield encode_sse_event({'chunks': count, 'chars': len(text), 'bytes': size, 'sha256': digest.hexdigest()},
+                           EVENT_RESULT_COMPLETE)
+
+
+class ResultAssembler:
+    """
+    Remonta o resultado a partir dos eventos result_chunk e confere o
+    marcador result_complete (levanta ValueError se faltar ou sobrar parte)
+    """
+
+    def __init__(self):
+        self._parts = []
+
+    def add(self, chunk: dict):
+        if chunk['index'] != len(self._parts):
+            raise ValueError(f"parte {chunk['index']} fora de ordem (esperada {len(self._parts)})")
+        self._parts.append(chunk['text'])
+
+    def text(self) -> str:
+        return ''.join(self._parts)
+
+    def complete(self, marker: dict) -> str:
+        text = self.text()
+        if marker['chunks'] != len(self._parts) or marker['chars'] != len(text):
+            raise ValueError(f"resultado incompleto: {len(self._parts)} de {marker['chunks']} partes")
+        if hashlib.sha256(text.encode('utf-8')).hexdigest() != marker['sha256']:
+            raise ValueError("checksum do resultado não confere")
+        return text
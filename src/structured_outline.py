@@ -0,0 +1,166 @@
+"""
+Outlines estruturados (JSON) do pesquisador
+
+No modo estruturado, o pesquisador responde em JSON (responseMimeType
+application/json com responseSchema) em vez de markdown livre: seções com
+pontos-chave e referências aos dados do contexto. A resposta é validada
+localmente e normalizada; downstream (escritor, síntese) recebe uma
+renderização compacta, numerada como os outlines em markdown, que também
+serve ao escritor por seções.
+
+Com os outlines dos colaboradores estruturados, os insights repetidos
+(entre colaboradores ou já presentes no outline principal) são removidos de
+forma determinística, comparando os termos normalizados de cada ponto, sem
+outra chamada ao modelo.
+"""
+import json
+import re
+
+from context_retrieval import tokenize
+
+# Esquema enviado em generationConfig.responseSchema (subconjunto OpenAPI aceito pelo Gemini)
+OUTLINE_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'title': {'type': 'STRING'},
+        'sections': {
+            'type': 'ARRAY',
+            'items': {
+                'type': 'OBJECT',
+                'properties': {
+                    'title': {'type': 'STRING'},
+                    'key_points': {'type': 'ARRAY', 'items': {'type': 'STRING'}},
+                    'data_refs': {'type': 'ARRAY', 'items': {'type': 'STRING'}},
+                },
+                'required': ['title', 'key_points'],
+            },
+        },
+    },
+    'required': ['sections'],
+}
+
+MAX_SECTIONS = 30
+MAX_POINTS = 20
+MAX_ITEM_CHARS = 500
+# Pontos com ao menos esta fração de termos em comum são considerados repetidos
+DUPLICATE_SIMILARITY = 0.8
+
+
+class OutlineValidationError(ValueError):
+    """Resposta do modelo que não é um outline válido"""
+
+
+def _strings(value, field: str) -> list:
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        raise OutlineValidationError(f"'{field}' deve ser uma lista de textos")
+    items = []
+    for item in value:
+        if isinstance(item, (int, float)) and not isinstance(item, bool):
+            item = str(item)
+        if not isinstance(item, str):
+            raise OutlineValidationError(f"'{field}' deve conter apenas textos")
+        item = ' '.join(item.split())
+        if item and item not in items:
+            items.append(item[:MAX_ITEM_CHARS])
+    return items[:MAX_POINTS]
+
+
+def parse_outline_json(text: str) -> dict:
+    """
+    Valida e normaliza a resposta JSON: {'title', 'sections': [{'title',
+    'key_points', 'data_refs'}]}, com espaços normalizados, itens vazios ou
+    repetidos removidos e limites de tamanho. Levanta OutlineValidationError.
+    """
+    text = (text or '').strip()
+    fenced = re.match(r"^```[a-zA-Z]*\n(.*?)\n?```$", text, re.S)
+    if fenced:
+        text = fenced.group(1)
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise OutlineValidationError(f"JSON inválido: {e}") from None
+    if isinstance(data, list):
+        data = {'sections': data}
+    if not isinstance(data, dict) or not isinstance(data.get('sections'), list):
+        raise OutlineValidationError("o outline deve ter a lista 'sections'")
+    sections = []
+    for index, section in enumerate(data['sections'][:MAX_SECTIONS], 1):
+        if not isinstance(section, dict):
+            raise OutlineValidationError(f"seção {index} não é um objeto")
+        title = ' '.join(str(section.get('title') or '').split())
+        if not title:
+            raise OutlineValidationError(f"seção {index} sem título")
+        sections.append({
+            'title': title[:MAX_ITEM_CHARS],
+            'key_points': _strings(section.get('key_points'), 'key_points'),
+            'data_refs': _strings(section.get('data_refs'), 'data_refs'),
+        })
+    if not sections:
+        raise OutlineValidationError("o outline não tem seções")
+    title = data.get('title')
+    return {'title': ' '.join(title.split())[:MAX_ITEM_CHARS] if isinstance(title, str) else '', 'sections': sections}
+
+
+def render_outline(outline: dict, numbered: bool = True) -> str:
+    """
+    Texto compacto para os prompts: título, seções numeradas, pontos em
+    tópicos e as referências aos dados em uma linha por seção
+    """
+    lines = [outline['title']] if outline.get('title') else []
+    for index, section in enumerate(outline['sections'], 1):
+        lines.append(f"{index}. {section['title']}" if numbered else f"* {section['title']}")
+        lines.extend(f"   - {point}" for point in section['key_points'])
+        if section['data_refs']:
+            lines.append(f"   [dados: {'; '.join(section['data_refs'])}]")
+    return '\n'.join(lines)
+
+
+def _point_terms(point: str) -> frozenset:
+    return frozenset(tokenize(point))
+
+
+def _is_duplicate(terms: frozenset, seen: list) -> bool:
+    if not terms:
+        return False
+    for other in seen:
+        if terms == other:
+            return True
+        if len(terms) >= 3 and len(other) >= 3 and len(terms & other) / len(terms | other) >= DUPLICATE_SIMILARITY:
+            return True
+    return False
+
+
+def dedupe_insights(collaborators: dict, primary: dict = None) -> tuple:
+    """
+    Outlines dos colaboradores sem os pontos já presentes no outline
+    principal ou em um colaborador anterior (na ordem do dicionário), e sem
+    as referências a dados já citadas. Seções que ficam sem pontos e sem
+    referências são omitidas. Retorna
+    ({tipo: outline filtrado}, pontos removidos).
+    """
+    seen = []
+    seen_refs = set()
+    if primary:
+        seen.extend(_point_terms(point) for section in primary['sections'] for point in section['key_points'])
+        seen_refs.update(ref.lower() for section in primary['sections'] for ref in section['data_refs'])
+    removed = 0
+    filtered = {}
+    for agent_type, outline in collaborators.items():
+        sections = []
+        for section in outline['sections']:
+            points = []
+            for point in section['key_points']:
+                terms = _point_terms(point)
+                if _is_duplicate(terms, seen):
+                    removed += 1
+                    continue
+                seen.append(terms)
+                points.append(point)
+            refs = [ref for ref in section['data_refs'] if ref.lower() not in seen_refs]
+            seen_refs.update(ref.lower() for ref in refs)
+            if points or refs:
+                sections.append({**section, 'key_points': points, 'data_refs': refs})
+        filtered[agent_type] = {'title': outline.get('title', ''), 'sections': sections}
+    return filtered, removed
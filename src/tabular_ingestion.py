@@ -0,0 +1,447 @@
+"""
+Leitura em streaming de CSV/TSV e JSON Lines para colunas tipadas
+
+O arquivo é lido em blocos de texto (UploadedText.iter_text), sem carregar
+o conteúdo inteiro em uma string. Cada coluna é acumulada em um array
+compacto conforme o tipo inferido durante a leitura: números em
+array('d'), datas em dias (array('q')) e textos com dicionário de valores
+(códigos em array('i')). Colunas de texto com valores demais para um
+dicionário guardam apenas uma amostra, o que mantém a memória limitada
+mesmo para exportações de centenas de MB. Linhas malformadas são contadas
+e registradas (número da linha e motivo) sem interromper a leitura.
+
+O resultado (ParsedTable) alimenta o perfil estatístico (data_profile) e
+a mesma codificação tabular usada para o JSON.
+"""
+import csv
+import json
+import math
+import re
+from array import array
+from datetime import date as _date
+
+import numpy as np
+
+from context_encoding import TABLE_DELIMITER, TABLE_LEGEND, encode_cell, encode_key
+from data_profile import TableProfile, parse_date
+
+FORMAT_CSV = 'csv'
+FORMAT_TSV = 'tsv'
+FORMAT_JSONL = 'jsonl'
+TABULAR_EXTENSIONS = {
+    '.csv': FORMAT_CSV,
+    '.tsv': FORMAT_TSV,
+    '.tab': FORMAT_TSV,
+    '.jsonl': FORMAT_JSONL,
+    '.ndjson': FORMAT_JSONL,
+}
+
+KIND_EMPTY = 'vazia'
+KIND_NUMBER = 'numérica'
+KIND_DATE = 'data'
+KIND_STRING = 'categórica'
+KIND_TEXT = 'texto'
+
+_NAT = np.iinfo(np.int64).min
+_EPOCH = np.datetime64('1970-01-01', 'D')
+_EPOCH_ORDINAL = _date(1970, 1, 1).toordinal()
+# Conversão de datas em bloco só para AAAA-MM-DD completo (o NumPy aceita '2024' e '2024-03')
+_FULL_ISO_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def tabular_format(filename: str):
+    """Formato tabular pelo nome do arquivo (ou None)"""
+    lowered = (filename or '').lower()
+    for extension, file_format in TABULAR_EXTENSIONS.items():
+        if lowered.endswith(extension):
+            return file_format
+    return None
+
+
+def parse_number(text: str, decimal_comma: bool = False):
+    """float a partir do texto ('1.234,56' quando decimal_comma); None se não for número"""
+    text = text.strip()
+    if not text or text[-1] in 'eE' or text.lower() in ('nan', 'inf', '-inf', 'infinity'):
+        return None
+    if decimal_comma:
+        text = text.replace('.', '').replace(',', '.')
+    try:
+        number = float(text)
+    except ValueError:
+        return None
+    # '1e999' estoura para inf: não é um número utilizável no perfil
+    return number if math.isfinite(number) else None
+
+
+def _is_number(value) -> bool:
+    """Número JSON finito (bool, NaN e infinito não contam)"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _parse_number_block(values: list, decimal_comma: bool):
+    """float64 de um bloco de textos ou números ('' e None = NaN); None se algum não for número"""
+    cleaned = []
+    for value in values:
+        if value is None or value == '':
+            cleaned.append('nan')
+        elif isinstance(value, str):
+            cleaned.append(value.replace('.', '').replace(',', '.') if decimal_comma else value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            cleaned.append(value)
+        else:
+            return None
+    try:
+        converted = np.array(cleaned, dtype=np.float64)
+    except ValueError:
+        return None
+    # Mesmas regras de parse_number: 'nan', 'inf', '1e999' etc. não são números
+    present = np.array([value is not None and value != '' for value in values], dtype=bool)
+    if not np.isfinite(converted[present]).all():
+        return None
+    return converted
+
+
+def _parse_date_block(values: list):
+    """Dias desde 1970 (int64) de um bloco de datas ISO; None se houver outro formato"""
+    if not all(value is None or value == '' or (isinstance(value, str) and _FULL_ISO_DATE.fullmatch(value))
+               for value in values):
+        return None
+    try:
+        return np.array([value or 'NaT' for value in values], dtype='datetime64[D]').view(np.int64)
+    except ValueError:
+        return None
+
+
+def _number_text(value: float) -> str:
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class ColumnBuilder:
+    """
+    Coluna acumulada durante a leitura, com o tipo rebaixado conforme
+    aparecem valores incompatíveis (número/data -> texto)
+    """
+
+    def __init__(self, name: str, max_categories: int = 4096, text_samples: int = 50):
+        self.name = name
+        self.max_categories = max_categories
+        self.text_samples = text_samples
+        self.kind = KIND_EMPTY
+        self.size = 0
+        self.missing = 0
+        self._values = None
+        self._labels = []
+        self._codes = {}
+        self.samples = []
+
+    def pad(self, count: int):
+        """Acrescenta count valores ausentes (coluna que surgiu depois das primeiras linhas)"""
+        for _ in range(count):
+            self.append(None)
+
+    def append(self, value, decimal_comma: bool = False):
+        self.size += 1
+        if value is None or value == '':
+            self.missing += 1
+            self._append_missing()
+            return
+        if self.kind == KIND_EMPTY:
+            self._start(value, decimal_comma)
+        if self.kind == KIND_NUMBER:
+            number = value if _is_number(value) else \
+                parse_number(value, decimal_comma) if isinstance(value, str) else None
+            if number is not None:
+                self._values.append(float(number))
+                return
+            self._to_strings()
+        elif self.kind == KIND_DATE:
+            date = parse_date(value)
+            if date is not None:
+                try:
+                    self._values.append(_date.fromisoformat(date).toordinal() - _EPOCH_ORDINAL)
+                    return
+                except ValueError:
+                    pass
+            self._to_strings()
+        self._append_string(value if isinstance(value, str) else
+                            json.dumps(value, ensure_ascii=False) if isinstance(value, (list, dict)) else str(value))
+
+    def extend(self, values: list, decimal_comma: bool = False):
+        """
+        Acrescenta um bloco de valores de uma coluna (várias linhas de CSV ou
+        registros JSON). Números e datas ISO são convertidos de uma vez pelo
+        NumPy; se o bloco tiver algum valor incompatível, cai para a conversão
+        valor a valor.
+        """
+        if self.kind == KIND_EMPTY:
+            first = next((index for index, value in enumerate(values) if value is not None and value != ''), None)
+            if first is None:
+                self.pad(len(values))
+                return
+            self.pad(first)
+            self.append(values[first], decimal_comma)
+            values = values[first + 1:]
+        converted = None
+        if self.kind == KIND_NUMBER:
+            converted = _parse_number_block(values, decimal_comma)
+        elif self.kind == KIND_DATE:
+            converted = _parse_date_block(values)
+        if converted is None:
+            for value in values:
+                self.append(value, decimal_comma)
+            return
+        self._values.frombytes(converted.tobytes())
+        self.size += len(values)
+        self.missing += sum(1 for value in values if value is None or value == '')
+
+    def _start(self, value, decimal_comma: bool):
+        # Valores anteriores (todos ausentes) são refeitos no tipo escolhido
+        missing = self.size - 1
+        if _is_number(value) or \
+                (isinstance(value, str) and parse_number(value, decimal_comma) is not None):
+            self.kind, self._values = KIND_NUMBER, array('d', [np.nan] * missing)
+        elif parse_date(value) is not None:
+            self.kind, self._values = KIND_DATE, array('q', [_NAT] * missing)
+        else:
+            self.kind, self._values = KIND_STRING, array('i', [-1] * missing)
+
+    def _append_missing(self):
+        if self.kind == KIND_NUMBER:
+            self._values.append(np.nan)
+        elif self.kind == KIND_DATE:
+            self._values.append(_NAT)
+        elif self.kind == KIND_STRING:
+            self._values.append(-1)
+
+    def _to_strings(self):
+        """Número/data -> texto: os valores já lidos passam para o dicionário"""
+        previous_kind, previous = self.kind, self._values
+        self.kind, self._values = KIND_STRING, array('i')
+        for value in previous:
+            if previous_kind == KIND_NUMBER:
+                text = None if np.isnan(value) else _number_text(value)
+            else:
+                text = None if value == _NAT else str(_EPOCH + np.timedelta64(value, 'D'))
+            if text is not None:
+                self._append_string(text)
+            elif self.kind == KIND_STRING:
+                self._values.append(-1)
+
+    def _append_string(self, text: str):
+        if self.kind == KIND_TEXT:
+            if len(self.samples) < self.text_samples:
+                self.samples.append(text)
+            return
+        code = self._codes.get(text)
+        if code is None:
+            if len(self._labels) >= self.max_categories:
+                # Valores distintos demais: passa a guardar só uma amostra
+                self.kind = KIND_TEXT
+                self.samples = self._labels[:self.text_samples]
+                self._values, self._labels, self._codes = None, [], {}
+                return
+            code = self._codes[text] = len(self._labels)
+            self._labels.append(text)
+        self._values.append(code)
+
+    def to_array(self):
+        """Array NumPy com todos os valores (None para colunas de texto sem dicionário)"""
+        if self.kind == KIND_NUMBER:
+            return np.frombuffer(self._values, dtype=np.float64)
+        if self.kind == KIND_DATE:
+            return np.frombuffer(self._values, dtype=np.int64).view('datetime64[D]')
+        if self.kind == KIND_STRING:
+            labels = np.array(self._labels + [''], dtype=object)
+            return labels[np.frombuffer(self._values, dtype=np.int32)]
+        if self.kind == KIND_EMPTY:
+            return np.full(self.size, np.nan)
+        return None
+
+    def memory_bytes(self) -> int:
+        values = self._values.itemsize * len(self._values) if self._values is not None else 0
+        return values + sum(len(label) for label in self._labels) + sum(len(sample) for sample in self.samples)
+
+
+class ParsedTable:
+    """
+    Colunas tipadas, amostra das primeiras linhas e linhas malformadas de um arquivo tabular
+    """
+
+    def __init__(self, name: str, file_format: str, sample_rows: int = 20, max_malformed: int = 100,
+                 max_categories: int = 4096):
+        self.name = name
+        self.format = file_format
+        self.sample_rows = sample_rows
+        self.max_malformed = max_malformed
+        self.max_categories = max_categories
+        self.columns = {}
+        self.rows = 0
+        self.sample = []
+        self.malformed = []
+        self.malformed_count = 0
+
+    def column(self, name: str) -> ColumnBuilder:
+        builder = self.columns.get(name)
+        if builder is None:
+            builder = self.columns[name] = ColumnBuilder(name, max_categories=self.max_categories)
+            builder.pad(self.rows)
+        return builder
+
+    def add_row(self, values: dict, decimal_comma: bool = False):
+        for name, value in values.items():
+            self.column(name).append(value, decimal_comma)
+        self.rows += 1
+        for builder in self.columns.values():
+            if builder.size < self.rows:
+                builder.append(None)
+        if self.sample_rows is None or len(self.sample) < self.sample_rows:
+            self.sample.append(values)
+
+    def add_rows(self, header: list, rows: list, decimal_comma: bool = False):
+        """Bloco de linhas completas (CSV): cada coluna é convertida de uma vez"""
+        if not rows:
+            return
+        for name, values in zip(header, zip(*rows)):
+            self.columns[name].extend(list(values), decimal_comma)
+        self.rows += len(rows)
+        if self.sample_rows is None or len(self.sample) < self.sample_rows:
+            needed = len(rows) if self.sample_rows is None else self.sample_rows - len(self.sample)
+            self.sample.extend(dict(zip(header, row)) for row in rows[:needed])
+
+    def add_records(self, records: list):
+        """Bloco de registros (dicts); colunas novas são preenchidas com ausentes nas linhas anteriores"""
+        if not records:
+            return
+        names = {}
+        for record in records:
+            for name in record:
+                names[name] = None
+        for name in names:
+            self.column(name)
+        for name, builder in self.columns.items():
+            builder.extend([record.get(name) for record in records])
+        self.rows += len(records)
+        if self.sample_rows is None or len(self.sample) < self.sample_rows:
+            needed = len(records) if self.sample_rows is None else self.sample_rows - len(self.sample)
+            self.sample.extend(records[:needed])
+
+    def flag(self, line_number: int, reason: str):
+        self.malformed_count += 1
+        if len(self.malformed) < self.max_malformed:
+            self.malformed.append((line_number, reason))
+
+    def profile_columns(self) -> dict:
+        """Colunas como arrays NumPy para TableProfile (colunas de texto sem dicionário ficam de fora)"""
+        return {name: values for name, values in
+                ((name, builder.to_array()) for name, builder in self.columns.items()) if values is not None}
+
+    def profile(self, top_k: int = 5) -> TableProfile:
+        return TableProfile(self.name, self.profile_columns(), top_k=top_k)
+
+    def encode_sample(self) -> str:
+        """Amostra de linhas na codificação tabular (cabeçalho uma vez, uma linha por registro)"""
+        names = list(self.columns)
+        lines = [TABLE_LEGEND, f"{self.name}[{len(self.sample)}]{{{TABLE_DELIMITER.join(encode_key(name) for name in names)}}}:"]
+        for record in self.sample:
+            lines.append('  ' + TABLE_DELIMITER.join(encode_cell(record.get(name)) for name in names))
+        return '\n'.join(lines)
+
+    def memory_bytes(self) -> int:
+        return sum(builder.memory_bytes() for builder in self.columns.values())
+
+
+def iter_lines(chunks):
+    """Linhas (com o '\\n') a partir de blocos de texto"""
+    pending = ''
+    for chunk in chunks:
+        pending += chunk
+        start = 0
+        while True:
+            end = pending.find('\n', start)
+            if end < 0:
+                break
+            yield pending[start:end + 1]
+            start = end + 1
+        pending = pending[start:]
+    if pending:
+        yield pending
+
+
+def sniff_dialect(head: str, file_format: str):
+    """Delimitador do CSV pelo início do arquivo (TSV sempre usa tabulação)"""
+    if file_format == FORMAT_TSV:
+        return '\t'
+    try:
+        return csv.Sniffer().sniff(head, delimiters=',;\t|').delimiter
+    except csv.Error:
+        return ','
+
+
+def read_delimited(chunks, name: str, file_format: str = FORMAT_CSV, head: str = '', batch_rows: int = 8192,
+                   **options) -> ParsedTable:
+    """CSV/TSV com cabeçalho na primeira linha, convertido em blocos de batch_rows linhas"""
+    table = ParsedTable(name, file_format, **options)
+    delimiter = sniff_dialect(head, file_format)
+    # CSV brasileiro: separador ';' e vírgula decimal
+    decimal_comma = delimiter == ';'
+    reader = csv.reader(iter_lines(chunks), delimiter=delimiter, strict=True)
+    header = None
+    batch = []
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            break
+        except csv.Error as error:
+            table.flag(reader.line_num, str(error))
+            continue
+        if header is None:
+            header = []
+            for index, column in enumerate(row):
+                column = column.strip().lstrip('\ufeff') or f"coluna_{index + 1}"
+                # Cabeçalhos repetidos viram colunas distintas
+                while column in header:
+                    column = f"{column}_{index + 1}"
+                header.append(column)
+                table.column(column)
+            continue
+        if not row or (len(row) == 1 and not row[0].strip()):
+            continue
+        if len(row) != len(header):
+            table.flag(reader.line_num, f"{len(row)} campos, esperados {len(header)}")
+            continue
+        batch.append(row)
+        if len(batch) >= batch_rows:
+            table.add_rows(header, batch, decimal_comma)
+            batch = []
+    if header is not None:
+        table.add_rows(header, batch, decimal_comma)
+    return table
+
+
+def read_jsonl(chunks, name: str, **options) -> ParsedTable:
+    """JSON Lines: um objeto por linha; colunas novas são acrescentadas quando aparecem"""
+    table = ParsedTable(name, FORMAT_JSONL, **options)
+    for line_number, line in enumerate(iter_lines(chunks), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as error:
+            table.flag(line_number, f"JSON inválido: {error.msg} (coluna {error.colno})")
+            continue
+        if not isinstance(record, dict):
+            table.flag(line_number, "linha não é um objeto JSON")
+            continue
+        table.add_row(record)
+    return table
+
+
+def read_tabular(upload, file_format: str = None, **options) -> ParsedTable:
+    """Lê um UploadedText (ou qualquer objeto com iter_text/head/filename) em colunas tipadas"""
+    file_format = file_format or tabular_format(upload.filename)
+    name = (upload.filename or 'dados').rsplit('/', 1)[-1].rsplit('.', 1)[0] or 'dados'
+    if file_format == FORMAT_JSONL:
+        return read_jsonl(upload.iter_text(), name, **options)
+    return read_delimited(upload.iter_text(), name, file_format, head=upload.head(16384), **options)
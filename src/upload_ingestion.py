@@ -0,0 +1,239 @@
+"""
+Ingestão de arquivos enviados (dataSource)
+
+O corpo do upload é gravado em blocos em um spool: fica em memória até um
+limite e depois passa para um arquivo temporário, com teto de tamanho e hash
+SHA-256 calculado durante a gravação. A codificação é detectada pelo início
+do arquivo (BOM, UTF-8 válido ou charset_normalizer, se instalado) e o texto
+é decodificado de forma incremental ou direto de uma visão mapeada em memória,
+sem manter bytes e texto completos ao mesmo tempo.
+"""
+import codecs
+import hashlib
+import io
+import mmap
+import tempfile
+from contextlib import contextmanager
+
+from flask import Request
+
+try:
+    import charset_normalizer
+except ImportError:  # pragma: no cover - dependência opcional
+    charset_normalizer = None
+
+CHUNK_SIZE = 64 * 1024
+DETECTION_BYTES = 64 * 1024
+FALLBACK_ENCODING = 'cp1252'
+# Páginas de código latinas que o charset_normalizer confunde entre si em
+# textos curtos; para dados em português a cp1252 (Windows) é a escolha correta
+_LATIN_CODEPAGES = frozenset({
+    'cp1250', 'cp1252', 'cp1254', 'cp1257', 'cp1258', 'latin_1',
+    'iso8859_2', 'iso8859_9', 'iso8859_13', 'iso8859_15', 'mac_latin2', 'mac_roman',
+})
+
+_BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32-le'),
+    (codecs.BOM_UTF32_BE, 'utf-32-be'),
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+)
+
+
+class UploadTooLarge(Exception):
+    """O upload ultrapassou o tamanho máximo configurado"""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Arquivo maior que o limite de {max_bytes // (1024 * 1024)} MB")
+        self.max_bytes = max_bytes
+
+
+class UploadSpool:
+    """
+    Destino dos bytes do upload: BytesIO até memory_bytes, depois arquivo
+    temporário. Conta os bytes, calcula o SHA-256 e aplica o teto max_bytes.
+    """
+
+    def __init__(self, max_bytes: int = None, memory_bytes: int = 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self.size_bytes = 0
+        self._sha256 = hashlib.sha256()
+        self._file = io.BytesIO()
+        self._on_disk = False
+
+    @property
+    def on_disk(self) -> bool:
+        return self._on_disk
+
+    @property
+    def sha256(self) -> str:
+        return self._sha256.hexdigest()
+
+    def write(self, data) -> int:
+        size = len(data)
+        if self.max_bytes and self.size_bytes + size > self.max_bytes:
+            raise UploadTooLarge(self.max_bytes)
+        self.size_bytes += size
+        self._sha256.update(data)
+        if not self._on_disk and self._file.tell() + size > self.memory_bytes:
+            self._rollover()
+        return self._file.write(data)
+
+    def _rollover(self):
+        disk_file = tempfile.TemporaryFile()
+        disk_file.write(self._file.getbuffer())
+        disk_file.seek(self._file.tell())
+        self._file = disk_file
+        self._on_disk = True
+
+    @contextmanager
+    def view(self):
+        """Visão somente leitura de todos os bytes (memoryview ou mmap), sem cópia"""
+        if not self._on_disk:
+            buffer = self._file.getbuffer()
+            try:
+                yield buffer
+            finally:
+                buffer.release()
+            return
+        self._file.flush()
+        if self.size_bytes == 0:
+            yield memoryview(b'')
+            return
+        mapped = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(mapped)
+        try:
+            yield buffer
+        finally:
+            buffer.release()
+            mapped.close()
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def __getattr__(self, name):
+        # read, readline, seek, tell, close... (interface exigida pelo Werkzeug)
+        return getattr(self._file, name)
+
+
+class SpoolingRequest(Request):
+    """
+    Request do Flask que grava os arquivos enviados diretamente em UploadSpool
+    (uma única cópia, com teto de tamanho) em vez do spool padrão do Werkzeug
+    """
+
+    upload_max_bytes = None
+    upload_memory_bytes = 1024 * 1024
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return UploadSpool(self.upload_max_bytes, self.upload_memory_bytes)
+
+    def keep_files_open(self):
+        """
+        Mantém os arquivos já lidos abertos quando a view retorna: uma resposta
+        em streaming que ainda vai usá-los os fecha com close_files()
+        """
+        self._files_kept = True
+
+    def close(self):
+        if not getattr(self, '_files_kept', False):
+            super().close()
+
+    def close_files(self):
+        self._files_kept = False
+        super().close()
+
+
+def detect_encoding(head: bytes) -> tuple:
+    """(codificação, tamanho do BOM) a partir dos primeiros bytes do arquivo"""
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding, len(bom)
+    try:
+        # final=False: um caractere multibyte cortado no fim da amostra não é erro
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+        return 'utf-8', 0
+    except UnicodeDecodeError:
+        pass
+    if charset_normalizer is not None:
+        best = charset_normalizer.from_bytes(head).best()
+        if best is not None and best.encoding not in _LATIN_CODEPAGES:
+            return best.encoding, 0
+    return FALLBACK_ENCODING, 0
+
+
+class UploadedText:
+    """
+    Texto de um upload em spool: decodificado sob demanda (em blocos ou de
+    uma vez, direto da visão mapeada em memória)
+    """
+
+    def __init__(self, spool: UploadSpool, filename: str = ''):
+        self.spool = spool
+        self.filename = filename or ''
+        with spool.view() as buffer:
+            self.encoding, self._bom_length = detect_encoding(bytes(buffer[:DETECTION_BYTES]))
+        self._text = None
+
+    @property
+    def size_bytes(self) -> int:
+        return self.spool.size_bytes
+
+    @property
+    def sha256(self) -> str:
+        return self.spool.sha256
+
+    def iter_text(self, chunk_bytes: int = CHUNK_SIZE):
+        """Gera o texto em blocos, com decodificação incremental"""
+        decoder = codecs.getincrementaldecoder(self.encoding)(errors='replace')
+        with self.spool.view() as buffer:
+            for start in range(self._bom_length, len(buffer), chunk_bytes):
+                text = decoder.decode(buffer[start:start + chunk_bytes])
+                if text:
+                    yield text
+        tail = decoder.decode(b'', final=True)
+        if tail:
+            yield tail
+
+    def head(self, max_chars: int = 200) -> str:
+        """Início do texto, sem decodificar o arquivo inteiro"""
+        collected = []
+        size = 0
+        for text in self.iter_text(chunk_bytes=max(max_chars * 4, 64)):
+            collected.append(text)
+            size += len(text)
+            if size >= max_chars:
+                break
+        return ''.join(collected)[:max_chars]
+
+    def read_text(self) -> str:
+        """Texto completo, decodificado uma única vez a partir da visão dos bytes"""
+        if self._text is None:
+            with self.spool.view() as buffer:
+                self._text = codecs.decode(buffer[self._bom_length:], self.encoding, 'replace')
+        return self._text
+
+    def close(self):
+        self._text = None
+        self.spool.close()
+
+
+def ingest_upload(file_storage, max_bytes: int = None, memory_bytes: int = 1024 * 1024) -> UploadedText:
+    """
+    Recebe o FileStorage do Flask. Se o Werkzeug já gravou o arquivo em um
+    UploadSpool (SpoolingRequest) ele é usado diretamente; senão o stream é
+    copiado em blocos para um novo spool, respeitando o teto de tamanho.
+    """
+    stream = file_storage.stream
+    if isinstance(stream, UploadSpool):
+        spool = stream
+    else:
+        spool = UploadSpool(max_bytes, memory_bytes)
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            spool.write(chunk)
+    return UploadedText(spool, file_storage.filename)
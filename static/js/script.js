@@ -128,6 +128,19 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    // Arquivo já armazenado no servidor (mesmo SHA-256): envia só a referência
+    const findStoredContext = async (file) => {
+        if (!window.crypto || !window.crypto.subtle) return null;
+        try {
+            const digest = await window.crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+            const hash = Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+            const response = await fetch(`/api/context/${hash}`, { method: 'HEAD' });
+            return response.ok ? hash : null;
+        } catch (error) {
+            return null;
+        }
+    };
+
     // Lógica do sistema de agentes
     const runAgentSystem = async () => {
         clearResults();
@@ -136,7 +149,12 @@ document.addEventListener('DOMContentLoaded', () => {
 
         const selectedDataSourceType = document.querySelector('input[name="dataSourceType"]:checked').value;
         if (selectedDataSourceType === 'file' && dataSourceInput.files.length > 0) {
-            formData.append('dataSource', dataSourceInput.files[0]);
+            const contextRef = await findStoredContext(dataSourceInput.files[0]);
+            if (contextRef) {
+                formData.append('context_ref', contextRef);
+            } else {
+                formData.append('dataSource', dataSourceInput.files[0]);
+            }
         } else if (selectedDataSourceType === 'json' && jsonInput.value.trim()) {
             formData.append('json_data', jsonInput.value);
         } else if (selectedDataSourceType === 'example' && exampleSelect.value) {
@@ -157,6 +175,10 @@ document.addEventListener('DOMContentLoaded', () => {
             }
         }
 
+        // Relatórios longos chegam em partes (result_chunk) e são exibidos à medida que chegam
+        formData.append('result_delivery', 'chunked');
+        let resultChunks = [];
+
         try {
             const response = await fetch('/api/run_agent_system', { method: 'POST', body: formData });
 
@@ -190,10 +212,34 @@ document.addEventListener('DOMContentLoaded', () => {
                         if (eventType === 'log') {
                             liveLog.innerHTML += `<p>${eventData}</p>`;
                             liveLog.scrollTop = liveLog.scrollHeight;
+                        } else if (eventType === 'queue') {
+                            const queueMsg = eventData.position > 0
+                                ? `Aguardando na fila: posição ${eventData.position} (espera estimada ~${Math.round(eventData.estimated_wait_seconds)}s)`
+                                : 'Execução iniciada.';
+                            liveLog.innerHTML += `<p>${queueMsg}</p>`;
+                            liveLog.scrollTop = liveLog.scrollHeight;
                         } else if (eventType === 'partial_result') {
                             resultContent.innerHTML = eventData;
                         } else if (eventType === 'final_result') {
                             resultContent.innerHTML = eventData;
+                        } else if (eventType === 'result_chunk') {
+                            if (eventData.index === 0) resultChunks = [];
+                            resultChunks.push(eventData.text);
+                            resultContent.innerHTML = resultChunks.join('');
+                        } else if (eventType === 'result_complete') {
+                            const assembled = resultChunks.join('');
+                            resultContent.innerHTML = assembled;
+                            verifyResultChunks(assembled, resultChunks.length, eventData).then((ok) => {
+                                if (!ok) {
+                                    liveLog.innerHTML += '<p class="text-warning">O resultado recebido está incompleto. Execute novamente.</p>';
+                                }
+                            });
+                        } else if (eventType === 'quality_report') {
+                            const qaMsg = eventData.status === 'ok'
+                                ? `Qualidade: ${eventData.overall_score.toFixed(2)}/1.0 (completude ${eventData.detailed_scores.completeness.toFixed(2)}, precisão ${eventData.detailed_scores.accuracy.toFixed(2)}, relevância ${eventData.detailed_scores.relevance.toFixed(2)}, acionabilidade ${eventData.detailed_scores.actionability.toFixed(2)})`
+                                : `Avaliação de qualidade indisponível (${eventData.status})`;
+                            liveLog.innerHTML += `<p>${qaMsg}</p>`;
+                            liveLog.scrollTop = liveLog.scrollHeight;
                         } else if (eventType === 'error') {
                             liveLog.innerHTML += `<p class="text-danger">Erro: ${eventData.error}</p>`;
                             resultContent.innerHTML = `<p class="text-danger">Ocorreu um erro: ${eventData.error}</p>`;
@@ -217,6 +263,16 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     };
 
+    // Confere o resultado remontado com o marcador result_complete (sha256 quando disponível)
+    const verifyResultChunks = async (text, count, marker) => {
+        const bytes = new TextEncoder().encode(text);
+        if (count !== marker.chunks || bytes.length !== marker.bytes) return false;
+        if (!window.crypto || !window.crypto.subtle) return true;
+        const digest = await window.crypto.subtle.digest('SHA-256', bytes);
+        const hex = Array.from(new Uint8Array(digest)).map((b) => b.toString(16).padStart(2, '0')).join('');
+        return hex === marker.sha256;
+    };
+
     const clearResults = () => {
         liveLog.innerHTML = '';
         resultContent.innerHTML = '<div class="placeholder-glow"><span class="placeholder col-7"></span><span class="placeholder col-4"></span><span class="placeholder col-4"></span><span class="placeholder col-6"></span><span class="placeholder col-8"></span></div>';
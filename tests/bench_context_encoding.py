@@ -0,0 +1,72 @@
+"""
+Benchmark: tamanho do contexto JSON em cada codificação
+
+Para cada exemplo em data/ mostra caracteres e tokens estimados (estimate_tokens)
+das codificações pretty (anterior), minified, yaml e tabular, além de uma
+linha com as listas de registros replicadas (--copies) para simular exportações
+maiores.
+
+Uso:
+    python tests/bench_context_encoding.py [--copies 200]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from context_encoding import ENCODINGS, ENCODING_PRETTY, compare_encodings
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../data'))
+
+
+def load_samples() -> dict:
+    samples = {}
+    for name in sorted(os.listdir(DATA_DIR)):
+        path = os.path.join(DATA_DIR, name)
+        with open(path, encoding='utf-8') as f:
+            raw = f.read()
+        if name.endswith('.json') and raw.strip():
+            samples[name] = json.loads(raw)
+    return samples
+
+
+def print_row(name: str, report: dict):
+    baseline = report[ENCODING_PRETTY]['tokens']
+    cells = [f"{report[encoding]['tokens']:>8} ({report[encoding]['tokens'] / baseline:>4.0%})" for encoding in ENCODINGS]
+    print(f"{name:<48}" + ''.join(f"{cell:>18}" for cell in cells))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--copies', type=int, default=200)
+    args = parser.parse_args()
+
+    samples = load_samples()
+    print(f"{'tokens estimados':<48}" + ''.join(f"{encoding:>18}" for encoding in ENCODINGS))
+    totals = {encoding: {'tokens': 0, 'chars': 0} for encoding in ENCODINGS}
+    for name, data in samples.items():
+        report = compare_encodings(data)
+        for encoding in ENCODINGS:
+            totals[encoding]['tokens'] += report[encoding]['tokens']
+            totals[encoding]['chars'] += report[encoding]['chars']
+        print_row(name, report)
+    print_row('TOTAL data/', totals)
+
+    # Listas de registros replicadas: o caso de exportações de CRM/vendas
+    large = {
+        key: value * args.copies
+        for data in samples.values() if isinstance(data, dict)
+        for key, value in data.items() if isinstance(value, list) and value and isinstance(value[0], dict)
+    }
+    started = time.perf_counter()
+    report = compare_encodings(large)
+    elapsed = time.perf_counter() - started
+    print_row(f"registros x{args.copies}", report)
+    print(f"\nCodificação das {len(ENCODINGS)} formas do conjunto replicado: {elapsed * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""
+Benchmark: detecção do tipo de objetivo com contexto completo x amostrado
+
+Para cada exemplo em data/ compara o tipo principal e os tipos relacionados
+detectados a partir do texto completo com os detectados a partir da amostra
+limitada (ContextSampler). Os exemplos são avaliados no tamanho original (com
+uma amostra pequena, para forçar a amostragem) e dentro de documentos grandes
+e distintos: as partes do exemplo (cada campo de primeiro nível ou item de
+lista) ficam espalhadas em posições aleatórias entre registros neutros, sem
+nenhuma palavra-chave, de modo que o início do documento não contém o
+exemplo inteiro. Várias configurações de amostra são comparadas.
+
+Uso:
+    python tests/bench_goal_detection.py [--mb 4] [--seed 7]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import app
+from context_sampling import ContextSampler
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../data'))
+
+GOALS = [
+    "",
+    "Gerar relatório",
+    "Análise de concorrência do mercado",
+    "Plano estratégico para o próximo ano",
+    "Definir OKRs do trimestre",
+]
+
+
+# Palavras dos registros neutros (nenhuma contém palavra-chave da detecção)
+FILLER_WORDS = ["lote", "item", "registro", "campo", "unidade", "referência", "linha", "bloco", "código",
+                "série", "volume", "caixa", "palete", "doca", "turno", "setor", "rota", "peso"]
+
+# Configurações de amostra comparadas nos documentos grandes (tamanhos em KB)
+SAMPLERS = [
+    ("padrão (app.DETECTION_SAMPLER)", None),
+    ("16+8 KB, 8 janelas de 4 KB (padrão anterior)", dict(head_chars=16384, tail_chars=8192, windows=8, window_chars=4096)),
+    ("16+8 KB, 64 janelas de 4 KB", dict(head_chars=16384, tail_chars=8192, windows=64, window_chars=4096)),
+    ("16+8 KB, 256 janelas de 1 KB", dict(head_chars=16384, tail_chars=8192, windows=256, window_chars=1024)),
+    ("16+8 KB, 256 janelas de 4 KB", dict(head_chars=16384, tail_chars=8192, windows=256, window_chars=4096)),
+]
+
+
+def load_examples() -> dict:
+    examples = {}
+    for name in sorted(os.listdir(DATA_DIR)):
+        if name.endswith('.json'):
+            with open(os.path.join(DATA_DIR, name), encoding='utf-8') as f:
+                raw = f.read()
+            if raw.strip():
+                examples[name] = json.loads(raw)
+    return examples
+
+
+def as_context(json_data) -> str:
+    """Mesmo formato enviado aos agentes pelo endpoint"""
+    return f"Dados JSON fornecidos:\n{json.dumps(json_data, indent=2, ensure_ascii=False)}"
+
+
+def parts(json_data) -> list:
+    """Partes do exemplo: cada item de lista e cada campo de primeiro nível, sob a chave original"""
+    if not isinstance(json_data, dict):
+        return [json_data]
+    pieces = []
+    for key, value in json_data.items():
+        if isinstance(value, list):
+            pieces.extend({key: [item]} for item in value)
+        else:
+            pieces.append({key: value})
+    return pieces
+
+
+def filler_record(index: int, rng: random.Random) -> dict:
+    return {
+        "id": index,
+        "codigo": f"R-{rng.randrange(10 ** 6):06d}",
+        "peso": round(rng.uniform(1, 500), 2),
+        "nota": " ".join(rng.choice(FILLER_WORDS) for _ in range(rng.randint(4, 12))),
+    }
+
+
+def scattered(json_data, target_chars: int, rng: random.Random) -> str:
+    """Documento de ~target_chars: as partes do exemplo em posições aleatórias entre registros neutros"""
+    records = []
+    size = 0
+    while size < target_chars:
+        record = json.dumps(filler_record(len(records), rng), indent=2, ensure_ascii=False)
+        records.append(record)
+        size += len(record) + 2
+    for piece in parts(json_data):
+        records.insert(rng.randrange(len(records) + 1), json.dumps(piece, indent=2, ensure_ascii=False))
+    return "Dados JSON fornecidos:\n[\n" + ",\n".join(records) + "\n]"
+
+
+def detect(goal: str, context: str, mode: str, sampler: ContextSampler):
+    hits = app.scan_goal_keywords(goal, context, mode=mode, sampler=sampler)
+    return (app.enhanced_detect_goal_type(goal, context, hits=hits),
+            app.detect_multiple_goal_types(goal, context, hits=hits))
+
+
+def compare(label: str, contexts: dict, sampler: ContextSampler):
+    agree_primary = agree_all = total = 0
+    full_time = sampled_time = 0.0
+    mismatches = []
+    for name, context in contexts.items():
+        for goal in GOALS:
+            start = time.perf_counter()
+            full = detect(goal, context, 'full', sampler)
+            full_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            sampled = detect(goal, context, 'sampled', sampler)
+            sampled_time += time.perf_counter() - start
+
+            total += 1
+            agree_primary += full[0] == sampled[0]
+            agree_all += full == sampled
+            if full != sampled:
+                mismatches.append((name, goal, full, sampled))
+
+    size = sum(len(c) for c in contexts.values()) / len(contexts)
+    print(f"\n== {label} (contexto médio {size / 1024:.0f} KB, amostra <= {sampler.budget / 1024:.0f} KB) ==")
+    print(f"tipo principal igual:         {agree_primary}/{total} ({100 * agree_primary / total:.1f}%)")
+    print(f"principal + relacionados:     {agree_all}/{total} ({100 * agree_all / total:.1f}%)")
+    print(f"tempo completo / amostrado:   {full_time:.3f}s / {sampled_time:.3f}s")
+    for name, goal, full, sampled in mismatches[:10]:
+        print(f"  divergência: {name} | {goal!r}: {full} != {sampled}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--mb', type=float, default=4.0, help="tamanho dos documentos grandes (MB)")
+    parser.add_argument('--seed', type=int, default=7, help="semente das posições e dos registros neutros")
+    args = parser.parse_args()
+
+    examples = load_examples()
+
+    # Tamanho original com amostra de poucos KB: mede a perda de precisão da amostragem
+    small = ContextSampler(head_chars=1024, tail_chars=512, windows=4, window_chars=256, threshold_chars=0)
+    compare("exemplos originais, amostra pequena", {name: as_context(data) for name, data in examples.items()}, small)
+
+    rng = random.Random(args.seed)
+    target = int(args.mb * 1024 * 1024)
+    large = {name: scattered(data, target, rng) for name, data in examples.items()}
+    # O cabeçalho "Dados JSON fornecidos" é comum a todos os contextos; os registros neutros não têm palavras-chave
+    filler = scattered({}, 256 * 1024, rng).split('\n', 1)[1]
+    filler_hits = app.scan_goal_keywords("", filler, mode='full').keyword_counts
+    assert not filler_hits, f"registros neutros com palavras-chave: {filler_hits}"
+    for label, sizes in SAMPLERS:
+        sampler = ContextSampler(**sizes, threshold_chars=0) if sizes else app.DETECTION_SAMPLER
+        compare(f"exemplos espalhados em {args.mb:g} MB, {label}", large, sampler)
+
+
+if __name__ == '__main__':
+    main()
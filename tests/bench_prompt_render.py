@@ -0,0 +1,88 @@
+"""
+Benchmark: renderização de prompts com escape + str.format x renderizador em passada única
+
+Mede tempo e pico de memória (tracemalloc) para renderizar os prompts do
+pesquisador e do escritor com um contexto JSON de vários MB montado a partir
+dos exemplos em data/, como acontece para o agente principal e cada colaborador.
+
+Uso:
+    python tests/bench_prompt_render.py [--mb 4] [--agents 4]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import app
+from prompt_templates import render_prompt
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../data'))
+
+
+def build_context(target_chars: int) -> str:
+    records = []
+    for name in sorted(os.listdir(DATA_DIR)):
+        path = os.path.join(DATA_DIR, name)
+        with open(path, encoding='utf-8') as f:
+            raw = f.read()
+        if name.endswith('.json') and raw.strip():
+            records.append(json.loads(raw))
+    copies = []
+    size = 0
+    while size < target_chars:
+        copies.extend(records)
+        size += sum(len(json.dumps(record, ensure_ascii=False)) for record in records)
+    return f"Dados JSON fornecidos:\n{json.dumps(copies, indent=2, ensure_ascii=False)}"
+
+
+def legacy_render(goal: str, context: str, outline: str, researcher: str, writer: str):
+    """Caminho anterior de agent_researcher/agent_writer"""
+    safe_context = context.replace('{', '{{').replace('}', '}}')
+    safe_goal = goal.replace('{', '{{').replace('}', '}}')
+    researcher_prompt = researcher.format(goal=safe_goal, context=safe_context, abnt_rules=app.get_abnt_formatting_rules())
+    safe_context = context.replace('{', '{{').replace('}', '}}')
+    safe_outline = outline.replace('{', '{{').replace('}', '}}')
+    writer_prompt = writer.format(outline=safe_outline, context=safe_context, abnt_rules=app.get_abnt_formatting_rules())
+    return len(researcher_prompt) + len(writer_prompt)
+
+
+def single_pass_render(goal: str, context: str, outline: str, researcher: str, writer: str):
+    researcher_prompt = render_prompt(researcher, goal=goal, context=context, abnt_rules=app.get_abnt_formatting_rules())
+    writer_prompt = render_prompt(writer, outline=outline, context=[context, "\n\n=== INSIGHTS COLABORATIVOS ===\n"],
+                                  abnt_rules=app.get_abnt_formatting_rules())
+    return len(researcher_prompt) + len(writer_prompt)
+
+
+def measure(label: str, render, agents: int, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(agents):
+        render(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {elapsed * 1000:9.1f} ms   pico {peak / 1024 / 1024:8.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--mb', type=float, default=4.0, help="tamanho do contexto (MB)")
+    parser.add_argument('--agents', type=int, default=4, help="agentes renderizados (principal + colaboradores)")
+    args = parser.parse_args()
+
+    context = build_context(int(args.mb * 1024 * 1024))
+    outline = "# Estrutura\n" + "\n".join(f"## {i}. Seção {{dados}}" for i in range(1, 40))
+    goal = "Análise de concorrência {2024}"
+    researcher, writer = app.generate_specialized_prompts('competitive_analysis', goal, context)
+
+    print(f"contexto: {len(context) / 1024 / 1024:.1f} MB, agentes: {args.agents}")
+    measure("escape + str.format", legacy_render, args.agents, goal, context, outline, researcher, writer)
+    measure("passada única", single_pass_render, args.agents, goal, context, outline, researcher, writer)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark: avaliação de qualidade (QualityAssurance) anterior x QualityScorer
+
+Gera relatórios sintéticos de 50 KB a alguns MB (seções, listas e
+parágrafos em português), confere que os quatro scores são idênticos aos da
+implementação anterior (três minusculizações e uma varredura por critério)
+e compara o tempo médio de cada uma.
+
+Uso:
+    python tests/bench_quality_scoring.py [--sizes 50,200,1000] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from quality_scoring import QualityScorer, REQUIRED_SECTIONS
+
+VOCABULARY = ("análise métricas tendências vendas receita região trimestre clientes produto equipe "
+              "implementação estratégia plano ação resultados crescimento margem custos mercado "
+              "concorrência indicadores metas operação processo melhoria qualidade dados relatório").split()
+
+GOALS = [
+    ("Análise de vendas do trimestre por região", 'sales_analysis'),
+    ("Plano estratégico para o próximo ano com OKRs", 'strategic_planning'),
+    ("Roadmap do produto e personas", 'product_management'),
+    ("Relatório geral da operação", 'general'),
+]
+
+
+def legacy_scores(content: str, goal: str, goal_type: str) -> dict:
+    """Implementação anterior, critério a critério"""
+    sections = REQUIRED_SECTIONS.get(goal_type, ['introdução', 'desenvolvimento', 'conclusão'])
+    content_lower = content.lower()
+    completeness = sum(1 for section in sections if section in content_lower) / len(sections)
+    goal_keywords = goal.lower().split()
+    content_lower = content.lower()
+    accuracy = min(sum(1 for keyword in goal_keywords if keyword in content_lower) / len(goal_keywords), 1.0)
+    relevance = min(len(content) / 1000, 1.0)
+    actionable_keywords = ['recomendação', 'ação', 'implementar', 'executar', 'plano', 'estratégia', 'próximos passos']
+    content_lower = content.lower()
+    actionability = min(sum(1 for keyword in actionable_keywords if keyword in content_lower) / 3, 1.0)
+    return {'completeness': completeness, 'accuracy': accuracy, 'relevance': relevance, 'actionability': actionability}
+
+
+def make_report(size_kb: int, seed: int) -> str:
+    rng = random.Random(seed)
+    parts = ["# RELATÓRIO\n\n## 1. Introdução\n"]
+    size = 0
+    section = 1
+    while size < size_kb * 1024:
+        if rng.random() < 0.05:
+            section += 1
+            parts.append(f"\n## {section}. {rng.choice(VOCABULARY).capitalize()}\n")
+        if rng.random() < 0.2:
+            parts.append("- " + " ".join(rng.choice(VOCABULARY) for _ in range(8)) + "\n")
+        else:
+            parts.append(" ".join(rng.choice(VOCABULARY) for _ in range(60)).capitalize() + ".\n\n")
+        size += len(parts[-1])
+    return "".join(parts)
+
+
+def mean_ms(function, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='50,200,1000,4000')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    scorer = QualityScorer()
+    print(f"{'relatório':<12}{'objetivo':<22}{'anterior (ms)':>16}{'scorer (ms)':>14}{'ganho':>8}")
+    for size_kb in (int(size) for size in args.sizes.split(',')):
+        report = make_report(size_kb, seed=size_kb)
+        for goal, goal_type in GOALS:
+            assert scorer.scores(report, goal, goal_type) == legacy_scores(report, goal, goal_type)
+            legacy = mean_ms(lambda: legacy_scores(report, goal, goal_type), args.repeat)
+            current = mean_ms(lambda: scorer.evaluate(report, goal, goal_type), args.repeat)
+            print(f"{f'{len(report) // 1024} KB':<12}{goal_type:<22}{legacy:>16.3f}{current:>14.3f}{legacy / current:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
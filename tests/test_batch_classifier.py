@@ -0,0 +1,45 @@
+import sys
+import os
+
+# Adiciona o diretório 'src' ao PYTHONPATH para que os módulos possam ser importados
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import app
+
+PAIRS = [
+    ("Análise de concorrência do mercado de fast food", ""),
+    ("Plano estratégico com OKRs", '{"vendas": 10, "clientes": 3, "dashboard": true}'),
+    ("Escrever um artigo para o blog", "marketing digital e seo"),
+    ("Organizar a agenda da semana", ""),
+    ("", ""),
+    ("Relatório técnico", "dados de vendas por região, vendas por produto"),
+]
+
+
+def test_batch_matches_single_classification():
+    results = app.classify_goals(PAIRS, mode='full')
+    assert len(results) == len(PAIRS)
+    for (goal, context), result in zip(PAIRS, results):
+        expected = app.classify_goal(goal, context, mode='full')
+        assert result['primary_type'] == expected.primary_type
+        assert result['related_types'] == expected.related_types
+        assert result['collaborators'] == expected.collaborators
+        assert abs(result['confidence'] - expected.confidence) < 0.002
+
+
+def test_batch_accepts_dicts_and_plain_goals():
+    results = app.classify_goals([{'goal': 'Análise SWOT'}, 'Plano de marketing'])
+    assert results[0]['primary_type'] == app.enhanced_detect_goal_type('Análise SWOT')
+    assert results[1]['primary_type'] == app.enhanced_detect_goal_type('Plano de marketing')
+
+
+def test_classify_endpoint():
+    client = app.app.test_client()
+    response = client.post('/api/classify', json={'items': [{'goal': g, 'context': c} for g, c in PAIRS]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['count'] == len(PAIRS)
+    assert body['results'][0]['primary_type'] == 'competitive_analysis'
+
+    assert client.post('/api/classify', json={'goal': 'x'}).status_code == 400
+    assert client.post('/api/classify', json=[1, 2]).status_code == 400
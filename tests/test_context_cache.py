@@ -0,0 +1,101 @@
+import sys
+import os
+
+# Adiciona o diretório 'src' ao PYTHONPATH para que os módulos possam ser importados
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from metrics import MetricsRegistry
+from context_cache import LocalContextCache, SharedPrefix
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, text):
+        self._text = text
+
+    def json(self):
+        return {'candidates': [{'content': {'parts': [{'text': self._text}]}}]}
+
+
+def test_local_cache_creates_once_then_hits():
+    cache = LocalContextCache(metrics=MetricsRegistry())
+    prefix = SharedPrefix("regras + contexto " * 100)
+    first = cache.get('gemini-2.0-flash', prefix)
+    second = cache.get('gemini-2.0-flash', SharedPrefix(prefix.text))
+    assert first == second and first.startswith('localCachedContents/')
+    stats = cache.snapshot()
+    assert stats['misses'] == 1 and stats['hits'] == 1
+    assert stats['saved_bytes'] == prefix.size_bytes
+
+    cache.invalidate('gemini-2.0-flash', prefix)
+    assert cache.get('gemini-2.0-flash', prefix) is None
+
+
+def run_collaborative(monkeypatch, mode, context, cache=None):
+    import app
+
+    calls = []
+
+    def fake_post(url, headers=None, json=None, timeout=None, **kwargs):
+        calls.append(json)
+        return FakeResponse("## 1. Seção\nTexto")
+
+    registry = MetricsRegistry()
+    if cache is not None:
+        cache.metrics = registry
+    elif mode == 'local':
+        cache = LocalContextCache(metrics=registry)
+    monkeypatch.setattr(app, 'metrics', registry)
+    monkeypatch.setattr(app.requests, 'post', fake_post)
+    monkeypatch.setattr(app, 'GEMINI_API_KEY', 'teste')
+    monkeypatch.setattr(app, 'AGENT_CONTEXT_CACHE', mode)
+    monkeypatch.setattr(app, 'context_cache', cache)
+
+    orchestrator = app.MangabaAgentOrchestrator()
+    collaborators = ['sales_analysis', 'product_management', 'user_management', 'marketing_analysis']
+    results = orchestrator.run_parallel_analysis_enhanced("Análise de concorrência", context, 'competitive_analysis', collaborators)
+    orchestrator.synthesize_collaborative_content("Análise de concorrência", context, results)
+    return calls, registry
+
+
+class FakeGeminiCache(LocalContextCache):
+    """Cache referenciado por nome (como o do Gemini), sem rede"""
+
+    mode = 'gemini'
+    sends_prefix_inline = False
+
+
+def test_upload_bytes_count_what_is_sent_and_savings_apart(monkeypatch):
+    context = '{"vendas": [' + ",".join(['{"produto": "X", "valor": 10}'] * 3000) + ']}'
+
+    legacy_calls, legacy = run_collaborative(monkeypatch, 'off', context)
+    local_calls, local = run_collaborative(monkeypatch, 'local', context)
+
+    assert len(legacy_calls) == len(local_calls) == 6
+    # Todas as chamadas recebem o mesmo prefixo estável; o texto do agente vem depois dele
+    prefixes = {call['systemInstruction']['parts'][0]['text'] for call in local_calls}
+    assert len(prefixes) == 1 and context in next(iter(prefixes))
+    assert all(context not in call['contents'][0]['parts'][0]['text'] for call in local_calls)
+    # No modo 'local' o prefixo segue em cada chamada: os bytes enviados não caem,
+    # e a economia emulada (5 acertos após a criação) fica em um contador separado
+    prefix_bytes = len(next(iter(prefixes)).encode('utf-8'))
+    legacy_bytes = legacy.get_counter('gemini_prompt_upload_bytes_total', labels={'cache': 'off'})
+    local_bytes = local.get_counter('gemini_prompt_upload_bytes_total', labels={'cache': 'local'})
+    assert local_bytes >= 6 * prefix_bytes and local_bytes > 0.9 * legacy_bytes
+    assert local.get_counter('context_cache_saved_bytes_total', labels={'mode': 'local'}) == 5 * prefix_bytes
+
+    # Com referência ao cache o prefixo sai uma única vez (na criação) e as chamadas só levam o nome
+    gemini_calls, gemini = run_collaborative(monkeypatch, 'gemini', context, cache=FakeGeminiCache())
+    assert all('systemInstruction' not in call and 'cachedContent' in call for call in gemini_calls)
+    gemini_bytes = gemini.get_counter('gemini_prompt_upload_bytes_total', labels={'cache': 'gemini'})
+    assert prefix_bytes <= gemini_bytes < 2 * prefix_bytes
+    assert legacy_bytes / gemini_bytes > 4
+
+
+def test_writer_keeps_collaborative_insights_after_prefix(monkeypatch):
+    context = '{"vendas": 10}'
+    calls, _ = run_collaborative(monkeypatch, 'system', context)
+    writer_text = calls[-1]['contents'][0]['parts'][0]['text']
+    assert 'INSIGHTS COLABORATIVOS' in writer_text
+    assert '{context' not in writer_text
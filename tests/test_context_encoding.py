@@ -0,0 +1,68 @@
+import sys
+import os
+import json
+
+# Adiciona o diretório 'src' ao PYTHONPATH para que os módulos possam ser importados
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import pytest
+
+from context_encoding import TABLE_LEGEND, compare_encodings, encode_context, estimate_tokens, table_columns
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../data'))
+
+RECORDS = {
+    "vendas": [
+        {"id": 1, "cliente": "João", "valor": 10.5, "tags": ["a", "b"]},
+        {"id": 2, "cliente": "Ana | Filial", "valor": None, "tags": []},
+        {"id": 3, "cliente": "Empresa XYZ", "tags": ["c"]},
+    ],
+    "resumo": {"total": 3, "ativo": True},
+}
+
+
+def test_pretty_and_minified_match_json():
+    assert encode_context(RECORDS, 'pretty') == json.dumps(RECORDS, indent=2, ensure_ascii=False)
+    assert json.loads(encode_context(RECORDS, 'minified')) == RECORDS
+
+
+def test_tabular_writes_header_once_and_quotes_delimiter():
+    lines = encode_context(RECORDS, 'tabular').splitlines()
+    assert lines[0] == TABLE_LEGEND
+    assert lines[1] == "vendas[3]{id|cliente|valor|tags}:"
+    assert lines[2] == "  1|João|10.5|[a, b]"
+    assert lines[3] == '  2|"Ana | Filial"||[]'
+    # Campo ausente: célula vazia
+    assert lines[4] == "  3|Empresa XYZ||[c]"
+    assert lines[5:] == ["resumo:", "  total: 3", "  ativo: true"]
+
+
+def test_yaml_has_no_tables():
+    text = encode_context(RECORDS, 'yaml')
+    assert TABLE_LEGEND not in text
+    assert "  -\n    id: 1\n    cliente: João" in text
+
+
+def test_heterogeneous_lists_are_not_tables():
+    assert table_columns([{"a": 1}, {"b": 2}, {"c": 3}]) is None
+    assert table_columns([{"a": {"x": 1}}, {"a": 2}, {"a": 3}]) is None
+    assert table_columns([{"a": 1, "b": 2}, {"a": 3}, {"b": 4}]) == ["a", "b"]
+
+
+def test_unknown_encoding_is_rejected():
+    with pytest.raises(ValueError):
+        encode_context(RECORDS, 'xml')
+
+
+@pytest.mark.parametrize("name", ["vendas.json", "produtos.json", "tarefas.json", "usuarios.json"])
+def test_compact_encodings_use_fewer_tokens_on_record_samples(name):
+    with open(os.path.join(DATA_DIR, name), encoding='utf-8') as f:
+        report = compare_encodings(json.load(f))
+    tokens = {encoding: values['tokens'] for encoding, values in report.items()}
+    assert tokens['tabular'] < tokens['yaml'] < tokens['minified'] < tokens['pretty']
+
+
+def test_estimate_tokens_counts_indentation_runs():
+    # { " a " : 1 }
+    assert estimate_tokens('{"a":1}') == 7
+    assert estimate_tokens("a\n    b") == 3
@@ -0,0 +1,80 @@
+import sys
+import os
+
+# Adiciona o diretório 'src' ao PYTHONPATH para que os módulos possam ser importados
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from context_retrieval import ChunkIndex, ChunkIndexCache, chunk_bounds, tokenize
+
+FILLER = "A reunião semanal tratou de assuntos gerais da equipe e do andamento das entregas. "
+
+
+def report(paragraphs: int = 200) -> str:
+    parts = [f"Parágrafo {index}. " + FILLER * 4 for index in range(paragraphs)]
+    parts[120] += "O faturamento trimestral da região Nordeste caiu 12% em relação ao ano anterior."
+    parts[60] += "A campanha de marketing digital elevou o engajamento nas redes sociais."
+    return "\n\n".join(parts)
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, text):
+        self._text = text
+
+    def json(self):
+        return {'candidates': [{'content': {'parts': [{'text': self._text}]}}]}
+
+
+def test_tokenize_folds_accents_and_plurals():
+    assert tokenize("Análise das Vendas por região") == ['analise', 'venda', 'regiao']
+
+
+def test_chunks_cover_text_with_overlap():
+    text = report()
+    bounds = chunk_bounds(text, chunk_chars=500, overlap_chars=100)
+    assert bounds[0][0] == 0 and bounds[-1][1] == len(text)
+    assert all(end - start <= 500 for start, end in bounds)
+    assert all(previous[1] > current[0] > previous[0] for previous, current in zip(bounds, bounds[1:]))
+
+
+def test_search_ranks_relevant_chunk_first():
+    index = ChunkIndex(report(), chunk_chars=500, overlap_chars=50)
+    best = index.search("Qual foi o faturamento do Nordeste?", k=3)
+    assert "faturamento trimestral" in index.chunk(best[0])
+    # O vocabulário do tipo de agente reforça a busca quando o objetivo é genérico
+    boosted = index.select("Resumo da reunião", k=2, boost="marketing campanha engajamento")
+    assert boosted[0] == 0
+    assert any("campanha de marketing" in index.chunk(chunk_id) for chunk_id in boosted)
+    rendered = index.render(boosted)
+    assert rendered.startswith("Trechos do contexto selecionados") and "[...]" in rendered
+
+
+def test_cache_reuses_index_by_text_hash():
+    cache = ChunkIndexCache(max_entries=1)
+    text = report(130)
+    assert cache.get(text) is cache.get(text[:])
+    cache.get(text + " fim")
+    assert cache.snapshot() == {'entries': 1, 'hits': 1, 'misses': 2}
+
+
+def test_traditional_pipeline_sends_only_selected_chunks(monkeypatch):
+    import app
+
+    prompts = []
+
+    def fake_post(url, headers=None, json=None, timeout=None, **kwargs):
+        prompts.append(json['contents'][0]['parts'][0]['text'])
+        return FakeResponse("## 1. Faturamento\nTexto")
+
+    monkeypatch.setattr(app.requests, 'post', fake_post)
+    monkeypatch.setattr(app, 'GEMINI_API_KEY', 'teste')
+    monkeypatch.setattr(app, 'AGENT_RETRIEVAL_TOP_K', 3)
+    context = report(400)
+    index = ChunkIndex(context, chunk_chars=800, overlap_chars=100)
+    app.master_control_plane_traditional("Explique a queda do faturamento no Nordeste", context, 'financial_analysis',
+                                         retrieval_index=index)
+    assert len(prompts) == 2
+    for prompt in prompts:
+        assert "faturamento trimestral da região Nordeste" in prompt
+        assert len(prompt) < len(context) // 10
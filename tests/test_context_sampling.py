@@ -0,0 +1,37 @@
+import sys
+import os
+
+# Adiciona o diretório 'src' ao PYTHONPATH para que os módulos possam ser importados
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from context_sampling import ContextSampler, SEGMENT_SEPARATOR
+
+
+def test_small_context_is_not_sampled():
+    sampler = ContextSampler(threshold_chars=1000)
+    assert sampler.segments("") == []
+    assert sampler.segments("contexto curto") == ["contexto curto"]
+
+
+def test_large_context_sample_is_bounded_and_keeps_head_tail_and_keys():
+    sampler = ContextSampler(head_chars=100, tail_chars=50, windows=4, window_chars=20, threshold_chars=0)
+    context = '{"receita_mensal": 1}' + "x" * 10000 + "FIM"
+    segments = sampler.segments(context)
+
+    assert segments[0] == "receita_mensal"
+    assert segments[2] == context[:100]
+    assert segments[-1] == context[-50:]
+    assert all(segments[i] == SEGMENT_SEPARATOR for i in range(1, len(segments), 2))
+    sampled = sum(len(segment) for segment in segments[2::2])
+    assert sampled == sampler.budget
+
+
+def test_sampled_detection_matches_full_on_repeated_records():
+    import app
+
+    record = '{"concorrente": "Empresa X", "vendas": 10, "receita": 5}'
+    context = "[" + ",".join([record] * 20000) + "]"
+    full = app.classify_goal("Relatório", context, mode='full')
+    sampled = app.classify_goal("Relatório", context, mode='sampled')
+    assert sampled.primary_type == full.primary_type
+    assert sampled.related_types == full.related_types
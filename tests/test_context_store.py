@@ -0,0 +1,145 @@
+import sys
+import os
+import io
+import json
+
+# Adiciona o diretório 'src' ao PYTHONPATH para que os módulos possam ser importados
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from werkzeug.datastructures import FileStorage
+
+from context_store import ContextStore, is_context_ref
+from upload_ingestion import ingest_upload
+
+
+def upload(data: bytes, filename: str = 'dados.csv'):
+    return ingest_upload(FileStorage(io.BytesIO(data), filename=filename))
+
+
+def test_upload_round_trip_is_compressed_and_deduplicated(tmp_path):
+    store = ContextStore(str(tmp_path))
+    data = ("data,valor\n" + "2024-01-01,10\n" * 20000).encode('utf-8')
+    key = store.put_upload(upload(data))
+    assert is_context_ref(key)
+    assert store.put_upload(upload(data)) == key
+    assert store.snapshot()['entries'] == 1
+    assert store.snapshot()['stored_bytes'] < len(data) / 10
+
+    loaded = store.load_upload(key)
+    with loaded.spool.view() as buffer:
+        assert bytes(buffer) == data
+    assert loaded.filename == 'dados.csv'
+    assert store.info(key)['size_bytes'] == len(data)
+
+
+def test_artifacts_survive_restart(tmp_path):
+    store = ContextStore(str(tmp_path))
+    key = store.put_upload(upload(b"a,b\n1,2\n"))
+    assert store.get_artifact(key, 'context-v1-csv') is None
+    store.put_artifact(key, 'context-v1-csv', "contexto pronto")
+
+    reopened = ContextStore(str(tmp_path))
+    assert reopened.contains(key)
+    assert reopened.get_artifact(key, 'context-v1-csv') == "contexto pronto"
+    assert reopened.info(key)['artifacts'] == ['context-v1-csv']
+
+
+def test_lru_eviction_removes_least_recently_used(tmp_path):
+    store = ContextStore(str(tmp_path), max_bytes=3000)
+    blobs = [os.urandom(1000) for _ in range(3)]
+    first = store.put_upload(upload(blobs[0], 'a.bin'))
+    second = store.put_upload(upload(blobs[1], 'b.bin'))
+    # Acesso ao primeiro: o segundo passa a ser o menos recente
+    assert store.load_upload(first) is not None
+    third = store.put_upload(upload(blobs[2], 'c.bin'))
+    assert store.contains(first) and store.contains(third)
+    assert not store.contains(second)
+    assert store.load_upload(second) is None
+    assert not [name for name in os.listdir(tmp_path / second[:2]) if name.startswith(second)]
+
+
+def test_uploads_are_visible_only_to_their_owners(tmp_path):
+    store = ContextStore(str(tmp_path))
+    key = store.put_upload(upload(b"a,b\n1,2\n", 'ana.csv'), owner='user:ana')
+    assert store.info(key, owner='user:bruno') is None and store.load_upload(key, owner='user:bruno') is None
+    assert store.put_upload(upload(b"a,b\n1,2\n", 'bruno.csv'), owner='user:bruno') == key
+    assert store.info(key, owner='user:ana')['filename'] == 'ana.csv'
+    assert store.info(key, owner='user:bruno')['filename'] == 'bruno.csv'
+    # Os owners sobrevivem ao reinício e não aparecem nos metadados devolvidos
+    reopened = ContextStore(str(tmp_path))
+    assert 'owners' not in reopened.info(key, owner='user:bruno')
+    assert reopened.load_upload(key, owner='user:ana').read_text() == "a,b\n1,2\n"
+
+
+def sse_events(body: str) -> list:
+    events = []
+    for block in body.split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.splitlines() if ': ' in line)
+        if 'event' in lines:
+            events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def test_context_ref_reuses_stored_context(monkeypatch, tmp_path):
+    import app as app_module
+
+    class FakeResponse:
+        status_code = 200
+
+        def json(self):
+            return {'candidates': [{'content': {'parts': [{'text': "## 1. Vendas\nTexto."}]}}]}
+
+    monkeypatch.setattr(app_module, 'context_store', ContextStore(str(tmp_path)))
+    monkeypatch.setattr(app_module.requests, 'post', lambda *args, **kwargs: FakeResponse())
+    monkeypatch.setattr(app_module, 'GEMINI_API_KEY', 'teste')
+    client = app_module.app.test_client()
+
+    data = b"data,vendedor,valor\n2024-01-01,Ana,10\n2024-02-01,Bruno,20\n2024-03-01,Ana,30\n"
+    first = sse_events(client.post('/api/run_agent_system', data={
+        'goal': 'Análise de vendas', 'dataSource': (io.BytesIO(data), 'vendas.csv')
+    }, content_type='multipart/form-data').get_data(as_text=True))
+    [reference] = [payload for event, payload in first if event == 'context_ref']
+    context_ref = reference['context_ref']
+
+    assert client.head(f'/api/context/{context_ref}').status_code == 200
+    assert client.get(f'/api/context/{context_ref}').get_json()['filename'] == 'vendas.csv'
+    assert client.head(f'/api/context/{"0" * 64}').status_code == 404
+    # Outro tenant com o mesmo hash não encontra (nem confirma) o arquivo
+    other = {'REMOTE_ADDR': '10.0.0.9'}
+    assert client.head(f'/api/context/{context_ref}', environ_base=other).status_code == 404
+    assert client.get(f'/api/context/{context_ref}', environ_base=other).status_code == 404
+    foreign = sse_events(client.post('/api/run_agent_system', data={
+        'goal': 'Análise de vendas', 'context_ref': context_ref
+    }, environ_base=other).get_data(as_text=True))
+    assert 'Contexto não encontrado' in dict(foreign)['error']['error']
+    assert not any('Usando contexto armazenado' in payload for event, payload in foreign if event == 'log')
+
+    second = sse_events(client.post('/api/run_agent_system', data={
+        'goal': 'Análise de vendas', 'context_ref': context_ref
+    }).get_data(as_text=True))
+    logs = [payload for event, payload in second if event == 'log']
+    assert any('reutilizado' in line for line in logs)
+    assert not any('Arquivo tabular' in line for line in logs)
+
+    missing = sse_events(client.post('/api/run_agent_system', data={
+        'goal': 'Análise de vendas', 'context_ref': 'f' * 64
+    }).get_data(as_text=True))
+    assert 'error' in [event for event, _ in missing]
+
+
+def test_upload_evicted_after_info_is_reported_as_missing(monkeypatch, tmp_path):
+    import app as app_module
+
+    store = ContextStore(str(tmp_path))
+    key = store.put_upload(upload(b"data,valor\n2024-01-01,10\n"), owner='ip:127.0.0.1')
+    # Evicção entre info() e a leitura do conteúdo
+    monkeypatch.setattr(store, '_blob_path', lambda key: str(tmp_path / 'removido.z'))
+    assert store.info(key) is not None and store.load_upload(key) is None
+
+    monkeypatch.setattr(app_module, 'context_store', store)
+    monkeypatch.setattr(app_module, 'GEMINI_API_KEY', 'teste')
+    events = sse_events(app_module.app.test_client().post('/api/run_agent_system', data={
+        'goal': 'Análise de vendas', 'context_ref': key
+    }).get_data(as_text=True))
+    [error] = [payload for event, payload in events if event == 'error']
+    assert 'Contexto não encontrado' in error['error']
@@ -0,0 +1,108 @@
+import sys
+import os
+import json
+
+# Adiciona o diretório 'src' ao PYTHONPATH para que os módulos possam ser importados
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import numpy as np
+import pytest
+
+from data_profile import (COLUMN_CATEGORICAL, COLUMN_DATE, COLUMN_IDENTIFIER, COLUMN_NUMERIC, COLUMN_TEXT,
+                          TableProfile, profile_data, render_profile, sample_records)
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../data'))
+
+
+def load(name):
+    with open(os.path.join(DATA_DIR, name), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_sales_profile_is_exact():
+    vendas = load('vendas.json')
+    [profile] = profile_data(vendas)
+    kinds = {column.name: column.kind for column in profile.columns}
+    assert kinds['id'] == COLUMN_IDENTIFIER
+    assert kinds['data'] == COLUMN_DATE
+    assert kinds['valor_total'] == COLUMN_NUMERIC
+    assert kinds['vendedor'] == COLUMN_CATEGORICAL
+    assert kinds['cliente'] == COLUMN_TEXT
+
+    totals = [record['valor_total'] for record in vendas['vendas']]
+    stats = profile.numeric_summary()['valor_total']
+    assert stats['soma'] == pytest.approx(sum(totals))
+    assert stats['media'] == pytest.approx(sum(totals) / len(totals))
+
+    # Ticket médio por vendedor
+    groups = dict((label, (total, mean, count)) for label, total, mean, count
+                  in profile.group_by()[('vendedor', 'valor_total')])
+    ana = [record['valor_total'] for record in vendas['vendas'] if record['vendedor'] == 'Ana Silva']
+    assert groups['Ana Silva'] == pytest.approx((sum(ana), sum(ana) / len(ana), len(ana)))
+
+
+def test_period_over_period_deltas():
+    records = [
+        {"data": "2024-01-05", "valor": 100.0, "canal": "loja"},
+        {"data": "2024-01-20", "valor": 100.0, "canal": "web"},
+        {"data": "2024-02-03", "valor": 300.0, "canal": "loja"},
+        {"data": "15/03/2024", "valor": 150.0, "canal": "web"},
+    ]
+    profile = TableProfile.from_records('vendas', records)
+    trend = profile.periods()[('data', 'valor')]
+    assert [(label, total) for label, total, _ in trend] == [('2024-01', 200.0), ('2024-02', 300.0), ('2024-03', 150.0)]
+    assert [change for _, _, change in trend] == [None, pytest.approx(50.0), pytest.approx(-50.0)]
+
+
+def test_typed_columns_are_accepted():
+    profile = TableProfile('csv', {
+        'valor': np.array([1.0, np.nan, 3.0]),
+        'dia': np.array(['2024-01-01', 'NaT', '2024-01-03'], dtype='datetime64[D]'),
+    })
+    assert profile.numeric_summary()['valor']['ausentes'] == 1
+    assert profile.date_ranges()['dia'] == ('2024-01-01', '2024-01-03')
+
+
+def test_render_and_replace_mode_sample():
+    data = {"vendas": load('vendas.json')['vendas'] * 10}
+    [profile] = profile_data(data)
+    text = render_profile(profile)
+    assert text.startswith("Tabela vendas: 40 registros")
+    assert "valor_total por vendedor" in text
+
+    sampled = sample_records(data, 5)
+    assert len(sampled['vendas']) == 5
+    assert len(data['vendas']) == 40
+
+
+def test_format_json_context_includes_profile():
+    import app
+
+    context = app.format_json_context(load('vendas.json'), encoding='tabular', profile_mode='alongside')
+    assert context.startswith("Perfil estatístico dos dados")
+    assert "Dados JSON fornecidos:" in context
+    assert app.format_json_context(load('vendas.json'), profile_mode='off').startswith("Dados JSON fornecidos:")
+
+
+def test_invalid_dates_and_non_finite_numbers_do_not_break_profile(monkeypatch):
+    import app
+
+    records = [{'d': '2024-02-30', 'v': 1}, {'d': '31/04/2024', 'v': float('inf')}, {'d': '2024-03-01', 'v': 3}]
+    [profile] = profile_data({'itens': records})
+    assert {column.name: column.kind for column in profile.columns}['d'] != 'data'
+    assert 'inf' in render_profile(profile)
+
+    def broken(*args, **kwargs):
+        raise ValueError("perfil")
+
+    from metrics import MetricsRegistry
+
+    registry = MetricsRegistry()
+    monkeypatch.setattr(app, 'metrics', registry)
+    monkeypatch.setattr(app, 'profile_data', broken)
+    warnings = []
+    context = app.format_json_context({'itens': records}, encoding='tabular', profile_mode='alongside', warnings=warnings)
+    assert context.startswith("Dados JSON fornecidos:") and '2024-02-30' in context
+    # A falha não some: fica contada e vira um aviso para o cliente
+    assert warnings == ["[WARNING] Perfil estatístico descartado (json): ValueError: perfil"]
+    assert registry.get_counter('data_profile_errors_total', labels={'source': 'json'}) == 1
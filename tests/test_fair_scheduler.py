@@ -0,0 +1,144 @@
+import pytest
+import sys
+import os
+import threading
+
+# Adiciona o diretório 'src' ao PYTHONPATH para que os módulos possam ser importados
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from metrics import MetricsRegistry
+from fair_scheduler import FairScheduler, PRIORITY_BATCH, PRIORITY_INTERACTIVE, parse_tenant_weights, parse_api_tokens
+
+
+def run_blocked(scheduler, submissions):
+    """Enfileira tudo com o único worker ocupado e devolve a ordem de despacho"""
+    order = []
+    started, gate = threading.Event(), threading.Event()
+    blocker = scheduler.submit('blocker', lambda: (started.set(), gate.wait()))
+    started.wait(timeout=5)
+    futures = [
+        scheduler.submit(tenant, order.append, label, priority=priority, cost=cost)
+        for tenant, label, priority, cost in submissions
+    ]
+    gate.set()
+    blocker.result(timeout=5)
+    for future in futures:
+        future.result(timeout=5)
+    return order
+
+
+def test_round_robin_between_tenants():
+    scheduler = FairScheduler(workers=1, metrics=MetricsRegistry())
+    submissions = [('heavy', f'h{i}', PRIORITY_INTERACTIVE, 1.0) for i in range(6)]
+    submissions += [('light', f'l{i}', PRIORITY_INTERACTIVE, 1.0) for i in range(2)]
+    order = run_blocked(scheduler, submissions)
+
+    # O tenant leve não espera todas as chamadas do tenant pesado
+    assert order.index('l1') < order.index('h3')
+
+
+def test_tenant_weights_and_costs():
+    scheduler = FairScheduler(workers=1, tenant_weights={'gold': 2.0}, metrics=MetricsRegistry())
+    submissions = [('gold', f'g{i}', PRIORITY_INTERACTIVE, 1.0) for i in range(4)]
+    submissions += [('std', f's{i}', PRIORITY_INTERACTIVE, 1.0) for i in range(4)]
+    order = run_blocked(scheduler, submissions)
+    first_six = order[:6]
+    assert sum(1 for label in first_six if label.startswith('g')) == 4
+
+
+def test_interactive_preferred_over_batch_without_starvation():
+    scheduler = FairScheduler(workers=1, metrics=MetricsRegistry())
+    submissions = [('b', f'b{i}', PRIORITY_BATCH, 1.0) for i in range(4)]
+    submissions += [('i', f'i{i}', PRIORITY_INTERACTIVE, 1.0) for i in range(8)]
+    order = run_blocked(scheduler, submissions)
+
+    # Peso 4:1 entre as classes: batch é atendido antes de as interativas terminarem
+    assert order[:5] == ['i0', 'i1', 'i2', 'i3', 'b0']
+    assert order.index('b0') < order.index('i7')
+
+
+def test_exceptions_propagate_and_wait_is_reported():
+    scheduler = FairScheduler(workers=2, metrics=MetricsRegistry())
+
+    def fail():
+        raise ConnectionError("falhou")
+
+    with pytest.raises(ConnectionError):
+        scheduler.run('ana', fail)
+    assert scheduler.run('ana', lambda: 42) == 42
+
+    stats = scheduler.snapshot()['tenants']['ana']
+    assert stats['dispatched'] == 2 and stats['queued'] == 0
+    assert scheduler.metrics.snapshot()['summaries']['scheduler_wait_seconds'][0]['labels'] == {
+        'tenant': 'ana', 'priority': PRIORITY_INTERACTIVE
+    }
+
+
+def test_parse_tenant_weights():
+    assert parse_tenant_weights("user:ana=2, ip:10.0.0.1=0.5,invalido,x=abc") == {'user:ana': 2.0, 'ip:10.0.0.1': 0.5}
+
+
+def test_tenant_and_priority_come_from_credentials(monkeypatch):
+    import hashlib
+    import app
+
+    monkeypatch.setattr(app, 'AGENT_API_TOKENS', parse_api_tokens(
+        '{"etl-token": {"user": "etl", "priority": "batch"}, '
+        f'"sha256:{hashlib.sha256(b"portal-token").hexdigest()}": {{"user": "portal", "forward_user": true}}}}'))
+
+    def resolve(headers=None, data=None):
+        with app.app.test_request_context('/', method='POST', headers=headers or {}, data=data or {},
+                                          environ_base={'REMOTE_ADDR': '10.0.0.9'}):
+            return app.resolve_tenant(app.request), app.resolve_priority(app.request)
+
+    # Cabeçalhos e campos controlados pelo cliente não mudam o tenant nem a prioridade
+    assert resolve({'X-User-Id': 'outro', 'X-Forwarded-For': '1.2.3.4', 'X-Priority': 'batch',
+                    'Authorization': 'Bearer desconhecido'}, {'user_id': 'x'}) == ('ip:10.0.0.9', PRIORITY_INTERACTIVE)
+    assert resolve({'X-API-Key': 'etl-token', 'X-User-Id': 'outro'}) == ('user:etl', PRIORITY_BATCH)
+    assert resolve({'Authorization': 'Bearer portal-token', 'X-User-Id': 'ana'}) == ('user:portal/ana', PRIORITY_INTERACTIVE)
+
+
+def test_backoff_does_not_hold_a_scheduler_worker(monkeypatch):
+    import time
+    import app
+
+    scheduler = FairScheduler(workers=1, metrics=MetricsRegistry())
+    monkeypatch.setattr(app, 'gemini_scheduler', scheduler)
+    monkeypatch.setattr(app, 'GEMINI_API_KEY', 'teste')
+    posts = []
+    other_results = []
+
+    class FakeResponse:
+        def __init__(self, status_code, text=''):
+            self.status_code = status_code
+            self.text = text
+
+        def json(self):
+            if self.status_code != 200:
+                return {'error': {'message': 'cota excedida'}}
+            return {'candidates': [{'content': {'parts': [{'text': self.text}]}}]}
+
+    def fake_post(url, headers=None, json=None, timeout=None):
+        prompt = json['contents'][0]['parts'][0]['text']
+        posts.append(prompt)
+        if prompt == 'lento' and posts.count('lento') == 1:
+            return FakeResponse(429)
+        return FakeResponse(200, f"resposta {prompt}")
+
+    def fake_sleep(seconds):
+        # Durante o backoff de 'lento' outro tenant usa o único worker
+        def other():
+            app.current_call_tenant.set(('user:outro', PRIORITY_INTERACTIVE))
+            other_results.append(app.run_generative_model('rápido'))
+
+        thread = threading.Thread(target=other)
+        thread.start()
+        thread.join(5)
+
+    monkeypatch.setattr(app.requests, 'post', fake_post)
+    monkeypatch.setattr(time, 'sleep', fake_sleep)
+    assert app.run_generative_model('lento') == "resposta lento"
+    scheduler.shutdown()
+    assert posts == ['lento', 'rápido', 'lento'] and other_results == ["resposta rápido"]
+    # Cada tentativa HTTP passou pelo escalonador (e foi cobrada do tenant)
+    assert scheduler.snapshot()['tenants']['anonymous']['dispatched'] == 2
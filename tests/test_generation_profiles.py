@@ -0,0 +1,78 @@
+import sys
+import os
+
+# Adiciona o diretório 'src' ao PYTHONPATH para que os módulos possam ser importados
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from generation_profiles import GenerationProfileRegistry, OutputLengthTracker, parse_profile_overrides
+
+
+def test_profiles_resolve_from_default_to_role_and_goal_type():
+    registry = GenerationProfileRegistry()
+    writer = registry.get('writer', 'strategic_planning')
+    assert writer.to_config() == {'temperature': 0.7, 'topK': 40, 'topP': 0.95, 'maxOutputTokens': 8192}
+    assert registry.get('collaborator', 'sales_analysis').to_config()['maxOutputTokens'] == 1536
+    summary = registry.get('writer', 'summary')
+    assert summary.max_output_tokens == 2048 and summary.source == 'default+writer+writer:summary'
+    assert registry.get('writer', 'summary') is summary
+
+
+def test_overrides_accept_generation_config_keys():
+    overrides = parse_profile_overrides('{"researcher": {"maxOutputTokens": 1024, "stopSequences": ["FIM"]}, '
+                                        '"writer:academic": {"temperature": 0.3, "desconhecido": 1}, "x": 3}')
+    assert overrides == {'researcher': {'max_output_tokens': 1024, 'stop_sequences': ['FIM']},
+                         'writer:academic': {'temperature': 0.3}}
+    assert parse_profile_overrides('{inválido') == {}
+    registry = GenerationProfileRegistry(overrides=overrides)
+    config = registry.get('researcher', 'general').to_config()
+    assert config['maxOutputTokens'] == 1024 and config['stopSequences'] == ['FIM'] and config['temperature'] == 0.4
+    assert registry.get('writer', 'academic').to_config()['temperature'] == 0.3
+
+
+def test_tracker_flags_profiles_that_truncate():
+    registry = GenerationProfileRegistry()
+    tracker = OutputLengthTracker(flag_rate=0.2, min_samples=5)
+    collaborator = registry.get('collaborator', 'sales_analysis')
+    writer = registry.get('writer', 'sales_analysis')
+    for _ in range(4):
+        tracker.record(collaborator, 1400, False)
+    tracker.record(collaborator, 1536, True)
+    for tokens in (900, 1000, 1100, 1200, 1300):
+        tracker.record(writer, tokens, False)
+    snapshot = tracker.snapshot()
+    assert tracker.flagged() == ['collaborator:sales_analysis']
+    assert snapshot['collaborator:sales_analysis']['suggested_max_output_tokens'] == 3072
+    # Folga grande: sugere um teto menor a partir do p95
+    assert snapshot['writer:sales_analysis']['p95_output_tokens'] == 1300
+    assert snapshot['writer:sales_analysis']['suggested_max_output_tokens'] == 2048
+
+
+def test_calls_send_role_profile_and_record_truncation(monkeypatch):
+    import app
+
+    configs = []
+
+    class FakeResponse:
+        status_code = 200
+
+        def json(self):
+            return {'candidates': [{'content': {'parts': [{'text': "1. Introdução\n2. Métricas"}]}, 'finishReason': 'MAX_TOKENS'}],
+                    'usageMetadata': {'candidatesTokenCount': 2048}}
+
+    def fake_post(url, headers=None, json=None, timeout=None):
+        configs.append(json['generationConfig'])
+        return FakeResponse()
+
+    logs = []
+    monkeypatch.setattr(app.requests, 'post', fake_post)
+    monkeypatch.setattr(app, 'GEMINI_API_KEY', 'teste')
+    monkeypatch.setattr(app, 'output_lengths', OutputLengthTracker(min_samples=1))
+    app.agent_researcher("Análise de vendas", "Vendas.", "Objetivo: {goal}\n{context}", 'sales_analysis',
+                         send_update=lambda data, event_type='message': logs.append(data))
+    app.agent_researcher("Análise de vendas", "Vendas.", "Objetivo: {goal}\n{context}", 'user_management', role='collaborator')
+    assert [config['maxOutputTokens'] for config in configs] == [2048, 1536]
+    assert configs[0]['temperature'] == 0.4
+    assert any('[GENERATION] Saída truncada' in str(line) for line in logs)
+    assert app.output_lengths.flagged() == ['collaborator:user_management', 'researcher:sales_analysis']
+    assert app.app.test_client().get('/api/metrics').get_json()['generation_profiles']['outputs'][
+        'researcher:sales_analysis']['truncated'] == 1
@@ -0,0 +1,44 @@
+import pytest
+import sys
+import os
+
+# Adiciona o diretório 'src' ao PYTHONPATH para que app.py possa ser importado
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from app import classify_goal, enhanced_detect_goal_type, detect_multiple_goal_types, get_collaborative_agents
+
+
+@pytest.mark.parametrize("goal, context", [
+    ("Análise de concorrência para o novo produto", ""),
+    ("Planejamento estratégico para o próximo ano fiscal", "visão da empresa"),
+    ("Relatório de vendas do último trimestre", "dados de crm"),
+    ("Escrever um artigo científico sobre IA", ""),
+    ("Qualquer coisa", ""),
+])
+def test_classification_is_backward_compatible(goal, context):
+    classification = classify_goal(goal, context)
+    primary = enhanced_detect_goal_type(goal, context)
+    related = detect_multiple_goal_types(goal, context)
+
+    assert classification.primary_type == primary
+    assert classification.related_types == related
+    assert sorted(classification.collaborators) == sorted(get_collaborative_agents(primary, related))
+
+
+def test_ranking_prefers_goal_text_and_specific_keywords():
+    classification = classify_goal("Análise de concorrência", "vendas vendas vendas")
+    ranked = classification.ranked
+
+    assert ranked[0]['type'] == 'competitive_analysis'
+    assert ranked[0]['keywords'][0] == 'análise de concorrência'
+    assert ranked[0]['positions'][0] == 0
+    assert [entry['score'] for entry in ranked] == sorted((entry['score'] for entry in ranked), reverse=True)
+    assert 0.0 < classification.confidence <= 1.0
+
+
+def test_no_keywords_means_general_with_zero_confidence():
+    classification = classify_goal("xyz", "")
+    assert classification.primary_type == 'general'
+    assert classification.ranked == []
+    assert classification.confidence == 0.0
+    assert classification.to_dict()['primary_type'] == 'general'
@@ -0,0 +1,113 @@
+import sys
+import os
+import io
+import json
+
+# Adiciona o diretório 'src' ao PYTHONPATH para que os módulos possam ser importados
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from json_stream import JsonEventReader, JsonStreamError, summarize_json_stream
+from tabular_ingestion import KIND_DATE, KIND_NUMBER
+from upload_ingestion import ingest_upload
+
+DOCUMENT = {
+    'empresa': {'nome': 'ACME', 'setores': ['vendas', 'suporte']},
+    'vendas': [{'id': i, 'valor': i * 1.5, 'data': f'2024-01-{i % 28 + 1:02d}', 'regiao': 'Sul' if i % 2 else 'Norte',
+                'desconto': None if i % 5 == 0 else 0.1} for i in range(120)],
+    'codigos': list(range(80)),
+    'vazio': [],
+}
+
+
+def chunked(text: str, size: int):
+    return [text[start:start + size] for start in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 64, 100000])
+def test_summary_is_independent_of_chunk_size(chunk_size):
+    text = json.dumps(DOCUMENT, indent=2, ensure_ascii=False)
+    summary = summarize_json_stream(chunked(text, chunk_size), sample_rows=5, max_list_items=10, batch_rows=16)
+    assert summary.top_level_keys == ['empresa', 'vendas', 'codigos', 'vazio']
+    assert summary.list_counts == {'empresa.setores': 2, 'vendas': 120, 'codigos': 80}
+    table = summary.tables['vendas']
+    assert table.rows == summary.record_count == 120
+    assert table.columns['valor'].kind == KIND_NUMBER
+    assert table.columns['data'].kind == KIND_DATE
+    assert table.columns['desconto'].missing == 24
+    assert table.columns['valor'].to_array().sum() == pytest.approx(sum(i * 1.5 for i in range(120)))
+    assert summary.skeleton['vendas'] == DOCUMENT['vendas'][:5]
+    assert summary.skeleton['codigos'] == list(range(10))
+    assert summary.skeleton['empresa'] == DOCUMENT['empresa']
+    assert summary.skeleton['vazio'] == []
+
+
+def test_events_for_nested_document():
+    text = '{"a": {"b": [1, {"c": 2}]}, "d": "x"}'
+    events = list(JsonEventReader(chunked(text, 3), expand_depth=3).events())
+    assert events == [
+        ('start_map', '', None), ('map_key', '', 'a'),
+        ('start_map', 'a', None), ('map_key', 'a', 'b'),
+        ('start_array', 'a.b', None), ('value', 'a.b[]', 1), ('value', 'a.b[]', {'c': 2}), ('end_array', 'a.b', None),
+        ('end_map', 'a', None), ('map_key', '', 'd'), ('value', 'd', 'x'), ('end_map', '', None),
+    ]
+
+
+@pytest.mark.parametrize('broken', [
+    lambda text: text.replace('"valor": 30.0', '"valor" 30.0'),
+    lambda text: text.replace('"valor": 45.0', '"valor": 45.0.1'),
+    lambda text: text.replace('"regiao": "Sul"', '"regiao": Sul', 1),
+    lambda text: text.replace('"nome": "ACME",', '"nome": "ACME"'),
+])
+def test_errors_report_same_line_and_column_as_json_loads(broken):
+    text = broken(json.dumps(DOCUMENT, indent=2))
+    with pytest.raises(json.JSONDecodeError) as expected:
+        json.loads(text)
+    for chunk_size in (1, 13, 100000):
+        with pytest.raises(JsonStreamError) as error:
+            summarize_json_stream(chunked(text, chunk_size))
+        assert (error.value.line, error.value.column) == (expected.value.lineno, expected.value.colno)
+        assert error.value.offset == expected.value.pos
+
+
+def test_truncated_and_trailing_content_are_errors():
+    with pytest.raises(JsonStreamError, match='Fim inesperado'):
+        summarize_json_stream(['{"a": [1, 2'])
+    with pytest.raises(JsonStreamError, match='Conteúdo extra'):
+        summarize_json_stream(['{"a": 1} {"b": 2}'])
+    with pytest.raises(JsonStreamError, match='vazio'):
+        summarize_json_stream(['  \n'])
+
+
+def test_large_json_upload_is_summarized_without_loading(monkeypatch):
+    import app as app_module
+
+    monkeypatch.setattr(app_module, 'AGENT_UPLOAD_REFORMAT_MAX_KB', 1)
+    monkeypatch.setattr(app_module, 'AGENT_DATA_PROFILE_SAMPLE_ROWS', 3)
+    monkeypatch.setattr(json, 'loads', lambda *args, **kwargs: pytest.fail('json.loads no arquivo inteiro'))
+    text = json.dumps(DOCUMENT, ensure_ascii=False)
+    upload = ingest_upload(FileStorage(io.BytesIO(text.encode('utf-8')), filename='dados.json'))
+    events = app_module.upload_context_events(upload, 'dados.json', 'tabular')
+    logs = []
+    try:
+        while True:
+            logs.append(next(events))
+    except StopIteration as stop:
+        context = stop.value
+    assert any('120 registros' in log for log in logs)
+    assert 'Perfil estatístico dos dados' in context
+    assert 'vendas: 120' in context
+    assert 'vendas[3]{' in context
+
+    broken = ingest_upload(FileStorage(io.BytesIO(text.replace('"id": 7,', '"id" 7,').encode('utf-8')), filename='dados.json'))
+    events = app_module.upload_context_events(broken, 'dados.json', 'tabular')
+    logs = []
+    try:
+        while True:
+            logs.append(next(events))
+    except StopIteration as stop:
+        context = stop.value
+    assert any('JSON inválido' in log and 'linha 1, coluna' in log for log in logs)
+    assert context.startswith('Arquivo JSON inválido')
@@ -0,0 +1,58 @@
+import pytest
+import sys
+import os
+
+# Adiciona o diretório 'src' ao PYTHONPATH para que os módulos possam ser importados
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from keyword_matcher import KeywordMatcher
+
+GROUPS = {
+    'academic': ['artigo', 'artigo científico', 'ti'],
+    'creative': ['artigo blog', 'post'],
+    'tech': ['ti', 'sistemas'],
+}
+
+
+def all_occurrences(text, keyword):
+    positions, start = [], text.find(keyword)
+    while start != -1:
+        positions.append(start)
+        start = text.find(keyword, start + 1)
+    return positions
+
+
+@pytest.mark.parametrize("text", [
+    "um artigo blog sobre sistemas",
+    "artigo científico e artigo blog",
+    "competitivo",
+    "tititi",
+    "nada relevante aqui",
+    "",
+])
+def test_finditer_matches_every_overlapping_occurrence(text):
+    matcher = KeywordMatcher(GROUPS)
+    found = sorted(matcher.finditer(text))
+    expected = sorted((pos, kw) for kw in matcher.labels_by_keyword for pos in all_occurrences(text, kw))
+    assert found == expected
+
+
+def test_shared_keyword_reports_every_label():
+    hits = KeywordMatcher(GROUPS).scan("competitivo")
+    assert hits.labels() == {'academic', 'tech'}
+    assert hits.count('tech') == 2
+    assert hits.first_position('academic') == 5
+
+
+@pytest.mark.parametrize("segments", [
+    ("artigo", " ", "blog"),
+    ("arti", "go b", "log"),
+    ("a", "r", "t", "i", "g", "o", " ", "b", "l", "o", "g"),
+])
+def test_scan_segments_equals_scan_of_concatenation(segments):
+    matcher = KeywordMatcher(GROUPS)
+    split = matcher.scan(*segments)
+    joined = matcher.scan("".join(segments))
+    assert split.keyword_counts == joined.keyword_counts
+    assert split.keyword_positions == joined.keyword_positions
+    assert split.has('creative')
@@ -0,0 +1,195 @@
+import pytest
+import sys
+import os
+import threading
+
+# Adiciona o diretório 'src' ao PYTHONPATH para que os módulos possam ser importados
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from metrics import MetricsRegistry
+from load_control import AdmissionController, LatencyTracker, OverloadPolicy
+
+
+def make_controller(max_concurrent=1, max_queue=2):
+    return AdmissionController(max_concurrent=max_concurrent, max_queue=max_queue,
+                               default_run_seconds=10.0, metrics=MetricsRegistry())
+
+
+def test_admits_up_to_limit_then_queues_then_rejects():
+    controller = make_controller(max_concurrent=1, max_queue=2)
+    first = controller.try_enqueue()
+    second = controller.try_enqueue()
+    third = controller.try_enqueue()
+
+    assert first.admitted
+    assert not second.admitted and not third.admitted
+    assert controller.position(second) == 1
+    assert controller.position(third) == 2
+    assert controller.try_enqueue() is None
+    assert controller.metrics.get_counter('agent_runs_rejected_total') == 1
+    assert controller.metrics.get_gauge('agent_runs_in_flight') == 1
+    assert controller.metrics.get_gauge('agent_runs_queue_depth') == 2
+
+
+def test_release_promotes_next_in_fifo_order():
+    controller = make_controller(max_concurrent=1, max_queue=2)
+    first = controller.try_enqueue()
+    second = controller.try_enqueue()
+    third = controller.try_enqueue()
+
+    controller.release(first)
+    assert second.admitted
+    assert controller.position(third) == 1
+    assert controller.in_flight == 1
+
+    # Liberar duas vezes não pode abrir vagas extras
+    controller.release(first)
+    assert controller.in_flight == 1
+    assert not third.admitted
+
+
+def test_abandoned_waiter_leaves_queue():
+    controller = make_controller(max_concurrent=1, max_queue=2)
+    controller.try_enqueue()
+    waiting = controller.try_enqueue()
+    controller.release(waiting)
+    assert controller.queue_depth == 0
+    assert controller.try_enqueue() is not None
+
+
+def test_wait_blocks_until_admitted():
+    controller = make_controller(max_concurrent=1, max_queue=1)
+    first = controller.try_enqueue()
+    second = controller.try_enqueue()
+
+    assert controller.wait(second, timeout=0) is False
+    threading.Timer(0.05, controller.release, args=(first,)).start()
+    assert controller.wait(second, timeout=2) is True
+
+
+@pytest.mark.parametrize("position, expected", [(0, 0.0), (1, 10.0), (2, 10.0), (3, 20.0)])
+def test_estimated_wait_uses_concurrency_slots(position, expected):
+    controller = make_controller(max_concurrent=2, max_queue=4)
+    assert controller.estimated_wait(position) == expected
+
+
+@pytest.mark.parametrize("queue_depth, latency, expected_level, expected_name", [
+    (0, 0.0, 0, 'full'),
+    (1, 5.0, 0, 'full'),
+    (3, 0.0, 1, 'reduced_collaborators'),
+    (0, 25.0, 1, 'reduced_collaborators'),
+    (5, 0.0, 2, 'truncated_outlines'),
+    (0, 30.0, 2, 'truncated_outlines'),
+    (8, 0.0, 3, 'traditional'),
+    (0, 45.0, 3, 'traditional'),
+])
+def test_overload_policy_levels(queue_depth, latency, expected_level, expected_name):
+    policy = OverloadPolicy(latency_target=20.0, max_collaborators=2, outline_char_limit=500, metrics=MetricsRegistry())
+    degradation = policy.evaluate(queue_depth, 10, latency)
+    assert degradation.level == expected_level
+    assert degradation.name == expected_name
+    assert (degradation.max_collaborators == 2) == (expected_level >= 1)
+    assert (degradation.outline_char_limit == 500) == (expected_level >= 2)
+    assert degradation.use_traditional == (expected_level == 3)
+
+
+def test_overload_policy_disabled_never_degrades():
+    policy = OverloadPolicy(enabled=False, metrics=MetricsRegistry())
+    assert policy.evaluate(10, 10, 1000.0).level == 0
+
+
+def test_latency_tracker_recent_average():
+    tracker = LatencyTracker(max_samples=3)
+    assert tracker.recent() == 0.0
+    for value in (1.0, 2.0, 3.0, 4.0):
+        tracker.record(value)
+    assert tracker.recent() == 3.0
+
+
+def test_endpoint_returns_503_with_retry_after_when_queue_is_full(monkeypatch):
+    import app as app_module
+
+    controller = make_controller(max_concurrent=1, max_queue=0)
+    controller.try_enqueue()
+    monkeypatch.setattr(app_module, 'admission_controller', controller)
+    monkeypatch.setattr(app_module, 'GEMINI_API_KEY', 'teste')
+
+    response = app_module.app.test_client().post('/api/run_agent_system', data={'goal': 'Teste'})
+    assert response.status_code == 503
+    assert int(response.headers['Retry-After']) >= 1
+    assert 'error' in response.get_json()
+
+
+def test_disconnect_cancels_pipeline_and_waits_for_runner():
+    import queue
+    import app as app_module
+
+    events = queue.Queue()
+    calls = []
+
+    def target():
+        events.put(('log', 'primeira etapa'))
+        # A próxima chamada ao modelo só acontece depois do fechamento do stream
+        app_module.current_run_cancel.get().wait(5)
+        try:
+            app_module.run_generative_model('prompt')
+        except app_module.PipelineCancelled:
+            calls.append('cancelada')
+        return 'fim'
+
+    stream = app_module.stream_pipeline_events(target, events)
+    assert 'primeira etapa' in next(stream)
+    stream.close()
+    # close() retorna só depois que a thread do pipeline terminou
+    assert calls == ['cancelada']
+
+
+def test_cancel_reaches_calls_waiting_in_the_scheduler(monkeypatch):
+    import app as app_module
+    from fair_scheduler import FairScheduler
+
+    scheduler = FairScheduler(workers=1, metrics=MetricsRegistry())
+    monkeypatch.setattr(app_module, 'gemini_scheduler', scheduler)
+    monkeypatch.setattr(app_module, 'GEMINI_API_KEY', 'teste')
+    monkeypatch.setattr(app_module.requests, 'post', lambda *args, **kwargs: pytest.fail("chamada enviada ao Gemini"))
+    # Ocupa o único worker para que a chamada do pipeline fique na fila
+    release = threading.Event()
+    busy = scheduler.submit('outro', release.wait, 5)
+    cancel = threading.Event()
+    outcome = []
+
+    def pipeline():
+        app_module.current_run_cancel.set(cancel)
+        try:
+            app_module.run_generative_model('prompt')
+        except app_module.PipelineCancelled:
+            outcome.append('cancelada')
+
+    thread = threading.Thread(target=pipeline)
+    thread.start()
+    while scheduler.snapshot()['tenants'].get('anonymous', {}).get('queued') != 1:
+        pass
+    cancel.set()
+    release.set()
+    thread.join(5)
+    busy.result(5)
+    scheduler.shutdown()
+    assert outcome == ['cancelada']
+
+
+def test_invalid_requests_are_rejected_before_the_queue(monkeypatch):
+    import app as app_module
+
+    controller = make_controller(max_concurrent=1, max_queue=1)
+    monkeypatch.setattr(app_module, 'admission_controller', controller)
+    client = app_module.app.test_client()
+
+    monkeypatch.setattr(app_module, 'GEMINI_API_KEY', 'teste')
+    response = client.post('/api/run_agent_system', data={'text_context': 'Vendas.'})
+    assert response.status_code == 400 and 'goal' in response.get_json()['error']
+
+    monkeypatch.setattr(app_module, 'GEMINI_API_KEY', None)
+    response = client.post('/api/run_agent_system', data={'goal': 'Teste'})
+    assert response.status_code == 503 and 'Retry-After' not in response.headers
+    assert controller.snapshot()['in_flight'] == 0 and controller.queue_depth == 0
+    assert controller.metrics.snapshot()['counters'].get('agent_runs_abandoned_total') is None
@@ -0,0 +1,71 @@
+import sys
+import os
+import pytest
+
+# Adiciona o diretório 'src' ao PYTHONPATH para que os módulos possam ser importados
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from prompt_templates import PromptTemplateRegistry, normalize_template
+
+
+def test_normalize_template_dedents_and_collapses_blank_lines():
+    text = """
+        Título:
+            item {goal}   
+
+
+        Fim
+        """
+    assert normalize_template(text) == "Título:\n    item {goal}\n\nFim"
+
+
+def test_registry_lookup_fallback_and_versions():
+    registry = PromptTemplateRegistry({
+        'general': {'researcher': "  Pesquise {goal}", 'writer': "  Escreva {outline}"},
+        'academic': {'researcher': "Pesquisa acadêmica {goal}", 'writer': "Texto acadêmico {outline}"},
+    })
+    researcher, writer = registry.pair('academic')
+    assert researcher.text == "Pesquisa acadêmica {goal}"
+    assert registry.get('desconhecido', 'writer').text == "Escreva {outline}"
+    assert researcher.version != registry.get('general', 'researcher').version
+
+    # Mesmo conteúdo normalizado -> mesma versão
+    same = PromptTemplateRegistry({'general': {'researcher': "Pesquise {goal}\n", 'writer': "Escreva {outline}"}})
+    assert same.get('general', 'researcher').version == registry.get('general', 'researcher').version
+
+
+def test_registry_is_immutable():
+    registry = PromptTemplateRegistry({'general': {'researcher': "a", 'writer': "b"}})
+    template = registry.get('general', 'researcher')
+    with pytest.raises(AttributeError):
+        template.text = "outro"
+    with pytest.raises(TypeError):
+        registry._templates['novo'] = {}
+
+
+def test_app_templates_are_compiled_once():
+    import app
+
+    first = app.generate_specialized_prompts('sales_analysis', 'g', 'c')
+    second = app.generate_specialized_prompts('sales_analysis', 'outro', 'contexto')
+    assert first[0] is second[0]
+    assert not first[0].startswith(' ')
+    assert '{context}' in first[0] and '{outline}' in first[1]
+
+
+def test_render_substitutes_without_escaping_braces():
+    from prompt_templates import render_prompt
+
+    template = "Objetivo: {goal}\nDados: '''{context}'''\nLiteral: {{chaves}}"
+    context = '{"vendas": {"total": 10}}'
+    rendered = render_prompt(template, goal="Meta {x}", context=context)
+    assert rendered == "Objetivo: Meta {x}\nDados: '''{\"vendas\": {\"total\": 10}}'''\nLiteral: {chaves}"
+
+
+def test_render_accepts_context_parts_and_requires_all_slots():
+    from prompt_templates import render_prompt
+
+    parts = ["base", "\n--- extra ---\n", "insight"]
+    assert render_prompt("[{context}]", context=parts) == "[base\n--- extra ---\ninsight]"
+    with pytest.raises(KeyError):
+        render_prompt("{goal} {context}", goal="g")
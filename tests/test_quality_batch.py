@@ -0,0 +1,118 @@
+import sys
+import os
+import json
+import random
+
+# Adiciona o diretório 'src' ao PYTHONPATH para que os módulos possam ser importados
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import pytest
+
+from quality_batch import BatchQualityScorer, chunk_path, run_batch
+from quality_scoring import QualityScorer
+
+WORDS = ("análise objetivos estratégias implementação métricas tendências recomendações roadmap personas "
+         "jornada experiência backlog sprint introdução conclusão ação plano executar próximos passos vendas "
+         "região trimestre receita clientes").split()
+GOAL_TYPES = ['strategic_planning', 'sales_analysis', 'product_management', 'general', 'creative']
+
+
+def make_records(count: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    return [{
+        'id': f"r{index}",
+        'content': " ".join(rng.choice(WORDS).upper() if rng.random() < 0.1 else rng.choice(WORDS)
+                            for _ in range(rng.randint(0, 400))),
+        'goal': " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 6))),
+        'goal_type': rng.choice(GOAL_TYPES),
+    } for index in range(count)]
+
+
+def test_batch_scores_match_single_report_scorer():
+    records = make_records(200)
+    scorer = QualityScorer()
+    for result, record in zip(BatchQualityScorer(scorer).score_records(records), records):
+        expected = scorer.evaluate(record['content'], record['goal'], record['goal_type'])
+        assert result['detailed_scores'] == expected['detailed_scores']
+        assert result['overall_score'] == expected['overall_score']
+        assert result['recommendations'] == expected['recommendations']
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_run_batch_is_restartable(tmp_path, workers):
+    source = tmp_path / 'relatorios.jsonl'
+    lines = [json.dumps(record, ensure_ascii=False) for record in make_records(45)]
+    lines.insert(10, '{"id": "quebrado"')
+    source.write_text("\n".join(lines) + "\n", encoding='utf-8')
+    output = str(tmp_path / 'saida')
+
+    first = run_batch(str(source), output, chunk_size=10, workers=workers)
+    assert first['reports'] == 45 and first['errors'] == 1
+    assert first['scored_chunks'] == 5 and first['skipped_chunks'] == 0
+    assert sum(first['overall_histogram'].values()) == 45
+
+    # Interrupção simulada: um bloco perdido é o único reavaliado
+    os.remove(chunk_path(output, 2))
+    second = run_batch(str(source), output, chunk_size=10, workers=workers)
+    assert (second['scored_chunks'], second['skipped_chunks']) == (1, 4)
+    assert second['scores'] == first['scores']
+    with open(os.path.join(output, 'summary.json'), encoding='utf-8') as f:
+        assert json.load(f)['reports'] == 45
+
+    with pytest.raises(ValueError):
+        run_batch(str(source), output, chunk_size=20, workers=workers)
+
+
+def test_run_batch_reads_directory_with_defaults(tmp_path):
+    reports = tmp_path / 'relatorios'
+    reports.mkdir()
+    (reports / 'a.md').write_text("# Introdução\nDesenvolvimento e conclusão com plano de ação.", encoding='utf-8')
+    (reports / 'b.json').write_text(json.dumps({'result': 'Métricas e tendências', 'goal_type': 'sales_analysis'}),
+                                    encoding='utf-8')
+    (reports / 'ignorado.csv').write_text("a,b\n1,2\n", encoding='utf-8')
+    summary = run_batch(str(reports), str(tmp_path / 'saida'), chunk_size=1, workers=1, default_goal='plano')
+    assert summary['reports'] == 2 and summary['chunks'] == 2
+    assert {goal_type: stats['reports'] for goal_type, stats in summary['by_goal_type'].items()} == {'general': 1, 'sales_analysis': 1}
+    with open(chunk_path(str(tmp_path / 'saida'), 0), encoding='utf-8') as f:
+        header, first = json.loads(f.readline()), json.loads(f.readline())
+    assert header['ids'] == ['a.md']
+    assert first['id'] == 'a.md' and first['detailed_scores']['completeness'] == 1.0
+
+
+def test_changed_input_rescores_only_affected_chunks(tmp_path):
+    source = tmp_path / 'relatorios.jsonl'
+    records = make_records(30)
+    source.write_text("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records[:25]), encoding='utf-8')
+    output = str(tmp_path / 'saida')
+    assert run_batch(str(source), output, chunk_size=10, workers=1)['scored_chunks'] == 3
+
+    # Linhas acrescentadas: o último bloco (incompleto) muda; os anteriores são reaproveitados
+    with open(source, 'a', encoding='utf-8') as f:
+        f.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records[25:]))
+    grown = run_batch(str(source), output, chunk_size=10, workers=1)
+    assert (grown['scored_chunks'], grown['skipped_chunks'], grown['reports']) == (1, 2, 30)
+
+    # Entrada reduzida: blocos que sobraram não entram no resumo
+    source.write_text("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records[:10]), encoding='utf-8')
+    shrunk = run_batch(str(source), output, chunk_size=10, workers=1)
+    assert (shrunk['skipped_chunks'], shrunk['reports'], shrunk['chunks']) == (1, 10, 1)
+
+    # Outros valores padrão mudam os scores: exigem outro diretório de saída
+    with pytest.raises(ValueError):
+        run_batch(str(source), output, chunk_size=10, workers=1, default_goal='vendas')
+
+
+def test_modified_report_file_is_rescored(tmp_path):
+    reports = tmp_path / 'relatorios'
+    reports.mkdir()
+    for name in ('a.md', 'b.md', 'c.md'):
+        (reports / name).write_text("Introdução e conclusão.", encoding='utf-8')
+    output = str(tmp_path / 'saida')
+    run_batch(str(reports), output, chunk_size=2, workers=1)
+    (reports / 'b.md').write_text("Introdução, desenvolvimento e conclusão com plano de ação.", encoding='utf-8')
+    rerun = run_batch(str(reports), output, chunk_size=2, workers=1)
+    assert (rerun['scored_chunks'], rerun['skipped_chunks']) == (1, 1)
+    (reports / 'a0.md').write_text("Novo relatório.", encoding='utf-8')
+    rerun = run_batch(str(reports), output, chunk_size=2, workers=1)
+    # a0.md desloca os blocos seguintes: todos mudaram
+    assert (rerun['scored_chunks'], rerun['skipped_chunks'], rerun['reports']) == (2, 0, 4)
@@ -0,0 +1,135 @@
+import sys
+import os
+
+# Adiciona o diretório 'src' ao PYTHONPATH para que os módulos possam ser importados
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import pytest
+
+from quality_scoring import QualityScorer, recommendations_for
+
+REPORT = """# Planejamento Estratégico 2025
+
+## Análise do cenário
+Os objetivos do ano dependem da implementação do novo CRM.
+
+## Próximos passos
+Executar o plano de ação por região e revisar as métricas de vendas.
+"""
+
+
+def legacy_scores(content: str, goal: str, goal_type: str) -> dict:
+    """Avaliação anterior (uma minusculização e varredura por critério)"""
+    sections = {
+        'strategic_planning': ['análise', 'objetivos', 'estratégias', 'implementação'],
+        'sales_analysis': ['métricas', 'tendências', 'recomendações'],
+    }.get(goal_type, ['introdução', 'desenvolvimento', 'conclusão'])
+    content_lower = content.lower()
+    goal_keywords = goal.lower().split()
+    actionable = ['recomendação', 'ação', 'implementar', 'executar', 'plano', 'estratégia', 'próximos passos']
+    return {
+        'completeness': sum(1 for section in sections if section in content_lower) / len(sections),
+        'accuracy': min(sum(1 for keyword in goal_keywords if keyword in content_lower) / len(goal_keywords), 1.0),
+        'relevance': min(len(content) / 1000, 1.0),
+        'actionability': min(sum(1 for keyword in actionable if keyword in content_lower) / 3, 1.0),
+    }
+
+
+@pytest.mark.parametrize('goal, goal_type', [
+    ("Plano estratégico com análise de vendas", 'strategic_planning'),
+    ("vendas vendas por região", 'sales_analysis'),
+    ("Relatório de conclusão", 'general'),
+])
+def test_scores_match_previous_evaluation(goal, goal_type):
+    scorer = QualityScorer()
+    for content in (REPORT, REPORT * 40, "", "AÇÃO"):
+        assert scorer.scores(content, goal, goal_type) == legacy_scores(content, goal, goal_type)
+
+
+def test_report_has_recommendations_and_timing():
+    report = QualityScorer().evaluate(REPORT, "Plano estratégico", 'strategic_planning')
+    assert report['detailed_scores']['completeness'] == pytest.approx(0.75)
+    assert report['overall_score'] == pytest.approx(sum(report['detailed_scores'].values()) / 4)
+    assert report['recommendations'] == recommendations_for(report['detailed_scores'])
+    assert "Expandir conteúdo com mais detalhes relevantes" in report['recommendations']
+    assert report['elapsed_ms'] >= 0
+
+
+def test_empty_goal_scores_zero_accuracy():
+    assert QualityScorer().scores(REPORT, "   ", 'general')['accuracy'] == 0.0
+
+
+def test_quality_assurance_logs_timing():
+    import app
+
+    logs = []
+    report = app.QualityAssurance(lambda data, event_type='message': logs.append(data)).evaluate_content_quality(
+        REPORT, "Plano estratégico", 'strategic_planning')
+    assert set(report) >= {'overall_score', 'detailed_scores', 'recommendations', 'elapsed_ms'}
+    assert any(' ms, ' in line for line in logs)
+
+
+def test_collect_quality_report_reports_timeout_and_failure():
+    import app
+    from concurrent.futures import Future
+
+    pending = Future()
+    assert app.collect_quality_report(pending, timeout=0.01) == {'status': 'timeout', 'timeout_seconds': 0.01}
+    failed = Future()
+    failed.set_exception(RuntimeError("falhou"))
+    assert app.collect_quality_report(failed) == {'status': 'error', 'error': 'falhou'}
+
+
+def test_final_result_is_sent_before_quality_report(monkeypatch):
+    import json
+    import app
+
+    class FakeResponse:
+        status_code = 200
+
+        def json(self):
+            return {'candidates': [{'content': {'parts': [{'text': "## 1. Métricas\nTendências e recomendações"}]}}]}
+
+    monkeypatch.setattr(app.requests, 'post', lambda *args, **kwargs: FakeResponse())
+    monkeypatch.setattr(app, 'GEMINI_API_KEY', 'teste')
+    body = app.app.test_client().post('/api/run_agent_system', data={
+        'goal': 'Análise de vendas por região', 'text_context': 'Vendas de janeiro a março.'
+    }).get_data(as_text=True)
+    events = [(block.split('\n')[0][len('event: '):], json.loads(block.split('\n', 1)[1][len('data: '):]))
+              for block in body.strip().split('\n\n')]
+    names = [name for name, _ in events]
+    assert names.index('final_result') < names.index('quality_report') < names.index('end')
+    final = dict(events)['final_result']
+    assert 'RELATÓRIO DE QUALIDADE' not in final
+    report = dict(events)['quality_report']
+    assert report['status'] == 'ok' and set(report['detailed_scores']) == {'completeness', 'accuracy', 'relevance', 'actionability'}
+
+
+def test_admission_slot_is_released_before_waiting_for_qa(monkeypatch):
+    import app
+    from load_control import AdmissionController
+    from metrics import MetricsRegistry
+
+    class FakeResponse:
+        status_code = 200
+
+        def json(self):
+            return {'candidates': [{'content': {'parts': [{'text': "## 1. Métricas\nTendências"}]}}]}
+
+    controller = AdmissionController(max_concurrent=1, max_queue=1, metrics=MetricsRegistry())
+    in_flight_during_qa = []
+    original_collect = app.collect_quality_report
+
+    def observed_collect(future, timeout=None):
+        in_flight_during_qa.append(controller.in_flight)
+        return original_collect(future, timeout)
+
+    monkeypatch.setattr(app.requests, 'post', lambda *args, **kwargs: FakeResponse())
+    monkeypatch.setattr(app, 'GEMINI_API_KEY', 'teste')
+    monkeypatch.setattr(app, 'admission_controller', controller)
+    monkeypatch.setattr(app, 'collect_quality_report', observed_collect)
+    body = app.app.test_client().post('/api/run_agent_system', data={
+        'goal': 'Análise de vendas por região', 'text_context': 'Vendas de janeiro a março.'
+    }).get_data(as_text=True)
+    assert 'event: quality_report' in body
+    assert in_flight_during_qa == [0] and controller.in_flight == 0
@@ -0,0 +1,141 @@
+import sys
+import os
+
+# Adiciona o diretório 'src' ao PYTHONPATH para que os módulos possam ser importados
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import json
+
+import pytest
+
+from report_sections import parse_sections, normalize_regenerated, heading_line
+from report_store import ReportStore, is_report_id
+
+REPORT = """Sumário gerado automaticamente.
+
+# RELATÓRIO DE VENDAS
+
+## 1. Métricas
+Receita de R$ 1,2 mi no trimestre.
+
+### Por região
+Sul lidera com 40%.
+
+```
+# não é um título
+```
+
+## 2. Tendências
+Crescimento de 8% ao mês.
+
+## 3. Recomendações
+Ampliar a equipe do Norte.
+"""
+
+
+def test_tree_follows_heading_levels():
+    tree = parse_sections(REPORT)
+    assert [(section.id, section.title) for section in tree.sections] == [
+        ('1', 'RELATÓRIO DE VENDAS'), ('1.1', '1. Métricas'), ('1.1.1', 'Por região'),
+        ('1.2', '2. Tendências'), ('1.3', '3. Recomendações')]
+    assert tree.preamble == "Sumário gerado automaticamente.\n\n"
+    metrics = tree.find('1.1')
+    assert tree.content(metrics).startswith('## 1. Métricas') and '# não é um título' in tree.content(metrics)
+    assert tree.body(metrics) == "Receita de R$ 1,2 mi no trimestre.\n\n"
+    assert tree.content(tree.find('1')) == REPORT[len(tree.preamble):]
+
+
+def test_find_by_title_and_resolve_without_overlap():
+    tree = parse_sections(REPORT)
+    assert tree.find('tendencias').id == '1.2'
+    assert tree.find('Por Região').id == '1.1.1'
+    assert [section.id for section in tree.resolve(['recomendações', '1.1.1', '1.1'])] == ['1.1', '1.3']
+    with pytest.raises(KeyError) as missing:
+        tree.resolve(['1.2', 'Conclusão'])
+    assert missing.value.args[0] == ['Conclusão']
+
+
+def test_neighbours_and_splice_keep_the_rest_intact():
+    tree = parse_sections(REPORT)
+    trends = tree.find('1.2')
+    previous, following = tree.neighbours(trends, max_chars=200)
+    assert previous.startswith('## 1. Métricas') and following.startswith('## 3. Recomendações')
+    assert tree.neighbours(tree.find('1.1'))[0] == '# RELATÓRIO DE VENDAS'
+
+    new_text = normalize_regenerated("```markdown\n## Tendências\nQueda nas vendas do Sul.\n```", trends,
+                                     heading_line(REPORT, trends))
+    assert new_text == "## 2. Tendências\n\nQueda nas vendas do Sul."
+    spliced = tree.splice({trends.id: new_text})
+    assert spliced == REPORT.replace("Tendências\nCrescimento de 8% ao mês.", "Tendências\n\nQueda nas vendas do Sul.")
+    assert [section.title for section in parse_sections(spliced).sections] == [section.title for section in tree.sections]
+
+
+def test_report_store_saves_versions_and_evicts(tmp_path):
+    store = ReportStore(str(tmp_path), max_entries=2)
+    first = store.save({'content': REPORT, 'goal': 'vendas', 'goal_type': 'sales_analysis'})
+    assert is_report_id(first) and store.get(first)['content'] == REPORT
+    second = store.save({'content': 'b', 'parent_id': first})
+    store.save({'content': 'c'})
+    assert store.get(first) is None and store.get(second)['parent_id'] == first
+    assert ReportStore(str(tmp_path), max_entries=2).snapshot()['entries'] == 2
+
+
+def test_regenerate_api_replaces_only_selected_section(monkeypatch, tmp_path):
+    import app
+
+    prompts = []
+
+    class FakeResponse:
+        status_code = 200
+
+        def json(self):
+            return {'candidates': [{'content': {'parts': [{'text': "## Tendências\nNovas tendências e recomendações."}]}}]}
+
+    def fake_post(url, headers=None, json=None, timeout=None):
+        prompts.append(json['contents'][0]['parts'][0]['text'])
+        return FakeResponse()
+
+    monkeypatch.setattr(app.requests, 'post', fake_post)
+    monkeypatch.setattr(app, 'GEMINI_API_KEY', 'teste')
+    monkeypatch.setattr(app, 'report_store', ReportStore(str(tmp_path)))
+    report_id = app.save_report(REPORT, 'Análise de vendas por região', 'sales_analysis', 'Outline: métricas e tendências',
+                                'Vendas de janeiro a março.')
+
+    client = app.app.test_client()
+    assert len(client.get(f'/api/reports/{report_id}').get_json()['sections']) == 5
+    response = client.post(f'/api/reports/{report_id}/regenerate', json={'sections': ['Tendências'], 'instructions': 'Use os dados do Sul'})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert len(prompts) == 1
+    assert 'Outline: métricas e tendências' in prompts[0] and 'Use os dados do Sul' in prompts[0]
+    assert '## 1. Métricas' in prompts[0] and '## 3. Recomendações' in prompts[0]
+    assert data['result'] == REPORT.replace("Tendências\nCrescimento de 8% ao mês.", "Tendências\n\nNovas tendências e recomendações.")
+    assert data['parent_id'] == report_id and data['regenerated'][0]['id'] == '1.2'
+    assert data['quality_report']['status'] == 'ok'
+    assert app.report_store.get(data['report_id'])['content'] == data['result']
+
+    missing = client.post(f'/api/reports/{report_id}/regenerate', json={'sections': ['Conclusão']})
+    assert missing.status_code == 400 and missing.get_json()['missing'] == ['Conclusão']
+    assert client.post(f'/api/reports/{"0" * 32}/regenerate', json={'sections': ['1']}).status_code == 404
+
+
+def test_pipeline_emits_report_event(monkeypatch, tmp_path):
+    import app
+
+    class FakeResponse:
+        status_code = 200
+
+        def json(self):
+            return {'candidates': [{'content': {'parts': [{'text': "## 1. Métricas\nTendências e recomendações"}]}}]}
+
+    monkeypatch.setattr(app.requests, 'post', lambda *args, **kwargs: FakeResponse())
+    monkeypatch.setattr(app, 'GEMINI_API_KEY', 'teste')
+    monkeypatch.setattr(app, 'report_store', ReportStore(str(tmp_path)))
+    body = app.app.test_client().post('/api/run_agent_system', data={
+        'goal': 'Análise de vendas por região', 'text_context': 'Vendas de janeiro a março.'
+    }).get_data(as_text=True)
+    events = dict((block.split('\n')[0][len('event: '):], json.loads(block.split('\n', 1)[1][len('data: '):]))
+                  for block in body.strip().split('\n\n'))
+    record = app.report_store.get(events['report']['report_id'])
+    assert record['content'] == events['final_result'] and record['context'] == 'Vendas de janeiro a março.'
+    assert record['outline'] and events['report']['sections'][0]['title'] == '1. Métricas'
@@ -0,0 +1,121 @@
+import sys
+import os
+
+# Adiciona o diretório 'src' ao PYTHONPATH para que os módulos possam ser importados
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import re
+import threading
+import time
+
+from report_sections import outline_sections, stitch_sections, parse_sections
+from generation_profiles import GenerationProfileRegistry
+
+NUMBERED_OUTLINE = """ESTRUTURA PROPOSTA
+
+1. Introdução
+   - Contexto do trimestre
+2) **Métricas de vendas**
+   1.1 Receita por região
+3. Recomendações
+"""
+
+HEADING_OUTLINE = """# Estrutura
+
+## 1. Sumário executivo
+Pontos principais.
+
+### 1.1 Destaques
+## 2. Análise
+Dados por região.
+"""
+
+
+def test_outline_sections_from_numbered_items_and_headings():
+    assert outline_sections(NUMBERED_OUTLINE) == [
+        {'title': 'Introdução', 'points': '   - Contexto do trimestre'},
+        {'title': 'Métricas de vendas', 'points': '   1.1 Receita por região'},
+        {'title': 'Recomendações', 'points': ''},
+    ]
+    sections = outline_sections(HEADING_OUTLINE)
+    assert [section['title'] for section in sections] == ['1. Sumário executivo', '2. Análise']
+    assert '### 1.1 Destaques' in sections[0]['points']
+    assert outline_sections("Apenas um parágrafo sem seções.") == []
+
+
+def test_stitch_sections_keeps_order_and_removes_repetition():
+    notice = "Este documento segue as normas ABNT e foi elaborado com base nos dados fornecidos pelo cliente."
+    texts = [
+        f"```markdown\n# Relatório\n## Introdução\n{notice}\n\nTexto da introdução.\n```",
+        f"## 2. Métricas\n## Receita\nR$ 1 mi.\n\n{notice}",
+    ]
+    content = stitch_sections(texts, ['## 1. Introdução', '## 2. Métricas'])
+    assert content.count(notice) == 1
+    tree = parse_sections(content)
+    assert [(section.id, section.title) for section in tree.sections] == [
+        ('1', '1. Introdução'), ('2', '2. Métricas'), ('2.1', 'Receita')]
+
+
+def test_section_writer_runs_sections_concurrently(monkeypatch):
+    import app
+
+    active = {'now': 0, 'max': 0}
+    lock = threading.Lock()
+    budgets = []
+
+    class FakeResponse:
+        status_code = 200
+
+        def __init__(self, text):
+            self.text = text
+
+        def json(self):
+            return {'candidates': [{'content': {'parts': [{'text': self.text}]}}]}
+
+    def fake_post(url, headers=None, json=None, timeout=None):
+        prompt = json['contents'][0]['parts'][0]['text']
+        budgets.append(json['generationConfig']['maxOutputTokens'])
+        heading = re.search(r'SUA SEÇÃO \((\d) de 3\): (.+)', prompt)
+        with lock:
+            active['now'] += 1
+            active['max'] = max(active['max'], active['now'])
+        time.sleep(0.05)
+        with lock:
+            active['now'] -= 1
+        return FakeResponse(f"{heading.group(2)}\nTexto da seção {heading.group(1)}.")
+
+    monkeypatch.setattr(app.requests, 'post', fake_post)
+    monkeypatch.setattr(app, 'GEMINI_API_KEY', 'teste')
+    monkeypatch.setattr(app, 'AGENT_WRITER_MODE', 'sections')
+    monkeypatch.setattr(app, 'AGENT_WRITER_CONCURRENCY', 3)
+    monkeypatch.setattr(app, 'generation_profiles', GenerationProfileRegistry(overrides={'section': {'max_output_tokens': 1024}}))
+    content = app.agent_writer(NUMBERED_OUTLINE, "Vendas do trimestre.", "não usado: {outline}", "Análise de vendas", 'sales_analysis')
+    assert content == ("## 1. Introdução\n\nTexto da seção 1.\n\n## 2. Métricas de vendas\n\nTexto da seção 2.\n\n"
+                       "## 3. Recomendações\n\nTexto da seção 3.\n")
+    assert budgets == [1024] * 3 and active['max'] == 3
+
+
+def test_failed_section_becomes_note(monkeypatch):
+    import app
+
+    def fake_run(prompt, send_update=None, shared_prefix=None, profile=None):
+        if 'SUA SEÇÃO (2 de 3)' in prompt or 'SUA SEÇÃO (3 de 3)' in prompt:
+            raise ConnectionError("indisponível")
+        return "Texto."
+
+    monkeypatch.setattr(app, 'run_generative_model', fake_run)
+    monkeypatch.setattr(app, 'AGENT_WRITER_MODE', 'sections')
+    content = app.agent_writer(NUMBERED_OUTLINE, "Vendas.", "não usado: {outline}", "Análise de vendas", 'sales_analysis')
+    tree = parse_sections(content)
+    assert len(tree) == 3
+    # Cada seção que falhou mantém a sua nota, mesmo repetida
+    assert app.SECTION_UNAVAILABLE_NOTE in tree.content(tree.find('2'))
+    assert app.SECTION_UNAVAILABLE_NOTE in tree.content(tree.find('3'))
+
+
+def test_stitch_keeps_verbatim_sections_out_of_dedupe():
+    import app
+
+    note = app.SECTION_UNAVAILABLE_NOTE
+    content = stitch_sections(['a', note, note, 'd'], ['## 1. A', '## 2. B', '## 3. C', '## 4. D'], verbatim={1, 2})
+    assert content.count(note) == 2 and "## 3. C\n\n" + note in content
@@ -0,0 +1,74 @@
+import sys
+import os
+
+# Adiciona o diretório 'src' ao PYTHONPATH para que os módulos possam ser importados
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import json
+
+import pytest
+
+from sse_encoding import ResultAssembler, encode_sse_event, iter_result_events, split_result
+
+REPORT = "## 1. Introdução\nVendas por região — ação 📈.\n\n## 2. Métricas\n" + "Receita média por cliente.\n" * 20
+
+
+def parse_events(body: str) -> list:
+    return [(block.split('\n')[0][len('event: '):], json.loads(block.split('\n', 1)[1][len('data: '):]))
+            for block in body.strip().split('\n\n')]
+
+
+def test_encoder_matches_text_frames():
+    import app
+
+    for data, event_type in (("Relatório — ação 📈", 'final_result'), ({'a': [1, 'ç']}, 'report')):
+        assert encode_sse_event(data, event_type) == app.format_sse_event(data, event_type).encode('utf-8')
+
+
+def test_chunks_cut_at_newlines_and_reassemble():
+    parts = list(split_result(REPORT, 100))
+    assert ''.join(parts) == REPORT and all(len(part) <= 100 for part in parts)
+    assert all(part.endswith('\n') for part in parts[:-1])
+    events = parse_events(b''.join(iter_result_events(REPORT, 100)).decode('utf-8'))
+    assert [name for name, _ in events] == ['result_chunk'] * len(parts) + ['result_complete']
+    assembler = ResultAssembler()
+    for _, chunk in events[:-1]:
+        assembler.add(chunk)
+    marker = events[-1][1]
+    assert marker['bytes'] == len(REPORT.encode('utf-8'))
+    assert assembler.complete(marker) == REPORT
+    with pytest.raises(ValueError):
+        assembler.complete({**marker, 'sha256': '0' * 64})
+    with pytest.raises(ValueError):
+        ResultAssembler().add(events[1][1])
+
+
+def test_pipeline_delivers_chunks_on_request(monkeypatch):
+    import app
+
+    class FakeResponse:
+        status_code = 200
+
+        def json(self):
+            return {'candidates': [{'content': {'parts': [{'text': REPORT}]}}]}
+
+    monkeypatch.setattr(app.requests, 'post', lambda *args, **kwargs: FakeResponse())
+    monkeypatch.setattr(app, 'GEMINI_API_KEY', 'teste')
+    monkeypatch.setattr(app, 'AGENT_RESULT_CHUNK_CHARS', 200)
+    form = {'goal': 'Análise de vendas por região', 'text_context': 'Vendas de janeiro a março.'}
+    client = app.app.test_client()
+
+    events = parse_events(client.post('/api/run_agent_system', data={**form, 'result_delivery': 'chunked'}).get_data(as_text=True))
+    names = [name for name, _ in events]
+    assert 'final_result' not in names and names.count('result_chunk') > 1
+    assert names.index('result_complete') < names.index('report') < names.index('end')
+    assembler = ResultAssembler()
+    for name, data in events:
+        if name == 'result_chunk':
+            assembler.add(data)
+    content = assembler.complete(dict(events)['result_complete'])
+    assert content.startswith('## 1. Introdução')
+
+    # Clientes antigos (sem result_delivery) continuam recebendo um único final_result
+    legacy = dict(parse_events(client.post('/api/run_agent_system', data=form).get_data(as_text=True)))
+    assert 'result_chunk' not in legacy and legacy['final_result'] == content
@@ -0,0 +1,136 @@
+import sys
+import os
+
+# Adiciona o diretório 'src' ao PYTHONPATH para que os módulos possam ser importados
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import json
+
+import pytest
+
+from structured_outline import OutlineValidationError, parse_outline_json, render_outline, dedupe_insights
+from report_sections import outline_sections
+
+PRIMARY = {
+    'title': 'Análise de vendas',
+    'sections': [
+        {'title': 'Métricas', 'key_points': ['Receita por região no trimestre', 'Ticket médio'], 'data_refs': ['vendas.receita']},
+        {'title': 'Recomendações', 'key_points': ['Ampliar a equipe do Norte'], 'data_refs': []},
+    ],
+}
+
+
+def test_parse_normalizes_and_validates():
+    text = "```json\n" + json.dumps({'title': ' Vendas ', 'sections': [
+        {'title': 'Métricas', 'key_points': ['  Receita  total ', 'Receita total', '', 42], 'data_refs': None}]}) + "\n```"
+    assert parse_outline_json(text) == {'title': 'Vendas', 'sections': [
+        {'title': 'Métricas', 'key_points': ['Receita total', '42'], 'data_refs': []}]}
+    for invalid in ('não é json', '{"sections": []}', '{"sections": [{"key_points": []}]}',
+                    '{"sections": [{"title": "A", "key_points": "texto"}]}'):
+        with pytest.raises(OutlineValidationError):
+            parse_outline_json(invalid)
+
+
+def test_render_is_compact_and_splits_into_sections():
+    rendered = render_outline(PRIMARY)
+    assert rendered == ("Análise de vendas\n1. Métricas\n   - Receita por região no trimestre\n   - Ticket médio\n"
+                        "   [dados: vendas.receita]\n2. Recomendações\n   - Ampliar a equipe do Norte")
+    assert [section['title'] for section in outline_sections(rendered)] == ['Métricas', 'Recomendações']
+
+
+def test_dedupe_removes_points_seen_before():
+    collaborators = {
+        'product_management': {'title': '', 'sections': [
+            {'title': 'Produto', 'key_points': ['Receitas por região no trimestre', 'Roadmap de features'], 'data_refs': []}]},
+        'user_management': {'title': '', 'sections': [
+            {'title': 'Clientes', 'key_points': ['roadmap de features'], 'data_refs': []},
+            {'title': 'Jornada', 'key_points': ['Mapear a jornada do cliente'], 'data_refs': []}]},
+    }
+    filtered, removed = dedupe_insights(collaborators, PRIMARY)
+    assert removed == 2
+    assert filtered['product_management']['sections'][0]['key_points'] == ['Roadmap de features']
+    assert [section['title'] for section in filtered['user_management']['sections']] == ['Jornada']
+    assert dedupe_insights(collaborators, PRIMARY) == (filtered, removed)
+
+
+def test_structured_pipeline_sends_schema_and_compact_outlines(monkeypatch):
+    import app
+
+    writer_prompts = []
+
+    class FakeResponse:
+        status_code = 200
+
+        def __init__(self, text):
+            self.text = text
+
+        def json(self):
+            return {'candidates': [{'content': {'parts': [{'text': self.text}]}}]}
+
+    def fake_post(url, headers=None, json=None, timeout=None):
+        config = json['generationConfig']
+        prompt = json['contents'][0]['parts'][0]['text']
+        if config.get('responseMimeType') == 'application/json':
+            assert config['responseSchema']['required'] == ['sections'] and 'FORMATO DA RESPOSTA' in prompt
+            return FakeResponse(app.json.dumps(PRIMARY, ensure_ascii=False))
+        writer_prompts.append(prompt)
+        return FakeResponse("## 1. Métricas\nTexto.")
+
+    monkeypatch.setattr(app.requests, 'post', fake_post)
+    monkeypatch.setattr(app, 'GEMINI_API_KEY', 'teste')
+    monkeypatch.setattr(app, 'AGENT_OUTLINE_FORMAT', 'json')
+    monkeypatch.setattr(app, 'AGENT_CONTEXT_CACHE', 'off')
+    classification = app.GoalClassification('sales_analysis', ['sales_analysis'], ['product_management'], [], 1.0)
+    result = app.master_control_plane_enhanced("Análise de vendas por região", "Vendas do trimestre.", 'sales_analysis',
+                                               use_qa=False, classification=classification,
+                                               degradation=app.overload_policy.evaluate(0, 16, 0.0))
+    assert result['outline'] == render_outline(PRIMARY)
+    assert len(writer_prompts) == 1 and render_outline(PRIMARY) in writer_prompts[0]
+    # O colaborador devolveu os mesmos pontos do principal: nada repetido nos insights
+    assert '--- Perspectiva PRODUCT_MANAGEMENT ---' not in writer_prompts[0]
+
+
+def test_invalid_json_falls_back_to_markdown_outline(monkeypatch):
+    import app
+
+    calls = []
+
+    def fake_run(prompt, send_update=None, shared_prefix=None, profile=None, details=None):
+        calls.append(profile.response_mime_type)
+        return "{incompleto" if profile.response_mime_type else "1. Introdução\n2. Conclusão"
+
+    monkeypatch.setattr(app, 'run_generative_model', fake_run)
+    monkeypatch.setattr(app, 'AGENT_OUTLINE_FORMAT', 'json')
+    outline, data = app.research_outline("Objetivo", "Contexto.", "Objetivo: {goal}\n{context}", 'general')
+    assert (outline, data) == ("1. Introdução\n2. Conclusão", None)
+    assert calls == ['application/json', None]
+
+
+def test_truncated_json_retries_with_larger_ceiling(monkeypatch):
+    import app
+
+    ceilings = []
+
+    class FakeResponse:
+        status_code = 200
+
+        def __init__(self, text, finish_reason):
+            self.text, self.finish_reason = text, finish_reason
+
+        def json(self):
+            return {'candidates': [{'content': {'parts': [{'text': self.text}]}, 'finishReason': self.finish_reason}]}
+
+    def fake_post(url, headers=None, json=None, timeout=None):
+        config = json['generationConfig']
+        assert config.get('responseMimeType') == 'application/json'
+        ceilings.append(config['maxOutputTokens'])
+        if len(ceilings) == 1:
+            return FakeResponse('{"sections": [{"title": "Métr', 'MAX_TOKENS')
+        return FakeResponse(app.json.dumps(PRIMARY, ensure_ascii=False), 'STOP')
+
+    monkeypatch.setattr(app.requests, 'post', fake_post)
+    monkeypatch.setattr(app, 'GEMINI_API_KEY', 'teste')
+    monkeypatch.setattr(app, 'AGENT_OUTLINE_FORMAT', 'json')
+    outline, data = app.research_outline("Análise de vendas", "Vendas.", "Objetivo: {goal}\n{context}", 'sales_analysis')
+    assert data == PRIMARY and outline == render_outline(PRIMARY)
+    assert ceilings == [2048, 4096]
@@ -0,0 +1,117 @@
+import sys
+import os
+import io
+
+# Adiciona o diretório 'src' ao PYTHONPATH para que os módulos possam ser importados
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import numpy as np
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from tabular_ingestion import (KIND_DATE, KIND_NUMBER, KIND_STRING, KIND_TEXT, ColumnBuilder, read_delimited, read_tabular,
+                               tabular_format)
+from data_profile import render_profile
+from upload_ingestion import ingest_upload
+
+
+def upload(text: str, filename: str, encoding: str = 'utf-8'):
+    return ingest_upload(FileStorage(io.BytesIO(text.encode(encoding)), filename=filename))
+
+
+def test_tabular_format_by_extension():
+    assert tabular_format('crm.CSV') == 'csv'
+    assert tabular_format('dados.tsv') == 'tsv'
+    assert tabular_format('eventos.ndjson') == 'jsonl'
+    assert tabular_format('dados.json') is None
+
+
+def test_brazilian_csv_with_decimal_comma_and_malformed_rows():
+    text = ("data;vendedor;valor;obs\n"
+            "15/01/2024;Ana;1.299,90;primeira\n"
+            "16/01/2024;Bruno;10,00\n"
+            "17/01/2024;Ana;;\"com ; separador\"\n")
+    table = read_tabular(upload(text, 'vendas.csv'))
+    assert table.rows == 2
+    assert table.malformed_count == 1
+    assert table.malformed[0][0] == 3
+    kinds = {name: column.kind for name, column in table.columns.items()}
+    assert kinds == {'data': KIND_DATE, 'vendedor': KIND_STRING, 'valor': KIND_NUMBER, 'obs': KIND_STRING}
+    values = table.columns['valor'].to_array()
+    assert values[0] == pytest.approx(1299.90)
+    assert np.isnan(values[1])
+    assert table.columns['obs'].to_array().tolist() == ['primeira', 'com ; separador']
+
+
+def test_column_falls_back_to_text_across_batches():
+    rows = ''.join(f"{index},{index * 10}\n" for index in range(5)) + "5,n/d\n6,70\n"
+    table = read_tabular(upload("id,valor\n" + rows, 'dados.csv'), batch_rows=2)
+    column = table.columns['valor']
+    assert column.kind == KIND_STRING
+    assert column.to_array().tolist() == ['0', '10', '20', '30', '40', 'n/d', '70']
+
+
+def test_quoted_multiline_fields_and_tsv():
+    table = read_tabular(upload('a,b\n"linha 1\nlinha 2",3\n', 'dados.csv'))
+    assert table.columns['a'].to_array().tolist() == ['linha 1\nlinha 2']
+    table = read_tabular(upload('a\tb\nx,y\t1\n', 'dados.tsv'))
+    assert table.columns['a'].to_array().tolist() == ['x,y']
+
+
+def test_jsonl_pads_new_columns_and_flags_bad_lines():
+    text = '{"id": 1, "valor": 10}\n{quebrado\n[1, 2]\n{"id": 2, "valor": 5, "canal": "web"}\n'
+    table = read_tabular(upload(text, 'eventos.jsonl'))
+    assert table.rows == 2
+    assert [line for line, _ in table.malformed] == [2, 3]
+    assert table.columns['canal'].to_array().tolist() == ['', 'web']
+    assert table.columns['valor'].to_array().tolist() == [10.0, 5.0]
+
+
+def test_high_cardinality_text_keeps_only_a_sample():
+    text = "cliente,valor\n" + ''.join(f"Cliente {index},{index}\n" for index in range(100))
+    table = read_tabular(upload(text, 'crm.csv'), max_categories=10)
+    column = table.columns['cliente']
+    assert column.kind == KIND_TEXT
+    assert column.to_array() is None
+    assert len(column.samples) == column.text_samples
+    # A coluna de texto fica fora do perfil; as demais continuam completas
+    assert set(table.profile_columns()) == {'valor'}
+    assert table.profile().numeric_summary()['valor']['soma'] == sum(range(100))
+
+
+def test_table_context_has_profile_sample_and_malformed_lines(monkeypatch):
+    import app
+
+    text = "data,vendedor,valor\n" + ''.join(f"2024-0{1 + index % 3}-10,{'Ana' if index % 2 else 'Bruno'},{index}\n"
+                                             for index in range(30)) + "2024-01-01,Ana\n"
+    table = read_tabular(upload(text, 'vendas.csv'), sample_rows=5)
+    context = app.format_table_context(table, profile_mode='alongside')
+    assert context.startswith("Perfil estatístico dos dados")
+    assert "valor por vendedor" in context
+    assert "Amostra dos dados tabulares fornecidos (5 de 30 registros)" in context
+    assert "Linhas malformadas ignoradas: 1" in context
+
+
+@pytest.mark.parametrize('values', [
+    ['1', '2', 'inf', '4'],
+    ['1', 'NaN', '3'],
+    ['1', '1e999', '3'],
+    [1.5, float('inf'), 2],
+    ['1', '', '3,5'],
+    ['2024-01-01', '2024', '2024-03'],
+    ['2024-01-01', '2024-02-30', '2024-03-01'],
+    ['2024-01-01', '', '2024-03-01T10:00'],
+])
+def test_block_conversion_matches_value_by_value(values):
+    batch, single = ColumnBuilder('c'), ColumnBuilder('c')
+    batch.extend(list(values))
+    for value in values:
+        single.append(value)
+    assert (batch.kind, batch.size, batch.missing) == (single.kind, single.size, single.missing)
+    assert str(batch.to_array().tolist()) == str(single.to_array().tolist())
+
+
+def test_non_finite_cells_become_text_and_profile_renders():
+    table = read_delimited(['a,b\n', '1,x\n', 'inf,y\n', '3,x\n', '4,y\n'], 'dados')
+    assert table.columns['a'].kind == KIND_STRING
+    assert 'Tabela dados: 4 registros' in render_profile(table.profile())
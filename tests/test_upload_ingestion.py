@@ -0,0 +1,80 @@
+import sys
+import os
+import io
+
+# Adiciona o diretório 'src' ao PYTHONPATH para que os módulos possam ser importados
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import codecs
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from upload_ingestion import UploadSpool, UploadTooLarge, UploadedText, detect_encoding, ingest_upload
+
+
+def test_spool_rolls_over_to_disk_and_hashes_while_writing():
+    import hashlib
+
+    spool = UploadSpool(memory_bytes=10)
+    spool.write(b"12345")
+    assert not spool.on_disk
+    spool.write(b"6789012345")
+    assert spool.on_disk
+    assert spool.size_bytes == 15
+    assert spool.sha256 == hashlib.sha256(b"123456789012345").hexdigest()
+    with spool.view() as buffer:
+        assert bytes(buffer) == b"123456789012345"
+
+
+def test_spool_enforces_size_cap():
+    spool = UploadSpool(max_bytes=8)
+    spool.write(b"1234")
+    with pytest.raises(UploadTooLarge):
+        spool.write(b"56789")
+
+
+@pytest.mark.parametrize("raw, expected", [
+    (codecs.BOM_UTF8 + "ação".encode('utf-8'), ('utf-8', 3)),
+    (codecs.BOM_UTF16_LE + "ação".encode('utf-16-le'), ('utf-16-le', 2)),
+    ("ação".encode('utf-8'), ('utf-8', 0)),
+])
+def test_detect_encoding(raw, expected):
+    assert detect_encoding(raw) == expected
+
+
+def test_latin1_text_is_not_decoded_as_utf8():
+    raw = ("Relatório de expansão da região " * 20).encode('cp1252')
+    upload = ingest_upload(FileStorage(io.BytesIO(raw), filename='dados.txt'))
+    assert upload.encoding != 'utf-8'
+    assert upload.read_text() == raw.decode('cp1252')
+
+
+def test_incremental_and_full_decoding_match_on_disk():
+    text = "Análise de mercado – cenário 🚀\n" * 5000
+    spool = UploadSpool(memory_bytes=1024)
+    raw = text.encode('utf-8')
+    for start in range(0, len(raw), 4096):
+        spool.write(raw[start:start + 4096])
+    upload = UploadedText(spool, 'dados.txt')
+    assert spool.on_disk
+    # Blocos de 7 bytes cortam caracteres multibyte no meio
+    assert ''.join(upload.iter_text(chunk_bytes=7)) == text
+    assert upload.read_text() == text
+    assert upload.head(10) == text[:10]
+    upload.close()
+
+
+def test_endpoint_rejects_oversized_upload_with_error_event(monkeypatch):
+    import app as app_module
+
+    monkeypatch.setattr(app_module.AgentRequest, 'upload_max_bytes', 1024)
+    response = app_module.app.test_client().post('/api/run_agent_system', data={
+        'goal': 'Teste',
+        'dataSource': (io.BytesIO(b"x" * 4096), 'grande.txt'),
+    }, content_type='multipart/form-data')
+    body = response.get_data(as_text=True)
+    events = [line for line in body.splitlines() if line.startswith('event:')]
+    assert events[0] == 'event: log'
+    assert 'event: error' in events
+    assert 'limite' in body